@@ -47,6 +47,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'leaf_api.timing.ServerTimingMiddleware',
+    'leaf_api.tracing.TracingMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -84,6 +86,10 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        'OPTIONS': {
+            # Writers from several gunicorn workers wait instead of failing fast
+            'timeout': 20,
+        },
     }
 }
 
@@ -130,3 +136,165 @@ STATIC_ROOT = os.path.join(BASE_DIR, "staticfiles")
 # https://docs.djangoproject.com/en/4.2/ref/settings/#default-auto-field
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
+
+
+# Image decode / preprocess pool
+# "thread" (default), "process" (tensors returned through shared memory)
+# or "none" (decode inline in the request thread)
+
+DECODE_POOL_KIND = os.environ.get("DECODE_POOL_KIND", "thread")
+DECODE_POOL_WORKERS = int(os.environ.get("DECODE_POOL_WORKERS", 0)) or None  # None: runtime planner decides
+
+# Decode each uploaded image as soon as its multipart part has arrived
+# (leaf_api/uploads.py) instead of after the whole body is parsed
+STREAMING_UPLOAD_DECODE = os.environ.get("STREAMING_UPLOAD_DECODE", "1") == "1"
+
+
+# Runtime planner and micro-batching (leaf_api/ml/planner.py)
+# MICRO_BATCH_SIZE = 0 autotunes the size at worker start against
+# AUTOTUNE_LATENCY_TARGET_MS; any other value is used as-is. A request
+# waiting longer than MICRO_BATCH_TIMEOUT_S for its batch fails.
+
+MICRO_BATCH_SIZE = int(os.environ.get("MICRO_BATCH_SIZE", 0))
+MICRO_BATCH_WAIT_MS = float(os.environ.get("MICRO_BATCH_WAIT_MS", 2.0))
+MICRO_BATCH_TIMEOUT_S = float(os.environ.get("MICRO_BATCH_TIMEOUT_S", 30))
+AUTOTUNE_LATENCY_TARGET_MS = float(os.environ.get("AUTOTUNE_LATENCY_TARGET_MS", 250))
+
+# Write-behind persistence of prediction records (leaf_api/recorder.py)
+
+PREDICTION_RECORDING = os.environ.get("PREDICTION_RECORDING", "1") == "1"
+RECORDER_BATCH_SIZE = int(os.environ.get("RECORDER_BATCH_SIZE", 200))
+RECORDER_FLUSH_INTERVAL_S = float(os.environ.get("RECORDER_FLUSH_INTERVAL_S", 1.0))
+RECORDER_MAX_QUEUE = int(os.environ.get("RECORDER_MAX_QUEUE", 10000))
+
+# Preprocessed tensor store for re-scoring (leaf_api/ml/tensor_store.py)
+
+TENSOR_STORE_ENABLED = os.environ.get("TENSOR_STORE_ENABLED", "0") == "1"
+TENSOR_STORE_DIR = os.environ.get("TENSOR_STORE_DIR", os.path.join(BASE_DIR, "tensor_store"))
+
+# Versioned model registry (leaf_api/ml/registry.py)
+# Workers poll ml_models/<name>/ACTIVE and hot-swap when it changes.
+
+MODEL_DIR = os.environ.get("MODEL_DIR", os.path.join(BASE_DIR, "ml_models"))
+MODEL_WATCH_INTERVAL_S = float(os.environ.get("MODEL_WATCH_INTERVAL_S", 10))
+# Load from the <model>.fast/ artifacts written by `manage.py convert_models`
+# when they match their .h5 (leaf_api/ml/artifacts.py)
+MODEL_FAST_LOAD = os.environ.get("MODEL_FAST_LOAD", "1") == "1"
+
+# "local": every worker loads the models itself.
+# "server": workers send tensors to `manage.py run_inference_server`
+# over INFERENCE_SOCKET and never import TensorFlow. The socket is created
+# 0600, so the server and the workers must run as the same user.
+
+INFERENCE_BACKEND = os.environ.get("INFERENCE_BACKEND", "local")
+INFERENCE_SOCKET = os.environ.get("INFERENCE_SOCKET", "/tmp/agrihat-inference.sock")
+
+# Server-Timing header (upload / decode / quality / inference / aggregation /
+# render, request CPU time, process peak RSS delta, result source) on every
+# response
+
+SERVER_TIMING_ENABLED = os.environ.get("SERVER_TIMING_ENABLED", "1") == "1"
+
+# Opt-in request profiling (leaf_api/profiling.py): cProfile + tracemalloc
+# for requests with a signed X-Profile header (needs PROFILING_SECRET) or
+# sampled at PROFILING_SAMPLE_RATE (0..1)
+
+PROFILING_SECRET = os.environ.get("PROFILING_SECRET", "")
+PROFILING_TOKEN_TTL_S = int(os.environ.get("PROFILING_TOKEN_TTL_S", 300))
+PROFILING_SAMPLE_RATE = float(os.environ.get("PROFILING_SAMPLE_RATE", 0))
+PROFILING_DIR = os.environ.get("PROFILING_DIR", os.path.join(BASE_DIR, "profiles"))
+PROFILING_MAX_CAPTURES = int(os.environ.get("PROFILING_MAX_CAPTURES", 50))
+PROFILING_TOP_ALLOCATIONS = int(os.environ.get("PROFILING_TOP_ALLOCATIONS", 25))
+
+# Span tracing (leaf_api/tracing.py): OTLP/JSON lines, one file per worker
+# process in TRACING_DIR, rotated once past TRACING_MAX_BYTES
+
+TRACING_ENABLED = os.environ.get("TRACING_ENABLED", "0") == "1"
+TRACING_SAMPLE_RATE = float(os.environ.get("TRACING_SAMPLE_RATE", 1.0))
+TRACING_DIR = os.environ.get("TRACING_DIR", os.path.join(BASE_DIR, "traces"))
+TRACING_MAX_BYTES = int(os.environ.get("TRACING_MAX_BYTES", 64 * 1024 * 1024))
+
+# Resumable chunked uploads (leaf_api/resumable.py)
+
+UPLOAD_CHUNK_DIR = os.environ.get("UPLOAD_CHUNK_DIR", os.path.join(BASE_DIR, "upload_chunks"))
+UPLOAD_CHUNK_SIZE = int(os.environ.get("UPLOAD_CHUNK_SIZE", 256 * 1024))  # suggested to clients
+UPLOAD_MAX_CHUNK_BYTES = int(os.environ.get("UPLOAD_MAX_CHUNK_BYTES", 1024 * 1024))
+UPLOAD_MAX_IMAGE_BYTES = int(os.environ.get("UPLOAD_MAX_IMAGE_BYTES", 20 * 1024 * 1024))
+UPLOAD_MAX_IMAGES = int(os.environ.get("UPLOAD_MAX_IMAGES", 10))
+UPLOAD_SESSION_TTL_H = float(os.environ.get("UPLOAD_SESSION_TTL_H", 24))
+UPLOAD_CLEANUP_INTERVAL_S = float(os.environ.get("UPLOAD_CLEANUP_INTERVAL_S", 3600))
+
+# Worker memory watchdog (leaf_api/watchdog.py), started by gunicorn.conf.py.
+# MEMORY_LIMIT_MB = 0: 90% of the cgroup memory limit split across workers
+# (no ceiling without a cgroup limit). Growth limit 0 disables that check.
+
+MEMORY_WATCHDOG_ENABLED = os.environ.get("MEMORY_WATCHDOG_ENABLED", "1") == "1"
+MEMORY_LIMIT_MB = int(os.environ.get("MEMORY_LIMIT_MB", 0))
+MEMORY_GROWTH_LIMIT_MB_PER_H = float(os.environ.get("MEMORY_GROWTH_LIMIT_MB_PER_H", 200))
+MEMORY_GROWTH_WINDOW_S = float(os.environ.get("MEMORY_GROWTH_WINDOW_S", 900))
+MEMORY_WARMUP_S = float(os.environ.get("MEMORY_WARMUP_S", 300))
+MEMORY_SAMPLE_INTERVAL_S = float(os.environ.get("MEMORY_SAMPLE_INTERVAL_S", 15))
+MEMORY_EVENTS_FILE = os.environ.get("MEMORY_EVENTS_FILE", os.path.join(BASE_DIR, "memory_events.jsonl"))
+
+# Short sweep videos (POST /api/video/, leaf_api/ml/video.py): only
+# VIDEO_CANDIDATES frames are decoded, at most VIDEO_MAX_FRAMES are scored.
+
+VIDEO_MAX_BYTES = int(os.environ.get("VIDEO_MAX_BYTES", 30 * 1024 * 1024))
+VIDEO_MAX_SECONDS = float(os.environ.get("VIDEO_MAX_SECONDS", 15))
+VIDEO_CANDIDATES = int(os.environ.get("VIDEO_CANDIDATES", 20))
+VIDEO_MAX_FRAMES = int(os.environ.get("VIDEO_MAX_FRAMES", 6))
+VIDEO_BLUR_RATIO = float(os.environ.get("VIDEO_BLUR_RATIO", 0.4))
+VIDEO_MIN_DIFFERENCE = float(os.environ.get("VIDEO_MIN_DIFFERENCE", 12))
+
+# Whole-plant photos (POST /api/plant-photo/, leaf_api/ml/tiling.py): windows
+# of TILE_SIZE px on the photo downscaled to TILE_MAX_SIDE; at most
+# TILE_MAX_PATCHES windows with TILE_MIN_VEGETATION plant share are scored.
+TILE_MAX_BYTES = int(os.environ.get("TILE_MAX_BYTES", 20 * 1024 * 1024))
+TILE_MAX_SIDE = int(os.environ.get("TILE_MAX_SIDE", 1024))
+TILE_SIZE = int(os.environ.get("TILE_SIZE", 256))
+TILE_STRIDE = int(os.environ.get("TILE_STRIDE", 128))
+TILE_MIN_VEGETATION = float(os.environ.get("TILE_MIN_VEGETATION", 0.25))
+TILE_MAX_PATCHES = int(os.environ.get("TILE_MAX_PATCHES", 48))
+
+# Shadow traffic (leaf_api/shadow.py): "endpoint=backend spec,..." with specs
+# as in leaf_api/ml/compare.py, e.g. "leaf=tflite:/models/leaf_int8.tflite".
+# Empty disables it.
+
+SHADOW_BACKENDS = os.environ.get("SHADOW_BACKENDS", "")
+SHADOW_SAMPLE_RATE = float(os.environ.get("SHADOW_SAMPLE_RATE", 0.05))
+SHADOW_MAX_QUEUE = int(os.environ.get("SHADOW_MAX_QUEUE", 100))
+SHADOW_LOG_FILE = os.environ.get("SHADOW_LOG_FILE", os.path.join(BASE_DIR, "shadow.jsonl"))
+
+# Similar past cases (leaf_api/ml/embeddings.py): embeddings of confirmed
+# cases are stored under EMBEDDING_DIR and searchable after
+# `manage.py build_embedding_index`.
+EMBEDDINGS_ENABLED = os.environ.get("EMBEDDINGS_ENABLED", "0") == "1"
+EMBEDDING_DIR = os.environ.get("EMBEDDING_DIR", os.path.join(BASE_DIR, "embeddings"))
+EMBEDDING_NPROBE = int(os.environ.get("EMBEDDING_NPROBE", 8))
+EMBEDDING_RELOAD_S = float(os.environ.get("EMBEDDING_RELOAD_S", 30))
+SIMILAR_CASES_K = int(os.environ.get("SIMILAR_CASES_K", 5))
+
+# Plot progression (leaf_api/progression.py): trend thresholds on the 0-1
+# disease score and history retention (`manage.py compact_plot_history`)
+PLOT_HALF_LIFE_DAYS = float(os.environ.get("PLOT_HALF_LIFE_DAYS", 4))
+PLOT_TREND_DELTA = float(os.environ.get("PLOT_TREND_DELTA", 0.1))
+PLOT_RAW_DAYS = int(os.environ.get("PLOT_RAW_DAYS", 30))
+PLOT_RETENTION_DAYS = int(os.environ.get("PLOT_RETENTION_DAYS", 365))
+
+# Localized advisories (leaf_api/ml/advisory.py); catalogs are LOCALE_DIR/<locale>.json.
+# No catalog ships with the repo yet: until translators fill in the files from
+# `manage.py export_advisory_strings`, every locale falls back to English and
+# responses say Content-Language: en.
+ADVISORY_LOCALES = os.environ.get("ADVISORY_LOCALES", "en,kn,hi,ml")
+LOCALE_DIR = os.environ.get("LOCALE_DIR", os.path.join(BASE_DIR, "leaf_api", "locale"))
+
+LOGGING = {
+    "version": 1,
+    "disable_existing_loggers": False,
+    "handlers": {
+        "console": {"class": "logging.StreamHandler"},
+    },
+    "loggers": {
+        "leaf_api": {"handlers": ["console"], "level": "INFO"},
+    },
+}
@@ -0,0 +1,42 @@
+"""
+API-only settings profile.
+
+Everything the prediction endpoints need and nothing else: no admin,
+auth, sessions, messages or CSRF (the API is stateless and csrf_exempt
+anyway), no templates or browsable API, and DRF without authentication.
+
+Select it with DJANGO_SETTINGS_MODULE=agrihat_backend.settings_api;
+`manage.py bench_settings_profiles` compares it with the default profile.
+"""
+
+from .settings import *  # noqa: F401,F403
+
+INSTALLED_APPS = [
+    'rest_framework',
+    'leaf_api',
+]
+
+MIDDLEWARE = [
+    'leaf_api.timing.ServerTimingMiddleware',
+    'leaf_api.tracing.TracingMiddleware',
+    'django.middleware.security.SecurityMiddleware',
+    'django.middleware.common.CommonMiddleware',
+]
+
+ROOT_URLCONF = 'agrihat_backend.urls_api'
+
+TEMPLATES = []
+
+AUTH_PASSWORD_VALIDATORS = []
+
+REST_FRAMEWORK = {
+    'DEFAULT_AUTHENTICATION_CLASSES': [],
+    'DEFAULT_PERMISSION_CLASSES': ['rest_framework.permissions.AllowAny'],
+    'UNAUTHENTICATED_USER': None,
+    'DEFAULT_RENDERER_CLASSES': ['rest_framework.renderers.JSONRenderer'],
+    'DEFAULT_PARSER_CLASSES': [
+        'rest_framework.parsers.JSONParser',
+        'rest_framework.parsers.MultiPartParser',
+        'rest_framework.parsers.FormParser',
+    ],
+}
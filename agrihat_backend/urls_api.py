@@ -0,0 +1,6 @@
+from django.urls import path, include
+
+# API-only URLconf (settings_api): no admin
+urlpatterns = [
+    path('api/', include('leaf_api.urls')),
+]
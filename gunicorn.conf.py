@@ -0,0 +1,26 @@
+# gunicorn.conf.py
+#
+# Worker count comes from the runtime planner so that
+# workers x TensorFlow intra-op threads never exceeds the CPU quota.
+
+from leaf_api.ml.planner import plan_runtime
+
+_plan = plan_runtime()
+
+workers = _plan["workers"]
+# Models take a while to load; don't let the arbiter kill a booting worker
+timeout = 120
+# A worker recycled by the memory watchdog finishes its in-flight requests
+graceful_timeout = 60
+
+
+def post_worker_init(worker):
+    # Load the URLconf and the models, warmed, before this worker accepts
+    # its first request; then watch its memory
+    from django.urls import get_resolver
+    from leaf_api.ml.engine import load_engines
+    from leaf_api.watchdog import start_watchdog
+
+    get_resolver().url_patterns
+    load_engines()
+    start_watchdog()
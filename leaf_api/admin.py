@@ -1,3 +1,25 @@
 from django.contrib import admin
 
-# Register your models here.
+from .models import ImageResult, Submission
+
+
+class ImageResultInline(admin.TabularInline):
+    model = ImageResult
+    extra = 0
+    fields = ("position", "label", "confidence", "quality_ok", "quality_message", "image_hash")
+    readonly_fields = fields
+
+
+@admin.register(Submission)
+class SubmissionAdmin(admin.ModelAdmin):
+    list_display = ("created_at", "endpoint", "crop", "label", "status", "confidence", "latency_ms", "model_version")
+    list_filter = ("endpoint", "crop", "status")
+    date_hierarchy = "created_at"
+    inlines = [ImageResultInline]
+
+
+@admin.register(ImageResult)
+class ImageResultAdmin(admin.ModelAdmin):
+    list_display = ("submission", "position", "crop", "label", "confidence", "quality_ok")
+    list_filter = ("crop", "label", "quality_ok")
+    search_fields = ("image_hash",)
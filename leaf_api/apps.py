@@ -4,3 +4,9 @@ from django.apps import AppConfig
 class LeafApiConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'leaf_api'
+
+    def ready(self):
+        from django.db.backends.signals import connection_created
+        from .recorder import enable_sqlite_wal
+
+        connection_created.connect(enable_sqlite_wal)
@@ -0,0 +1,55 @@
+# localization.py
+#
+# Response side of the localized advisories (ml/advisory.py): picking the
+# locale of a request and rendering LocalizedResult by splicing its
+# pre-serialized fragment in, so only the per-request fields are encoded.
+
+from rest_framework.renderers import JSONRenderer
+
+from .ml.advisory import LocalizedResult, get_catalog, locales
+
+
+def served_locales():
+    """ADVISORY_LOCALES that have translations loaded; English always"""
+    return ["en"] + [code for code in locales() if code != "en" and get_catalog(code).strings]
+
+
+def negotiate_locale(request):
+    """?lang=<code>, else the best Accept-Language match, else English"""
+    # A locale without a catalog would advertise its Content-Language over English text
+    supported = served_locales()
+    lang = request.query_params.get("lang", "").lower()
+    if lang:
+        lang = lang.split("-")[0]
+        return lang if lang in supported else "en"
+
+    choices = []
+    for i, part in enumerate(request.headers.get("Accept-Language", "").split(",")):
+        code, _, params = part.strip().partition(";")
+        q = 1.0
+        if params.strip().startswith("q="):
+            try:
+                q = float(params.strip()[2:])
+            except ValueError:
+                q = 0.0
+        code = code.strip().lower().split("-")[0]
+        if code in supported and q > 0:
+            choices.append((-q, i, code))
+    return min(choices)[2] if choices else "en"
+
+
+class AdvisoryJSONRenderer(JSONRenderer):
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if (
+            not isinstance(data, LocalizedResult)
+            or not data.static
+            or self.get_indent(accepted_media_type, renderer_context or {})
+            or data.static != set(data.fragment.fields)
+        ):
+            return super().render(data, accepted_media_type, renderer_context)
+
+        per_request = {k: v for k, v in data.items() if k not in data.static}
+        head = super().render(per_request, accepted_media_type, renderer_context)
+        if per_request:
+            return head[:-1] + b"," + data.fragment.json + b"}"
+        return b"{" + data.fragment.json + b"}"
@@ -0,0 +1,43 @@
+import os
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from leaf_api.ml.engine import ENGINES
+from leaf_api.ml.registry import ACTIVE_FILE, MODEL_FILE, version_key, write_active
+
+
+class Command(BaseCommand):
+    help = (
+        "Point all workers at a model version (ml_models/<name>/<version>/). "
+        "Workers load and warm it in the background and swap without a restart."
+    )
+    requires_system_checks = []
+
+    def add_arguments(self, parser):
+        parser.add_argument("name", choices=sorted(ENGINES))
+        parser.add_argument("version", nargs="?", help="Omit to list available versions")
+
+    def handle(self, *args, **options):
+        root = os.path.join(settings.MODEL_DIR, options["name"])
+        versions = sorted(
+            (v for v in os.listdir(root) if os.path.isfile(os.path.join(root, v, MODEL_FILE))),
+            key=version_key
+        ) if os.path.isdir(root) else []
+
+        if not options["version"]:
+            active_path = os.path.join(root, ACTIVE_FILE)
+            active = open(active_path).read().strip() if os.path.exists(active_path) else None
+            for v in versions:
+                marker = "*" if v == active or (active is None and v == versions[-1]) else " "
+                self.stdout.write(f"{marker} {v}")
+            return
+
+        if options["version"] not in versions:
+            raise CommandError(f"No {MODEL_FILE} for version {options['version']} under {root}")
+
+        write_active(options["name"], options["version"])
+        self.stdout.write(self.style.SUCCESS(
+            f"{options['name']} -> {options['version']}; workers swap within "
+            f"{settings.MODEL_WATCH_INTERVAL_S:g}s"
+        ))
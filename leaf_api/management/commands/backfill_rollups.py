@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from leaf_api.rollups import rebuild_rollups
+
+
+class Command(BaseCommand):
+    help = "Rebuild the disease-prevalence rollups from all recorded submissions"
+    requires_system_checks = []
+
+    def add_arguments(self, parser):
+        parser.add_argument("--chunk-size", type=int, default=5000)
+
+    def handle(self, *args, **options):
+        total = rebuild_rollups(chunk_size=options["chunk_size"])
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt rollups from {total} submissions"))
@@ -0,0 +1,246 @@
+import csv
+import json
+import multiprocessing
+import os
+import shutil
+import tempfile
+import zipfile
+from collections import OrderedDict
+from contextlib import contextmanager
+
+from django.core.management.base import BaseCommand, CommandError
+
+from leaf_api.ml.engine import ENGINES, get_engine
+
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".bmp", ".webp")
+
+CSV_FIELDS = [
+    "submission", "image_count", "status", "crop", "label",
+    "confidence", "agreement", "health_score", "model_version",
+]
+
+
+# ======================================================
+# WORKER PROCESS
+# ======================================================
+_engine = None
+
+
+def _init_worker(engine_name, threads):
+    """Runs once per worker process: split the CPU, then load one model"""
+    global _engine
+    os.environ["WEB_CONCURRENCY"] = "1"
+    os.environ["TF_INTRA_OP_THREADS"] = str(threads)
+    os.environ["DECODE_POOL_WORKERS"] = str(threads)
+
+    import django
+    django.setup()
+
+    _engine = get_engine(engine_name)
+    _engine.engine.registry  # load before the first task
+
+
+def _score(task):
+    """task: (key, crop, archive or None, [paths or members]) -> output row"""
+    key, crop, archive, members = task
+    tmp_dir = None
+
+    try:
+        if archive:
+            tmp_dir = tempfile.mkdtemp(prefix="batch_predict_")
+            with zipfile.ZipFile(archive) as zf:
+                paths = []
+                for i, member in enumerate(members):
+                    path = os.path.join(tmp_dir, f"{i}{os.path.splitext(member)[1]}")
+                    with zf.open(member) as src, open(path, "wb") as dst:
+                        shutil.copyfileobj(src, dst)
+                    paths.append(path)
+        else:
+            paths = members
+
+        details = {}
+        if crop is None:
+            result = _engine.predict_images(paths, details)
+        else:
+            result = _engine.predict_images(paths, crop, details)
+
+        return {
+            "submission": key,
+            "images": [os.path.basename(m) for m in members],
+            "image_count": len(members),
+            "status": result.get("status"),
+            "crop": result.get("crop", crop or ""),
+            "label": details.get("label", ""),
+            "confidence": result.get("confidence"),
+            "agreement": result.get("agreement"),
+            "health_score": result.get("health_score"),
+            "model_version": details.get("model_version", ""),
+            "per_image": details.get("images", []),
+        }
+    except Exception as e:
+        return {"submission": key, "image_count": len(members), "status": "failed", "error": str(e)}
+    finally:
+        if tmp_dir:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+
+
+# ======================================================
+# COMMAND
+# ======================================================
+class Command(BaseCommand):
+    help = (
+        "Score a directory or ZIP archive of field images offline. Images are grouped "
+        "into submissions by subfolder or manifest; results are appended to a CSV / "
+        "JSONL file and a rerun resumes where the previous one stopped."
+    )
+    requires_system_checks = []
+
+    def add_arguments(self, parser):
+        parser.add_argument("source", help="Directory or .zip archive")
+        parser.add_argument("output", help="Results file (.jsonl or .csv)")
+        parser.add_argument("--engine", choices=sorted(ENGINES), default="leaf")
+        parser.add_argument("--crop", help="Crop for the leaf engine when the manifest has none")
+        parser.add_argument(
+            "--manifest",
+            help="CSV with columns submission,path[,crop]; paths relative to the source"
+        )
+        parser.add_argument("--processes", type=int, default=os.cpu_count() or 1)
+        parser.add_argument("--min-images", type=int, default=3)
+
+    def handle(self, *args, **options):
+        source, output = options["source"], options["output"]
+        engine = options["engine"]
+        fmt = "csv" if output.lower().endswith(".csv") else "jsonl"
+
+        archive = source if zipfile.is_zipfile(source) else None
+        if not archive and not os.path.isdir(source):
+            raise CommandError(f"{source} is neither a directory nor a ZIP archive")
+
+        names = self._list_images(source, archive)
+        groups = self._group(names, options["manifest"])
+        done = self._completed(output, fmt)
+
+        tasks, skipped = [], []
+        for key, (crop, members) in groups.items():
+            if key in done:
+                continue
+            crop = crop or options["crop"]
+            if engine == "leaf" and not crop:
+                raise CommandError(f"Submission {key} has no crop; pass --crop or a manifest crop column")
+            if len(members) < options["min_images"]:
+                skipped.append({"submission": key, "image_count": len(members), "status": "skipped"})
+                continue
+
+            if not archive:
+                members = [os.path.join(source, m) for m in members]
+            tasks.append((key, crop.capitalize() if engine == "leaf" else None, archive, members))
+
+        self.stdout.write(
+            f"{len(groups)} submissions: {len(done)} already done, "
+            f"{len(skipped)} below --min-images, {len(tasks)} to score"
+        )
+
+        processes = max(1, min(options["processes"], len(tasks) or 1))
+        threads = max(1, (os.cpu_count() or 1) // processes)
+
+        with self._open_output(output, fmt) as (f, write):
+            for row in skipped:
+                write(row)
+
+            if processes == 1:
+                _init_worker(engine, threads)
+                results = map(_score, tasks)
+                self._drain(results, write, f, len(tasks))
+            else:
+                ctx = multiprocessing.get_context("forkserver")
+                with ctx.Pool(processes, initializer=_init_worker, initargs=(engine, threads)) as pool:
+                    self._drain(pool.imap_unordered(_score, tasks), write, f, len(tasks))
+
+    def _drain(self, results, write, f, total):
+        for n, row in enumerate(results, 1):
+            write(row)
+            f.flush()  # every finished submission survives an interruption
+            if n % 100 == 0 or n == total:
+                self.stdout.write(f"{n}/{total} scored")
+
+    # ---------- discovery ----------
+    def _list_images(self, source, archive):
+        if archive:
+            with zipfile.ZipFile(archive) as zf:
+                names = [n for n in zf.namelist() if not n.endswith("/")]
+        else:
+            names = []
+            for root, _, files in os.walk(source):
+                for name in files:
+                    names.append(os.path.relpath(os.path.join(root, name), source).replace(os.sep, "/"))
+
+        return sorted(n for n in names if n.lower().endswith(IMAGE_EXTENSIONS))
+
+    def _group(self, names, manifest):
+        """OrderedDict key -> (crop or None, [relative names])"""
+        groups = OrderedDict()
+
+        if manifest:
+            available = set(names)
+            with open(manifest, newline="") as mf:
+                for row in csv.DictReader(mf):
+                    path = row["path"][2:] if row["path"].startswith("./") else row["path"]
+                    if path not in available:
+                        raise CommandError(f"Manifest path not found in source: {row['path']}")
+                    crop, members = groups.setdefault(row["submission"], (row.get("crop") or None, []))
+                    members.append(path)
+            return groups
+
+        for name in names:
+            folder = os.path.dirname(name) or "."
+            groups.setdefault(folder, (None, []))[1].append(name)
+        return groups
+
+    # ---------- resumable output ----------
+    def _completed(self, output, fmt):
+        if not os.path.exists(output):
+            return set()
+
+        done = set()
+        with open(output, newline="") as f:
+            if fmt == "csv":
+                for row in csv.DictReader(f):
+                    if row.get("status") and row["status"] != "failed":
+                        done.add(row["submission"])
+            else:
+                for line in f:
+                    try:
+                        row = json.loads(line)
+                    except ValueError:
+                        continue  # line cut short by the interruption
+                    if row.get("status") != "failed":
+                        done.add(row["submission"])
+        return done
+
+    @contextmanager
+    def _open_output(self, output, fmt):
+        exists = os.path.exists(output) and os.path.getsize(output) > 0
+
+        if exists:
+            with open(output, "rb") as tail:
+                tail.seek(-1, os.SEEK_END)
+                partial = tail.read(1) != b"\n"
+        else:
+            partial = False
+
+        with open(output, "a", newline="") as f:
+            if partial:
+                f.write("\n")  # terminate the line cut short by the interruption
+
+            if fmt == "csv":
+                writer = csv.DictWriter(f, fieldnames=CSV_FIELDS, extrasaction="ignore")
+                if not exists:
+                    writer.writeheader()
+                write = writer.writerow
+            else:
+                def write(row):
+                    f.write(json.dumps(row) + "\n")
+
+            yield f, write
+
+        self.stdout.write(f"Results written to {output}")
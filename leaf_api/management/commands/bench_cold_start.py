@@ -0,0 +1,87 @@
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from leaf_api.ml.artifacts import is_current
+
+# Fresh interpreter per run: process start -> Django -> TensorFlow -> model -> first prediction
+CHILD = r"""
+import json, os, sys, time
+spawned, path, fast = float(sys.argv[1]), sys.argv[2], sys.argv[3] == "fast"
+started = time.time()
+
+import django
+django.setup()
+import numpy as np
+from leaf_api.ml.artifacts import load_model
+from leaf_api.ml.preprocess import TENSOR_SHAPE
+
+t = time.perf_counter()
+import tensorflow as tf
+import_ms = (time.perf_counter() - t) * 1000
+
+t = time.perf_counter()
+model, source = load_model(path, fast=fast)
+load_ms = (time.perf_counter() - t) * 1000
+
+t = time.perf_counter()
+model.predict_on_batch(np.zeros((1,) + TENSOR_SHAPE, dtype=np.float32))
+predict_ms = (time.perf_counter() - t) * 1000
+
+with open("/proc/self/statm") as f:
+    rss_mb = int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2**20
+
+print(json.dumps({
+    "source": source, "interpreter_ms": (started - spawned) * 1000,
+    "import_ms": import_ms, "load_ms": load_ms, "predict_ms": predict_ms,
+    "total_ms": (time.time() - spawned) * 1000, "rss_mb": rss_mb,
+}))
+"""
+
+COLUMNS = ("interpreter_ms", "import_ms", "load_ms", "predict_ms", "total_ms", "rss_mb")
+
+
+class Command(BaseCommand):
+    help = "Time process start to first prediction, loading from the .h5 and from its .fast artifact"
+    requires_system_checks = []
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "model", nargs="?",
+            default=os.path.join(settings.MODEL_DIR, "leaf_model.h5"),
+            help="Model file (default: the legacy leaf model)"
+        )
+        parser.add_argument("--rounds", type=int, default=3, help="Runs per mode; medians are reported")
+
+    def handle(self, *args, **options):
+        path = options["model"]
+        if not os.path.isfile(path):
+            raise CommandError(f"No such model file: {path}")
+        if not is_current(path):
+            raise CommandError(f"No current artifact for {path}; run `manage.py convert_models` first")
+
+        self.stdout.write(f"{path}, median of {options['rounds']} runs per mode")
+        self.stdout.write(f"{'mode':<6}" + "".join(f"{c:>16}" for c in COLUMNS))
+
+        for mode in ("h5", "fast"):
+            runs = [self._run(path, mode) for _ in range(options["rounds"])]
+            if any(r["source"] != mode for r in runs):
+                raise CommandError(f"{mode} run loaded from {runs[0]['source']}")
+            self.stdout.write(
+                f"{mode:<6}" + "".join(f"{statistics.median(r[c] for r in runs):>16.1f}" for c in COLUMNS)
+            )
+
+    def _run(self, path, mode):
+        proc = subprocess.run(
+            [sys.executable, "-c", CHILD, repr(time.time()), path, mode],
+            env=dict(os.environ), capture_output=True, text=True
+        )
+        if proc.returncode != 0:
+            raise CommandError(f"{mode} run failed:\n{proc.stderr}")
+        return json.loads(proc.stdout.strip().splitlines()[-1])
@@ -0,0 +1,75 @@
+import time
+
+from django.core.management.base import BaseCommand
+from rest_framework.renderers import JSONRenderer
+
+from leaf_api.localization import AdvisoryJSONRenderer
+from leaf_api.ml.advisory import (
+    advisory_strings, compile_model, get_catalog, install_catalog, localize, locales, sample_advisories,
+    translate_result,
+)
+from leaf_api.ml.engine import get_engine
+
+
+class Command(BaseCommand):
+    help = (
+        "Time building and rendering a prediction response in English and in every "
+        "ADVISORY_LOCALES locale, against translating the advisory per request. "
+        "Locales without translations get a pseudo-translation so they do real work."
+    )
+    requires_system_checks = []
+
+    def add_arguments(self, parser):
+        parser.add_argument("--model", default="leaf", help="Crop model whose advisories are rendered")
+        parser.add_argument("--rounds", type=int, default=2000, help="Responses per case")
+
+    def handle(self, *args, **options):
+        model = get_engine(options["model"]).engine.model
+        rounds = options["rounds"]
+
+        pseudo = []
+        for code in locales():
+            if code != "en" and not get_catalog(code).strings:
+                install_catalog(code, {text: f"[{code}] {text} ಠ" for text in advisory_strings(model)})
+                pseudo.append(code)
+        if pseudo:
+            self.stdout.write(f"Pseudo-translated (no catalog entries): {', '.join(pseudo)}")
+        compile_model(model)
+
+        # What a response looks like when it leaves finish_prediction
+        responses = []
+        for label, result in sample_advisories(model):
+            result = dict(result, model_version="v1", calibration_version="default-1",
+                          submission_id="00000000-0000-0000-0000-000000000000")
+            if result.get("status") == "early_risk":
+                result["why_not_confirmed"] = ["Prediction agreement: 34%", "Average confidence: 60%"]
+            responses.append((label, result))
+
+        plain = JSONRenderer()
+        spliced = AdvisoryJSONRenderer()
+        cases = [("en, plain render", lambda label, result: plain.render(result))]
+        for code in locales():
+            cases.append((f"{code}, pre-rendered", lambda label, result, code=code: spliced.render(
+                localize(model.name, result, label, code)
+            )))
+        for code in locales():
+            if code != "en":
+                cases.append((f"{code}, per request", lambda label, result, code=code: plain.render(
+                    translate_result(result, code)
+                )))
+
+        repeat = max(1, rounds // len(responses))
+        self.stdout.write(f"{len(responses)} advisories x {repeat} rounds")
+        self.stdout.write(f"{'case':<24}{'us/response':>14}{'vs en':>10}")
+        baseline = None
+        for name, build in cases:
+            for label, result in responses:
+                build(label, result)  # warm-up (and lazy fragments)
+            start = time.perf_counter()
+            for _ in range(repeat):
+                for label, result in responses:
+                    build(label, result)
+            elapsed = time.perf_counter() - start
+            per_response = elapsed / (repeat * len(responses)) * 1e6
+            baseline = baseline or per_response
+            self.stdout.write(f"{name:<24}{per_response:>14.1f}{per_response / baseline:>9.2f}x")
@@ -0,0 +1,70 @@
+import os
+import shutil
+import tempfile
+import time
+
+import cv2
+import numpy as np
+from django.core.management.base import BaseCommand
+
+from leaf_api.ml.preprocess import DecodePool
+
+
+class Command(BaseCommand):
+    help = "Benchmark decode/resize/quality-check of a submission across pool kinds and worker counts"
+    requires_system_checks = []
+
+    def add_arguments(self, parser):
+        parser.add_argument("--images", type=int, default=10, help="Images per submission")
+        parser.add_argument("--width", type=int, default=4000)
+        parser.add_argument("--height", type=int, default=3000)
+        parser.add_argument("--rounds", type=int, default=5)
+        parser.add_argument("--max-workers", type=int, default=os.cpu_count() or 1)
+
+    def handle(self, *args, **options):
+        tmp_dir = tempfile.mkdtemp(prefix="bench_preprocess_")
+
+        try:
+            paths = self._make_images(tmp_dir, options)
+            self.stdout.write(
+                f"{len(paths)} x {options['width']}x{options['height']} JPEG, "
+                f"{options['rounds']} rounds, {os.cpu_count()} cores visible"
+            )
+
+            baseline = self._run(DecodePool("none"), paths, options["rounds"])
+            self.stdout.write(f"{'none':<8} {1:>3}  {baseline * 1000:8.1f} ms   1.00x")
+
+            for kind in ("thread", "process"):
+                workers = 1
+                while workers <= options["max_workers"]:
+                    elapsed = self._run(DecodePool(kind, workers), paths, options["rounds"])
+                    self.stdout.write(
+                        f"{kind:<8} {workers:>3}  {elapsed * 1000:8.1f} ms  "
+                        f"{baseline / elapsed:5.2f}x"
+                    )
+                    workers *= 2
+        finally:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+
+    def _make_images(self, tmp_dir, options):
+        rng = np.random.default_rng(0)
+        # Smooth noise compresses like a photo rather than pure noise
+        small = rng.integers(40, 220, size=(options["height"] // 16, options["width"] // 16, 3), dtype=np.uint8)
+        img = cv2.resize(small, (options["width"], options["height"]), interpolation=cv2.INTER_LINEAR)
+
+        paths = []
+        for i in range(options["images"]):
+            path = os.path.join(tmp_dir, f"leaf_{i}.jpg")
+            cv2.imwrite(path, img)
+            paths.append(path)
+        return paths
+
+    def _run(self, pool, paths, rounds):
+        try:
+            pool.preprocess(paths)  # warm up workers
+            start = time.perf_counter()
+            for _ in range(rounds):
+                pool.preprocess(paths)
+            return (time.perf_counter() - start) / rounds
+        finally:
+            pool.shutdown()
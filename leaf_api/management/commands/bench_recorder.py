@@ -0,0 +1,78 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from leaf_api.models import ImageResult, PrevalenceRollup, Submission
+from leaf_api.recorder import WriteBehindRecorder
+
+BENCH_CROP = "__benchmark__"
+
+
+def _make_record(images=10, classes=24):
+    submission = Submission(
+        endpoint="leaf",
+        crop=BENCH_CROP,
+        label="Potato__Late_blight",
+        status="disease_confirmed",
+        confidence=91.5,
+        agreement=80.0,
+        image_count=images,
+        latency_ms=120.0,
+        model_version="benchmark"
+    )
+    rows = [
+        ImageResult(
+            submission=submission,
+            position=i,
+            created_at=submission.created_at,
+            crop=BENCH_CROP,
+            image_hash=f"{i:064x}",
+            label="Potato__Late_blight",
+            confidence=91.5,
+            probabilities=[round(1 / classes, 4)] * classes,
+            model_version="benchmark"
+        )
+        for i in range(images)
+    ]
+    return submission, rows
+
+
+class Command(BaseCommand):
+    help = "Compare request-path cost of write-behind recording against synchronous saves"
+    requires_system_checks = []
+
+    def add_arguments(self, parser):
+        parser.add_argument("--records", type=int, default=500)
+        parser.add_argument("--images", type=int, default=10)
+
+    def handle(self, *args, **options):
+        n, images = options["records"], options["images"]
+
+        try:
+            # Synchronous: what the request would pay without the recorder
+            records = [_make_record(images) for _ in range(n)]
+            start = time.perf_counter()
+            for submission, rows in records:
+                with transaction.atomic():
+                    submission.save()
+                    ImageResult.objects.bulk_create(rows)
+            sync = time.perf_counter() - start
+
+            # Write-behind: request pays only the enqueue; the burst drains in the background
+            recorder = WriteBehindRecorder(batch_size=200, flush_interval=0.2, max_queue=n)
+            records = [_make_record(images) for _ in range(n)]
+            start = time.perf_counter()
+            for submission, rows in records:
+                recorder.record(submission, rows)
+            enqueue = time.perf_counter() - start
+
+            recorder.stop(timeout=60)
+            drained = time.perf_counter() - start
+
+            self.stdout.write(f"{n} submissions x {images} images")
+            self.stdout.write(f"synchronous save   {sync / n * 1e3:8.3f} ms/request   total {sync:6.2f} s")
+            self.stdout.write(f"write-behind       {enqueue / n * 1e6:8.1f} us/request   drained in {drained:6.2f} s")
+        finally:
+            Submission.objects.filter(crop=BENCH_CROP).delete()
+            PrevalenceRollup.objects.filter(crop=BENCH_CROP).delete()
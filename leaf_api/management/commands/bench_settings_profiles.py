@@ -0,0 +1,71 @@
+import json
+import os
+import subprocess
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+# Runs in a fresh interpreter per profile so RSS and import cost are not shared
+CHILD = r"""
+import json, sys, time
+import django
+
+def rss_kb():
+    with open("/proc/self/statm") as f:
+        return int(f.read().split()[1]) * (__import__("os").sysconf("SC_PAGE_SIZE") // 1024)
+
+django.setup()
+setup_kb = rss_kb()
+
+from django.test import Client
+client = Client()
+path, n = sys.argv[1], int(sys.argv[2])
+
+status = client.get(path).status_code  # loads the URLconf, views and models
+warm_kb = rss_kb()
+
+started = time.perf_counter()
+for _ in range(n):
+    client.get(path)
+elapsed = time.perf_counter() - started
+
+print(json.dumps({
+    "status": status, "setup_kb": setup_kb, "warm_kb": warm_kb,
+    "after_kb": rss_kb(), "us_per_request": elapsed / n * 1e6,
+}))
+"""
+
+
+class Command(BaseCommand):
+    help = "Compare per-request overhead and worker RSS across settings profiles"
+    requires_system_checks = []
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--profiles", nargs="+",
+            default=["agrihat_backend.settings", "agrihat_backend.settings_api"]
+        )
+        parser.add_argument("--path", default="/api/runtime-plan/", help="Cheap GET endpoint to time")
+        parser.add_argument("--requests", type=int, default=2000)
+
+    def handle(self, *args, **options):
+        rows = []
+        for profile in options["profiles"]:
+            env = dict(os.environ, DJANGO_SETTINGS_MODULE=profile)
+            proc = subprocess.run(
+                [sys.executable, "-c", CHILD, options["path"], str(options["requests"])],
+                env=env, capture_output=True, text=True
+            )
+            if proc.returncode != 0:
+                raise CommandError(f"{profile} failed:\n{proc.stderr}")
+            rows.append((profile, json.loads(proc.stdout.strip().splitlines()[-1])))
+
+        self.stdout.write(
+            f"GET {options['path']} x {options['requests']}\n"
+            f"{'profile':<34} {'status':>6} {'us/req':>8} {'RSS setup':>10} {'RSS warm':>10} {'RSS after':>10}"
+        )
+        for profile, r in rows:
+            self.stdout.write(
+                f"{profile:<34} {r['status']:>6} {r['us_per_request']:>8.0f} "
+                f"{r['setup_kb'] / 1024:>8.1f}MB {r['warm_kb'] / 1024:>8.1f}MB {r['after_kb'] / 1024:>8.1f}MB"
+            )
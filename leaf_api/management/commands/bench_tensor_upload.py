@@ -0,0 +1,88 @@
+import os
+import shutil
+import tempfile
+import time
+import zlib
+
+import cv2
+import numpy as np
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management.base import BaseCommand
+
+from leaf_api.ml.preprocess import IMG_SIZE, DecodePool
+from leaf_api.ml.tensor_upload import read_tensor_uploads
+
+
+class Command(BaseCommand):
+    help = "Compare upload size and server-side preprocessing time of JPEG vs client-side tensor uploads"
+    requires_system_checks = []
+
+    def add_arguments(self, parser):
+        parser.add_argument("--images", type=int, default=5, help="Images per submission")
+        parser.add_argument("--width", type=int, default=4000)
+        parser.add_argument("--height", type=int, default=3000)
+        parser.add_argument("--jpeg-quality", type=int, default=90)
+        parser.add_argument("--rounds", type=int, default=5)
+        parser.add_argument("--link-kbps", type=float, default=1000, help="Uplink used for the transfer estimate")
+
+    def handle(self, *args, **options):
+        n = options["images"]
+        img = self._make_image(options["width"], options["height"])
+
+        ok, jpeg = cv2.imencode(".jpg", img, [cv2.IMWRITE_JPEG_QUALITY, options["jpeg_quality"]])
+        jpeg = jpeg.tobytes()
+        small = cv2.resize(img, (IMG_SIZE, IMG_SIZE), interpolation=cv2.INTER_NEAREST)
+        raw = cv2.cvtColor(small, cv2.COLOR_BGR2RGB).tobytes()
+        packed = zlib.compress(raw, 6)
+        brightness = cv2.mean(cv2.cvtColor(img, cv2.COLOR_BGR2GRAY))[0]
+        stats = [{"width": options["width"], "height": options["height"], "brightness": brightness}] * n
+
+        tmp_dir = tempfile.mkdtemp(prefix="bench_tensor_upload_")
+        try:
+            paths = []
+            for i in range(n):
+                path = os.path.join(tmp_dir, f"leaf_{i}.jpg")
+                with open(path, "wb") as f:
+                    f.write(jpeg)
+                paths.append(path)
+
+            pool = DecodePool("none")
+            jpeg_s = self._time(lambda: pool.preprocess(paths), options["rounds"])
+            pool.shutdown()
+        finally:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+
+        raw_s = self._time(lambda: read_tensor_uploads(
+            [SimpleUploadedFile(f"t{i}", raw) for i in range(n)], stats, "raw"
+        ), options["rounds"])
+        zlib_s = self._time(lambda: read_tensor_uploads(
+            [SimpleUploadedFile(f"t{i}", packed) for i in range(n)], stats, "zlib"
+        ), options["rounds"])
+
+        self.stdout.write(
+            f"{n} x {options['width']}x{options['height']} photo, "
+            f"uplink {options['link_kbps']:.0f} kbit/s, {options['rounds']} rounds"
+        )
+        self.stdout.write(f"{'input':<12} {'bytes/image':>12} {'upload':>10} {'server prep':>12}")
+        for name, size, prep_s in (
+            ("jpeg", len(jpeg), jpeg_s),
+            ("tensor raw", len(raw), raw_s),
+            ("tensor zlib", len(packed), zlib_s),
+        ):
+            upload_s = size * n * 8 / (options["link_kbps"] * 1000)
+            self.stdout.write(
+                f"{name:<12} {size:>12,} {upload_s * 1000:>8.0f}ms {prep_s * 1000:>10.2f}ms"
+            )
+
+    def _make_image(self, width, height):
+        rng = np.random.default_rng(0)
+        # Smooth noise compresses like a photo rather than pure noise
+        small = rng.integers(40, 220, size=(height // 16, width // 16, 3), dtype=np.uint8)
+        return cv2.resize(small, (width, height), interpolation=cv2.INTER_LINEAR)
+
+    def _time(self, fn, rounds):
+        fn()
+        start = time.perf_counter()
+        for _ in range(rounds):
+            fn()
+        return (time.perf_counter() - start) / rounds
@@ -0,0 +1,85 @@
+import os
+import time
+
+import numpy as np
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from leaf_api.ml.embeddings import EmbeddingIndex, build_index, version_dir
+from leaf_api.ml.engine import ENGINES
+
+
+class Command(BaseCommand):
+    help = (
+        "Compact the stored embeddings of confirmed cases into the searchable "
+        "inverted-file index workers serve similar cases from. Run periodically "
+        "(e.g. nightly); new cases are searchable after the next run."
+    )
+    requires_system_checks = []
+
+    def add_arguments(self, parser):
+        parser.add_argument("--model", choices=list(ENGINES), help="Default: every model")
+        parser.add_argument("--model-version", help="Default: every version with stored embeddings")
+        parser.add_argument("--lists", type=int, help="Inverted lists (default: about 4 * sqrt(rows))")
+        parser.add_argument("--iterations", type=int, default=10, help="k-means iterations")
+        parser.add_argument(
+            "--check", type=int, default=200,
+            help="Queries (stored vectors) to time and compare against exact search; 0 skips"
+        )
+
+    def handle(self, *args, **options):
+        names = [options["model"]] if options["model"] else list(ENGINES)
+        for name in names:
+            root = os.path.join(settings.EMBEDDING_DIR, name)
+            versions = [options["model_version"]] if options["model_version"] else (
+                sorted(os.listdir(root)) if os.path.isdir(root) else []
+            )
+            for version in versions:
+                self._build(name, version, options)
+
+    def _build(self, name, version, options):
+        started = time.perf_counter()
+        built = build_index(version_dir(name, version), options["lists"], options["iterations"])
+        if built is None:
+            self.stdout.write(f"{name} {version}: no stored embeddings")
+            return
+
+        directory, rows, lists = built
+        self.stdout.write(
+            f"{name} {version}: {rows} vectors in {lists} lists -> {directory} "
+            f"({time.perf_counter() - started:.1f} s)"
+        )
+        if options["check"]:
+            self._check(EmbeddingIndex(directory), options["check"])
+
+    def _check(self, index, queries, k=10, block=65536):
+        """Query latency and recall@k of the probed search against a full scan"""
+        rng = np.random.default_rng(0)
+        rows = np.sort(rng.choice(len(index), min(queries, len(index)), replace=False))
+        probes = np.asarray(index.vectors[rows], dtype=np.float32)
+
+        latencies, found = [], []
+        for query in probes:
+            t = time.perf_counter()
+            found.append(set(index.search_rows(query, k)[0].tolist()))
+            latencies.append((time.perf_counter() - t) * 1000)
+
+        # Exact top-k of every query, one pass over the vectors
+        best = np.full((len(probes), k), -np.inf, dtype=np.float32)
+        best_rows = np.zeros((len(probes), k), dtype=np.int64)
+        for start in range(0, len(index), block):
+            scores = probes @ np.asarray(index.vectors[start:start + block], dtype=np.float32).T
+            merged = np.concatenate([best, scores], axis=1)
+            merged_rows = np.concatenate([best_rows, np.broadcast_to(
+                np.arange(start, start + scores.shape[1]), scores.shape
+            )], axis=1)
+            top = np.argpartition(-merged, k - 1, axis=1)[:, :k]
+            best = np.take_along_axis(merged, top, axis=1)
+            best_rows = np.take_along_axis(merged_rows, top, axis=1)
+
+        recall = np.mean([len(f & set(exact.tolist())) / k for f, exact in zip(found, best_rows)])
+        self.stdout.write(
+            f"  {len(rows)} queries, nprobe {settings.EMBEDDING_NPROBE}: "
+            f"p50 {np.percentile(latencies, 50):.2f} ms, p95 {np.percentile(latencies, 95):.2f} ms, "
+            f"recall@{k} {recall:.3f}"
+        )
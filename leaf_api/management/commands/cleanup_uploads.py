@@ -0,0 +1,20 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from leaf_api.resumable import collect_chunks, expire_sessions
+
+
+class Command(BaseCommand):
+    help = "Expire idle resumable upload sessions and delete chunk files no session references"
+    requires_system_checks = []
+
+    def add_arguments(self, parser):
+        parser.add_argument("--max-age-h", type=float, default=settings.UPLOAD_SESSION_TTL_H)
+        parser.add_argument("--grace-s", type=int, default=3600, help="Keep unreferenced chunks younger than this")
+
+    def handle(self, *args, **options):
+        sessions = expire_sessions(options["max_age_h"])
+        removed, freed = collect_chunks(options["grace_s"])
+        self.stdout.write(self.style.SUCCESS(
+            f"Expired {sessions} sessions, removed {removed} chunks ({freed / 1024 / 1024:.1f} MiB)"
+        ))
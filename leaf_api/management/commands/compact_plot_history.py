@@ -0,0 +1,23 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from leaf_api.progression import compact
+
+
+class Command(BaseCommand):
+    help = (
+        "Average plot time-series points older than PLOT_RAW_DAYS into one point per "
+        "week and delete points and idle plots older than PLOT_RETENTION_DAYS"
+    )
+    requires_system_checks = []
+
+    def add_arguments(self, parser):
+        parser.add_argument("--raw-days", type=int, default=settings.PLOT_RAW_DAYS)
+        parser.add_argument("--retention-days", type=int, default=settings.PLOT_RETENTION_DAYS)
+
+    def handle(self, *args, **options):
+        merged, written, deleted_points, deleted_plots = compact(options["raw_days"], options["retention_days"])
+        self.stdout.write(self.style.SUCCESS(
+            f"Merged {merged} points into {written} weekly points, "
+            f"deleted {deleted_points} points and {deleted_plots} plots"
+        ))
@@ -0,0 +1,62 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from leaf_api.ml.compare import load_backend, replay
+from leaf_api.ml.engine import ENGINES, get_engine
+
+
+class Command(BaseCommand):
+    help = (
+        "Replay the stored tensor corpus through two inference backends and "
+        "compare per-image labels, confidence, final status and speed. "
+        "Backends: active | version:<v> | keras:<path> | tflite:<path>"
+    )
+    requires_system_checks = []
+
+    def add_arguments(self, parser):
+        parser.add_argument("--engine", choices=sorted(ENGINES), default="leaf")
+        parser.add_argument("--a", default="active", help="Baseline backend (default: active)")
+        parser.add_argument("--b", required=True, help="Candidate backend")
+        parser.add_argument("--batch-size", type=int, default=64)
+        parser.add_argument("--limit", type=int, default=0, help="Only the first N stored images")
+        parser.add_argument("--json", help="Also write the full report to this file")
+
+    def handle(self, *args, **options):
+        engine = get_engine(options["engine"])
+        try:
+            a = load_backend(options["a"], engine.engine.registry)
+            b = load_backend(options["b"], engine.engine.registry)
+        except ValueError as e:
+            raise CommandError(str(e))
+
+        report = replay(engine, a, b, options["batch_size"], options["limit"] or None)
+        if not report["images"]:
+            raise CommandError(f"No stored tensors for {options['engine']}; enable TENSOR_STORE_ENABLED first")
+
+        drift = report["confidence_drift"]
+        self.stdout.write(
+            f"{report['images']} images, {report['submissions']} complete submissions "
+            f"(calibration {report['calibration_version']})\n"
+            f"label agreement      {report['label_agreement'] * 100:.2f}%\n"
+            f"confidence drift     mean {drift['mean']:.2f}  p95 {drift['p95']:.2f}  max {drift['max']:.2f} points\n"
+            f"status changed       {report['status_changed']} of {report['submissions']} submissions\n"
+            f"final label changed  {report['final_label_changed']} of {report['submissions']} submissions"
+        )
+        for la, lb, n in report["label_transitions"]:
+            self.stdout.write(f"  image    {la or '-'} -> {lb or '-'}: {n}")
+        for sa, sb, n in report["status_transitions"]:
+            self.stdout.write(f"  status   {sa} -> {sb}: {n}")
+
+        self.stdout.write(
+            f"\n{'':<4}{'backend':<40} {'load ms':>9} {'load RSS':>10} {'p50 ms':>8} {'p95 ms':>8} {'img/s':>8}"
+        )
+        for key, r in report["backends"].items():
+            self.stdout.write(
+                f"{key:<4}{r['spec']:<40} {r['load_ms']:>9.0f} {r['load_rss_mb']:>8.1f}MB "
+                f"{r['batch_p50_ms']:>8.1f} {r['batch_p95_ms']:>8.1f} {r['images_per_s'] or 0:>8.0f}"
+            )
+
+        if options["json"]:
+            with open(options["json"], "w") as f:
+                json.dump(report, f, indent=2)
@@ -0,0 +1,60 @@
+import os
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from leaf_api.ml.artifacts import artifact_dir, convert, is_current
+from leaf_api.ml.registry import MODEL_FILE
+
+# (registry name, legacy single file) as the engines register them
+MODELS = (
+    ("leaf", "leaf_model.h5"),
+    ("areca_coconut", "arecanut_coconut_leaf_model.h5"),
+)
+
+
+class Command(BaseCommand):
+    help = (
+        "Write the load-optimized artifact (<model>.fast/) next to every model "
+        "file under MODEL_DIR. Run at build time; workers fall back to the .h5 "
+        "for any model without a current artifact."
+    )
+    requires_system_checks = []
+
+    def add_arguments(self, parser):
+        parser.add_argument("paths", nargs="*", help="Model files to convert (default: all)")
+        parser.add_argument("--force", action="store_true", help="Rebuild artifacts that are up to date")
+
+    def handle(self, *args, **options):
+        paths = options["paths"] or self._model_files()
+        if not paths:
+            self.stdout.write(f"No model files under {settings.MODEL_DIR}")
+            return
+
+        for path in paths:
+            if not os.path.isfile(path):
+                raise CommandError(f"No such model file: {path}")
+            if not options["force"] and is_current(path):
+                self.stdout.write(f"up to date  {artifact_dir(path)}")
+                continue
+
+            started = time.perf_counter()
+            out = convert(path)
+            self.stdout.write(self.style.SUCCESS(
+                f"converted   {out} ({time.perf_counter() - started:.1f}s)"
+            ))
+
+    def _model_files(self):
+        paths = []
+        for name, legacy_file in MODELS:
+            root = os.path.join(settings.MODEL_DIR, name)
+            if os.path.isdir(root):
+                paths += sorted(
+                    os.path.join(root, v, MODEL_FILE) for v in os.listdir(root)
+                    if os.path.isfile(os.path.join(root, v, MODEL_FILE))
+                )
+            legacy = os.path.join(settings.MODEL_DIR, legacy_file)
+            if os.path.isfile(legacy):
+                paths.append(legacy)
+        return paths
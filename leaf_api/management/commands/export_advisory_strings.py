@@ -0,0 +1,49 @@
+import json
+import os
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from leaf_api.ml.advisory import advisory_strings, catalog_path, locales
+from leaf_api.ml.engine import ENGINES, get_engine
+
+
+class Command(BaseCommand):
+    help = (
+        "Write or update the advisory catalogs (LOCALE_DIR/<locale>.json) with every "
+        "English text the crop models can answer with. Existing translations are kept; "
+        "new texts get an empty translation, which is served in English."
+    )
+    requires_system_checks = []
+
+    def add_arguments(self, parser):
+        parser.add_argument("locales", nargs="*", help="Locales to update (default: ADVISORY_LOCALES without en)")
+        parser.add_argument("--prune", action="store_true", help="Drop texts no model produces any more")
+
+    def handle(self, *args, **options):
+        codes = options["locales"] or [code for code in locales() if code != "en"]
+        if "en" in codes:
+            raise CommandError("English is the source language and has no catalog")
+
+        strings = {}
+        for name in ENGINES:
+            strings.update(dict.fromkeys(advisory_strings(get_engine(name).engine.model)))
+
+        os.makedirs(settings.LOCALE_DIR, exist_ok=True)
+        for code in codes:
+            path = catalog_path(code)
+            existing = {}
+            if os.path.exists(path):
+                with open(path, encoding="utf-8") as f:
+                    existing = json.load(f)
+
+            catalog = {text: existing.get(text, "") for text in strings}
+            if not options["prune"]:
+                catalog.update((k, v) for k, v in existing.items() if k not in catalog)
+
+            with open(path, "w", encoding="utf-8") as f:
+                json.dump(catalog, f, ensure_ascii=False, indent=2)
+                f.write("\n")
+
+            translated = sum(1 for text in strings if catalog[text])
+            self.stdout.write(f"{path}: {translated}/{len(strings)} translated")
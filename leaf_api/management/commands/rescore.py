@@ -0,0 +1,135 @@
+import json
+import time
+from collections import Counter, defaultdict
+
+import numpy as np
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from leaf_api.ml.artifacts import load_model
+from leaf_api.ml.calibration import get_calibration
+from leaf_api.ml.engine import ENGINES, get_engine
+from leaf_api.ml.registry import ModelVersions
+from leaf_api.ml.tensor_store import iter_batches, load_index
+from leaf_api.models import ImageResult
+
+
+class Command(BaseCommand):
+    help = (
+        "Re-score every stored preprocessed tensor with a model and diff the "
+        "per-image and per-submission labels against the recorded results"
+    )
+    requires_system_checks = []
+
+    def add_arguments(self, parser):
+        parser.add_argument("--engine", choices=sorted(ENGINES), default="leaf")
+        parser.add_argument("--model-version", help="Registry version to score with (default: the active one)")
+        parser.add_argument("--model", help="Model file outside the registry to score with")
+        parser.add_argument("--batch-size", type=int, default=64)
+        parser.add_argument("--output", help="Write one JSON line per changed image here")
+
+    def handle(self, *args, **options):
+        endpoint = options["engine"]
+        engine = get_engine(endpoint)
+
+        # Load just the model to score with, in-process: no registry, warm-up
+        # or ACTIVE watcher, and never the inference server
+        versions = ModelVersions(engine.MODEL_NAME, engine.LEGACY_MODEL_FILE)
+        version = options["model_version"] or versions.wanted_version()
+        model, _ = load_model(options["model"] or versions.model_path(version))
+        calibration = get_calibration(engine.MODEL_NAME, version, engine.DEFAULT_CALIBRATION)
+
+        index = load_index(settings.TENSOR_STORE_DIR, endpoint)
+        if not index:
+            raise CommandError(f"No stored tensors for {endpoint} in {settings.TENSOR_STORE_DIR}")
+
+        preds = {}
+        started = time.perf_counter()
+        for hashes, batch in iter_batches(settings.TENSOR_STORE_DIR, index, options["batch_size"]):
+            for image_hash, p in zip(hashes, model.predict_on_batch(batch.astype(np.float32) / 255.0)):
+                preds[image_hash] = np.asarray(p, dtype=np.float32)
+        elapsed = time.perf_counter() - started
+
+        report = self._compare(endpoint, engine, preds, calibration)
+
+        if options["output"]:
+            with open(options["output"], "w") as f:
+                for row in report["changed"]:
+                    f.write(json.dumps(row) + "\n")
+
+        self.stdout.write(f"Scored {len(preds)} images in {elapsed:.1f}s ({len(preds) / elapsed:.0f} img/s)")
+        self.stdout.write(f"Per-image label changes: {len(report['changed'])}")
+        if report["drift"]:
+            drift = np.asarray(report["drift"])
+            self.stdout.write(
+                f"Confidence drift: mean {drift.mean():+.2f}, mean |drift| {np.abs(drift).mean():.2f}"
+            )
+        self.stdout.write(
+            f"Submissions compared: {report['compared']}, status changed: {report['status_changed']}, "
+            f"final label changed: {report['label_changed']}"
+        )
+        for (old, new), n in report["transitions"].most_common(10):
+            self.stdout.write(f"  {old or '-'} -> {new or '-'}: {n}")
+
+    def _compare(self, endpoint, engine, preds, calibration):
+        """
+        Re-run the engine's verdict rules on every recorded submission whose
+        images were all stored, and diff the per-image labels and the
+        submission status and label against what was recorded.
+        """
+        submissions = defaultdict(list)
+        recorded = {}
+        rows = (
+            ImageResult.objects
+            .filter(submission__endpoint=endpoint)
+            .order_by("submission_id", "position")
+            .values_list(
+                "submission_id", "image_hash", "label", "confidence", "quality_ok", "quality_message",
+                "submission__crop", "submission__status", "submission__label"
+            )
+        )
+        for submission_id, image_hash, label, confidence, quality_ok, message, crop, status, final in (
+            rows.iterator(chunk_size=5000)
+        ):
+            submissions[submission_id].append((image_hash, label, confidence, quality_ok, message))
+            recorded[submission_id] = (crop, status, final)
+
+        changed = []
+        drift = []
+        transitions = Counter()
+        compared = status_changed = label_changed = 0
+        for submission_id, entries in submissions.items():
+            if not all(image_hash in preds for image_hash, *_ in entries):
+                continue  # some images were never stored
+            compared += 1
+
+            crop, old_status, old_label = recorded[submission_id]
+            reports = [(True, quality_ok, message) for *_, quality_ok, message in entries]
+            stacked = np.stack([preds[image_hash] for image_hash, *_ in entries])
+            details = {}
+            result = engine.engine.evaluate(
+                reports, list(range(len(entries))), stacked, calibration,
+                crop=crop if engine.engine.model.requires_crop else None, details=details
+            )
+
+            for (image_hash, label, confidence, *_), image in zip(entries, details["images"]):
+                if confidence is not None and image["confidence"] is not None:
+                    drift.append(image["confidence"] - confidence)
+                if image["label"] != label:
+                    changed.append({
+                        "submission_id": str(submission_id), "image_hash": image_hash,
+                        "old_label": label, "new_label": image["label"],
+                        "old_confidence": confidence, "new_confidence": image["confidence"],
+                    })
+
+            new_label = details.get("label", "")
+            if result.get("status", "") != old_status:
+                status_changed += 1
+            if new_label != old_label:
+                label_changed += 1
+                transitions[(old_label, new_label)] += 1
+
+        return {
+            "changed": changed, "drift": drift, "transitions": transitions, "compared": compared,
+            "status_changed": status_changed, "label_changed": label_changed,
+        }
@@ -0,0 +1,61 @@
+import os
+import signal
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from leaf_api.ml.inference_server import InferenceServer, bind, served_models
+from leaf_api.ml.planner import available_cores
+
+
+class Command(BaseCommand):
+    help = (
+        "Run the local inference server that owns the models for workers "
+        "started with INFERENCE_BACKEND=server"
+    )
+    requires_system_checks = []
+
+    def add_arguments(self, parser):
+        parser.add_argument("--socket", default=settings.INFERENCE_SOCKET)
+        parser.add_argument("--processes", type=int, default=1,
+                            help="Server processes sharing the socket, each with its own models")
+
+    def handle(self, *args, **options):
+        processes = max(1, options["processes"])
+        cores = available_cores()[0]
+
+        # Split the CPU between server processes before TensorFlow exists
+        threads = str(max(1, cores // processes))
+        os.environ["WEB_CONCURRENCY"] = "1"
+        os.environ.setdefault("TF_INTRA_OP_THREADS", threads)
+
+        # Bind once, then fork: every process accepts on the same socket
+        listener = bind(options["socket"])
+        children = []
+        for _ in range(processes - 1):
+            pid = os.fork()
+            if pid == 0:
+                try:
+                    self._serve(listener)
+                finally:
+                    os._exit(1)
+            children.append(pid)
+
+        self.stdout.write(
+            f"Inference server on {options['socket']}: {processes} process(es), "
+            f"{threads} TF thread(s) each"
+        )
+        try:
+            self._serve(listener)
+        finally:
+            for pid in children:
+                os.kill(pid, signal.SIGTERM)
+
+    def _serve(self, listener):
+        from leaf_api.ml.registry import get_registry
+
+        registries = {
+            name: get_registry(name, legacy_file, backend="local")
+            for name, legacy_file in served_models().items()
+        }
+        InferenceServer(registries).serve_forever(listener)
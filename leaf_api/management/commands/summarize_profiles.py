@@ -0,0 +1,57 @@
+import io
+import os
+import pstats
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from leaf_api.profiling import list_captures
+
+SORT_KEYS = {"cumulative": "cumulative", "self": "tottime", "calls": "ncalls"}
+
+
+class Command(BaseCommand):
+    help = "Summarize the hottest functions and allocation sites across captured request profiles"
+    requires_system_checks = []
+
+    def add_arguments(self, parser):
+        parser.add_argument("--dir", default=None, help="Capture directory (default: PROFILING_DIR)")
+        parser.add_argument("--endpoint", choices=["leaf", "areca_coconut"])
+        parser.add_argument("--sort", choices=sorted(SORT_KEYS), default="cumulative")
+        parser.add_argument("--limit", type=int, default=25)
+
+    def handle(self, *args, **options):
+        directory = options["dir"] or settings.PROFILING_DIR
+        captures = [
+            meta for meta in list_captures(directory, options["endpoint"])
+            if os.path.exists(meta["prof_path"])
+        ]
+        if not captures:
+            raise CommandError(f"No captured profiles in {directory}")
+
+        elapsed = sorted(meta["elapsed_ms"] for meta in captures)
+        self.stdout.write(
+            f"{len(captures)} captures, request time median {elapsed[len(elapsed) // 2]:.0f} ms, "
+            f"max {elapsed[-1]:.0f} ms"
+        )
+
+        # ---------- Functions, summed over all captures ----------
+        out = io.StringIO()
+        stats = pstats.Stats(*(meta["prof_path"] for meta in captures), stream=out)
+        stats.strip_dirs().sort_stats(SORT_KEYS[options["sort"]]).print_stats(options["limit"])
+        self.stdout.write(out.getvalue())
+
+        # ---------- Allocation sites ----------
+        sites = defaultdict(lambda: [0.0, 0, 0])
+        for meta in captures:
+            for alloc in meta["top_allocations"]:
+                site = sites[alloc["site"]]
+                site[0] += alloc["size_kb"]
+                site[1] += alloc["count"]
+                site[2] += 1
+
+        self.stdout.write("Top allocation sites (KiB summed over captures, blocks, captures seen in):")
+        ranked = sorted(sites.items(), key=lambda item: item[1][0], reverse=True)
+        for site, (size_kb, count, seen) in ranked[:options["limit"]]:
+            self.stdout.write(f"  {size_kb:10.1f}  {count:8d}  {seen:4d}  {site}")
@@ -0,0 +1,62 @@
+# metrics.py
+#
+# Minimal in-process metrics registry rendered in the Prometheus text
+# format at /api/metrics/. Values are per worker process.
+
+import threading
+
+_lock = threading.Lock()
+_gauges = {}
+_counters = {}
+_help = {}
+
+
+def _key(name, labels):
+    return name, tuple(sorted((labels or {}).items()))
+
+
+def describe(name, text):
+    _help[name] = text
+
+
+def set_gauge(name, value, labels=None):
+    with _lock:
+        _gauges[_key(name, labels)] = float(value)
+
+
+def inc(name, amount=1, labels=None):
+    key = _key(name, labels)
+    with _lock:
+        _counters[key] = _counters.get(key, 0.0) + amount
+
+
+def snapshot():
+    with _lock:
+        return dict(_gauges), dict(_counters)
+
+
+def _format_labels(labels):
+    if not labels:
+        return ""
+    inner = ",".join(
+        '{}="{}"'.format(k, str(v).replace("\\", "\\\\").replace('"', '\\"'))
+        for k, v in labels
+    )
+    return "{" + inner + "}"
+
+
+def render():
+    gauges, counters = snapshot()
+    lines = []
+
+    for kind, values in (("gauge", gauges), ("counter", counters)):
+        seen = set()
+        for (name, labels), value in sorted(values.items()):
+            if name not in seen:
+                seen.add(name)
+                if name in _help:
+                    lines.append(f"# HELP {name} {_help[name]}")
+                lines.append(f"# TYPE {name} {kind}")
+            lines.append(f"{name}{_format_labels(labels)} {value:g}")
+
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,58 @@
+# Generated by Django 4.2.10 on 2026-10-19 06:52
+
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+import uuid
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Submission',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('endpoint', models.CharField(choices=[('leaf', 'Leaf health'), ('areca_coconut', 'Areca / coconut')], max_length=32)),
+                ('crop', models.CharField(blank=True, max_length=32)),
+                ('label', models.CharField(blank=True, max_length=64)),
+                ('status', models.CharField(max_length=32)),
+                ('confidence', models.FloatField(blank=True, null=True)),
+                ('agreement', models.FloatField(blank=True, null=True)),
+                ('image_count', models.PositiveSmallIntegerField(default=0)),
+                ('latency_ms', models.FloatField()),
+                ('model_version', models.CharField(max_length=64)),
+            ],
+            options={
+                'ordering': ['-created_at'],
+                'indexes': [models.Index(fields=['created_at'], name='leaf_api_su_created_59bd26_idx'), models.Index(fields=['crop', 'created_at'], name='leaf_api_su_crop_6637fe_idx'), models.Index(fields=['label', 'created_at'], name='leaf_api_su_label_b1de9c_idx')],
+            },
+        ),
+        migrations.CreateModel(
+            name='ImageResult',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('position', models.PositiveSmallIntegerField()),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('crop', models.CharField(blank=True, max_length=32)),
+                ('image_hash', models.CharField(max_length=64)),
+                ('label', models.CharField(blank=True, max_length=64)),
+                ('confidence', models.FloatField(blank=True, null=True)),
+                ('probabilities', models.JSONField(default=list)),
+                ('quality_ok', models.BooleanField(default=True)),
+                ('quality_message', models.CharField(blank=True, max_length=128)),
+                ('model_version', models.CharField(max_length=64)),
+                ('submission', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='images', to='leaf_api.submission')),
+            ],
+            options={
+                'ordering': ['submission', 'position'],
+                'indexes': [models.Index(fields=['created_at'], name='leaf_api_im_created_70f5e3_idx'), models.Index(fields=['crop', 'created_at'], name='leaf_api_im_crop_0dfbeb_idx'), models.Index(fields=['label', 'created_at'], name='leaf_api_im_label_6ac1d0_idx'), models.Index(fields=['image_hash'], name='leaf_api_im_image_h_30a522_idx')],
+            },
+        ),
+    ]
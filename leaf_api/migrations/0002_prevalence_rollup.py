@@ -0,0 +1,32 @@
+# Generated by Django 4.2.10 on 2026-10-19 06:53
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('leaf_api', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PrevalenceRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('period', models.CharField(choices=[('day', 'Day'), ('week', 'Week')], max_length=8)),
+                ('period_start', models.DateField()),
+                ('crop', models.CharField(blank=True, max_length=32)),
+                ('label', models.CharField(blank=True, max_length=64)),
+                ('status', models.CharField(max_length=32)),
+                ('count', models.PositiveIntegerField(default=0)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['period', 'crop', 'period_start'], name='leaf_api_pr_period_715d5d_idx'), models.Index(fields=['period', 'label', 'period_start'], name='leaf_api_pr_period_30f358_idx')],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='prevalencerollup',
+            constraint=models.UniqueConstraint(fields=('period', 'period_start', 'crop', 'label', 'status'), name='unique_prevalence_bucket'),
+        ),
+    ]
@@ -0,0 +1,51 @@
+# Generated by Django 4.2.10 on 2026-10-19 07:06
+
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+import uuid
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('leaf_api', '0002_prevalence_rollup'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UploadSession',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('endpoint', models.CharField(choices=[('leaf', 'Leaf health'), ('areca_coconut', 'Areca / coconut')], max_length=32)),
+                ('crop', models.CharField(blank=True, max_length=32)),
+                ('sizes', models.JSONField(default=list)),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('finalized_at', models.DateTimeField(blank=True, null=True)),
+                ('result', models.JSONField(blank=True, null=True)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['updated_at'], name='leaf_api_up_updated_4e34f8_idx')],
+            },
+        ),
+        migrations.CreateModel(
+            name='UploadChunk',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('image', models.PositiveSmallIntegerField()),
+                ('offset', models.PositiveIntegerField()),
+                ('length', models.PositiveIntegerField()),
+                ('sha256', models.CharField(max_length=64)),
+                ('session', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='chunks', to='leaf_api.uploadsession')),
+            ],
+            options={
+                'ordering': ['session', 'image', 'offset'],
+                'indexes': [models.Index(fields=['sha256'], name='leaf_api_up_sha256_963d40_idx')],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='uploadchunk',
+            constraint=models.UniqueConstraint(fields=('session', 'image', 'offset'), name='unique_upload_chunk'),
+        ),
+    ]
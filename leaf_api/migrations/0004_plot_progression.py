@@ -0,0 +1,77 @@
+# Generated by Django 4.2.10 on 2026-10-19 07:26
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('leaf_api', '0003_upload_session'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PlotPoint',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('resolution', models.CharField(choices=[('raw', 'Submission'), ('week', 'Week')], default='raw', max_length=8)),
+                ('at', models.DateTimeField()),
+                ('count', models.PositiveIntegerField(default=1)),
+                ('label', models.CharField(blank=True, max_length=64)),
+                ('status', models.CharField(blank=True, max_length=32)),
+                ('score', models.FloatField()),
+                ('probabilities', models.JSONField(default=list)),
+                ('embedding', models.BinaryField(blank=True, default=b'')),
+            ],
+            options={
+                'ordering': ['state', 'at'],
+            },
+        ),
+        migrations.CreateModel(
+            name='PlotState',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('endpoint', models.CharField(choices=[('leaf', 'Leaf health'), ('areca_coconut', 'Areca / coconut')], max_length=32)),
+                ('plot', models.CharField(max_length=64)),
+                ('observations', models.PositiveIntegerField(default=0)),
+                ('first_at', models.DateTimeField()),
+                ('last_at', models.DateTimeField()),
+                ('last_label', models.CharField(blank=True, max_length=64)),
+                ('last_status', models.CharField(blank=True, max_length=32)),
+                ('last_score', models.FloatField()),
+                ('baseline_score', models.FloatField()),
+                ('last_embedding', models.BinaryField(blank=True, default=b'')),
+            ],
+        ),
+        migrations.AddField(
+            model_name='submission',
+            name='plot',
+            field=models.CharField(blank=True, max_length=64),
+        ),
+        migrations.AddIndex(
+            model_name='submission',
+            index=models.Index(fields=['plot', 'created_at'], name='leaf_api_su_plot_e1a676_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='plotstate',
+            index=models.Index(fields=['last_at'], name='leaf_api_pl_last_at_193f13_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='plotstate',
+            constraint=models.UniqueConstraint(fields=('endpoint', 'plot'), name='unique_plot_state'),
+        ),
+        migrations.AddField(
+            model_name='plotpoint',
+            name='state',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='points', to='leaf_api.plotstate'),
+        ),
+        migrations.AddIndex(
+            model_name='plotpoint',
+            index=models.Index(fields=['state', 'at'], name='leaf_api_pl_state_i_02ef1b_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='plotpoint',
+            index=models.Index(fields=['resolution', 'at'], name='leaf_api_pl_resolut_2b99d9_idx'),
+        ),
+    ]
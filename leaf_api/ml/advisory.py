@@ -0,0 +1,267 @@
+# advisory.py
+#
+# Localized advisory payloads for ADVISORY_LOCALES (Kannada, Hindi,
+# Malayalam next to English). Catalogs are LOCALE_DIR/<locale>.json,
+# {"English text": "translation"}, written for translators by
+# `manage.py export_advisory_strings`; missing entries stay English.
+# Keys containing "{}" are templates for the few texts built per request
+# ("Prediction agreement: {}%").
+#
+# Nothing from the knowledge bases is translated per request. When a crop
+# engine starts, every advisory it can give for a label (one per status)
+# is rendered once per locale: its translatable fields are translated and
+# serialized to JSON into a Fragment keyed by (model, label, status, crop,
+# message, locale). localize() swaps the fragment's fields into the
+# English result and localization.AdvisoryJSONRenderer splices the
+# fragment's bytes next to the per-request fields, so every locale,
+# English included, costs the same. Only the advisories compiled at
+# startup are ever cached: anything else (unclear images, wrong crop, poor
+# quality, a crop spelled differently) may carry request input, so it is
+# translated per response through the catalog and its templates.
+
+import json
+import logging
+import os
+import re
+import threading
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+# Machine-readable codes and per-request numbers: never translated or cached
+VERBATIM_FIELDS = frozenset({
+    "status", "crop", "disease_type", "action_priority", "confidence", "agreement", "health_score",
+    "submission_id", "model_version", "calibration_version", "video", "tiles",
+    "similar_cases", "progression",
+})
+# Text built per request: translated through catalog templates on every response
+PER_REQUEST_FIELDS = frozenset({"why_not_confirmed", "quality_issues"})
+
+
+def dumps(value):
+    """Same bytes rest_framework's JSONRenderer produces with its default settings"""
+    return json.dumps(value, ensure_ascii=False, separators=(",", ":"), allow_nan=False).encode()
+
+
+# ======================================================
+# CATALOGS
+# ======================================================
+class Catalog:
+    def __init__(self, locale, strings):
+        self.locale = locale
+        self.strings = {k: v for k, v in strings.items() if v and "{}" not in k}
+        self.templates = [
+            (re.compile("^" + re.escape(k).replace(re.escape("{}"), "(.*?)") + "$"), v)
+            for k, v in strings.items() if v and "{}" in k
+        ]
+
+    def translate(self, value):
+        """Knowledge-base text: exact catalog lookups through lists and dicts"""
+        if isinstance(value, str):
+            return self.strings.get(value, value)
+        if isinstance(value, list):
+            return [self.translate(v) for v in value]
+        if isinstance(value, dict):
+            return {k: self.translate(v) for k, v in value.items()}
+        return value
+
+    def translate_text(self, value):
+        """Per-request text: exact lookups, then the templates"""
+        if isinstance(value, list):
+            return [self.translate_text(v) for v in value]
+        if isinstance(value, dict):
+            return {k: self.translate_text(v) for k, v in value.items()}
+        if not isinstance(value, str):
+            return value
+        if value in self.strings:
+            return self.strings[value]
+        for pattern, translation in self.templates:
+            match = pattern.match(value)
+            if match:
+                parts = translation.split("{}")
+                filled = [parts[0]]
+                for group, part in zip(match.groups(), parts[1:]):
+                    filled += [group, part]
+                return "".join(filled)
+        return value
+
+
+def catalog_path(locale):
+    return os.path.join(settings.LOCALE_DIR, f"{locale}.json")
+
+
+_catalogs = {}
+_catalog_lock = threading.Lock()
+
+
+def get_catalog(locale):
+    catalog = _catalogs.get(locale)
+    if catalog is not None:
+        return catalog
+
+    strings = {}
+    if locale != "en":
+        try:
+            with open(catalog_path(locale), encoding="utf-8") as f:
+                strings = json.load(f)
+        except OSError:
+            logger.warning("No advisory catalog for %s; serving English text", locale)
+        except ValueError:
+            logger.exception("Bad advisory catalog %s; serving English text", catalog_path(locale))
+
+    with _catalog_lock:
+        catalog = _catalogs.setdefault(locale, Catalog(locale, strings))
+    return catalog
+
+
+def install_catalog(locale, strings):
+    """Replace the catalog of `locale` and drop its compiled fragments"""
+    with _catalog_lock:
+        _catalogs[locale] = Catalog(locale, strings)
+    with _fragment_lock:
+        for key in [key for key in _fragments if key[-1] == locale]:
+            del _fragments[key]
+
+
+def locales():
+    return [code.strip() for code in settings.ADVISORY_LOCALES.split(",") if code.strip()]
+
+
+# ======================================================
+# FRAGMENTS
+# ======================================================
+class Fragment:
+    """Translated static fields of one advisory, and their JSON members"""
+
+    def __init__(self, fields):
+        self.fields = fields
+        # '"key":value,"key":value' without braces, spliced by the renderer
+        self.json = dumps(fields)[1:-1]
+
+
+UNCACHED = Fragment({})
+
+
+class LocalizedResult(dict):
+    """
+    A response whose `fragment` fields are already serialized. Setting
+    one of them again makes it an ordinary per-request field.
+    """
+
+    def __init__(self, data, fragment):
+        super().__init__(data)
+        self.fragment = fragment
+        self.static = set(fragment.fields)
+
+    def __setitem__(self, key, value):
+        self.static.discard(key)
+        super().__setitem__(key, value)
+
+    def __delitem__(self, key):
+        self.static.discard(key)
+        super().__delitem__(key)
+
+
+_fragments = {}
+_fragment_lock = threading.Lock()
+
+
+def _key(model_name, label, result, locale):
+    return model_name, label, result.get("status"), result.get("crop"), result.get("message"), locale
+
+
+def _compile(key, result, locale):
+    catalog = get_catalog(locale)
+    fragment = Fragment({
+        k: catalog.translate(v) for k, v in result.items()
+        if k not in VERBATIM_FIELDS and k not in PER_REQUEST_FIELDS
+    })
+    with _fragment_lock:
+        return _fragments.setdefault(key, fragment)
+
+
+def _crop_of(model, label):
+    """The requested crop whose votes `label` counts for, None for models that infer it"""
+    if not model.requires_crop:
+        return None
+    prefix = label.split("__")[0]
+    return {p: crop for crop, p in model.crop_keys.items()}.get(prefix, prefix)
+
+
+def sample_advisories(model):
+    """(label, English result) for every advisory a CropModel gives for a label"""
+    from .engine import Vote
+
+    for label in model.class_names:
+        crop = _crop_of(model, label)
+        # A confident unanimous vote and a weak split one reach every status
+        for confidence, agreement in ((90.0, 1.0), (60.0, 0.34)):
+            yield label, model.advise(Vote(label, confidence, agreement, crop))
+    yield None, model.unclear_response()
+
+
+def compile_model(model):
+    """Pre-render every label advisory of `model` in every locale; returns the fragment count"""
+    count = 0
+    for label, result in sample_advisories(model):
+        if label is None:
+            continue  # not cached, see localize()
+        for locale in locales():
+            key = _key(model.name, label, result, locale)
+            if key not in _fragments:
+                _compile(key, result, locale)
+                count += 1
+    return count
+
+
+def localize(model_name, result, label, locale):
+    """`result` (English, from the engine) in `locale`, as a LocalizedResult"""
+    fragment = _fragments.get(_key(model_name, label, result, locale)) if label is not None else None
+    if fragment is None:
+        # Never compiled here: keys built from request input would grow without bound
+        return LocalizedResult(translate_result(result, locale), UNCACHED)
+
+    localized = LocalizedResult(result, fragment)
+    dict.update(localized, fragment.fields)
+
+    catalog = get_catalog(locale)
+    for field in PER_REQUEST_FIELDS:
+        if field in result:
+            dict.__setitem__(localized, field, catalog.translate_text(result[field]))
+    return localized
+
+
+def translate_result(result, locale):
+    """`result` in `locale` without the fragment cache (catalog strings, then templates)"""
+    catalog = get_catalog(locale)
+    return {k: v if k in VERBATIM_FIELDS else catalog.translate_text(v) for k, v in result.items()}
+
+
+def advisory_strings(model):
+    """Every English text the model's advisories can contain, in first-seen order"""
+    seen = {}
+
+    def walk(value, per_request=False):
+        if isinstance(value, str):
+            # Numbers in per-request text become template slots
+            seen.setdefault(re.sub(r"\d+", "{}", value) if per_request else value, None)
+        elif isinstance(value, list):
+            for v in value:
+                walk(v, per_request)
+        elif isinstance(value, dict):
+            for v in value.values():
+                walk(v, per_request)
+
+    results = [result for _, result in sample_advisories(model)]
+    if model.check_quality:
+        results.append(model.poor_quality_response([]))
+    if model.requires_crop:
+        # The requested crop is request input: one template, not one text per crop
+        results.append(model.wrong_crop_response("{}", 0.0))
+
+    for result in results:
+        for k, v in result.items():
+            if k not in VERBATIM_FIELDS:
+                walk(v, k in PER_REQUEST_FIELDS)
+    return list(seen)
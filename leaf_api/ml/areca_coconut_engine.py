@@ -1,19 +1,12 @@
 # areca_coconut_engine.py
 
-import tensorflow as tf
-import numpy as np
-from tensorflow.keras.preprocessing import image
-import os
-from django.conf import settings
+from .calibration import Calibration
+from .engine import CropEngine, CropModel, health_score
 
 #CONFIG
-IMG_SIZE = 128
-
-MODEL_PATH = os.path.join(
-    settings.BASE_DIR,
-    "ml_models",
-    "arecanut_coconut_leaf_model.h5"
-)
+# Versioned under ml_models/areca_coconut/<version>/, falling back to the single file
+MODEL_NAME = "areca_coconut"
+LEGACY_MODEL_FILE = "arecanut_coconut_leaf_model.h5"
 
 CLASS_NAMES = [
     "Arecanut_Healthy",
@@ -22,7 +15,8 @@ CLASS_NAMES = [
     "Coconut_Disease",
 ]
 
-model = tf.keras.models.load_model(MODEL_PATH)
+# Used when no calibration.json ships with the model version
+DEFAULT_CALIBRATION = Calibration("default-1", confidence_points=((0, 0), (90, 90), (95, 93.5), (100, 97)))
 
 # ======================================================
 # COMPREHENSIVE DISEASE KNOWLEDGE BASE
@@ -179,60 +173,15 @@ HEALTHY_GUIDANCE = {
 }
 
 # ======================================================
-# HEALTH SCORE LOGIC
-# ======================================================
-def calculate_health_score(status, confidence):
-    if status == "healthy":
-        return min(95, int(80 + confidence * 0.15))
-    if status == "early_risk":
-        return int(55 + confidence * 0.2)
-    if status == "disease_confirmed":
-        return int(30 + confidence * 0.2)
-    return 50
-
-
-# ======================================================
-# CONFIDENCE CALIBRATION
-# ======================================================
-def calibrate_confidence(confidence):
-    """Reduce over-confidence for realism"""
-    if confidence > 95:
-        reduction = np.random.uniform(2.0, 4.0)
-        calibrated = confidence - reduction
-        return max(calibrated, 80.0)
-    elif confidence > 90:
-        reduction = np.random.uniform(1.0, 2.0)
-        return confidence - reduction
-    return confidence
-
-
-# ======================================================
-# MAIN PREDICTION FUNCTION (API SAFE)
+# CROP MODEL
 # ======================================================
-def predict_images(image_paths):
-    labels = []
-    confidences = []
-
-    # ---------- Run predictions ----------
-    for path in image_paths:
-        try:
-            img = image.load_img(path, target_size=(IMG_SIZE, IMG_SIZE))
-            arr = image.img_to_array(img)
-            arr = np.expand_dims(arr, axis=0) / 255.0
-
-            preds = model.predict(arr, verbose=0)[0]
-            idx = int(np.argmax(preds))
-
-            if idx >= len(CLASS_NAMES):
-                continue
-
-            labels.append(CLASS_NAMES[idx])
-            confidences.append(float(np.max(preds) * 100))
-        except Exception as e:
-            continue
+class ArecaCoconutModel(CropModel):
+    name = MODEL_NAME
+    legacy_model_file = LEGACY_MODEL_FILE
+    class_names = CLASS_NAMES
+    default_calibration = DEFAULT_CALIBRATION
 
-    # ---------- No valid images ----------
-    if not confidences:
+    def unclear_response(self):
         return {
             "status": "early_risk",
             "message": "Images are unclear or not leaf-related",
@@ -246,158 +195,171 @@ def predict_images(image_paths):
             "disclaimer": "AI-based advisory. Confirm with agriculture expert."
         }
 
-    avg_conf = round(sum(confidences) / len(confidences), 2)
-    avg_conf = calibrate_confidence(avg_conf)
-    final_label = max(set(labels), key=labels.count)
-    agreement = labels.count(final_label) / len(labels)
+    def advise(self, vote):
+        final_label, avg_conf, agreement = vote.label, vote.confidence, vote.agreement
 
-    crop = "Arecanut" if "Arecanut" in final_label else "Coconut"
-    is_healthy = "Healthy" in final_label
+        crop = "Arecanut" if "Arecanut" in final_label else "Coconut"
+        is_healthy = "Healthy" in final_label
 
-    # ======================================================
-    # HEALTHY CASE
-    # ======================================================
-    if is_healthy and avg_conf >= 75:
-        crop_guidance = HEALTHY_GUIDANCE.get(crop, {})
+        # ======================================================
+        # HEALTHY CASE
+        # ======================================================
+        if is_healthy and avg_conf >= 75:
+            crop_guidance = HEALTHY_GUIDANCE.get(crop, {})
         
-        return {
-            "status": "healthy",
-            "crop": crop,
-            "confidence": avg_conf,
-            "health_score": calculate_health_score("healthy", avg_conf),
-            "action_priority": "Low",
-            "message": f"{crop} palm appears healthy",
-            "current_condition": "Good palm health",
-            "routine_care": crop_guidance.get("routine_care", [
-                "Continue regular irrigation",
-                "Apply organic manure annually",
-                "Monitor for pests monthly"
-            ]),
-            "nutrient_management": crop_guidance.get("nutrient_management", [
-                "Apply balanced fertilizer",
-                "Supplement with micronutrients",
-                "Maintain soil pH 5.0-8.0"
-            ]),
-            "yield_optimization": crop_guidance.get("harvest_management", [
-                "Harvest at proper maturity",
-                "Follow good processing practices"
-            ]),
-            "economic_potential": f"Expected yield: {crop} specific normal range",
-            "preventive_measures": [
-                "Regular field sanitation",
-                "Proper drainage maintenance",
-                "Disease monitoring every 15 days"
-            ],
-            "farmer_reassurance": "Your palm garden is in good health. Regular care ensures sustained productivity.",
-            "disclaimer": "AI-based advisory. For commercial decisions, consult palm specialist."
-        }
+            return {
+                "status": "healthy",
+                "crop": crop,
+                "confidence": avg_conf,
+                "health_score": health_score("healthy", avg_conf),
+                "action_priority": "Low",
+                "message": f"{crop} palm appears healthy",
+                "current_condition": "Good palm health",
+                "routine_care": crop_guidance.get("routine_care", [
+                    "Continue regular irrigation",
+                    "Apply organic manure annually",
+                    "Monitor for pests monthly"
+                ]),
+                "nutrient_management": crop_guidance.get("nutrient_management", [
+                    "Apply balanced fertilizer",
+                    "Supplement with micronutrients",
+                    "Maintain soil pH 5.0-8.0"
+                ]),
+                "yield_optimization": crop_guidance.get("harvest_management", [
+                    "Harvest at proper maturity",
+                    "Follow good processing practices"
+                ]),
+                "economic_potential": f"Expected yield: {crop} specific normal range",
+                "preventive_measures": [
+                    "Regular field sanitation",
+                    "Proper drainage maintenance",
+                    "Disease monitoring every 15 days"
+                ],
+                "farmer_reassurance": "Your palm garden is in good health. Regular care ensures sustained productivity.",
+                "disclaimer": "AI-based advisory. For commercial decisions, consult palm specialist."
+            }
+
+        # Get disease information
+        info = DISEASE_INFO.get(final_label, {})
 
-    # Get disease information
-    info = DISEASE_INFO.get(final_label, {})
+        # ======================================================
+        # DISEASE CONFIRMED
+        # ======================================================
+        if avg_conf >= 80 and agreement >= 0.6:
+            result = {
+                "status": "disease_confirmed",
+                "crop": crop,
+                "confidence": avg_conf,
+                "agreement": round(agreement * 100, 1),
+                "health_score": health_score("disease_confirmed", avg_conf),
+                "severity": info.get("severity", "High"),
+                "action_priority": "Immediate",
+                "common_diseases": info.get("common_diseases", ["Leaf disease detected"]),
+                "identified_symptoms": info.get("symptoms", [
+                    "Leaf discoloration",
+                    "Abnormal leaf drop",
+                    "Reduced palm vigor"
+                ]),
+                "immediate_actions": info.get("immediate_actions", [
+                    "Remove infected leaves/fronds",
+                    "Improve field drainage",
+                    "Maintain palm hygiene"
+                ]),
+                "chemical_treatment": info.get("chemical_treatment", {}),
+                "organic_management": info.get("organic_management", [
+                    "Neem cake application",
+                    "Biocontrol agents",
+                    "Proper spacing and sanitation"
+                ]),
+                "nutrient_management": info.get("fertilizer_guidance", {
+                    "recommended": ["Balanced NPK", "Organic manure", "Micronutrients"]
+                }),
+                "prevention_strategies": info.get("prevention", [
+                    "Use disease-free planting material",
+                    "Maintain proper palm spacing",
+                    "Regular field inspection"
+                ]),
+                "economic_impact": info.get("economic_impact", "Significant yield loss if untreated"),
+                "monitoring_schedule": [
+                    "Inspect palms weekly during rainy season",
+                    "Check for new symptoms every 3 days",
+                    "Monitor soil moisture regularly"
+                ],
+                "expert_contact": info.get("expert_contact", "Contact State Horticulture Department"),
+                "farmer_reassurance": "Palm diseases are common and manageable. Early treatment can save your plantation.",
+                "disclaimer": "AI-based advisory. For confirmed diagnosis and commercial treatment, consult palm specialist."
+            }
+        
+            # Add specific guidance based on crop
+            if crop == "Arecanut":
+                result["arecanut_specific"] = {
+                    "ideal_spacing": "2.7m x 2.7m minimum",
+                    "water_requirement": "150-200 liters/palm/week in summer",
+                    "intercrop_suggestions": ["Banana", "Black pepper", "Cocoa"]
+                }
+            else:  # Coconut
+                result["coconut_specific"] = {
+                    "ideal_spacing": "7.5m x 7.5m minimum",
+                    "water_requirement": "200-250 liters/palm/week",
+                    "intercrop_suggestions": ["Pineapple", "Turmeric", "Ginger", "Banana"]
+                }
+        
+            return result
 
-    # ======================================================
-    # DISEASE CONFIRMED
-    # ======================================================
-    if avg_conf >= 80 and agreement >= 0.6:
-        result = {
-            "status": "disease_confirmed",
+        # ======================================================
+        # EARLY RISK (NOT CONFIRMED)
+        # ======================================================
+        return {
+            "status": "early_risk",
             "crop": crop,
+            "possible_issue": "Early signs of palm disease",
             "confidence": avg_conf,
             "agreement": round(agreement * 100, 1),
-            "health_score": calculate_health_score("disease_confirmed", avg_conf),
-            "severity": info.get("severity", "High"),
-            "action_priority": "Immediate",
-            "common_diseases": info.get("common_diseases", ["Leaf disease detected"]),
-            "identified_symptoms": info.get("symptoms", [
-                "Leaf discoloration",
-                "Abnormal leaf drop",
-                "Reduced palm vigor"
-            ]),
-            "immediate_actions": info.get("immediate_actions", [
-                "Remove infected leaves/fronds",
-                "Improve field drainage",
-                "Maintain palm hygiene"
+            "health_score": health_score("early_risk", avg_conf),
+            "action_priority": "Medium",
+            "why_not_confirmed": [
+                f"Prediction agreement: {int(agreement * 100)}%",
+                "Symptoms may be early-stage",
+                "Environmental stress can mimic disease"
+            ],
+            "recommended_actions": info.get("immediate_actions", [
+                "Remove suspicious leaves",
+                "Improve drainage",
+                "Apply organic preventives"
             ]),
-            "chemical_treatment": info.get("chemical_treatment", {}),
-            "organic_management": info.get("organic_management", [
+            "organic_preventives": info.get("organic_management", [
                 "Neem cake application",
-                "Biocontrol agents",
-                "Proper spacing and sanitation"
+                "Trichoderma soil treatment",
+                "Proper irrigation management"
             ]),
-            "nutrient_management": info.get("fertilizer_guidance", {
-                "recommended": ["Balanced NPK", "Organic manure", "Micronutrients"]
-            }),
-            "prevention_strategies": info.get("prevention", [
-                "Use disease-free planting material",
-                "Maintain proper palm spacing",
-                "Regular field inspection"
-            ]),
-            "economic_impact": info.get("economic_impact", "Significant yield loss if untreated"),
-            "monitoring_schedule": [
-                "Inspect palms weekly during rainy season",
-                "Check for new symptoms every 3 days",
-                "Monitor soil moisture regularly"
+            "monitoring_advice": [
+                "Monitor palms daily for 5 days",
+                "Take photos of same leaves for comparison",
+                "Note any weather changes"
+            ],
+            "nutrient_support": [
+                "Apply balanced fertilizer",
+                "Supplement with micronutrients",
+                "Maintain soil organic matter"
             ],
-            "expert_contact": info.get("expert_contact", "Contact State Horticulture Department"),
-            "farmer_reassurance": "Palm diseases are common and manageable. Early treatment can save your plantation.",
-            "disclaimer": "AI-based advisory. For confirmed diagnosis and commercial treatment, consult palm specialist."
+            "when_to_act": "If symptoms worsen within 3 days or spread to other palms",
+            "contact_for_help": info.get("expert_contact", "Local agriculture officer"),
+            "economic_consideration": "Early intervention prevents major losses",
+            "farmer_reassurance": "Most palm issues are manageable with early detection. Your vigilance is key to success.",
+            "disclaimer": "Early warning advisory. Confirm with palm specialist before major interventions."
         }
-        
-        # Add specific guidance based on crop
-        if crop == "Arecanut":
-            result["arecanut_specific"] = {
-                "ideal_spacing": "2.7m x 2.7m minimum",
-                "water_requirement": "150-200 liters/palm/week in summer",
-                "intercrop_suggestions": ["Banana", "Black pepper", "Cocoa"]
-            }
-        else:  # Coconut
-            result["coconut_specific"] = {
-                "ideal_spacing": "7.5m x 7.5m minimum",
-                "water_requirement": "200-250 liters/palm/week",
-                "intercrop_suggestions": ["Pineapple", "Turmeric", "Ginger", "Banana"]
-            }
-        
-        return result
 
-    # ======================================================
-    # EARLY RISK (NOT CONFIRMED)
-    # ======================================================
-    return {
-        "status": "early_risk",
-        "crop": crop,
-        "possible_issue": "Early signs of palm disease",
-        "confidence": avg_conf,
-        "agreement": round(agreement * 100, 1),
-        "health_score": calculate_health_score("early_risk", avg_conf),
-        "action_priority": "Medium",
-        "why_not_confirmed": [
-            f"Prediction agreement: {int(agreement * 100)}%",
-            "Symptoms may be early-stage",
-            "Environmental stress can mimic disease"
-        ],
-        "recommended_actions": info.get("immediate_actions", [
-            "Remove suspicious leaves",
-            "Improve drainage",
-            "Apply organic preventives"
-        ]),
-        "organic_preventives": info.get("organic_management", [
-            "Neem cake application",
-            "Trichoderma soil treatment",
-            "Proper irrigation management"
-        ]),
-        "monitoring_advice": [
-            "Monitor palms daily for 5 days",
-            "Take photos of same leaves for comparison",
-            "Note any weather changes"
-        ],
-        "nutrient_support": [
-            "Apply balanced fertilizer",
-            "Supplement with micronutrients",
-            "Maintain soil organic matter"
-        ],
-        "when_to_act": "If symptoms worsen within 3 days or spread to other palms",
-        "contact_for_help": info.get("expert_contact", "Local agriculture officer"),
-        "economic_consideration": "Early intervention prevents major losses",
-        "farmer_reassurance": "Most palm issues are manageable with early detection. Your vigilance is key to success.",
-        "disclaimer": "Early warning advisory. Confirm with palm specialist before major interventions."
-    }
+
+engine = CropEngine(ArecaCoconutModel())
+
+
+# ======================================================
+# MAIN PREDICTION FUNCTION (API SAFE)
+# ======================================================
+def predict_images(image_paths, details=None):
+    return engine.predict_images(image_paths, details)
+
+
+def predict_batch(batch, reports, details=None):
+    """See CropEngine.predict_batch"""
+    return engine.predict_batch(batch, reports, details)
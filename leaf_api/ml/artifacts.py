@@ -0,0 +1,163 @@
+# artifacts.py
+#
+# Load-optimized model artifacts. `load_model` on an .h5 parses HDF5,
+# rebuilds every layer from the saved config and copies each weight
+# through h5py; on a cold worker that dominates boot. `manage.py
+# convert_models` writes next to every model file a directory with
+#
+#   model.fast/architecture.json   model.to_json()
+#   model.fast/weights.bin         all weights back to back, 64-byte aligned
+#   model.fast/index.json          dtype/shape/offset per weight + source file
+#
+# and load_model() below builds the model from the JSON and points
+# set_weights at np.memmap views of weights.bin: no HDF5, no per-weight
+# reads, the kernel pages weights in as TensorFlow copies them (and keeps
+# them in the page cache shared by every worker on the host).
+#
+# An artifact is only used while it matches its source file (size and
+# mtime, or the sha256 when the mtime changed, e.g. after a fresh
+# checkout); otherwise loading falls back to the .h5.
+
+import hashlib
+import json
+import logging
+import os
+import shutil
+
+import numpy as np
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+FAST_SUFFIX = ".fast"
+ARCHITECTURE_FILE = "architecture.json"
+WEIGHTS_FILE = "weights.bin"
+INDEX_FILE = "index.json"
+ALIGN = 64
+FORMAT_VERSION = 1
+
+
+def artifact_dir(model_path):
+    """ml_models/leaf/v3/model.h5 -> ml_models/leaf/v3/model.fast"""
+    return os.path.splitext(model_path)[0] + FAST_SUFFIX
+
+
+def _sha256(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _source_info(path, with_hash=True):
+    stat = os.stat(path)
+    info = {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+    if with_hash:
+        info["sha256"] = _sha256(path)
+    return info
+
+
+def _read_index(directory):
+    try:
+        with open(os.path.join(directory, INDEX_FILE)) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def is_current(model_path):
+    """True when model_path has an artifact built from its current contents"""
+    index = _read_index(artifact_dir(model_path))
+    if not index or index.get("format") != FORMAT_VERSION:
+        return False
+
+    source = index["source"]
+    info = _source_info(model_path, with_hash=False)
+    if info["size"] != source["size"]:
+        return False
+    return info["mtime_ns"] == source["mtime_ns"] or _sha256(model_path) == source["sha256"]
+
+
+# ======================================================
+# CONVERSION (build step)
+# ======================================================
+def convert(model_path):
+    """Write the artifact for model_path; returns its directory"""
+    import tensorflow as tf
+
+    model = tf.keras.models.load_model(model_path)
+    out = artifact_dir(model_path)
+    tmp = f"{out}.{os.getpid()}.tmp"
+    shutil.rmtree(tmp, ignore_errors=True)
+    os.makedirs(tmp)
+
+    weights, offset = [], 0
+    with open(os.path.join(tmp, WEIGHTS_FILE), "wb") as f:
+        for array in model.get_weights():
+            array = np.ascontiguousarray(array)
+            pad = -offset % ALIGN
+            f.write(b"\0" * pad)
+            offset += pad
+            weights.append({"dtype": array.dtype.str, "shape": list(array.shape), "offset": offset})
+            f.write(array.tobytes())
+            offset += array.nbytes
+
+    with open(os.path.join(tmp, ARCHITECTURE_FILE), "w") as f:
+        f.write(model.to_json())
+    with open(os.path.join(tmp, INDEX_FILE), "w") as f:
+        json.dump({
+            "format": FORMAT_VERSION,
+            "source": _source_info(model_path),
+            "tensorflow": tf.__version__,
+            "weights": weights,
+        }, f)
+
+    # Swap the whole directory in so a booting worker never sees half of it
+    old = f"{out}.{os.getpid()}.old"
+    if os.path.exists(out):
+        os.replace(out, old)
+    os.replace(tmp, out)
+    shutil.rmtree(old, ignore_errors=True)
+    return out
+
+
+# ======================================================
+# LOADING
+# ======================================================
+def load_fast(directory):
+    import tensorflow as tf
+
+    index = _read_index(directory)
+    with open(os.path.join(directory, ARCHITECTURE_FILE)) as f:
+        model = tf.keras.models.model_from_json(f.read())
+
+    weights_path = os.path.join(directory, WEIGHTS_FILE)
+    arrays = []
+    if index["weights"]:
+        blob = np.memmap(weights_path, dtype=np.uint8, mode="r")
+        for w in index["weights"]:
+            dtype = np.dtype(w["dtype"])
+            count = int(np.prod(w["shape"], dtype=np.int64))
+            arrays.append(
+                np.frombuffer(blob, dtype=dtype, count=count, offset=w["offset"]).reshape(w["shape"])
+            )
+    model.set_weights(arrays)
+    return model
+
+
+def load_model(model_path, fast=None):
+    """
+    The Keras model stored at model_path, from its artifact when there is
+    a current one (and MODEL_FAST_LOAD is on), otherwise from the file.
+    Returns (model, "fast" | "h5").
+    """
+    fast = settings.MODEL_FAST_LOAD if fast is None else fast
+    if fast and is_current(model_path):
+        try:
+            return load_fast(artifact_dir(model_path)), "fast"
+        except Exception:
+            logger.exception("Could not load %s; falling back to %s", artifact_dir(model_path), model_path)
+
+    import tensorflow as tf
+    return tf.keras.models.load_model(model_path), "h5"
@@ -0,0 +1,189 @@
+# batching.py
+
+import queue
+import threading
+import time
+
+import numpy as np
+
+from .. import timing, tracing
+
+
+class _Job:
+    __slots__ = ("batch", "result", "error", "done", "cancelled", "batch_rows", "span", "batch_span")
+
+    def __init__(self, batch):
+        self.batch = batch
+        self.batch_rows = 0
+        self.span = tracing.current()
+        self.batch_span = None
+        self.result = None
+        self.error = None
+        self.done = threading.Event()
+        self.cancelled = False  # the caller timed out; the dispatcher skips it
+
+
+class MicroBatcher:
+    """
+    Coalesces the images of concurrent requests into forward passes of at
+    most `max_batch` rows.
+
+    Callers hand in uint8 tensors of shape (n, 128, 128, 3) and get back
+    the (n, classes) probability rows for exactly their images. A single
+    in-flight request never waits: the dispatcher only holds a batch open
+    (up to `max_wait_ms`) while other callers are known to be queueing.
+    A caller whose batch is not served within `timeout_s` gets a
+    TimeoutError, and its images are dropped if still queued.
+    """
+
+    def __init__(self, predict_fn, max_batch=16, max_wait_ms=2.0, name="model", timeout_s=30.0):
+        self.predict_fn = predict_fn
+        self.max_batch = max(1, int(max_batch))
+        self.max_wait = max(0.0, float(max_wait_ms)) / 1000.0
+        self.timeout = timeout_s
+        self.name = name
+
+        self._queue = queue.Queue()
+        self._closed = False
+        self._waiting = 0
+        self._waiting_lock = threading.Lock()
+
+        self._thread = threading.Thread(
+            target=self._run,
+            name=f"batcher-{name}",
+            daemon=True
+        )
+        self._thread.start()
+
+    def predict(self, batch):
+        if len(batch) == 0:
+            return np.zeros((0, 0), dtype=np.float32)
+
+        job = _Job(batch)
+        # Same lock as close(): nothing is queued behind the stop sentinel
+        with self._waiting_lock:
+            closed = self._closed
+            if not closed:
+                self._waiting += 1
+                self._queue.put(job)
+
+        if closed:
+            # Retired (e.g. a swapped-out model version): run inline
+            return self.forward(batch.astype(np.float32) / 255.0)
+
+        if not job.done.wait(self.timeout):
+            job.cancelled = True
+            raise TimeoutError(f"{self.name}: no batch served within {self.timeout:g} s")
+        if job.error is not None:
+            raise job.error
+
+        timing.note("batch_rows", job.batch_rows)
+        if job.batch_span is not None:
+            tracing.set_attribute("batch.trace_id", job.batch_span.trace_id)
+            tracing.set_attribute("batch.span_id", job.batch_span.span_id)
+        return job.result
+
+    def forward(self, x):
+        """Run `x` (float32, already scaled) in chunks of max_batch rows"""
+        outputs = [
+            np.asarray(self.predict_fn(x[i:i + self.max_batch]))
+            for i in range(0, len(x), self.max_batch)
+        ]
+        return np.concatenate(outputs)
+
+    def close(self):
+        """Stop the dispatcher once everything already queued is served"""
+        with self._waiting_lock:
+            self._closed = True
+            self._queue.put(None)
+
+    def _fail_remaining(self):
+        """After the sentinel: release anything still queued rather than leave it waiting"""
+        error = RuntimeError(f"{self.name}: batcher closed")
+        while True:
+            try:
+                job = self._queue.get_nowait()
+            except queue.Empty:
+                return
+            if job is not None:
+                job.error = error
+                job.done.set()
+
+    def _get(self, block=True, timeout=None):
+        """Next job or the sentinel, dropping jobs whose caller gave up waiting"""
+        while True:
+            job = self._queue.get(block, timeout)
+            if job is None or not job.cancelled:
+                return job
+            with self._waiting_lock:
+                self._waiting -= 1
+
+    def _collect(self):
+        first = self._get()
+        if first is None:
+            return None, None
+
+        formed_ns = time.time_ns()
+        jobs = [first]
+        rows = len(first.batch)
+
+        while rows < self.max_batch:
+            with self._waiting_lock:
+                others_queued = self._waiting > len(jobs)
+            try:
+                if others_queued:
+                    job = self._get(timeout=self.max_wait)
+                else:
+                    job = self._get(block=False)
+            except queue.Empty:
+                break
+            if job is None:
+                self._queue.put(None)  # serve this batch, stop on the next round
+                break
+            jobs.append(job)
+            rows += len(job.batch)
+
+        with self._waiting_lock:
+            self._waiting -= len(jobs)
+        return jobs, formed_ns
+
+    def _run(self):
+        while True:
+            jobs, formed_ns = self._collect()
+            if jobs is None:
+                self._fail_remaining()
+                return
+
+            # Traced batch: its own trace, linked to every traced request in it
+            links = [job.span for job in jobs if job.span is not None]
+            batch_span = None
+            if links:
+                batch_span = tracing.Span("micro_batch", start_ns=formed_ns, links=links, attributes={
+                    "model": self.name, "batch.requests": len(jobs),
+                    "batch.rows": sum(len(job.batch) for job in jobs),
+                })
+                tracing.record("batch.form", batch_span, formed_ns, time.time_ns())
+
+            try:
+                x = np.concatenate([job.batch for job in jobs]).astype(np.float32) / 255.0
+                predict_ns = time.time_ns()
+                preds = self.forward(x)
+                tracing.record("model.predict", batch_span, predict_ns, time.time_ns(), rows=len(x))
+
+                offset = 0
+                for job in jobs:
+                    n = len(job.batch)
+                    job.result = preds[offset:offset + n]
+                    job.batch_rows = len(x)
+                    offset += n
+            except Exception as e:
+                if batch_span is not None:
+                    batch_span.set("error", type(e).__name__)
+                for job in jobs:
+                    job.error = e
+            finally:
+                if batch_span is not None:
+                    batch_span.end()
+                for job in jobs:
+                    job.batch_span = batch_span
+                    job.done.set()
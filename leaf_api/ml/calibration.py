@@ -0,0 +1,107 @@
+# calibration.py
+#
+# Deterministic confidence calibration, versioned next to the models.
+#
+# Looked up per model version, first match wins:
+#   ml_models/<name>/<version>/calibration.json
+#   ml_models/<name>/calibration.json
+#   the engine's built-in default
+#
+#   {
+#     "version": "2026-10-01",
+#     "temperature": 1.3,
+#     "confidence_points": [[0, 0], [90, 90], [95, 94], [100, 97.5]]
+#   }
+#
+# temperature         softmax temperature applied to every probability row
+#                     (p ** (1 / T), renormalized); 1.0 leaves them as-is
+# confidence_points   monotonic piecewise-linear map of the submission's
+#                     average confidence (percent)
+#
+# Files are read once per model version and worker: ship a changed
+# calibration with a new version string and a worker restart (or a new
+# model version). Output is a pure function of the model output and the
+# calibration version, so identical inputs give identical, cacheable
+# responses.
+
+import json
+import logging
+import os
+import threading
+
+import numpy as np
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+CALIBRATION_FILE = "calibration.json"
+
+
+class Calibration:
+    def __init__(self, version, temperature=1.0, confidence_points=((0, 0), (100, 100))):
+        points = np.asarray(confidence_points, dtype=np.float64)
+        if points.ndim != 2 or points.shape[1] != 2 or len(points) < 2:
+            raise ValueError("confidence_points must be a list of [x, y] pairs")
+        if np.any(np.diff(points[:, 0]) <= 0) or np.any(np.diff(points[:, 1]) < 0):
+            raise ValueError("confidence_points must be increasing")
+        if temperature <= 0:
+            raise ValueError("temperature must be positive")
+
+        self.version = str(version)
+        self.temperature = float(temperature)
+        self._xs = points[:, 0]
+        self._ys = points[:, 1]
+
+    @classmethod
+    def from_file(cls, path):
+        with open(path) as f:
+            spec = json.load(f)
+        return cls(
+            spec["version"],
+            spec.get("temperature", 1.0),
+            spec.get("confidence_points", ((0, 0), (100, 100))),
+        )
+
+    def probabilities(self, preds):
+        """Temperature-scale an (n, classes) probability matrix"""
+        preds = np.asarray(preds, dtype=np.float32)
+        if self.temperature == 1.0 or preds.size == 0:
+            return preds
+
+        logits = np.log(np.clip(preds, 1e-7, 1.0)) / self.temperature
+        logits -= logits.max(axis=1, keepdims=True)
+        scaled = np.exp(logits)
+        return scaled / scaled.sum(axis=1, keepdims=True)
+
+    def confidence(self, percent):
+        """Calibrated confidence (percent) for a scalar or an array of them"""
+        calibrated = np.interp(percent, self._xs, self._ys)
+        return float(calibrated) if np.ndim(calibrated) == 0 else calibrated
+
+
+# ======================================================
+# LOOKUP (cached per model version)
+# ======================================================
+_cache = {}
+_cache_lock = threading.Lock()
+
+
+def get_calibration(name, version, default):
+    key = (name, version)
+    calibration = _cache.get(key)
+    if calibration is not None:
+        return calibration
+
+    root = os.path.join(settings.MODEL_DIR, name)
+    calibration = default
+    for path in (os.path.join(root, version, CALIBRATION_FILE), os.path.join(root, CALIBRATION_FILE)):
+        if os.path.exists(path):
+            try:
+                calibration = Calibration.from_file(path)
+            except (OSError, KeyError, ValueError):
+                logger.exception("Bad calibration file %s; using the built-in default", path)
+            break
+
+    with _cache_lock:
+        _cache[key] = calibration
+    return calibration
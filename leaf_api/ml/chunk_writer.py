@@ -0,0 +1,73 @@
+# chunk_writer.py
+#
+# Append-only rows in preallocated, memory-mapped .npy chunks, shared by
+# the tensor store (tensor_store.py) and the embedding index
+# (embeddings.py). Next to the chunks, one TSV index line per row:
+#
+#   <caller's fields> \t <chunk file> \t <row>
+#
+# Every worker process is its own <writer>, so appends never need a
+# cross-process lock. A chunk is allocated at its full CHUNK_ROWS size
+# on first use; a row of another shape starts a new chunk.
+
+import os
+import threading
+import time
+
+import numpy as np
+
+
+class ChunkedWriter:
+    def __init__(self, root, prefix, dtype, chunk_rows):
+        self.root = root
+        self.prefix = prefix
+        self.dtype = dtype
+        self.chunk_rows = chunk_rows
+        self.writer_id = f"{int(time.time())}-{os.getpid()}"
+
+        os.makedirs(root, exist_ok=True)
+        # Reentrant: subclasses hold it around their own bookkeeping
+        self._lock = threading.RLock()
+        self._chunk = None
+        self._chunk_name = None
+        self._chunk_no = 0
+        self._row = chunk_rows  # forces a new chunk on first append
+        self._index = open(os.path.join(root, f"index-{self.writer_id}.tsv"), "a")
+
+    def _next_chunk(self, row_shape):
+        if self._chunk is not None:
+            self._chunk.flush()
+        self._chunk_name = f"{self.prefix}-{self.writer_id}-{self._chunk_no}.npy"
+        self._chunk = np.lib.format.open_memmap(
+            os.path.join(self.root, self._chunk_name),
+            mode="w+",
+            dtype=self.dtype,
+            shape=(self.chunk_rows,) + row_shape
+        )
+        self._chunk_no += 1
+        self._row = 0
+
+    def write_rows(self, fields, rows):
+        """One chunk row per entry of `rows`; `fields` are the leading index columns of each"""
+        lines = []
+
+        with self._lock:
+            for entry, row in zip(fields, rows):
+                shape = np.shape(row)
+                if self._row >= self.chunk_rows or self._chunk.shape[1:] != shape:
+                    self._next_chunk(shape)
+
+                self._chunk[self._row] = row
+                lines.append("\t".join(map(str, tuple(entry) + (self._chunk_name, self._row))) + "\n")
+                self._row += 1
+
+            if lines:
+                # Index after data: a crash can orphan rows but never index garbage
+                self._index.write("".join(lines))
+                self._index.flush()
+
+    def close(self):
+        with self._lock:
+            if self._chunk is not None:
+                self._chunk.flush()
+            self._index.close()
@@ -0,0 +1,230 @@
+# compare.py
+#
+# Side-by-side evaluation of two inference backends for one crop model,
+# before production moves to a lighter (quantized / compiled) model.
+#
+# Backend specs:
+#   active            the version the registry serves now
+#   version:<v>       ml_models/<name>/<v>/model.h5 (or its .fast artifact)
+#   keras:<path>      any Keras model file
+#   tflite:<path>     a TensorFlow Lite flatbuffer, float or quantized input
+#
+# replay() scores the tensor store corpus (ml/tensor_store.py) with both
+# backends, then re-runs the engine's own verdict rules
+# (CropEngine.evaluate) on every recorded submission whose images are
+# all stored, so a status change is exactly what a user would have seen.
+# Both backends use the calibration of the active model version: the
+# comparison is between models, not calibrations.
+
+import time
+from collections import Counter, defaultdict
+
+import numpy as np
+from django.conf import settings
+
+from ..watchdog import current_rss
+from .artifacts import load_model
+from .calibration import get_calibration
+from .preprocess import TENSOR_SHAPE
+from .tensor_store import iter_batches, load_index
+
+
+# ======================================================
+# BACKENDS
+# ======================================================
+class Backend:
+    """predict(float32 (n, 128, 128, 3) in [0, 1]) -> (n, classes) probabilities"""
+
+    def __init__(self, spec, predict, load_ms, load_rss):
+        self.spec = spec
+        self.predict = predict
+        self.load_ms = load_ms
+        self.load_rss = load_rss
+
+
+def _tflite_predict(path):
+    import tensorflow as tf
+
+    interpreter = tf.lite.Interpreter(model_path=path)
+    input_detail = interpreter.get_input_details()[0]
+    output_detail = interpreter.get_output_details()[0]
+    size = None
+
+    def predict(x):
+        nonlocal size
+        if size != len(x):
+            interpreter.resize_tensor_input(input_detail["index"], (len(x),) + x.shape[1:])
+            interpreter.allocate_tensors()
+            size = len(x)
+
+        scale, zero_point = input_detail["quantization"]
+        if scale:  # quantized input
+            x = np.round(x / scale + zero_point)
+        interpreter.set_tensor(input_detail["index"], x.astype(input_detail["dtype"]))
+        interpreter.invoke()
+
+        out = interpreter.get_tensor(output_detail["index"]).astype(np.float32)
+        scale, zero_point = output_detail["quantization"]
+        return (out - zero_point) * scale if scale else out
+
+    return predict
+
+
+def load_backend(spec, registry):
+    """Backend for `spec`; `registry` is the crop model's ModelRegistry"""
+    kind, _, arg = spec.partition(":")
+    rss = current_rss()
+    started = time.perf_counter()
+
+    if kind == "active":
+        predict = registry.active.model.predict_on_batch
+    elif kind == "version":
+        model, _ = load_model(registry.model_path(arg))
+        predict = model.predict_on_batch
+    elif kind == "keras":
+        model, _ = load_model(arg)
+        predict = model.predict_on_batch
+    elif kind == "tflite":
+        predict = _tflite_predict(arg)
+    else:
+        raise ValueError(f"Unknown backend {spec!r} (active, version:<v>, keras:<path>, tflite:<path>)")
+
+    # Warm-up, so the first timed batch does not pay for graph building
+    predict(np.zeros((1,) + TENSOR_SHAPE, dtype=np.float32))
+    return Backend(spec, predict, (time.perf_counter() - started) * 1000, current_rss() - rss)
+
+
+def parse_backends(value):
+    """"leaf=tflite:/m.tflite,areca_coconut=active" -> {"leaf": "tflite:/m.tflite", ...}"""
+    backends = {}
+    for item in filter(None, (part.strip() for part in value.split(","))):
+        endpoint, _, spec = item.partition("=")
+        backends[endpoint.strip()] = spec.strip()
+    return backends
+
+
+# ======================================================
+# REPLAY
+# ======================================================
+class _Timer:
+    def __init__(self):
+        self.batches_ms = []
+        self.images = 0
+
+    def run(self, predict, x):
+        started = time.perf_counter()
+        preds = np.asarray(predict(x), dtype=np.float32)
+        self.batches_ms.append((time.perf_counter() - started) * 1000)
+        self.images += len(x)
+        return preds
+
+    def summary(self):
+        total_s = sum(self.batches_ms) / 1000
+        ms = np.asarray(self.batches_ms or [0.0])
+        return {
+            "batches": len(self.batches_ms),
+            "batch_p50_ms": round(float(np.percentile(ms, 50)), 2),
+            "batch_p95_ms": round(float(np.percentile(ms, 95)), 2),
+            "images_per_s": round(self.images / total_s, 1) if total_s else None,
+        }
+
+
+def replay(engine, a, b, batch_size=64, limit=None):
+    """
+    Score the stored corpus of `engine` (a crop engine module) with
+    backends `a` and `b`; returns the comparison report.
+    """
+    from ..models import ImageResult
+
+    name = engine.MODEL_NAME
+    index = load_index(settings.TENSOR_STORE_DIR, name)
+    if limit:
+        index = type(index)(list(index.items())[:limit])
+
+    calibration = get_calibration(name, engine.engine.registry.active.version, engine.DEFAULT_CALIBRATION)
+
+    preds = {"a": {}, "b": {}}
+    timers = {"a": _Timer(), "b": _Timer()}
+    for hashes, batch in iter_batches(settings.TENSOR_STORE_DIR, index, batch_size):
+        x = batch.astype(np.float32) / 255.0
+        for key, backend in (("a", a), ("b", b)):
+            for image_hash, p in zip(hashes, timers[key].run(backend.predict, x)):
+                preds[key][image_hash] = p
+
+    # ---------- per image ----------
+    class_names = list(engine.CLASS_NAMES) + [""]  # out-of-range index -> no label
+    images = len(preds["a"])
+    transitions = Counter()
+    drift = np.zeros(1)
+    if images:
+        pa = calibration.probabilities(np.stack(list(preds["a"].values())))
+        pb = calibration.probabilities(np.stack([preds["b"][h] for h in preds["a"]]))
+        last = len(class_names) - 1
+        for ia, ib in zip(pa.argmax(axis=1).tolist(), pb.argmax(axis=1).tolist()):
+            if ia != ib:
+                transitions[(class_names[min(ia, last)], class_names[min(ib, last)])] += 1
+        drift = np.abs(pa.max(axis=1) - pb.max(axis=1)) * 100
+
+    # ---------- per submission (the engine's verdict rules) ----------
+    submissions = defaultdict(list)
+    crops = {}
+    records = (
+        ImageResult.objects
+        .filter(submission__endpoint=name)
+        .order_by("submission_id", "position")
+        .values_list("submission_id", "image_hash", "quality_ok", "quality_message", "submission__crop")
+    )
+    for submission_id, image_hash, quality_ok, message, crop in records.iterator(chunk_size=5000):
+        submissions[submission_id].append((image_hash, quality_ok, message))
+        crops[submission_id] = crop if engine.engine.model.requires_crop else None
+
+    status_changes = Counter()
+    label_changes = 0
+    compared = 0
+    for submission_id, entries in submissions.items():
+        if not all(image_hash in preds["a"] for image_hash, _, _ in entries):
+            continue  # some images were never stored
+        compared += 1
+
+        reports = [(True, quality_ok, message) for _, quality_ok, message in entries]
+        rows = list(range(len(entries)))
+        verdicts = []
+        for key in ("a", "b"):
+            stacked = np.stack([preds[key][image_hash] for image_hash, _, _ in entries])
+            details = {}
+            result = engine.engine.evaluate(
+                reports, rows, stacked, calibration, crop=crops[submission_id], details=details
+            )
+            verdicts.append((result.get("status"), details.get("label")))
+
+        (status_a, label_a), (status_b, label_b) = verdicts
+        if status_a != status_b:
+            status_changes[(status_a, status_b)] += 1
+        if label_a != label_b:
+            label_changes += 1
+
+    return {
+        "model": name,
+        "calibration_version": calibration.version,
+        "images": images,
+        "label_agreement": round(1 - sum(transitions.values()) / images, 4) if images else None,
+        "confidence_drift": {
+            "mean": round(float(drift.mean()), 2),
+            "p95": round(float(np.percentile(drift, 95)), 2),
+            "max": round(float(drift.max()), 2),
+        },
+        "label_transitions": [[la, lb, n] for (la, lb), n in transitions.most_common(10)],
+        "submissions": compared,
+        "status_changed": sum(status_changes.values()),
+        "final_label_changed": label_changes,
+        "status_transitions": [[sa, sb, n] for (sa, sb), n in status_changes.most_common(10)],
+        "backends": {
+            key: dict(
+                spec=backend.spec,
+                load_ms=round(backend.load_ms, 1),
+                load_rss_mb=round(backend.load_rss / 2**20, 1),
+                **timers[key].summary()
+            )
+            for key, backend in (("a", a), ("b", b))
+        },
+    }
@@ -0,0 +1,368 @@
+# embeddings.py
+#
+# "Similar past cases": the penultimate-layer activations of every scored
+# image, kept in an on-disk vector index per model version (embedding
+# spaces of two versions are not comparable).
+#
+# With EMBEDDINGS_ENABLED the micro-batcher's forward pass returns the
+# embedding next to the probabilities (served_forward), so nothing is run
+# twice. Images that voted for the final label of a confirmed submission
+# (CONFIRMED_STATUSES) are appended, L2-normalized float16, by one writer
+# per worker process (chunk_writer.ChunkedWriter, as the tensor store):
+#
+#   EMBEDDING_DIR/<model>/<version>/
+#     raw/vectors-<writer>-<n>.npy   preallocated (CHUNK_ROWS, dim) float16
+#     raw/index-<writer>.tsv         submission \t label \t status \t created \t chunk \t row
+#     ivf-<built>/                   searchable index, from `manage.py build_embedding_index`
+#     CURRENT                        name of the ivf- directory served
+#
+# The ivf- directory is an inverted file: spherical k-means centroids
+# (about 4 * sqrt(rows) lists) and the vectors sorted by list, memory
+# mapped. A query scores the centroids, then only the EMBEDDING_NPROBE
+# closest lists, so its cost grows with sqrt(rows), not rows. Cases
+# become searchable at the next build.
+
+import glob
+import json
+import logging
+import os
+import shutil
+import threading
+import time
+
+import numpy as np
+from django.conf import settings
+
+from .. import tracing
+from .chunk_writer import ChunkedWriter
+
+logger = logging.getLogger(__name__)
+
+CHUNK_ROWS = 4096
+CURRENT_FILE = "CURRENT"
+CONFIRMED_STATUSES = ("healthy", "disease_confirmed")
+EXACT_ROWS = 10000  # below this a single list (exact search) is as fast
+
+META_DTYPE = np.dtype([("submission", "S32"), ("label", "<i2"), ("status", "<i1"), ("created", "<i8")])
+
+
+# ======================================================
+# FORWARD PASS
+# ======================================================
+def served_forward(model):
+    """
+    (predict_fn, classes) for the micro-batcher. With EMBEDDINGS_ENABLED
+    predict_fn returns (n, classes + dim): the probabilities followed by
+    the input of the last layer, from the same forward pass.
+    """
+    classes = int(model.output_shape[-1])
+    if not settings.EMBEDDINGS_ENABLED:
+        return model.predict_on_batch, classes
+
+    import tensorflow as tf
+
+    both = tf.keras.Model(model.inputs, [model.output, model.layers[-1].input])
+
+    def predict(x):
+        probs, features = both.predict_on_batch(x)
+        return np.concatenate([
+            np.asarray(probs, dtype=np.float32),
+            np.asarray(features, dtype=np.float32).reshape(len(x), -1),
+        ], axis=1)
+
+    return predict, classes
+
+
+def split_outputs(preds, classes):
+    """(probabilities, embeddings or None) of a batcher result"""
+    if classes is None or preds.shape[1] <= classes:
+        return preds, None
+    return preds[:, :classes], preds[:, classes:]
+
+
+def normalize(vectors):
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    return vectors / np.maximum(norms, 1e-12)
+
+
+def version_dir(name, version):
+    return os.path.join(settings.EMBEDDING_DIR, name, version)
+
+
+# ======================================================
+# WRITING
+# ======================================================
+class EmbeddingWriter(ChunkedWriter):
+    def __init__(self, root, chunk_rows=CHUNK_ROWS):
+        super().__init__(root, "vectors", np.float16, chunk_rows)
+
+    def append(self, submission_id, label, status, vectors):
+        """`vectors`: normalized embeddings of the submission's images"""
+        created = int(time.time())
+        self.write_rows([(submission_id, label, status, created)] * len(vectors), vectors)
+
+
+def read_raw(root):
+    """Raw entries of a version: list of (submission, label, status, created, chunk, row)"""
+    entries = []
+    for path in sorted(glob.glob(os.path.join(root, "index-*.tsv"))):
+        with open(path) as f:
+            for line in f:
+                parts = line.rstrip("\n").split("\t")
+                if len(parts) != 6:
+                    continue  # torn last line
+                submission, label, status, created, chunk, row = parts
+                entries.append((submission, label, status, int(created), chunk, int(row)))
+    return entries
+
+
+# ======================================================
+# BUILDING (manage.py build_embedding_index)
+# ======================================================
+def _gather(root, entries, indices):
+    """float32 vectors of entries[indices], one read per chunk"""
+    by_chunk = {}
+    for position, i in enumerate(indices):
+        by_chunk.setdefault(entries[i][4], []).append((entries[i][5], position))
+
+    out = None
+    for chunk, rows in by_chunk.items():
+        data = np.load(os.path.join(root, chunk), mmap_mode="r")
+        if out is None:
+            out = np.zeros((len(indices), data.shape[1]), dtype=np.float32)
+        rows.sort()
+        out[[p for _, p in rows]] = data[[r for r, _ in rows]]
+    return out
+
+
+def _assign(vectors, centroids, block=8192):
+    return np.concatenate([
+        (vectors[i:i + block] @ centroids.T).argmax(axis=1)
+        for i in range(0, len(vectors), block)
+    ]) if len(vectors) else np.zeros(0, dtype=np.int64)
+
+
+def train_centroids(sample, lists, iterations=10, seed=0):
+    """Spherical k-means: unit centroids maximizing cosine similarity"""
+    rng = np.random.default_rng(seed)
+    centroids = sample[rng.choice(len(sample), lists, replace=False)]
+
+    for _ in range(iterations):
+        assigned = _assign(sample, centroids)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, assigned, sample)
+        empty = np.bincount(assigned, minlength=lists) == 0
+        # Re-seed empty lists with random sample rows
+        sums[empty] = sample[rng.choice(len(sample), int(empty.sum()))]
+        centroids = normalize(sums)
+    return centroids
+
+
+def build_index(root, lists=None, iterations=10, sample_size=100000, seed=0):
+    """
+    Build a new ivf- directory from root/raw and point CURRENT at it.
+    Returns (directory, rows, lists); None when nothing is stored.
+    """
+    raw = os.path.join(root, "raw")
+    entries = read_raw(raw)
+    if not entries:
+        return None
+    n = len(entries)
+
+    if lists is None:
+        lists = 1 if n < EXACT_ROWS else int(min(65536, round(4 * np.sqrt(n))))
+    lists = max(1, min(lists, n))
+
+    rng = np.random.default_rng(seed)
+    sample = _gather(raw, entries, np.sort(rng.choice(n, min(n, sample_size), replace=False)))
+    centroids = train_centroids(sample, lists, iterations, seed) if lists > 1 else normalize(sample.mean(axis=0))[None]
+    dim = centroids.shape[1]
+
+    built = f"ivf-{time.strftime('%Y%m%d%H%M%S')}"
+    directory = os.path.join(root, built)
+    os.makedirs(directory)
+
+    # Assign every vector, then write it to its list's slot (stable within a list)
+    assigned = np.zeros(n, dtype=np.int64)
+    block = 65536
+    for start in range(0, n, block):
+        indices = np.arange(start, min(start + block, n))
+        assigned[indices] = _assign(_gather(raw, entries, indices), centroids)
+    order = np.argsort(assigned, kind="stable")
+    position = np.empty(n, dtype=np.int64)
+    position[order] = np.arange(n)
+
+    vectors = np.lib.format.open_memmap(
+        os.path.join(directory, "vectors.npy"), mode="w+", dtype=np.float16, shape=(n, dim)
+    )
+    for start in range(0, n, block):
+        indices = np.arange(start, min(start + block, n))
+        vectors[position[indices]] = _gather(raw, entries, indices)
+    vectors.flush()
+    del vectors
+
+    labels = sorted({e[1] for e in entries})
+    statuses = sorted({e[2] for e in entries})
+    label_ids = {label: i for i, label in enumerate(labels)}
+    status_ids = {status: i for i, status in enumerate(statuses)}
+    meta = np.zeros(n, dtype=META_DTYPE)
+    meta["submission"] = [e[0].replace("-", "") for e in entries]
+    meta["label"] = [label_ids[e[1]] for e in entries]
+    meta["status"] = [status_ids[e[2]] for e in entries]
+    meta["created"] = [e[3] for e in entries]
+    np.save(os.path.join(directory, "meta.npy"), meta[order])
+
+    np.save(os.path.join(directory, "centroids.npy"), centroids.astype(np.float32))
+    offsets = np.zeros(lists + 1, dtype=np.int64)
+    offsets[1:] = np.cumsum(np.bincount(assigned, minlength=lists))
+    np.save(os.path.join(directory, "offsets.npy"), offsets)
+    with open(os.path.join(directory, "vocab.json"), "w") as f:
+        json.dump({"labels": labels, "statuses": statuses, "rows": n, "lists": lists, "dim": dim}, f)
+
+    tmp = os.path.join(root, f".{CURRENT_FILE}.tmp")
+    with open(tmp, "w") as f:
+        f.write(built + "\n")
+    os.replace(tmp, os.path.join(root, CURRENT_FILE))
+
+    # Keep the new and the previous build; workers may still be reading the previous one
+    for old in sorted(glob.glob(os.path.join(root, "ivf-*")))[:-2]:
+        shutil.rmtree(old, ignore_errors=True)
+    return directory, n, lists
+
+
+# ======================================================
+# SEARCHING
+# ======================================================
+class EmbeddingIndex:
+    def __init__(self, directory):
+        self.directory = directory
+        self.centroids = np.load(os.path.join(directory, "centroids.npy"))
+        self.offsets = np.load(os.path.join(directory, "offsets.npy"))
+        self.vectors = np.load(os.path.join(directory, "vectors.npy"), mmap_mode="r")
+        self.meta = np.load(os.path.join(directory, "meta.npy"), mmap_mode="r")
+        with open(os.path.join(directory, "vocab.json")) as f:
+            vocab = json.load(f)
+        self.labels = vocab["labels"]
+        self.statuses = vocab["statuses"]
+
+    def __len__(self):
+        return len(self.vectors)
+
+    def search_rows(self, query, k, nprobe=None):
+        """(rows, similarities) of the best `k` rows in the `nprobe` closest lists"""
+        nprobe = min(nprobe or settings.EMBEDDING_NPROBE, len(self.centroids))
+        query = normalize(query)
+        closest = np.argpartition(-(self.centroids @ query), nprobe - 1)[:nprobe]
+
+        rows, scores = [], []
+        for lst in closest.tolist():
+            start, end = int(self.offsets[lst]), int(self.offsets[lst + 1])
+            if end > start:
+                rows.append(np.arange(start, end))
+                scores.append(self.vectors[start:end].astype(np.float32) @ query)
+        if not rows:
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float32)
+
+        rows, scores = np.concatenate(rows), np.concatenate(scores)
+        if len(scores) > k:
+            best = np.argpartition(-scores, k - 1)[:k]
+            rows, scores = rows[best], scores[best]
+        order = np.argsort(-scores)
+        return rows[order], scores[order]
+
+    def similar_cases(self, query, k, exclude=None):
+        """Best `k` distinct submissions: their ids, outcomes and similarity"""
+        exclude = exclude.replace("-", "").encode() if exclude else None
+        # A submission can own several of the best rows: over-fetch, then dedupe
+        rows, scores = self.search_rows(query, k * 4)
+
+        cases, seen = [], set()
+        for row, score in zip(rows.tolist(), scores.tolist()):
+            entry = self.meta[row]
+            submission = bytes(entry["submission"])
+            if submission == exclude or submission in seen:
+                continue
+            seen.add(submission)
+            hex_id = submission.decode()
+            cases.append({
+                "submission_id": f"{hex_id[:8]}-{hex_id[8:12]}-{hex_id[12:16]}-{hex_id[16:20]}-{hex_id[20:]}",
+                "label": self.labels[int(entry["label"])],
+                "status": self.statuses[int(entry["status"])],
+                "similarity": round(score, 4),
+                "date": time.strftime("%Y-%m-%d", time.gmtime(int(entry["created"]))),
+            })
+            if len(cases) == k:
+                break
+        return cases
+
+
+# ======================================================
+# SHARED STATE (one per worker process)
+# ======================================================
+_writers = {}
+_indexes = {}
+_lock = threading.Lock()
+
+
+def get_writer(name, version):
+    key = (name, version)
+    if key not in _writers:
+        with _lock:
+            if key not in _writers:
+                _writers[key] = EmbeddingWriter(os.path.join(version_dir(name, version), "raw"))
+    return _writers[key]
+
+
+def get_index(name, version):
+    """The served index of a model version (None before the first build); CURRENT is re-read every EMBEDDING_RELOAD_S"""
+    key = (name, version)
+    cached = _indexes.get(key)
+    if cached is not None and time.monotonic() - cached[0] < settings.EMBEDDING_RELOAD_S:
+        return cached[1]
+
+    root = version_dir(name, version)
+    try:
+        with open(os.path.join(root, CURRENT_FILE)) as f:
+            built = f.read().strip()
+    except OSError:
+        built = None
+
+    index = cached[1] if cached else None
+    if built and (index is None or os.path.basename(index.directory) != built):
+        try:
+            index = EmbeddingIndex(os.path.join(root, built))
+            logger.info("Serving %s %s similar cases from %s (%d rows)", name, version, built, len(index))
+        except (OSError, ValueError):
+            logger.exception("Could not open embedding index %s", built)
+
+    with _lock:
+        _indexes[key] = (time.monotonic(), index)
+    return index
+
+
+def attach_similar_cases(endpoint, details, result):
+    """
+    Add "similar_cases" to `result` from the embeddings of the images that
+    voted for its label, then index those images if the verdict is confirmed.
+    """
+    label = details.get("label")
+    if not settings.EMBEDDINGS_ENABLED or "embeddings" not in details or not label:
+        return
+
+    images = details["images"]
+    voters = [i for i, row in enumerate(details["tensor_rows"]) if images[row]["label"] == label]
+    if not voters:
+        return
+    vectors = normalize(details["embeddings"][voters])
+
+    version = details["model_version"]
+    with tracing.span("similar_cases"):
+        index = get_index(endpoint, version)
+        if index is not None:
+            result["similar_cases"] = index.similar_cases(
+                vectors.mean(axis=0), settings.SIMILAR_CASES_K, exclude=result.get("submission_id")
+            )
+
+    if result.get("status") in CONFIRMED_STATUSES:
+        get_writer(endpoint, version).append(result["submission_id"], label, result["status"], vectors)
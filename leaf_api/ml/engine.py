@@ -0,0 +1,270 @@
+# engine.py
+#
+# One prediction pipeline for every crop model. A crop model is a
+# CropModel subclass that only declares what differs between models:
+#
+#   name / legacy_model_file   registry name and pre-registry .h5
+#   class_names                model output order
+#   default_calibration        used when no calibration.json ships
+#   check_quality              run the image quality gate
+#   requires_crop              requests name the crop; votes are filtered by it
+#   crop_keys                  requested crop -> class-name prefix
+#   knowledge base + advise()  the advisory built from the vote
+#
+# CropEngine runs all of them through the same path, so an optimization
+# here applies to every crop and a new crop adds no per-request code:
+#
+#   preprocess -> quality gate -> batched inference -> calibration
+#   -> per-image labels -> vote -> model.advise()
+
+import importlib
+import os
+import threading
+from abc import ABC, abstractmethod
+from collections import Counter
+
+from .. import timing, tracing
+from .advisory import compile_model
+from .calibration import Calibration, get_calibration
+from .embeddings import split_outputs
+from .preprocess import preprocess_images
+from .registry import get_registry
+
+# Crop models served by the API: registry name -> module declaring it
+ENGINES = {
+    "leaf": "leaf_api.ml.leaf_engine",
+    "areca_coconut": "leaf_api.ml.areca_coconut_engine",
+}
+
+
+def get_engine(name):
+    """The module of a served crop model; its model loads on first use of engine.registry"""
+    return importlib.import_module(ENGINES[name])
+
+
+def load_engines():
+    """Load and warm every served model now (worker start) rather than on the first request"""
+    for name in ENGINES:
+        get_engine(name).engine.registry
+
+
+# ======================================================
+# SHARED SCORING
+# ======================================================
+def health_score(status, confidence):
+    if status == "healthy":
+        return min(95, int(80 + confidence * 0.15))
+    if status == "early_risk":
+        return int(55 + confidence * 0.2)
+    if status == "disease_confirmed":
+        return int(30 + confidence * 0.2)
+    return 50
+
+
+def majority(labels):
+    """(most frequent label, its count); ties go to the label seen first"""
+    return Counter(labels).most_common(1)[0]
+
+
+class Vote:
+    """Outcome of one submission, handed to CropModel.advise()"""
+
+    def __init__(self, label, confidence, agreement, crop):
+        self.label = label
+        self.confidence = confidence    # calibrated average, percent
+        self.agreement = agreement      # share of all labelled images voting for `label`
+        self.crop = crop                # requested crop, None for models that infer it
+
+
+# ======================================================
+# CROP MODEL DECLARATION
+# ======================================================
+class CropModel(ABC):
+    name = None
+    legacy_model_file = None
+    class_names = ()
+    default_calibration = Calibration("default-1")
+    check_quality = False
+    requires_crop = False
+    crop_keys = {}
+
+    def __init__(self):
+        # Hooks only some models need: an incomplete model fails here, not on its first such request
+        for flag, hook in (("check_quality", "poor_quality_response"), ("requires_crop", "wrong_crop_response")):
+            if getattr(self, flag) and getattr(type(self), hook) is getattr(CropModel, hook):
+                raise TypeError(f"{type(self).__name__} sets {flag} but does not define {hook}()")
+
+    def crop_prefix(self, crop):
+        return self.crop_keys.get(crop, crop)
+
+    def poor_quality_response(self, issues):
+        """More than half of the images failed the quality gate (required with check_quality)"""
+        raise NotImplementedError
+
+    @abstractmethod
+    def unclear_response(self):
+        """No image produced a usable prediction"""
+
+    def wrong_crop_response(self, crop, confidence):
+        """No prediction matches the requested crop (required with requires_crop)"""
+        raise NotImplementedError
+
+    @abstractmethod
+    def advise(self, vote):
+        """The response for a vote"""
+
+
+# ======================================================
+# SHARED PIPELINE
+# ======================================================
+class CropEngine:
+    def __init__(self, model):
+        self.model = model
+        self._registry_lock = threading.Lock()
+        # Localized advisories are rendered now, never per request (advisory.py)
+        compile_model(model)
+
+    def __getattr__(self, name):
+        # Only reached until `registry` is set: tools that only need the
+        # verdict rules (evaluate) never load the model
+        if name != "registry":
+            raise AttributeError(name)
+        with self._registry_lock:
+            if "registry" not in self.__dict__:
+                self.registry = get_registry(self.model.name, self.model.legacy_model_file)
+        return self.__dict__["registry"]
+
+    def predict_images(self, image_paths, details=None, crop=None):
+        # Decode, resize and (optionally) quality-check all images in parallel
+        batch, reports = preprocess_images(image_paths, check_quality=self.model.check_quality)
+        names = [os.path.basename(path) for path in image_paths]
+        return self.predict_batch(batch, reports, details, names=names, crop=crop)
+
+    def predict_batch(self, batch, reports, details=None, names=None, crop=None):
+        """
+        Everything after preprocessing: `batch` / `reports` as returned by
+        preprocess_images (or built from client-side tensors), `names` for
+        the quality messages, `crop` for models that filter votes by crop.
+        """
+        model = self.model
+        active = self.registry.active
+
+        images = self._images(reports)
+        if details is not None:
+            details["model_version"] = active.version
+            details["images"] = images
+
+        early = self._quality_gate(reports, names)
+        if early is not None:
+            timing.note("source", "early_exit")
+            return early
+
+        # Make predictions (batched together with concurrent requests)
+        preds = None
+        calibration = model.default_calibration
+        rows = [i for i, report in enumerate(reports) if report[0]]
+        if rows:
+            tensors = batch[rows]
+            if details is not None:
+                details["tensors"] = tensors
+                details["tensor_rows"] = rows
+
+            with timing.stage("inference"), tracing.span("inference", rows=len(rows)):
+                preds = active.batcher.predict(tensors)
+            timing.note("source", "batch")
+
+            preds, embeddings = split_outputs(preds, active.classes)
+            if details is not None and embeddings is not None:
+                details["embeddings"] = embeddings
+
+            calibration = get_calibration(model.name, active.version, model.default_calibration)
+            preds = calibration.probabilities(preds)
+
+            if details is not None:
+                # Re-read after the batch: in server mode this is the version that scored it
+                details["model_version"] = active.version
+
+        return self.conclude(images, rows, preds, calibration, crop, details)
+
+    def evaluate(self, reports, rows, preds, calibration, names=None, crop=None, details=None):
+        """
+        The response predict_batch would give if the model had returned
+        `preds` (uncalibrated, one row per entry of `rows`): for comparing
+        backends on recorded submissions without serving them.
+        """
+        images = self._images(reports)
+        if details is not None:
+            details["images"] = images
+
+        early = self._quality_gate(reports, names)
+        if early is not None:
+            return early
+        if rows:
+            preds = calibration.probabilities(preds)
+        return self.conclude(images, rows, preds, calibration, crop, details)
+
+    # ---------- steps ----------
+    @staticmethod
+    def _images(reports):
+        return [
+            {"quality_ok": is_ok, "quality_message": msg, "label": "", "confidence": None, "probabilities": []}
+            for decoded, is_ok, msg in reports
+        ]
+
+    def _quality_gate(self, reports, names):
+        """The poor-quality response when more than half the images fail the gate, else None"""
+        if not self.model.check_quality:
+            return None
+
+        names = names or [f"image {i + 1}" for i in range(len(reports))]
+        quality_issues = [
+            f"{name}: {msg}" for name, (decoded, is_ok, msg) in zip(names, reports) if not is_ok
+        ]
+        if quality_issues and len(quality_issues) > len(reports) // 2:
+            return self.model.poor_quality_response(quality_issues)
+        return None
+
+    def conclude(self, images, rows, preds, calibration, crop=None, details=None):
+        """Per-image labels, vote and advisory from calibrated `preds` (one row per entry of `rows`)"""
+        model = self.model
+        labels = []
+        confidences = []
+
+        if rows:
+            # Whole-batch reductions; tolist() hands back Python floats in one call
+            indices = preds.argmax(axis=1).tolist()
+            maxima = (preds.max(axis=1) * 100).tolist()
+            for row, idx, conf, p in zip(rows, indices, maxima, preds.tolist()):
+                images[row]["probabilities"] = [round(v, 4) for v in p]
+
+                if idx >= len(model.class_names):
+                    continue
+
+                labels.append(model.class_names[idx])
+                confidences.append(conf)
+                images[row]["label"] = labels[-1]
+                images[row]["confidence"] = round(conf, 2)
+
+        # ---------------- No usable predictions ----------------
+        if not confidences:
+            return model.unclear_response()
+
+        avg_conf = round(sum(confidences) / len(confidences), 2)
+        avg_conf = round(calibration.confidence(avg_conf), 2)
+        if details is not None:
+            details["calibration_version"] = calibration.version
+
+        votes = labels
+        if crop is not None:
+            prefix = model.crop_prefix(crop)
+            votes = [label for label in labels if label.startswith(prefix)]
+            if not votes:
+                return model.wrong_crop_response(crop, avg_conf)
+
+        with tracing.span("vote", votes=len(votes)):
+            final_label, count = majority(votes)
+            agreement = count / len(labels)
+        if details is not None:
+            details["label"] = final_label
+
+        return model.advise(Vote(final_label, avg_conf, agreement, crop))
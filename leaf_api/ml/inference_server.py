@@ -0,0 +1,270 @@
+# inference_server.py
+#
+# Optional out-of-process inference. One or more server processes own the
+# models and the micro-batching; Django workers (INFERENCE_BACKEND =
+# "server") never import TensorFlow. Per request the client writes the
+# uint8 tensors into a shared-memory segment and sends only the segment
+# name and row count over a Unix socket; the server answers with the
+# model version and the (n, classes) float32 probabilities (with the
+# embeddings appended when EMBEDDINGS_ENABLED, see embeddings.py).
+#
+# Wire format, both directions: 4-byte big-endian header length, JSON
+# header, then `payload` bytes as announced in the header.
+
+import atexit
+import json
+import logging
+import os
+import socket
+import struct
+import threading
+from collections import OrderedDict
+from multiprocessing import resource_tracker, shared_memory
+
+import numpy as np
+
+from .preprocess import TENSOR_BYTES, TENSOR_SHAPE
+
+logger = logging.getLogger(__name__)
+
+# ======================================================
+# CONFIG
+# ======================================================
+ATTACH_CACHE = 64
+CLIENT_TIMEOUT_S = 30
+
+_HEADER = struct.Struct("!I")
+
+
+def served_models():
+    """Model name -> legacy model file of every engine the server loads (engine.ENGINES)"""
+    from .engine import ENGINES, get_engine
+
+    modules = [get_engine(name) for name in ENGINES]
+    return {module.MODEL_NAME: module.LEGACY_MODEL_FILE for module in modules}
+
+
+# ======================================================
+# FRAMING
+# ======================================================
+def _recv_exact(sock, n):
+    buf = bytearray(n)
+    view = memoryview(buf)
+    pos = 0
+    while pos < n:
+        got = sock.recv_into(view[pos:], n - pos)
+        if not got:
+            raise ConnectionError("inference socket closed")
+        pos += got
+    return buf
+
+
+def send_msg(sock, header, payload=b""):
+    header = dict(header, payload=len(payload))
+    data = json.dumps(header).encode()
+    sock.sendall(_HEADER.pack(len(data)) + data + payload)
+
+
+def recv_msg(sock):
+    (size,) = _HEADER.unpack(_recv_exact(sock, _HEADER.size))
+    header = json.loads(_recv_exact(sock, size))
+    payload = _recv_exact(sock, header["payload"]) if header["payload"] else b""
+    return header, payload
+
+
+# ======================================================
+# SERVER
+# ======================================================
+class InferenceServer:
+    def __init__(self, registries):
+        self.registries = registries
+        self._segments = OrderedDict()
+        self._segments_lock = threading.Lock()
+
+    def _attach(self, name):
+        """Attach once per segment name; clients reuse their segments"""
+        with self._segments_lock:
+            shm = self._segments.get(name)
+            if shm is not None:
+                self._segments.move_to_end(name)
+                return shm
+
+            shm = shared_memory.SharedMemory(name=name)
+            # The client owns the segment; keep our tracker from unlinking it at exit
+            resource_tracker.unregister(shm._name, "shared_memory")
+            self._segments[name] = shm
+
+            while len(self._segments) > ATTACH_CACHE:
+                _, old = self._segments.popitem(last=False)
+                old.close()
+            return shm
+
+    def handle(self, header):
+        registry = self.registries[header["model"]]
+
+        if header["op"] == "status":
+            return registry.describe(), b""
+
+        n = header["n"]
+        shm = self._attach(header["shm"])
+        batch = np.ndarray((n,) + TENSOR_SHAPE, dtype=np.uint8, buffer=shm.buf)
+        active = registry.active
+        preds = np.ascontiguousarray(active.batcher.predict(batch), dtype=np.float32)
+        del batch
+
+        return {"version": active.version, "classes": active.classes, "shape": list(preds.shape)}, preds.tobytes()
+
+    def _serve_connection(self, conn):
+        with conn:
+            while True:
+                try:
+                    header, _ = recv_msg(conn)
+                except ConnectionError:
+                    return
+                try:
+                    reply, payload = self.handle(header)
+                except Exception as e:
+                    logger.exception("Inference request failed")
+                    reply, payload = {"error": str(e)}, b""
+                send_msg(conn, reply, payload)
+
+    def serve_forever(self, listener):
+        while True:
+            conn, _ = listener.accept()
+            threading.Thread(target=self._serve_connection, args=(conn,), daemon=True).start()
+
+
+def bind(socket_path):
+    """Listen on socket_path, connectable by this user only (it reads arbitrary shared memory)"""
+    if os.path.exists(socket_path):
+        os.unlink(socket_path)
+    listener = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    # Created 0600 rather than chmod-ed after bind, so there is no window
+    # in which another user can connect
+    umask = os.umask(0o177)
+    try:
+        listener.bind(socket_path)
+    finally:
+        os.umask(umask)
+    listener.listen(128)
+    return listener
+
+
+# ======================================================
+# CLIENT (used as the engines' registry in "server" mode)
+# ======================================================
+class _RemoteBatcher:
+    def __init__(self, client):
+        self.client = client
+
+    def predict(self, batch):
+        return self.client.predict(batch)
+
+
+class RemoteRegistry:
+    """
+    Same surface as ModelRegistry for the engines: `active.version` and
+    `active.batcher.predict(uint8 batch)`.
+    """
+
+    def __init__(self, name, socket_path):
+        self.name = name
+        self.socket_path = socket_path
+        self.batcher = _RemoteBatcher(self)
+        self._last_version = None
+        self._local = threading.local()
+        self._segments = []
+        atexit.register(self._release_segments)
+
+    @property
+    def active(self):
+        return self
+
+    @property
+    def version(self):
+        # Set per thread by every reply: read after predict it names the
+        # version that actually scored this request's batch
+        version = getattr(self._local, "version", None) or self._last_version
+        if version is None:
+            # Nothing predicted yet (e.g. an early exit): ask the server
+            version = self.describe()["active"]
+        return version
+
+    @property
+    def classes(self):
+        # Width of the probabilities in this thread's last reply (embeddings follow)
+        return getattr(self._local, "classes", None)
+
+    def _connection(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            conn.settimeout(CLIENT_TIMEOUT_S)
+            try:
+                conn.connect(self.socket_path)
+            except OSError:
+                conn.close()
+                raise
+            self._local.conn = conn
+        return conn
+
+    def _drop_connection(self):
+        conn = getattr(self._local, "conn", None)
+        self._local.conn = None
+        if conn is not None:
+            conn.close()
+
+    def _segment(self, n):
+        """Per-thread segment, grown as needed and reused across requests"""
+        shm = getattr(self._local, "shm", None)
+        if shm is None or shm.size < n * TENSOR_BYTES:
+            if shm is not None:
+                self._segments.remove(shm)
+                shm.close()
+                shm.unlink()
+            shm = shared_memory.SharedMemory(create=True, size=max(n, 16) * TENSOR_BYTES)
+            self._segments.append(shm)
+            self._local.shm = shm
+        return shm
+
+    def _release_segments(self):
+        for shm in self._segments:
+            shm.close()
+            shm.unlink()
+        self._segments = []
+
+    def _call(self, header):
+        for attempt in (1, 2):
+            try:
+                conn = self._connection()
+                send_msg(conn, header)
+                reply, payload = recv_msg(conn)
+                break
+            except (ConnectionError, OSError):
+                # Server restarted, or a timeout left a reply in flight on
+                # this connection: close it and reconnect once
+                self._drop_connection()
+                if attempt == 2:
+                    raise
+
+        if "error" in reply:
+            raise RuntimeError(f"Inference server: {reply['error']}")
+        return reply, payload
+
+    def predict(self, batch):
+        n = len(batch)
+        shm = self._segment(n)
+        view = np.ndarray((n,) + TENSOR_SHAPE, dtype=np.uint8, buffer=shm.buf)
+        view[:] = batch
+        del view
+
+        reply, payload = self._call({"op": "predict", "model": self.name, "shm": shm.name, "n": n})
+        self._local.version = self._last_version = reply["version"]
+        self._local.classes = reply.get("classes")
+        return np.frombuffer(payload, dtype=np.float32).reshape(reply["shape"])
+
+    def describe(self):
+        reply, _ = self._call({"op": "status", "model": self.name})
+        self._last_version = reply["active"]
+        reply.pop("payload", None)
+        return reply
@@ -1,22 +1,14 @@
 # leaf_engine.py
 
-import tensorflow as tf
-import numpy as np
-import cv2
-from tensorflow.keras.preprocessing import image
-import os
-from django.conf import settings
+from .calibration import Calibration
+from .engine import CropEngine, CropModel, health_score
 
 # ======================================================
 # CONFIG
 # ======================================================
-IMG_SIZE = 128
-
-MODEL_PATH = os.path.join(
-    settings.BASE_DIR,
-    "ml_models",
-    "leaf_model.h5"
-)
+# Versioned under ml_models/leaf/<version>/, falling back to the single file
+MODEL_NAME = "leaf"
+LEGACY_MODEL_FILE = "leaf_model.h5"
 
 KNOWN_CROPS = ["Apple", "Corn", "Grape", "Potato", "Tomato"]
 
@@ -51,7 +43,8 @@ CLASS_NAMES = [
     "Tomato__healthy",
 ]
 
-model = tf.keras.models.load_model(MODEL_PATH)
+# Used when no calibration.json ships with the model version
+DEFAULT_CALIBRATION = Calibration("default-1", confidence_points=((0, 0), (90, 90), (95, 94), (100, 97.5)))
 
 # ======================================================
 # COMPREHENSIVE DISEASE KNOWLEDGE BASE
@@ -401,58 +394,6 @@ HEALTHY_GUIDANCE = {
     }
 }
 
-# ======================================================
-# IMAGE QUALITY CHECK
-# ======================================================
-def check_image_quality(path):
-    img = cv2.imread(path)
-    if img is None:
-        return False, "Unreadable image"
-
-    h, w = img.shape[:2]
-    if h < 200 or w < 200:
-        return False, "Low resolution image"
-
-    # Check brightness
-    gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
-    brightness = np.mean(gray)
-    
-    if brightness < 50:
-        return False, "Image too dark - take in daylight"
-    elif brightness > 200:
-        return False, "Image overexposed - avoid direct sunlight"
-
-    return True, "OK"
-
-
-# ======================================================
-# CONFIDENCE CALIBRATION
-# ======================================================
-def calibrate_confidence(confidence):
-    """Reduce over-confidence for realism"""
-    if confidence > 95:
-        reduction = np.random.uniform(1.5, 3.5)
-        calibrated = confidence - reduction
-        return max(calibrated, 85.0)
-    elif confidence > 90:
-        reduction = np.random.uniform(0.5, 1.5)
-        return confidence - reduction
-    return confidence
-
-
-# ======================================================
-# HEALTH SCORE CALCULATION
-# ======================================================
-def health_score(status, confidence):
-    if status == "healthy":
-        return min(95, int(80 + confidence * 0.15))
-    if status == "early_risk":
-        return int(55 + confidence * 0.2)
-    if status == "disease_confirmed":
-        return int(30 + confidence * 0.2)
-    return 50
-
-
 # ======================================================
 # DISEASE TYPE DETECTION
 # ======================================================
@@ -471,20 +412,18 @@ def get_disease_type(disease_name):
 
 
 # ======================================================
-# MAIN PREDICTION (API SAFE)
+# CROP MODEL
 # ======================================================
-def predict_images(image_paths, crop):
-    labels = []
-    confidences = []
-    quality_issues = []
-
-    # Check image quality first
-    for path in image_paths:
-        is_ok, msg = check_image_quality(path)
-        if not is_ok:
-            quality_issues.append(f"{os.path.basename(path)}: {msg}")
-    
-    if quality_issues and len(quality_issues) > len(image_paths) // 2:
+class LeafModel(CropModel):
+    name = MODEL_NAME
+    legacy_model_file = LEGACY_MODEL_FILE
+    class_names = CLASS_NAMES
+    default_calibration = DEFAULT_CALIBRATION
+    check_quality = True
+    requires_crop = True
+    crop_keys = {"Corn": "Corn_(maize)"}
+
+    def poor_quality_response(self, quality_issues):
         return {
             "status": "error",
             "message": "Multiple images have quality issues",
@@ -492,26 +431,7 @@ def predict_images(image_paths, crop):
             "recommendation": "Please take clear photos in daylight, focusing on individual leaves"
         }
 
-    # Make predictions
-    for path in image_paths:
-        try:
-            img = image.load_img(path, target_size=(IMG_SIZE, IMG_SIZE))
-            arr = image.img_to_array(img)
-            arr = np.expand_dims(arr, axis=0) / 255.0
-
-            preds = model.predict(arr, verbose=0)[0]
-            idx = int(np.argmax(preds))
-
-            if idx >= len(CLASS_NAMES):
-                continue
-
-            labels.append(CLASS_NAMES[idx])
-            confidences.append(float(np.max(preds) * 100))
-        except Exception as e:
-            continue
-
-    # ---------------- No usable predictions ----------------
-    if not confidences:
+    def unclear_response(self):
         return {
             "status": "early_risk",
             "message": "Images unclear or not leaf related",
@@ -524,15 +444,7 @@ def predict_images(image_paths, crop):
             ]
         }
 
-    avg_conf = round(sum(confidences) / len(confidences), 2)
-    avg_conf = calibrate_confidence(avg_conf)
-
-    # Normalize crop name for matching
-    crop_key = "Corn_(maize)" if crop == "Corn" else crop
-
-    filtered = [l for l in labels if l.startswith(crop_key)]
-
-    if not filtered:
+    def wrong_crop_response(self, crop, avg_conf):
         return {
             "status": "early_risk",
             "confidence": avg_conf,
@@ -541,136 +453,151 @@ def predict_images(image_paths, crop):
             "action_priority": "Medium"
         }
 
-    final_label = max(set(filtered), key=filtered.count)
-    agreement = filtered.count(final_label) / len(labels)
+    def advise(self, vote):
+        final_label, avg_conf, agreement, crop = vote.label, vote.confidence, vote.agreement, vote.crop
 
-    disease_key = final_label.replace(" ", "_")
-    disease_name = final_label.split("__")[1].replace("_", " ")
+        disease_key = final_label.replace(" ", "_")
+        disease_name = final_label.split("__")[1].replace("_", " ")
 
-    # Get disease type
-    disease_type = get_disease_type(disease_name)
+        # Get disease type
+        disease_type = get_disease_type(disease_name)
 
-    # ---------------- HEALTHY ----------------
-    if "healthy" in final_label.lower() and avg_conf >= 75:
-        crop_guidance = HEALTHY_GUIDANCE.get(crop, {})
+        # ---------------- HEALTHY ----------------
+        if "healthy" in final_label.lower() and avg_conf >= 75:
+            crop_guidance = HEALTHY_GUIDANCE.get(crop, {})
         
-        return {
-            "status": "healthy",
-            "crop": crop,
-            "confidence": avg_conf,
-            "health_score": health_score("healthy", avg_conf),
-            "action_priority": "Low",
-            "message": f"{crop} leaves appear healthy",
-            "current_condition": "Good plant health",
-            "routine_care": crop_guidance.get("routine_care", [
-                "Continue regular irrigation",
-                "Apply balanced fertilizer",
-                "Monitor weekly for pests"
-            ]),
-            "seasonal_advice": crop_guidance.get("seasonal_tasks", []),
-            "monitoring_schedule": [
-                "Check leaves weekly for early signs",
-                "Monitor soil moisture regularly",
-                "Inspect for pests during early morning"
-            ],
-            "preventive_measures": [
-                "Maintain proper plant spacing",
-                "Practice crop rotation",
-                "Use disease-resistant varieties"
-            ],
-            "farmer_reassurance": "Your crop is in good condition. Most diseases are preventable with proper care.",
-            "disclaimer": "AI-based advisory. Confirm with agriculture expert for commercial decisions."
-        }
+            return {
+                "status": "healthy",
+                "crop": crop,
+                "confidence": avg_conf,
+                "health_score": health_score("healthy", avg_conf),
+                "action_priority": "Low",
+                "message": f"{crop} leaves appear healthy",
+                "current_condition": "Good plant health",
+                "routine_care": crop_guidance.get("routine_care", [
+                    "Continue regular irrigation",
+                    "Apply balanced fertilizer",
+                    "Monitor weekly for pests"
+                ]),
+                "seasonal_advice": crop_guidance.get("seasonal_tasks", []),
+                "monitoring_schedule": [
+                    "Check leaves weekly for early signs",
+                    "Monitor soil moisture regularly",
+                    "Inspect for pests during early morning"
+                ],
+                "preventive_measures": [
+                    "Maintain proper plant spacing",
+                    "Practice crop rotation",
+                    "Use disease-resistant varieties"
+                ],
+                "farmer_reassurance": "Your crop is in good condition. Most diseases are preventable with proper care.",
+                "disclaimer": "AI-based advisory. Confirm with agriculture expert for commercial decisions."
+            }
+
+        # ---------------- DISEASE CONFIRMED ----------------
+        if avg_conf >= 80 and agreement >= 0.6:
+            disease_info = DISEASE_DATABASE.get(disease_key, {})
+        
+            result = {
+                "status": "disease_confirmed",
+                "crop": crop,
+                "disease": disease_name,
+                "disease_type": disease_type,
+                "confidence": avg_conf,
+                "agreement": round(agreement * 100, 1),
+                "health_score": health_score("disease_confirmed", avg_conf),
+                "severity": disease_info.get("severity", "High"),
+                "action_priority": "Immediate",
+                "scientific_name": disease_info.get("scientific_name", "Not specified"),
+                "common_season": disease_info.get("season", ["Various seasons"]),
+                "identified_symptoms": disease_info.get("symptoms", ["Leaf abnormalities detected"]),
+                "possible_causes": disease_info.get("causes", ["Environmental factors", "Pathogen presence"]),
+                "immediate_actions": disease_info.get("immediate_actions", [
+                    "Remove infected leaves/plants",
+                    "Improve air circulation",
+                    "Avoid overhead watering"
+                ]),
+                "organic_treatment": disease_info.get("organic_treatment", [
+                    "Neem oil spray (5ml/liter water)",
+                    "Baking soda solution",
+                    "Garlic-chili extract"
+                ]),
+                "monitoring_advice": "Check plants every 3 days for spread",
+                "expert_contact": disease_info.get("expert_advice", "Contact local agriculture officer"),
+                "economic_impact": disease_info.get("economic_impact", "Significant if untreated"),
+                "farmer_reassurance": "This disease is manageable if treated early. Most farmers successfully control it with proper measures.",
+                "disclaimer": "AI-based advisory. For confirmed diagnosis and commercial treatment, consult agriculture expert."
+            }
+        
+            # Add chemical treatment only if not viral
+            if disease_type != "Viral" and 'chemical_treatment' in disease_info:
+                result["chemical_treatment"] = disease_info["chemical_treatment"]
+        
+            # Add fertilizer guidance if available
+            if 'fertilizer_guidance' in disease_info:
+                result["fertilizer_guidance"] = disease_info["fertilizer_guidance"]
+        
+            # Special warning for viral diseases
+            if disease_type == "Viral":
+                result["critical_warning"] = "⚠️ VIRAL DISEASE - NO CHEMICAL CURE"
+                result["viral_disease_management"] = [
+                    "Remove and destroy infected plants",
+                    "Control insect vectors (whiteflies, aphids)",
+                    "Use virus-free planting material",
+                    "Practice strict field sanitation"
+                ]
+        
+            return result
 
-    # ---------------- DISEASE CONFIRMED ----------------
-    if avg_conf >= 80 and agreement >= 0.6:
+        # ---------------- EARLY RISK ----------------
         disease_info = DISEASE_DATABASE.get(disease_key, {})
-        
-        result = {
-            "status": "disease_confirmed",
+    
+        return {
+            "status": "early_risk",
             "crop": crop,
-            "disease": disease_name,
+            "possible_disease": disease_name,
             "disease_type": disease_type,
             "confidence": avg_conf,
             "agreement": round(agreement * 100, 1),
-            "health_score": health_score("disease_confirmed", avg_conf),
-            "severity": disease_info.get("severity", "High"),
-            "action_priority": "Immediate",
-            "scientific_name": disease_info.get("scientific_name", "Not specified"),
-            "common_season": disease_info.get("season", ["Various seasons"]),
-            "identified_symptoms": disease_info.get("symptoms", ["Leaf abnormalities detected"]),
-            "possible_causes": disease_info.get("causes", ["Environmental factors", "Pathogen presence"]),
-            "immediate_actions": disease_info.get("immediate_actions", [
-                "Remove infected leaves/plants",
-                "Improve air circulation",
-                "Avoid overhead watering"
-            ]),
-            "organic_treatment": disease_info.get("organic_treatment", [
-                "Neem oil spray (5ml/liter water)",
-                "Baking soda solution",
-                "Garlic-chili extract"
-            ]),
-            "monitoring_advice": "Check plants every 3 days for spread",
-            "expert_contact": disease_info.get("expert_advice", "Contact local agriculture officer"),
-            "economic_impact": disease_info.get("economic_impact", "Significant if untreated"),
-            "farmer_reassurance": "This disease is manageable if treated early. Most farmers successfully control it with proper measures.",
-            "disclaimer": "AI-based advisory. For confirmed diagnosis and commercial treatment, consult agriculture expert."
+            "health_score": health_score("early_risk", avg_conf),
+            "action_priority": "Medium",
+            "why_not_confirmed": [
+                f"Prediction agreement: {int(agreement * 100)}%",
+                "Symptoms may be early-stage",
+                "Image quality may affect accuracy"
+            ],
+            "recommended_actions": [
+                "Take clear photos of multiple leaves",
+                "Monitor plants for 2-3 days",
+                "Apply organic preventative spray"
+            ],
+            "organic_preventives": [
+                "Neem oil spray (5ml/liter)",
+                "Garlic extract spray",
+                "Proper field sanitation"
+            ],
+            "monitoring_schedule": [
+                "Check daily for symptom progression",
+                "Take photos every 2 days for comparison",
+                "Note weather conditions"
+            ],
+            "when_to_consult": "If symptoms worsen in 3 days or spread to other plants",
+            "contact_for_help": "Local Krishi Vigyan Kendra (KVK) or agriculture officer",
+            "farmer_reassurance": "Early detection gives best chance for control. Most leaf issues are manageable.",
+            "disclaimer": "Early warning advisory. Confirm with agriculture expert before major interventions."
         }
-        
-        # Add chemical treatment only if not viral
-        if disease_type != "Viral" and 'chemical_treatment' in disease_info:
-            result["chemical_treatment"] = disease_info["chemical_treatment"]
-        
-        # Add fertilizer guidance if available
-        if 'fertilizer_guidance' in disease_info:
-            result["fertilizer_guidance"] = disease_info["fertilizer_guidance"]
-        
-        # Special warning for viral diseases
-        if disease_type == "Viral":
-            result["critical_warning"] = "⚠️ VIRAL DISEASE - NO CHEMICAL CURE"
-            result["viral_disease_management"] = [
-                "Remove and destroy infected plants",
-                "Control insect vectors (whiteflies, aphids)",
-                "Use virus-free planting material",
-                "Practice strict field sanitation"
-            ]
-        
-        return result
 
-    # ---------------- EARLY RISK ----------------
-    disease_info = DISEASE_DATABASE.get(disease_key, {})
-    
-    return {
-        "status": "early_risk",
-        "crop": crop,
-        "possible_disease": disease_name,
-        "disease_type": disease_type,
-        "confidence": avg_conf,
-        "agreement": round(agreement * 100, 1),
-        "health_score": health_score("early_risk", avg_conf),
-        "action_priority": "Medium",
-        "why_not_confirmed": [
-            f"Prediction agreement: {int(agreement * 100)}%",
-            "Symptoms may be early-stage",
-            "Image quality may affect accuracy"
-        ],
-        "recommended_actions": [
-            "Take clear photos of multiple leaves",
-            "Monitor plants for 2-3 days",
-            "Apply organic preventative spray"
-        ],
-        "organic_preventives": [
-            "Neem oil spray (5ml/liter)",
-            "Garlic extract spray",
-            "Proper field sanitation"
-        ],
-        "monitoring_schedule": [
-            "Check daily for symptom progression",
-            "Take photos every 2 days for comparison",
-            "Note weather conditions"
-        ],
-        "when_to_consult": "If symptoms worsen in 3 days or spread to other plants",
-        "contact_for_help": "Local Krishi Vigyan Kendra (KVK) or agriculture officer",
-        "farmer_reassurance": "Early detection gives best chance for control. Most leaf issues are manageable.",
-        "disclaimer": "Early warning advisory. Confirm with agriculture expert before major interventions."
-    }
+
+engine = CropEngine(LeafModel())
+
+
+# ======================================================
+# MAIN PREDICTION (API SAFE)
+# ======================================================
+def predict_images(image_paths, crop, details=None):
+    return engine.predict_images(image_paths, details, crop=crop)
+
+
+def predict_batch(batch, reports, names, crop, details=None):
+    """See CropEngine.predict_batch"""
+    return engine.predict_batch(batch, reports, details, names=names, crop=crop)
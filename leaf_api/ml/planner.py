@@ -0,0 +1,225 @@
+# planner.py
+#
+# Decides how the CPU budget is split between gunicorn workers, the
+# TensorFlow thread pools and the decode pool, and picks the micro-batch
+# size per model. Must stay importable without Django so gunicorn.conf.py
+# can use it before any worker exists.
+
+import logging
+import math
+import os
+import threading
+import time
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# ======================================================
+# CONFIG
+# ======================================================
+CGROUP_V2_CPU_MAX = "/sys/fs/cgroup/cpu.max"
+CGROUP_V1_QUOTA = "/sys/fs/cgroup/cpu/cpu.cfs_quota_us"
+CGROUP_V1_PERIOD = "/sys/fs/cgroup/cpu/cpu.cfs_period_us"
+CGROUP_V2_MEMORY_MAX = "/sys/fs/cgroup/memory.max"
+CGROUP_V1_MEMORY_LIMIT = "/sys/fs/cgroup/memory/memory.limit_in_bytes"
+
+BATCH_CANDIDATES = (1, 2, 4, 8, 16, 32)
+AUTOTUNE_ROUNDS = 5
+
+_lock = threading.Lock()
+_plan = None
+_applied = False
+
+
+# ======================================================
+# CPU / MEMORY DISCOVERY
+# ======================================================
+def _read(path):
+    try:
+        with open(path) as f:
+            return f.read().strip()
+    except OSError:
+        return None
+
+
+def cgroup_cpu_limit():
+    """CPU quota in cores from cgroup v2 / v1, or None when unlimited"""
+    cpu_max = _read(CGROUP_V2_CPU_MAX)
+    if cpu_max:
+        quota, _, period = cpu_max.partition(" ")
+        if quota != "max" and period:
+            return int(quota) / int(period)
+        return None
+
+    quota, period = _read(CGROUP_V1_QUOTA), _read(CGROUP_V1_PERIOD)
+    if quota and period and int(quota) > 0:
+        return int(quota) / int(period)
+    return None
+
+
+def cgroup_memory_limit():
+    """Memory limit in bytes from cgroup v2 / v1, or None when unlimited"""
+    limit = _read(CGROUP_V2_MEMORY_MAX) or _read(CGROUP_V1_MEMORY_LIMIT)
+    if not limit or limit == "max":
+        return None
+    limit = int(limit)
+    # cgroup v1 reports "unlimited" as a huge page-aligned number
+    return limit if limit < 2 ** 60 else None
+
+
+def available_cores():
+    """(usable cores, affinity cores, cgroup quota)"""
+    try:
+        affinity = len(os.sched_getaffinity(0))
+    except AttributeError:
+        affinity = os.cpu_count() or 1
+
+    quota = cgroup_cpu_limit()
+    cores = affinity
+    if quota is not None:
+        cores = max(1, min(affinity, math.ceil(quota)))
+    return cores, affinity, quota
+
+
+def _env_int(name):
+    value = os.environ.get(name)
+    return int(value) if value else None
+
+
+# ======================================================
+# PLAN
+# ======================================================
+def plan_runtime(cores=None):
+    """
+    Split the usable cores so that
+    workers * intra_op_threads <= cores.
+
+    Each worker gets at least two cores for inference once there are four
+    or more; below that a single worker owns everything. Environment
+    overrides: WEB_CONCURRENCY, TF_INTRA_OP_THREADS, TF_INTER_OP_THREADS,
+    DECODE_POOL_WORKERS.
+    """
+    detected, affinity, quota = available_cores()
+    cores = cores or detected
+
+    workers = _env_int("WEB_CONCURRENCY") or (max(1, cores // 2) if cores >= 4 else 1)
+    per_worker = max(1, cores // workers)
+
+    return {
+        "cores": cores,
+        "affinity_cores": affinity,
+        "cgroup_quota": quota,
+        "workers": workers,
+        "intra_op_threads": _env_int("TF_INTRA_OP_THREADS") or per_worker,
+        # A feed-forward CNN has no independent branches worth running concurrently
+        "inter_op_threads": _env_int("TF_INTER_OP_THREADS") or 1,
+        "decode_pool_workers": _env_int("DECODE_POOL_WORKERS") or per_worker,
+        "micro_batch": {},
+    }
+
+
+def get_plan():
+    global _plan
+    with _lock:
+        if _plan is None:
+            _plan = plan_runtime()
+        return _plan
+
+
+def apply_plan():
+    """
+    Apply the plan inside a worker. Has to run before TensorFlow builds
+    its thread pools, i.e. before the first model is loaded.
+    """
+    global _applied
+    plan = get_plan()
+
+    with _lock:
+        if _applied:
+            return plan
+        _applied = True
+
+    import tensorflow as tf
+
+    try:
+        tf.config.threading.set_intra_op_parallelism_threads(plan["intra_op_threads"])
+        tf.config.threading.set_inter_op_parallelism_threads(plan["inter_op_threads"])
+    except RuntimeError:
+        # TensorFlow already initialised its pools (e.g. imported elsewhere first)
+        logger.warning("TensorFlow thread pools already initialised; plan not applied to TF")
+
+    from .preprocess import configure_pool
+    configure_pool(workers=plan["decode_pool_workers"])
+
+    from .. import metrics
+    metrics.describe("leaf_api_plan", "Runtime plan chosen at worker start")
+    for key in ("cores", "workers", "intra_op_threads", "inter_op_threads", "decode_pool_workers"):
+        metrics.set_gauge("leaf_api_plan", plan[key], {"setting": key})
+
+    logger.info(
+        "Runtime plan: cores=%s (affinity=%s, cgroup quota=%s) workers=%s "
+        "intra_op=%s inter_op=%s decode_pool=%s",
+        plan["cores"], plan["affinity_cores"], plan["cgroup_quota"], plan["workers"],
+        plan["intra_op_threads"], plan["inter_op_threads"], plan["decode_pool_workers"]
+    )
+    return plan
+
+
+# ======================================================
+# MICRO-BATCH AUTOTUNE
+# ======================================================
+def autotune_batch_size(predict_fn, latency_target_ms, candidates=BATCH_CANDIDATES,
+                        rounds=AUTOTUNE_ROUNDS, input_shape=(128, 128, 3)):
+    """
+    Time `predict_fn` on synthetic batches and return the size with the best
+    images/second whose worst observed latency stays under the target.
+    """
+    results = []
+
+    for size in candidates:
+        x = np.zeros((size,) + tuple(input_shape), dtype=np.float32)
+        predict_fn(x)  # first call per shape may trace / allocate
+
+        latencies = []
+        for _ in range(rounds):
+            start = time.perf_counter()
+            predict_fn(x)
+            latencies.append((time.perf_counter() - start) * 1000)
+
+        worst = max(latencies)
+        results.append({
+            "batch_size": size,
+            "latency_ms": round(worst, 2),
+            "images_per_s": round(size * 1000 / (sum(latencies) / rounds), 1),
+        })
+
+        if worst > latency_target_ms:
+            break  # larger batches will only be slower
+
+    within = [r for r in results if r["latency_ms"] <= latency_target_ms] or results[:1]
+    best = max(within, key=lambda r: r["images_per_s"])
+    return best["batch_size"], results
+
+
+def tune_batch_size(name, predict_fn):
+    """Micro-batch size for one model: fixed from settings or autotuned"""
+    from django.conf import settings
+    from .. import metrics
+
+    fixed = getattr(settings, "MICRO_BATCH_SIZE", 0)
+    if fixed:
+        size, trials = fixed, []
+    else:
+        size, trials = autotune_batch_size(
+            predict_fn,
+            getattr(settings, "AUTOTUNE_LATENCY_TARGET_MS", 250)
+        )
+
+    plan = get_plan()
+    with _lock:
+        plan["micro_batch"][name] = {"batch_size": size, "trials": trials}
+
+    metrics.set_gauge("leaf_api_micro_batch_size", size, {"model": name})
+    logger.info("Micro-batch size for %s: %s (trials: %s)", name, size, trials)
+    return size
@@ -0,0 +1,349 @@
+# preprocess.py
+
+import logging
+import os
+import threading
+import time
+import multiprocessing
+from concurrent.futures import Future, ThreadPoolExecutor, ProcessPoolExecutor
+from multiprocessing import shared_memory
+
+import cv2
+import numpy as np
+
+from .. import timing, tracing
+
+logger = logging.getLogger(__name__)
+
+# ======================================================
+# CONFIG
+# ======================================================
+IMG_SIZE = 128
+TENSOR_SHAPE = (IMG_SIZE, IMG_SIZE, 3)
+TENSOR_BYTES = IMG_SIZE * IMG_SIZE * 3
+
+MIN_SIDE = 200
+MIN_BRIGHTNESS = 50
+MAX_BRIGHTNESS = 200
+
+POOL_KINDS = ("none", "thread", "process")
+
+
+# ======================================================
+# IMAGE QUALITY CHECK
+# ======================================================
+def check_image_quality(img):
+    """Quality gate on an already decoded BGR image"""
+    h, w = img.shape[:2]
+    if h < MIN_SIDE or w < MIN_SIDE:
+        return False, "Low resolution image"
+
+    # Check brightness
+    gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
+    return check_image_stats(w, h, cv2.mean(gray)[0])
+
+
+def check_image_stats(width, height, brightness):
+    """
+    The same gate from statistics of the full resolution image (size and
+    mean gray level), e.g. as reported by a client that resized it
+    """
+    if height < MIN_SIDE or width < MIN_SIDE:
+        return False, "Low resolution image"
+
+    if brightness < MIN_BRIGHTNESS:
+        return False, "Image too dark - take in daylight"
+    elif brightness > MAX_BRIGHTNESS:
+        return False, "Image overexposed - avoid direct sunlight"
+
+    return True, "OK"
+
+
+# ======================================================
+# DECODE + RESIZE (one image)
+# ======================================================
+def decode_into(path, out, check_quality=True):
+    """
+    Decode `path`, optionally run the quality check on the full
+    resolution image, and write the 128x128 RGB uint8 tensor into `out`.
+
+    Returns (decoded, quality_ok, message).
+    """
+    return _decode(path, out, check_quality)[:3]
+
+
+def _decode(path, out, check_quality):
+    """decode_into plus the seconds spent in the quality check and the CPU seconds of the whole call"""
+    cpu_started = time.thread_time()
+    img = cv2.imread(path, cv2.IMREAD_COLOR)
+    if img is None:
+        return False, False, "Unreadable image", 0.0, time.thread_time() - cpu_started
+    return (True,) + prepare_image(img, out, check_quality) + (time.thread_time() - cpu_started,)
+
+
+def prepare_image(img, out, check_quality=True):
+    """
+    Quality check and 128x128 RGB tensor (into `out`) for an already
+    decoded BGR image. Returns (quality_ok, message, quality seconds).
+    """
+    started = time.perf_counter()
+    if check_quality:
+        with tracing.span("check_image_quality"):
+            ok, msg = check_image_quality(img)
+    else:
+        ok, msg = True, "OK"
+    quality_s = time.perf_counter() - started
+
+    # Nearest neighbour matches keras `load_img(target_size=...)`
+    small = cv2.resize(img, (IMG_SIZE, IMG_SIZE), interpolation=cv2.INTER_NEAREST)
+    cv2.cvtColor(small, cv2.COLOR_BGR2RGB, dst=out)
+    return ok, msg, quality_s
+
+
+def _traced_decode(parent, path, out, check_quality):
+    """_decode as a child span of `parent`, which may live in another thread"""
+    with tracing.attach(parent), tracing.span("decode", file=os.path.basename(path)):
+        return _decode(path, out, check_quality)
+
+
+def _decode_one(parent, path, check_quality):
+    """submit() task in this process: (result of _decode, tensor) for one image"""
+    out = np.zeros(TENSOR_SHAPE, dtype=np.uint8)
+    return _traced_decode(parent, path, out, check_quality), out
+
+
+def _init_process_worker():
+    # Each pool process is one core's worth of work; keep OpenCV from
+    # spawning its own threads on top of that.
+    cv2.setNumThreads(1)
+
+
+def _decode_to_shm(shm_name, slot, path, check_quality):
+    """Process-pool entry point: only the path goes in, only a status tuple comes out"""
+    shm = shared_memory.SharedMemory(name=shm_name)
+    try:
+        out = np.ndarray(TENSOR_SHAPE, dtype=np.uint8, buffer=shm.buf, offset=slot * TENSOR_BYTES)
+        try:
+            return _decode(path, out, check_quality)
+        finally:
+            del out
+    finally:
+        shm.close()
+
+
+# ======================================================
+# DECODE POOL
+# ======================================================
+class DecodePool:
+    """
+    Runs decode / resize / quality check for a whole submission in parallel.
+
+    kind:
+    - "none"    decode inline in the calling thread
+    - "thread"  OpenCV releases the GIL, so threads scale for decode
+    - "process" separate processes; tensors come back through shared memory
+    """
+
+    def __init__(self, kind="thread", workers=None):
+        if kind not in POOL_KINDS:
+            raise ValueError(f"Unknown decode pool kind: {kind}")
+
+        self.kind = kind
+        self.workers = max(1, int(workers or os.cpu_count() or 1))
+        self._executor = None
+
+        if kind == "thread":
+            self._executor = ThreadPoolExecutor(
+                max_workers=self.workers,
+                thread_name_prefix="decode"
+            )
+        elif kind == "process":
+            # forkserver: never fork a process that already has TensorFlow threads
+            ctx = multiprocessing.get_context("forkserver")
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.workers,
+                mp_context=ctx,
+                initializer=_init_process_worker
+            )
+
+    def preprocess(self, image_paths, check_quality=True):
+        """
+        Returns (batch, reports):
+        - batch   uint8 array of shape (n, 128, 128, 3), RGB
+        - reports list of (decoded, quality_ok, message) per image
+        Rows whose image could not be decoded are left zeroed.
+
+        Wall time (quality check included) is recorded as the "decode"
+        stage; the quality check alone, summed over all images, as "quality".
+        CPU time of decodes run by pool workers is added to the request's.
+        """
+        n = len(image_paths)
+        if n == 0:
+            return np.zeros((0,) + TENSOR_SHAPE, dtype=np.uint8), []
+
+        started = time.perf_counter()
+
+        with tracing.span("preprocess", images=n, pool=self.kind) as parent:
+            inline = self.kind == "none" or n == 1
+            if self.kind == "process":
+                # Per-image spans stay in the request process; only the total is traced
+                inline = False
+                batch, results = self._preprocess_shm(image_paths, check_quality)
+            else:
+                batch = np.zeros((n,) + TENSOR_SHAPE, dtype=np.uint8)
+
+                if inline:
+                    results = [
+                        _traced_decode(parent, path, batch[i], check_quality)
+                        for i, path in enumerate(image_paths)
+                    ]
+                else:
+                    futures = [
+                        self._executor.submit(_traced_decode, parent, path, batch[i], check_quality)
+                        for i, path in enumerate(image_paths)
+                    ]
+                    results = [f.result() for f in futures]
+
+        timing.add("decode", (time.perf_counter() - started) * 1000)
+        timing.add("quality", sum(r[3] for r in results) * 1000)
+        if not inline:
+            timing.add_cpu(sum(r[4] for r in results))
+
+        return batch, [r[:3] for r in results]
+
+    def submit(self, path, check_quality=True):
+        """
+        Start on one image right away (e.g. as soon as its upload part has
+        arrived); hand the returned futures to gather().
+        """
+        parent = tracing.current()
+        if self._executor is None:
+            future = Future()
+            future.set_result(_decode_one(parent, path, check_quality))
+            return future
+        if self.kind == "process":
+            # Spans do not cross the process boundary; tensors come back like _preprocess_shm's
+            return self._submit_shm(path, check_quality)
+        return self._executor.submit(_decode_one, parent, path, check_quality)
+
+    def _submit_shm(self, path, check_quality):
+        """
+        submit() for the process pool: the worker decodes into a one-image
+        shared memory block, so only the status tuple is pickled. The block
+        is copied out and released as soon as the worker is done, whether
+        or not gather() is ever called.
+        """
+        shm = shared_memory.SharedMemory(create=True, size=TENSOR_BYTES)
+        future = Future()
+
+        def collect(task):
+            try:
+                result = task.result()
+                view = np.ndarray(TENSOR_SHAPE, dtype=np.uint8, buffer=shm.buf)
+                tensor = view.copy()
+                del view
+                future.set_result((result, tensor))
+            except BaseException as e:
+                future.set_exception(e)
+            finally:
+                shm.close()
+                shm.unlink()
+
+        try:
+            task = self._executor.submit(_decode_to_shm, shm.name, 0, path, check_quality)
+        except BaseException:
+            shm.close()
+            shm.unlink()
+            raise
+        task.add_done_callback(collect)
+        return future
+
+    def gather(self, futures):
+        """
+        (batch, reports) like preprocess() for futures from submit(). Only
+        the time spent still waiting here is recorded as "decode".
+        """
+        started = time.perf_counter()
+        batch = np.zeros((len(futures),) + TENSOR_SHAPE, dtype=np.uint8)
+        results = []
+        for i, future in enumerate(futures):
+            result, tensor = future.result()
+            batch[i] = tensor
+            results.append(result)
+
+        timing.add("decode", (time.perf_counter() - started) * 1000)
+        timing.add("quality", sum(r[3] for r in results) * 1000)
+        if self._executor is not None:  # else submit() decoded in this thread
+            timing.add_cpu(sum(r[4] for r in results))
+        return batch, [r[:3] for r in results]
+
+    def _preprocess_shm(self, image_paths, check_quality):
+        n = len(image_paths)
+        shm = shared_memory.SharedMemory(create=True, size=n * TENSOR_BYTES)
+        try:
+            futures = [
+                self._executor.submit(_decode_to_shm, shm.name, i, path, check_quality)
+                for i, path in enumerate(image_paths)
+            ]
+            results = [f.result() for f in futures]
+
+            view = np.ndarray((n,) + TENSOR_SHAPE, dtype=np.uint8, buffer=shm.buf)
+            batch = view.copy()
+            del view
+            return batch, results
+        finally:
+            shm.close()
+            shm.unlink()
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+
+
+# ======================================================
+# SHARED POOL (one per worker process)
+# ======================================================
+_pool = None
+_pool_served = False  # handed out by get_pool(): requests may hold it from now on
+_pool_lock = threading.Lock()
+
+
+def _build_pool(kind, workers):
+    from django.conf import settings
+
+    kind = kind or getattr(settings, "DECODE_POOL_KIND", "thread")
+    workers = workers or getattr(settings, "DECODE_POOL_WORKERS", None)
+    return DecodePool(kind, workers)
+
+
+def configure_pool(kind=None, workers=None):
+    """
+    (Re)create the shared pool, e.g. from the startup planner. Only before
+    get_pool() has handed it out: a request may still be submitting to
+    the pool it got, so a pool in use is never shut down.
+    """
+    global _pool
+    with _pool_lock:
+        if _pool_served:
+            logger.warning("Decode pool already serving requests; keeping %s x %s", _pool.kind, _pool.workers)
+            return _pool
+        old, _pool = _pool, _build_pool(kind, workers)
+
+    if old is not None:
+        old.shutdown()
+    return _pool
+
+
+def get_pool():
+    global _pool, _pool_served
+    if not _pool_served:
+        with _pool_lock:
+            if _pool is None:
+                _pool = _build_pool(None, None)
+            _pool_served = True
+    return _pool
+
+
+def preprocess_images(image_paths, check_quality=True):
+    return get_pool().preprocess(image_paths, check_quality)
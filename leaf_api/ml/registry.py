@@ -0,0 +1,238 @@
+# registry.py
+#
+# Versioned models with background loading and atomic hot-swap.
+#
+# Layout under MODEL_DIR (ml_models/):
+#   <name>/<version>/model.h5     one directory per version
+#   <name>/ACTIVE                 version to serve (default: newest, in
+#                                 natural order: v10 is newer than v9)
+#   <legacy file>.h5              pre-registry single file, still served
+#                                 when <name>/ has no versions
+#   <model file stem>.fast/       load-optimized copy of a model file
+#                                 (artifacts.py, `manage.py convert_models`)
+#
+# Every worker polls ACTIVE; when it changes the new version is loaded and
+# warmed on a background thread and swapped in with one reference
+# assignment. Requests already holding the old version finish on it. The
+# previous version stays loaded so a rollback is instant. A version that
+# fails to load is not tried again until ACTIVE is rewritten.
+
+import logging
+import os
+import re
+import threading
+import time
+
+import numpy as np
+from django.conf import settings
+
+from .. import metrics
+from .artifacts import load_model
+from .batching import MicroBatcher
+from .embeddings import served_forward
+from .planner import apply_plan, tune_batch_size
+from .preprocess import TENSOR_SHAPE
+
+logger = logging.getLogger(__name__)
+
+MODEL_FILE = "model.h5"
+ACTIVE_FILE = "ACTIVE"
+
+
+class LoadedModel:
+    """One model version together with its own micro-batcher"""
+
+    def __init__(self, name, version, model, batcher, load_ms, source="h5", classes=None):
+        self.name = name
+        self.version = version
+        self.model = model
+        self.batcher = batcher
+        self.load_ms = load_ms
+        self.source = source
+        self.classes = classes  # batcher rows are wider when they carry embeddings
+
+
+def version_key(version):
+    """Natural order: v9 < v10, 2024-9 < 2024-10"""
+    return [int(part) if part.isdigit() else part for part in re.split(r"(\d+)", version)]
+
+
+class ModelVersions:
+    """Where the versions of one model live and which one ACTIVE asks for; loads nothing"""
+
+    def __init__(self, name, legacy_file):
+        self.name = name
+        self.root = os.path.join(settings.MODEL_DIR, name)
+        self.legacy_path = os.path.join(settings.MODEL_DIR, legacy_file)
+        self.legacy_version = os.path.splitext(legacy_file)[0]
+
+    def versions(self):
+        """Version directories, oldest first"""
+        if not os.path.isdir(self.root):
+            return []
+        return sorted(
+            (v for v in os.listdir(self.root) if os.path.isdir(os.path.join(self.root, v))),
+            key=version_key
+        )
+
+    def wanted_version(self):
+        try:
+            with open(os.path.join(self.root, ACTIVE_FILE)) as f:
+                version = f.read().strip()
+            if version:
+                return version
+        except OSError:
+            pass
+
+        versions = self.versions()
+        return versions[-1] if versions else self.legacy_version
+
+    def active_stamp(self):
+        """Modification time of ACTIVE (None without one): tells a rewrite apart"""
+        try:
+            return os.stat(os.path.join(self.root, ACTIVE_FILE)).st_mtime_ns
+        except OSError:
+            return None
+
+    def model_path(self, version):
+        if version == self.legacy_version and not self.versions():
+            return self.legacy_path
+        return os.path.join(self.root, version, MODEL_FILE)
+
+
+class ModelRegistry(ModelVersions):
+    def __init__(self, name, legacy_file):
+        super().__init__(name, legacy_file)
+
+        self._lock = threading.Lock()
+        self._loading = None
+        self._batch_size = None
+        self._failed = None         # version whose last load failed
+        self._failed_stamp = None   # ACTIVE's stamp when the watcher tried it
+        self.previous = None
+
+        apply_plan()
+        self.active = self.load(self.wanted_version())
+        self._publish()
+
+        self._watcher = threading.Thread(target=self._watch, name=f"registry-{name}", daemon=True)
+        self._watcher.start()
+
+    # ---------- loading ----------
+    def load(self, version):
+        started = time.perf_counter()
+        model, source = load_model(self.model_path(version))
+
+        # Warm-up: build the graph and allocate buffers before taking traffic
+        model.predict_on_batch(np.zeros((1,) + TENSOR_SHAPE, dtype=np.float32))
+
+        if self._batch_size is None:
+            self._batch_size = tune_batch_size(self.name, model.predict_on_batch)
+
+        forward, classes = served_forward(model)
+        if forward is not model.predict_on_batch:
+            forward(np.zeros((1,) + TENSOR_SHAPE, dtype=np.float32))
+
+        batcher = MicroBatcher(
+            forward,
+            max_batch=self._batch_size,
+            max_wait_ms=settings.MICRO_BATCH_WAIT_MS,
+            timeout_s=settings.MICRO_BATCH_TIMEOUT_S,
+            name=f"{self.name}-{version}"
+        )
+        load_ms = (time.perf_counter() - started) * 1000
+        logger.info("Loaded %s model version %s from %s in %.0f ms", self.name, version, source, load_ms)
+        return LoadedModel(self.name, version, model, batcher, load_ms, source, classes)
+
+    def activate(self, version):
+        """Load `version` (unless it is the previous one) and swap it in"""
+        with self._lock:
+            if version == self.active.version or version == self._loading:
+                return
+            self._loading = version
+
+        try:
+            if self.previous is not None and self.previous.version == version:
+                candidate = self.previous
+            else:
+                candidate = self.load(version)
+
+            with self._lock:
+                retired = self.previous if self.previous is not candidate else None
+                # Single reference assignment: the next batch uses the new version
+                self.previous, self.active = self.active, candidate
+                self._failed = None
+            self._publish()
+
+            if retired is not None:
+                retired.batcher.close()
+        except Exception:
+            self._failed = version
+            logger.exception("Failed to load %s model version %s; keeping %s",
+                             self.name, version, self.active.version)
+            metrics.inc("leaf_api_model_load_failures", labels={"model": self.name, "version": version})
+        finally:
+            with self._lock:
+                self._loading = None
+
+    def describe(self):
+        return {
+            "active": self.active.version,
+            "source": self.active.source,
+            "previous": self.previous.version if self.previous else None,
+            "available": self.versions() or [self.legacy_version],
+        }
+
+    def rollback(self):
+        """Swap back to the previous version and point ACTIVE at it, so the watcher keeps it"""
+        previous = self.previous
+        if previous is not None:
+            write_active(self.name, previous.version)
+            self.activate(previous.version)
+
+    def poll(self):
+        """One watcher round: activate the version ACTIVE asks for"""
+        version = self.wanted_version()
+        if version == self.active.version:
+            return
+        stamp = self.active_stamp()
+        if version == self._failed and stamp == self._failed_stamp:
+            return  # failed to load and ACTIVE not rewritten since: do not reload every round
+        self._failed_stamp = stamp
+        self.activate(version)
+
+    def _watch(self):
+        while True:
+            time.sleep(settings.MODEL_WATCH_INTERVAL_S)
+            try:
+                self.poll()
+            except Exception:
+                logger.exception("Model watcher for %s failed", self.name)
+
+    def _publish(self):
+        metrics.describe("leaf_api_model_active", "Model version served by this worker (1 = active)")
+        if self.previous is not None:
+            metrics.set_gauge("leaf_api_model_active", 0, {"model": self.name, "version": self.previous.version})
+        metrics.set_gauge("leaf_api_model_active", 1, {"model": self.name, "version": self.active.version})
+        metrics.set_gauge("leaf_api_model_load_ms", self.active.load_ms, {"model": self.name})
+
+
+def get_registry(name, legacy_file, backend=None):
+    """
+    The engines' model handle: loaded in this process ("local") or served
+    by the out-of-process inference server ("server").
+    """
+    backend = backend or settings.INFERENCE_BACKEND
+    if backend == "server":
+        from .inference_server import RemoteRegistry
+        return RemoteRegistry(name, settings.INFERENCE_SOCKET)
+    return ModelRegistry(name, legacy_file)
+
+
+def write_active(name, version):
+    """Point every worker at `version`; they swap on their next poll"""
+    root = os.path.join(settings.MODEL_DIR, name)
+    tmp = os.path.join(root, f".{ACTIVE_FILE}.{os.getpid()}.tmp")
+    with open(tmp, "w") as f:
+        f.write(version + "\n")
+    os.replace(tmp, os.path.join(root, ACTIVE_FILE))
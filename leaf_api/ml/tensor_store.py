@@ -0,0 +1,119 @@
+# tensor_store.py
+#
+# Optional append-only store of the preprocessed 128x128x3 uint8 tensors
+# of every request, so historical submissions can be re-scored by a new
+# model without decoding a single JPEG again.
+#
+# Layout of TENSOR_STORE_DIR:
+#   chunk-<writer>-<n>.npy   preallocated (CHUNK_ROWS, 128, 128, 3) uint8
+#   index-<writer>.tsv       image_hash \t endpoint \t chunk file \t row
+#
+# Written through chunk_writer.ChunkedWriter, one writer per worker
+# process; readers merge all index files.
+
+import glob
+import os
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+from .chunk_writer import ChunkedWriter
+
+# ======================================================
+# CONFIG
+# ======================================================
+CHUNK_ROWS = 1024  # ~48 MB per chunk
+
+
+class TensorStoreWriter(ChunkedWriter):
+    def __init__(self, root, chunk_rows=CHUNK_ROWS):
+        super().__init__(root, "chunk", np.uint8, chunk_rows)
+        self._seen = set()
+
+    def append(self, endpoint, image_hashes, tensors):
+        """Store tensors not seen before by this writer; one index line each"""
+        with self._lock:
+            fresh = {}
+            for image_hash, tensor in zip(image_hashes, tensors):
+                if image_hash not in self._seen and image_hash not in fresh:
+                    fresh[image_hash] = tensor
+
+            self.write_rows([(image_hash, endpoint) for image_hash in fresh], fresh.values())
+            self._seen.update(fresh)
+
+
+# ======================================================
+# READING
+# ======================================================
+def load_index(root, endpoint=None):
+    """OrderedDict image_hash -> (chunk file, row), first occurrence wins"""
+    index = OrderedDict()
+
+    for path in sorted(glob.glob(os.path.join(root, "index-*.tsv"))):
+        with open(path) as f:
+            for line in f:
+                parts = line.rstrip("\n").split("\t")
+                if len(parts) != 4:
+                    continue  # torn last line
+                image_hash, entry_endpoint, chunk, row = parts
+                if endpoint and entry_endpoint != endpoint:
+                    continue
+                index.setdefault(image_hash, (chunk, int(row)))
+
+    return index
+
+
+def iter_batches(root, index, batch_size=64):
+    """
+    Yield (hashes, uint8 batch) in chunk / row order. Chunks are opened
+    memory-mapped; a batch of consecutive rows is a view straight onto
+    the file, anything else is a single gather.
+    """
+    by_chunk = OrderedDict()
+    for image_hash, (chunk, row) in index.items():
+        by_chunk.setdefault(chunk, []).append((row, image_hash))
+
+    for chunk, entries in by_chunk.items():
+        data = np.load(os.path.join(root, chunk), mmap_mode="r")
+        entries.sort()
+
+        for i in range(0, len(entries), batch_size):
+            part = entries[i:i + batch_size]
+            rows = [row for row, _ in part]
+
+            if rows[-1] - rows[0] == len(rows) - 1:
+                batch = data[rows[0]:rows[-1] + 1]
+            else:
+                batch = data[rows]
+
+            yield [image_hash for _, image_hash in part], batch
+
+
+# ======================================================
+# SHARED WRITER (one per worker process)
+# ======================================================
+_writer = None
+_writer_lock = threading.Lock()
+
+
+def get_writer():
+    global _writer
+    from django.conf import settings
+
+    if _writer is None:
+        with _writer_lock:
+            if _writer is None:
+                _writer = TensorStoreWriter(settings.TENSOR_STORE_DIR)
+    return _writer
+
+
+def store_submission(endpoint, image_hashes, details):
+    """Append the decoded tensors of one prediction when the store is enabled"""
+    from django.conf import settings
+
+    if not settings.TENSOR_STORE_ENABLED or "tensors" not in details:
+        return
+
+    hashes = [image_hashes[i] for i in details["tensor_rows"]]
+    get_writer().append(endpoint, hashes, details["tensors"])
@@ -0,0 +1,119 @@
+# tensor_upload.py
+#
+# Client-side preprocessed input: the app resizes each photo itself and
+# uploads the 128x128 RGB tensor instead of the JPEG. Decode and resize
+# are skipped; the tensors go straight to the batched model.
+#
+# Multipart fields (instead of images[]):
+#   tensors[]        one part per image: 49152 bytes, uint8 RGB, row-major
+#                    (128, 128, 3), resized with nearest neighbour
+#   tensor_encoding  "raw" (default) or "zlib" (each part deflated)
+#   stats            JSON list, one object per tensor, describing the
+#                    original photo for the quality check:
+#                    {"width": 3000, "height": 4000, "brightness": 118.5}
+#                    brightness = mean gray level (0-255) of the full image
+#
+# stats may be omitted where the endpoint has no quality gate.
+
+import hashlib
+import json
+import zlib
+
+import numpy as np
+
+from .preprocess import TENSOR_BYTES, TENSOR_SHAPE, check_image_stats
+
+ENCODINGS = ("raw", "zlib")
+
+
+class TensorUploadError(ValueError):
+    pass
+
+
+def _read_part(upload, encoding, out):
+    """Fill `out` (flat uint8 view of one row) from one uploaded part"""
+    if encoding == "raw":
+        if upload.size != TENSOR_BYTES:
+            raise TensorUploadError(
+                f"{upload.name}: expected {TENSOR_BYTES} bytes, got {upload.size}"
+            )
+        pos = 0
+        for chunk in upload.chunks():
+            out[pos:pos + len(chunk)] = np.frombuffer(chunk, dtype=np.uint8)
+            pos += len(chunk)
+        return
+
+    inflater = zlib.decompressobj()
+    pos = 0
+    try:
+        for chunk in upload.chunks():
+            # Bounded output: a part can never inflate past one tensor (+1 to detect it)
+            data = inflater.decompress(chunk, TENSOR_BYTES + 1 - pos)
+            if pos + len(data) > TENSOR_BYTES or inflater.unconsumed_tail:
+                raise TensorUploadError(f"{upload.name}: inflates past {TENSOR_BYTES} bytes")
+            out[pos:pos + len(data)] = np.frombuffer(data, dtype=np.uint8)
+            pos += len(data)
+    except zlib.error:
+        raise TensorUploadError(f"{upload.name}: not valid zlib data")
+
+    if pos != TENSOR_BYTES:
+        raise TensorUploadError(f"{upload.name}: expected {TENSOR_BYTES} bytes, got {pos}")
+    if not inflater.eof:
+        raise TensorUploadError(f"{upload.name}: truncated zlib data")
+
+
+def _parse_stats(stats, n, required):
+    if not stats:
+        if required:
+            raise TensorUploadError("stats are required with tensors")
+        return None
+
+    try:
+        stats = json.loads(stats) if isinstance(stats, str) else stats
+    except ValueError:
+        raise TensorUploadError("stats must be a JSON list")
+
+    if not isinstance(stats, list) or len(stats) != n:
+        raise TensorUploadError(f"stats must be a JSON list with one entry per tensor ({n})")
+
+    parsed = []
+    for i, entry in enumerate(stats):
+        try:
+            width, height = int(entry["width"]), int(entry["height"])
+            brightness = float(entry["brightness"])
+        except (KeyError, TypeError, ValueError):
+            raise TensorUploadError(f"stats[{i}] needs numeric width, height and brightness")
+        if width <= 0 or height <= 0 or not 0 <= brightness <= 255:
+            raise TensorUploadError(f"stats[{i}] out of range")
+        parsed.append((width, height, brightness))
+    return parsed
+
+
+def read_tensor_uploads(uploads, stats=None, encoding="raw", check_quality=True):
+    """
+    Returns (batch, reports, hashes) shaped like preprocess_images output
+    plus the sha256 of every (inflated) tensor. Raises TensorUploadError.
+    """
+    encoding = encoding or "raw"
+    if encoding not in ENCODINGS:
+        raise TensorUploadError(f"tensor_encoding must be one of {', '.join(ENCODINGS)}")
+
+    n = len(uploads)
+    parsed = _parse_stats(stats, n, required=check_quality)
+
+    batch = np.empty((n,) + TENSOR_SHAPE, dtype=np.uint8)
+    flat = batch.reshape(n, TENSOR_BYTES)
+    reports = []
+    hashes = []
+
+    for i, upload in enumerate(uploads):
+        _read_part(upload, encoding, flat[i])
+        hashes.append(hashlib.sha256(flat[i]).hexdigest())
+
+        if check_quality:
+            ok, msg = check_image_stats(*parsed[i])
+        else:
+            ok, msg = True, "OK"
+        reports.append((True, ok, msg))
+
+    return batch, reports, hashes
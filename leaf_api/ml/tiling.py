@@ -0,0 +1,123 @@
+# tiling.py
+#
+# Whole-plant photos. One high resolution photo of a plant or canopy is
+# cut into overlapping windows that are each scored like a leaf close-up;
+# the engines then vote over the windows as they do over separate photos.
+#
+# Cost is bounded by the settings, not by the photo:
+#
+#   1. scale       the photo is downscaled once so its long side is at most
+#                  TILE_MAX_SIDE px; windows are TILE_SIZE px there, every
+#                  TILE_STRIDE px (so at most ((side - size) / stride + 1)^2)
+#   2. vegetation  Excess Green (2g - r - b on chromaticities) above
+#                  EXG_THRESHOLD marks plant pixels; with integral images the
+#                  plant share and brightness of a window cost four lookups,
+#                  and windows below TILE_MIN_VEGETATION are dropped as
+#                  background (soil, sky, hands)
+#   3. cap         the TILE_MAX_PATCHES windows with the most plant in them
+#                  are kept and go to the model as one batch
+#
+# Yellowing leaves still count as plant; windows that are brown all over
+# (soil, fully necrotic leaves) do not.
+
+import time
+
+import cv2
+import numpy as np
+from django.conf import settings
+
+from .. import timing, tracing
+from .preprocess import TENSOR_SHAPE, check_image_stats, prepare_image
+
+EXG_THRESHOLD = 0.05
+
+
+class TilingError(ValueError):
+    pass
+
+
+def vegetation_mask(img):
+    """uint8 mask (1 = plant) of a BGR image by Excess Green"""
+    b, g, r = cv2.split(img.astype(np.float32))
+    total = b + g + r + 1.0
+    return ((2 * g - r - b) / total > EXG_THRESHOLD).astype(np.uint8)
+
+
+def _windows(width, height, size, stride):
+    """Top-left corners covering the image, the last row / column flush with its edge"""
+    def starts(length):
+        last = length - size
+        points = list(range(0, last + 1, stride))
+        if points[-1] != last:
+            points.append(last)
+        return points
+
+    return [(x, y) for y in starts(height) for x in starts(width)]
+
+
+def _window_sums(integral, x, y, size):
+    return float(integral[y + size, x + size] - integral[y, x + size] - integral[y + size, x] + integral[y, x])
+
+
+def select_tiles(img):
+    """
+    Windows of the (already downscaled) BGR image worth scoring, most
+    plant first: list of (x, y, size, vegetation share, mean brightness).
+    """
+    height, width = img.shape[:2]
+    size = min(settings.TILE_SIZE, width, height)
+    stride = max(1, min(settings.TILE_STRIDE, size))
+
+    plant = cv2.integral(vegetation_mask(img))
+    light = cv2.integral(cv2.cvtColor(img, cv2.COLOR_BGR2GRAY))
+    area = float(size * size)
+
+    tiles = []
+    for x, y in _windows(width, height, size, stride):
+        share = _window_sums(plant, x, y, size) / area
+        if share >= settings.TILE_MIN_VEGETATION:
+            tiles.append((x, y, size, share, _window_sums(light, x, y, size) / area))
+
+    tiles.sort(key=lambda t: t[3], reverse=True)
+    return tiles[:settings.TILE_MAX_PATCHES]
+
+
+def tile_image(path, check_quality=True):
+    """
+    Plant windows of the photo at `path`, shaped like preprocess_images
+    output. Returns (batch, reports, info); info["tiles"] has one {"x",
+    "y", "size", "vegetation"} per batch row, in full resolution pixels.
+    """
+    started = time.perf_counter()
+    with tracing.span("tiling"):
+        img = cv2.imread(path, cv2.IMREAD_COLOR)
+        if img is None:
+            raise TilingError("Unreadable image")
+
+        height, width = img.shape[:2]
+        scale = min(1.0, settings.TILE_MAX_SIDE / max(width, height))
+        if scale < 1.0:
+            img = cv2.resize(
+                img, (max(1, round(width * scale)), max(1, round(height * scale))), interpolation=cv2.INTER_AREA
+            )
+
+        tiles = select_tiles(img)
+        tiles.sort(key=lambda t: (t[1], t[0]))  # reading order
+        tracing.set_attribute("tiles", len(tiles))
+
+        batch = np.zeros((len(tiles),) + TENSOR_SHAPE, dtype=np.uint8)
+        reports, info_tiles = [], []
+        for row, (x, y, size, share, brightness) in enumerate(tiles):
+            prepare_image(img[y:y + size, x:x + size], batch[row], check_quality=False)
+            # The quality gate judges each window at the resolution it was photographed
+            full = round(size / scale)
+            ok, msg = check_image_stats(full, full, brightness) if check_quality else (True, "OK")
+            reports.append((True, ok, msg))
+            info_tiles.append({
+                "x": round(x / scale), "y": round(y / scale), "size": full, "vegetation": round(share, 2)
+            })
+    timing.add("decode", (time.perf_counter() - started) * 1000)
+
+    if not tiles:
+        raise TilingError("No plant found in the photo")
+    return batch, reports, {"width": width, "height": height, "tiles": info_tiles}
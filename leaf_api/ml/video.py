@@ -0,0 +1,160 @@
+# video.py
+#
+# Keyframe sampling for short sweep videos. A farmer films a few seconds
+# over the plant instead of taking 3+ photos; we pick a handful of sharp,
+# distinct frames and feed them to the engines as if they were photos.
+#
+# Cost is bounded by VIDEO_CANDIDATES, not by the clip: candidate
+# timestamps are spread over the clip and reached by seeking (or by
+# grab(), which skips colour conversion, across short gaps), so only the
+# candidates are ever converted to BGR. Each candidate is reduced on the
+# spot to its model tensor and a small grayscale copy (sharpness,
+# distinctness, brightness for the quality gate); full resolution frames
+# are never held beyond that.
+#
+#   1. sharpness   variance of the Laplacian at SCORE_WIDTH px; frames
+#                  below VIDEO_BLUR_RATIO x the sharpest one are dropped
+#   2. distinct    sharpest first, a frame is kept only if its THUMB x THUMB
+#                  thumbnail differs from every kept one by at least
+#                  VIDEO_MIN_DIFFERENCE (mean absolute difference, 0-255)
+#   3. minimum     if fewer than MIN_FRAMES survive, the sharpest remaining
+#                  candidates fill up (the engines still gate quality)
+
+import time
+
+import cv2
+import numpy as np
+from django.conf import settings
+
+from .. import timing, tracing
+from .preprocess import TENSOR_SHAPE, check_image_stats, prepare_image
+
+SCORE_WIDTH = 160
+THUMB = 32
+MIN_FRAMES = 3
+
+
+class VideoError(ValueError):
+    pass
+
+
+class _Candidate:
+    def __init__(self, index, time_s, frame):
+        self.index = index
+        self.time_s = time_s
+
+        self.tensor = np.zeros(TENSOR_SHAPE, dtype=np.uint8)
+        prepare_image(frame, self.tensor, check_quality=False)
+
+        h, w = frame.shape[:2]
+        gray = cv2.cvtColor(
+            cv2.resize(frame, (SCORE_WIDTH, max(1, h * SCORE_WIDTH // w)), interpolation=cv2.INTER_AREA),
+            cv2.COLOR_BGR2GRAY
+        )
+        # Area averaging keeps the mean: same brightness the full frame would give
+        self.stats = (w, h, cv2.mean(gray)[0])
+        self.sharpness = float(cv2.Laplacian(gray, cv2.CV_32F).var())
+        self.thumb = cv2.resize(gray, (THUMB, THUMB), interpolation=cv2.INTER_AREA).astype(np.int16)
+
+    def difference(self, other):
+        return float(np.abs(self.thumb - other.thumb).mean())
+
+
+def _candidate_indices(frame_count, candidates):
+    # Skip the first and last few percent: the camera is still moving into place
+    lo, hi = int(frame_count * 0.03), max(int(frame_count * 0.97) - 1, 0)
+    return sorted(set(np.linspace(lo, hi, min(candidates, frame_count)).astype(int).tolist()))
+
+
+def read_candidates(path, candidates=None):
+    """Decode only the candidate frames; returns (list of _Candidate, duration_s)"""
+    candidates = candidates or settings.VIDEO_CANDIDATES
+    cap = cv2.VideoCapture(path)
+    try:
+        if not cap.isOpened():
+            raise VideoError("Unreadable video")
+
+        fps = cap.get(cv2.CAP_PROP_FPS) or 0.0
+        frame_count = int(cap.get(cv2.CAP_PROP_FRAME_COUNT) or 0)
+        if fps <= 0 or frame_count <= 0:
+            raise VideoError("Video has no frame rate or frame count")
+
+        duration_s = frame_count / fps
+        if duration_s > settings.VIDEO_MAX_SECONDS:
+            raise VideoError(f"Video must be at most {settings.VIDEO_MAX_SECONDS:g} seconds")
+
+        # Gaps shorter than this are crossed with grab() instead of a seek,
+        # which would decode again from the previous keyframe anyway
+        seek_gap = max(int(fps / 2), 1)
+        found = []
+        pos = 0
+        for index in _candidate_indices(frame_count, candidates):
+            if index - pos > seek_gap:
+                cap.set(cv2.CAP_PROP_POS_FRAMES, index)
+                pos = index
+            while pos < index and cap.grab():
+                pos += 1
+            if pos != index or not cap.grab():
+                continue
+            pos += 1
+            ok, frame = cap.retrieve()
+            if ok and frame is not None:
+                found.append(_Candidate(index, index / fps, frame))
+    finally:
+        cap.release()
+
+    return found, duration_s
+
+
+def select_keyframes(found, max_frames=None):
+    """Sharp, mutually distinct candidates in time order"""
+    max_frames = max_frames or settings.VIDEO_MAX_FRAMES
+    if not found:
+        return []
+
+    by_sharpness = sorted(found, key=lambda c: c.sharpness, reverse=True)
+    floor = by_sharpness[0].sharpness * settings.VIDEO_BLUR_RATIO
+
+    selected = []
+    for c in by_sharpness:
+        if len(selected) == max_frames:
+            break
+        if c.sharpness < floor:
+            break
+        if all(c.difference(s) >= settings.VIDEO_MIN_DIFFERENCE for s in selected):
+            selected.append(c)
+
+    for c in by_sharpness:
+        if len(selected) >= min(MIN_FRAMES, max_frames):
+            break
+        if c not in selected:
+            selected.append(c)
+
+    return sorted(selected, key=lambda c: c.index)
+
+
+def sample_video(path, check_quality=True):
+    """
+    Keyframes of the video at `path`, shaped like preprocess_images output.
+    Returns (batch, reports, info); info["frames"] has one {"frame",
+    "time_s", "sharpness"} per batch row.
+    """
+    started = time.perf_counter()
+    with tracing.span("video.sample"):
+        found, duration_s = read_candidates(path)
+        selected = select_keyframes(found)
+        tracing.set_attribute("candidates", len(found))
+        tracing.set_attribute("selected", len(selected))
+
+        batch = np.zeros((len(selected),) + TENSOR_SHAPE, dtype=np.uint8)
+        reports, frames = [], []
+        for row, c in enumerate(selected):
+            batch[row] = c.tensor
+            ok, msg = check_image_stats(*c.stats) if check_quality else (True, "OK")
+            reports.append((True, ok, msg))
+            frames.append({"frame": c.index, "time_s": round(c.time_s, 2), "sharpness": round(c.sharpness, 1)})
+    timing.add("decode", (time.perf_counter() - started) * 1000)
+
+    if len(selected) < MIN_FRAMES:
+        raise VideoError(f"Could only read {len(selected)} frames from the video")
+    return batch, reports, {"duration_s": round(duration_s, 2), "candidates": len(found), "frames": frames}
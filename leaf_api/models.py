@@ -1,3 +1,214 @@
+import uuid
+
 from django.db import models
+from django.utils import timezone
+
+
+class Submission(models.Model):
+    """One POST to a prediction endpoint and its final verdict"""
+
+    ENDPOINT_CHOICES = [
+        ("leaf", "Leaf health"),
+        ("areca_coconut", "Areca / coconut"),
+    ]
+
+    # Generated in the request so the id can be returned before the
+    # write-behind recorder has persisted the row.
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    created_at = models.DateTimeField(default=timezone.now)
+    endpoint = models.CharField(max_length=32, choices=ENDPOINT_CHOICES)
+    crop = models.CharField(max_length=32, blank=True)
+    label = models.CharField(max_length=64, blank=True)
+    status = models.CharField(max_length=32)
+    confidence = models.FloatField(null=True, blank=True)
+    agreement = models.FloatField(null=True, blank=True)
+    image_count = models.PositiveSmallIntegerField(default=0)
+    latency_ms = models.FloatField()
+    model_version = models.CharField(max_length=64)
+    plot = models.CharField(max_length=64, blank=True)
+
+    class Meta:
+        ordering = ["-created_at"]
+        indexes = [
+            models.Index(fields=["created_at"]),
+            models.Index(fields=["crop", "created_at"]),
+            models.Index(fields=["label", "created_at"]),
+            models.Index(fields=["plot", "created_at"]),
+        ]
+
+    def __str__(self):
+        return f"{self.endpoint} {self.crop} {self.status} @ {self.created_at:%Y-%m-%d %H:%M}"
+
+
+class ImageResult(models.Model):
+    """Per-image model output within a submission"""
+
+    submission = models.ForeignKey(Submission, related_name="images", on_delete=models.CASCADE)
+    position = models.PositiveSmallIntegerField()
+    created_at = models.DateTimeField(default=timezone.now)
+    crop = models.CharField(max_length=32, blank=True)
+    image_hash = models.CharField(max_length=64)
+    label = models.CharField(max_length=64, blank=True)
+    confidence = models.FloatField(null=True, blank=True)
+    probabilities = models.JSONField(default=list)
+    quality_ok = models.BooleanField(default=True)
+    quality_message = models.CharField(max_length=128, blank=True)
+    model_version = models.CharField(max_length=64)
+
+    class Meta:
+        ordering = ["submission", "position"]
+        indexes = [
+            models.Index(fields=["created_at"]),
+            models.Index(fields=["crop", "created_at"]),
+            models.Index(fields=["label", "created_at"]),
+            models.Index(fields=["image_hash"]),
+        ]
+
+    def __str__(self):
+        return f"{self.submission_id}#{self.position} {self.label}"
+
+
+class PrevalenceRollup(models.Model):
+    """
+    Submission counts per (period, crop, label, status), kept up to date
+    by the recorder as predictions are written. Analytics read only this
+    table, never the raw submissions.
+    """
+
+    PERIOD_CHOICES = [
+        ("day", "Day"),
+        ("week", "Week"),
+    ]
+
+    period = models.CharField(max_length=8, choices=PERIOD_CHOICES)
+    period_start = models.DateField()
+    crop = models.CharField(max_length=32, blank=True)
+    label = models.CharField(max_length=64, blank=True)
+    status = models.CharField(max_length=32)
+    count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["period", "period_start", "crop", "label", "status"],
+                name="unique_prevalence_bucket"
+            ),
+        ]
+        indexes = [
+            models.Index(fields=["period", "crop", "period_start"]),
+            models.Index(fields=["period", "label", "period_start"]),
+        ]
+
+    def __str__(self):
+        return f"{self.period} {self.period_start} {self.label or self.crop} {self.status}: {self.count}"
+
+
+class PlotState(models.Model):
+    """
+    Running summary of one plot / field (leaf_api/progression.py): enough
+    to compare a new submission with the plot's history in O(1).
+    """
+
+    endpoint = models.CharField(max_length=32, choices=Submission.ENDPOINT_CHOICES)
+    plot = models.CharField(max_length=64)
+    observations = models.PositiveIntegerField(default=0)
+    first_at = models.DateTimeField()
+    last_at = models.DateTimeField()
+    last_label = models.CharField(max_length=64, blank=True)
+    last_status = models.CharField(max_length=32, blank=True)
+    last_score = models.FloatField()
+    # Exponentially weighted disease score, half-life PLOT_HALF_LIFE_DAYS
+    baseline_score = models.FloatField()
+    # Normalized float16 mean embedding of the last submission (empty without embeddings)
+    last_embedding = models.BinaryField(blank=True, default=b"")
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["endpoint", "plot"], name="unique_plot_state"),
+        ]
+        indexes = [
+            models.Index(fields=["last_at"]),
+        ]
+
+    def __str__(self):
+        return f"{self.endpoint} plot {self.plot}: {self.observations} observations"
+
+
+class PlotPoint(models.Model):
+    """
+    One point of a plot's time series: a single submission ("raw") or, once
+    older than PLOT_RAW_DAYS, the mean of a week of them ("week").
+    """
+
+    RESOLUTION_CHOICES = [
+        ("raw", "Submission"),
+        ("week", "Week"),
+    ]
+
+    state = models.ForeignKey(PlotState, related_name="points", on_delete=models.CASCADE)
+    resolution = models.CharField(max_length=8, choices=RESOLUTION_CHOICES, default="raw")
+    at = models.DateTimeField()
+    count = models.PositiveIntegerField(default=1)
+    label = models.CharField(max_length=64, blank=True)
+    status = models.CharField(max_length=32, blank=True)
+    score = models.FloatField()
+    # Mean class probabilities, rounded; float16 mean embedding as in PlotState
+    probabilities = models.JSONField(default=list)
+    embedding = models.BinaryField(blank=True, default=b"")
+
+    class Meta:
+        ordering = ["state", "at"]
+        indexes = [
+            models.Index(fields=["state", "at"]),
+            models.Index(fields=["resolution", "at"]),
+        ]
+
+    def __str__(self):
+        return f"{self.state_id} {self.resolution} @ {self.at:%Y-%m-%d}: {self.score:.2f}"
+
+
+class UploadSession(models.Model):
+    """
+    A submission uploaded in resumable chunks (leaf_api/resumable.py).
+    Finalizing it runs the endpoint's prediction; the result is kept so a
+    client that lost the response can fetch it again.
+    """
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    endpoint = models.CharField(max_length=32, choices=Submission.ENDPOINT_CHOICES)
+    crop = models.CharField(max_length=32, blank=True)
+    sizes = models.JSONField(default=list)
+    created_at = models.DateTimeField(default=timezone.now)
+    updated_at = models.DateTimeField(auto_now=True)
+    finalized_at = models.DateTimeField(null=True, blank=True)
+    result = models.JSONField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["updated_at"]),
+        ]
+
+    def __str__(self):
+        return f"{self.endpoint} upload {self.id} ({len(self.sizes)} images)"
+
+
+class UploadChunk(models.Model):
+    """One received byte range of one image; the bytes are stored once per sha256"""
+
+    session = models.ForeignKey(UploadSession, related_name="chunks", on_delete=models.CASCADE)
+    image = models.PositiveSmallIntegerField()
+    offset = models.PositiveIntegerField()
+    length = models.PositiveIntegerField()
+    sha256 = models.CharField(max_length=64)
+
+    class Meta:
+        ordering = ["session", "image", "offset"]
+        constraints = [
+            models.UniqueConstraint(fields=["session", "image", "offset"], name="unique_upload_chunk"),
+        ]
+        indexes = [
+            models.Index(fields=["sha256"]),
+        ]
 
-# Create your models here.
+    def __str__(self):
+        return f"{self.session_id}#{self.image} @{self.offset}+{self.length}"
@@ -0,0 +1,198 @@
+# profiling.py
+#
+# Opt-in cProfile + tracemalloc capture of single prediction requests.
+#
+# A request is profiled when it carries a valid X-Profile header or is
+# picked by PROFILING_SAMPLE_RATE. The header is "<unix ts>:<hex hmac>",
+# HMAC-SHA256 of the timestamp under PROFILING_SECRET, accepted for
+# PROFILING_TOKEN_TTL_S seconds:
+#
+#   ts=$(date +%s)
+#   sig=$(printf %s "$ts" | openssl dgst -sha256 -hmac "$PROFILING_SECRET" -r | cut -d' ' -f1)
+#   curl -H "X-Profile: $ts:$sig" ...
+#
+# Each capture writes <id>.prof (pstats) and <id>.json (request facts, the
+# tracemalloc peak and the top allocation sites still live when the view
+# returns) to PROFILING_DIR, keeping the newest PROFILING_MAX_CAPTURES.
+# `manage.py summarize_profiles` aggregates them.
+#
+# cProfile only sees the request thread: time spent in the decode pool and
+# the micro-batcher shows up as waiting in preprocess / batcher.predict.
+# tracemalloc is process-wide, so concurrent requests' allocations are
+# included. One capture runs at a time; others are served unprofiled.
+
+import cProfile
+import functools
+import hashlib
+import hmac
+import json
+import logging
+import os
+import random
+import threading
+import time
+import tracemalloc
+import uuid
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+HEADER = "HTTP_X_PROFILE"
+TRACEMALLOC_FRAMES = 5
+
+_capture_lock = threading.Lock()
+
+
+# ======================================================
+# TRIGGER
+# ======================================================
+def sign(timestamp, secret=None):
+    secret = secret if secret is not None else settings.PROFILING_SECRET
+    return hmac.new(secret.encode(), str(timestamp).encode(), hashlib.sha256).hexdigest()
+
+
+def _valid_token(token):
+    if not settings.PROFILING_SECRET or not token or ":" not in token:
+        return False
+
+    timestamp, signature = token.split(":", 1)
+    try:
+        age = time.time() - int(timestamp)
+    except ValueError:
+        return False
+    if abs(age) > settings.PROFILING_TOKEN_TTL_S:
+        return False
+
+    return hmac.compare_digest(sign(timestamp), signature)
+
+
+def trigger(request):
+    """"header", "sample" or None"""
+    if _valid_token(request.META.get(HEADER)):
+        return "header"
+    rate = settings.PROFILING_SAMPLE_RATE
+    if rate > 0 and random.random() < rate:
+        return "sample"
+    return None
+
+
+# ======================================================
+# CAPTURE
+# ======================================================
+def _top_allocations(snapshot, limit):
+    snapshot = snapshot.filter_traces((
+        tracemalloc.Filter(False, tracemalloc.__file__),
+        tracemalloc.Filter(False, "<frozen importlib._bootstrap*>"),
+    ))
+    return [
+        {
+            "site": f"{stat.traceback[0].filename}:{stat.traceback[0].lineno}",
+            "size_kb": round(stat.size / 1024, 1),
+            "count": stat.count,
+        }
+        for stat in snapshot.statistics("lineno")[:limit]
+    ]
+
+
+def _rotate(directory, keep):
+    captures = sorted(
+        (entry for entry in os.scandir(directory) if entry.name.endswith(".json")),
+        key=lambda entry: entry.stat().st_mtime,
+    )
+    for entry in captures[:max(0, len(captures) - keep)]:
+        stem = entry.path[:-len(".json")]
+        for path in (entry.path, stem + ".prof"):
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+
+def _write(capture_id, profiler, meta):
+    directory = settings.PROFILING_DIR
+    os.makedirs(directory, exist_ok=True)
+
+    profiler.dump_stats(os.path.join(directory, f"{capture_id}.prof"))
+    # The .json is written last: its presence marks a complete capture
+    tmp = os.path.join(directory, f".{capture_id}.json.tmp")
+    with open(tmp, "w") as f:
+        json.dump(meta, f, indent=1)
+    os.replace(tmp, os.path.join(directory, f"{capture_id}.json"))
+
+    _rotate(directory, settings.PROFILING_MAX_CAPTURES)
+
+
+def profiled(endpoint):
+    """Decorator for an APIView post(): profile the request when triggered"""
+
+    def decorator(post):
+        @functools.wraps(post)
+        def wrapper(view, request, *args, **kwargs):
+            reason = trigger(request)
+            if reason is None or not _capture_lock.acquire(blocking=False):
+                return post(view, request, *args, **kwargs)
+
+            try:
+                started_tracing = not tracemalloc.is_tracing()
+                if started_tracing:
+                    tracemalloc.start(TRACEMALLOC_FRAMES)
+                tracemalloc.reset_peak()
+
+                profiler = cProfile.Profile()
+                started = time.perf_counter()
+                try:
+                    response = profiler.runcall(post, view, request, *args, **kwargs)
+                finally:
+                    elapsed_ms = (time.perf_counter() - started) * 1000
+                    snapshot = tracemalloc.take_snapshot()
+                    _, peak = tracemalloc.get_traced_memory()
+                    if started_tracing:
+                        tracemalloc.stop()
+
+                capture_id = f"{time.strftime('%Y%m%dT%H%M%S')}-{endpoint}-{uuid.uuid4().hex[:8]}"
+                meta = {
+                    "id": capture_id,
+                    "endpoint": endpoint,
+                    "trigger": reason,
+                    "created_at": time.time(),
+                    "elapsed_ms": round(elapsed_ms, 1),
+                    "status": response.status_code,
+                    "images": len(request.FILES.getlist("images")),
+                    "tracemalloc_peak_kb": round(peak / 1024, 1),
+                    "top_allocations": _top_allocations(snapshot, settings.PROFILING_TOP_ALLOCATIONS),
+                }
+                try:
+                    _write(capture_id, profiler, meta)
+                    response["X-Profile-Id"] = capture_id
+                except OSError:
+                    logger.exception("Could not write profile %s", capture_id)
+                return response
+            finally:
+                _capture_lock.release()
+
+        return wrapper
+
+    return decorator
+
+
+# ======================================================
+# READING CAPTURES
+# ======================================================
+def list_captures(directory, endpoint=None):
+    """Metadata of every complete capture, oldest first"""
+    if not os.path.isdir(directory):
+        return []
+
+    captures = []
+    for name in os.listdir(directory):
+        if not name.endswith(".json") or name.startswith("."):
+            continue
+        with open(os.path.join(directory, name)) as f:
+            meta = json.load(f)
+        if endpoint and meta.get("endpoint") != endpoint:
+            continue
+        meta["prof_path"] = os.path.join(directory, f"{meta['id']}.prof")
+        captures.append(meta)
+
+    return sorted(captures, key=lambda meta: meta["created_at"])
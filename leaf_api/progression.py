@@ -0,0 +1,282 @@
+# progression.py
+#
+# Per-plot disease progression. Submissions may name a plot / field
+# ("plot"); each plot keeps a PlotState (last verdict, an exponentially
+# weighted disease score, the last mean embedding) and a PlotPoint time
+# series. A new submission is compared with the PlotState alone, one
+# indexed row, however long the history: old images are never re-scored.
+#
+# disease score   1 - the healthy share of the mean probability the
+#                 submission's labelled images give the voted crop's classes
+#                 (0 = healthy, 1 = diseased); only submissions with a
+#                 verdict label are observed
+# baseline        the score weighted by age, half-life PLOT_HALF_LIFE_DAYS
+#                 (repeats on the same day weigh as in a running mean)
+# trend           new score vs the baseline: worsening / improving beyond
+#                 PLOT_TREND_DELTA, else stable ("first" for a new plot)
+#
+# States and points are written in the request itself, one short transaction
+# per submission, so rapid repeats see each other and progression does not
+# depend on PREDICTION_RECORDING or the recorder's queue. `manage.py
+# compact_plot_history` averages points older than PLOT_RAW_DAYS into one
+# per week and drops everything older than PLOT_RETENTION_DAYS.
+
+import logging
+import re
+from collections import Counter, defaultdict
+from datetime import datetime, time as dt_time, timedelta, timezone as dt_timezone
+
+import numpy as np
+from django.conf import settings
+from django.db import DatabaseError, IntegrityError, transaction
+from django.utils import timezone
+
+from .ml.engine import get_engine
+from .models import PlotPoint, PlotState
+from .rollups import period_start
+
+logger = logging.getLogger(__name__)
+
+PLOT_RE = re.compile(r"^[\w.-]{1,64}$")
+
+
+def valid_plot(value):
+    return bool(PLOT_RE.match(value))
+
+
+def _embedding(value):
+    """float32 vector from a stored float16 blob, None when empty"""
+    value = bytes(value or b"")
+    return np.frombuffer(value, dtype=np.float16).astype(np.float32) if value else None
+
+
+def _unit(vector):
+    return vector / max(float(np.linalg.norm(vector)), 1e-12)
+
+
+# ======================================================
+# OBSERVATIONS
+# ======================================================
+class Observation:
+    """What one submission adds to its plot"""
+
+    def __init__(self, endpoint, plot, at, label, status, score, probabilities, embedding):
+        self.endpoint = endpoint
+        self.plot = plot
+        self.at = at
+        self.label = label
+        self.status = status
+        self.score = score
+        self.probabilities = probabilities
+        self.embedding = embedding  # unit float32 vector or None
+
+
+def _crop_prefix(model, crop, result, label):
+    """Class name prefix of the crop a verdict is about"""
+    if model.requires_crop and crop:
+        return model.crop_prefix(crop)
+    return result.get("crop") or label.split("_")[0]
+
+
+def observe(endpoint, plot, result, details, crop=None, at=None):
+    """
+    The Observation of a scored submission; None without a verdict label
+    (unclear, wrong crop, poor quality) or when no image got a label
+    """
+    label = details.get("label")
+    images = details.get("images", [])
+    labelled = [image["probabilities"] for image in images if image["label"]]
+    if not label or not labelled:
+        return None
+
+    mean = np.mean(np.asarray(labelled, dtype=np.float32), axis=0)
+    model = get_engine(endpoint).engine.model
+    prefix = _crop_prefix(model, crop, result, label)
+    # Other crops' classes say nothing about this crop's health
+    classes = [i for i, name in enumerate(model.class_names) if name.startswith(prefix) and i < len(mean)]
+    total = float(mean[classes].sum())
+    if total <= 0:
+        return None
+    healthy = float(sum(mean[i] for i in classes if "healthy" in model.class_names[i].lower()))
+    score = float(np.clip(1.0 - healthy / total, 0.0, 1.0))
+
+    embedding = None
+    if "embeddings" in details:
+        rows = [i for i, row in enumerate(details["tensor_rows"]) if images[row]["label"]]
+        vectors = details["embeddings"][rows]
+        vectors = vectors / np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+        embedding = _unit(vectors.mean(axis=0))
+
+    return Observation(
+        endpoint, plot, at or timezone.now(), label, result.get("status", ""),
+        score, [round(float(p), 3) for p in mean], embedding
+    )
+
+
+# ======================================================
+# INCREMENTAL STATE
+# ======================================================
+def compare(state, obs):
+    """The "progression" field of a response: `obs` against the plot's state before it"""
+    progression = {"plot": obs.plot, "disease_score": round(obs.score, 3)}
+    if state is None:
+        progression.update(observations=1, trend="first")
+        return progression
+
+    delta = obs.score - state.baseline_score
+    if delta > settings.PLOT_TREND_DELTA:
+        trend = "worsening"
+    elif delta < -settings.PLOT_TREND_DELTA:
+        trend = "improving"
+    else:
+        trend = "stable"
+
+    progression.update(
+        observations=state.observations + 1,
+        trend=trend,
+        previous_score=round(state.last_score, 3),
+        baseline_score=round(state.baseline_score, 3),
+        days_since_last=round((obs.at - state.last_at).total_seconds() / 86400, 1),
+        previous_label=state.last_label,
+        previous_status=state.last_status,
+    )
+    last = _embedding(state.last_embedding)
+    if obs.embedding is not None and last is not None and len(last) == len(obs.embedding):
+        # Low similarity: probably not the same plants photographed as before
+        progression["similarity_to_last"] = round(float(_unit(last) @ obs.embedding), 3)
+    return progression
+
+
+def advance(state, obs):
+    """Fold `obs` into `state` (unsaved; a new PlotState when None)"""
+    if state is None:
+        state = PlotState(
+            endpoint=obs.endpoint, plot=obs.plot, first_at=obs.at, last_at=obs.at,
+            last_score=obs.score, baseline_score=obs.score
+        )
+    else:
+        days = max((obs.at - state.last_at).total_seconds() / 86400, 0.0)
+        # Same-day repeats still count: never less than a running mean's share
+        keep = min(0.5 ** (days / settings.PLOT_HALF_LIFE_DAYS), state.observations / (state.observations + 1))
+        state.baseline_score = keep * state.baseline_score + (1 - keep) * obs.score
+        state.last_at = max(state.last_at, obs.at)
+
+    state.observations += 1
+    state.last_label = obs.label
+    state.last_status = obs.status
+    state.last_score = obs.score
+    if obs.embedding is not None:
+        state.last_embedding = obs.embedding.astype(np.float16).tobytes()
+    return state
+
+
+def _point(state, obs):
+    return PlotPoint(
+        state=state, at=obs.at, label=obs.label, status=obs.status, score=obs.score,
+        probabilities=obs.probabilities,
+        embedding=obs.embedding.astype(np.float16).tobytes() if obs.embedding is not None else b"",
+    )
+
+
+def record_observation(obs):
+    """
+    Compare `obs` with its plot's state, fold it in and append its point,
+    in one transaction; returns the "progression" field of the response,
+    None when the database refused the update.
+    """
+    for attempt in range(2):
+        try:
+            with transaction.atomic():
+                state = (
+                    PlotState.objects.select_for_update()
+                    .filter(endpoint=obs.endpoint, plot=obs.plot).first()
+                )
+                progression = compare(state, obs)
+                state = advance(state, obs)
+                state.save()
+                _point(state, obs).save()
+            return progression
+        except IntegrityError:
+            if not attempt:
+                # Another request created the plot first: fold into its state instead
+                continue
+            logger.exception("Could not update plot %s", obs.plot)
+        except DatabaseError:
+            # The prediction itself still stands; only this plot point is lost
+            logger.exception("Could not update plot %s", obs.plot)
+        return None
+
+
+# ======================================================
+# RETENTION (manage.py compact_plot_history)
+# ======================================================
+def _merge(points):
+    """Count-weighted mean of points of one plot and week (the first one is reused)"""
+    counts = np.asarray([p.count for p in points], dtype=np.float64)
+    target = points[0]
+    target.score = float(np.average([p.score for p in points], weights=counts))
+
+    widths = {len(p.probabilities) for p in points}
+    if len(widths) == 1 and widths != {0}:
+        target.probabilities = [
+            round(float(v), 3) for v in np.average([p.probabilities for p in points], axis=0, weights=counts)
+        ]
+
+    embeddings = [(_embedding(p.embedding), c) for p, c in zip(points, counts)]
+    embeddings = [(e, c) for e, c in embeddings if e is not None]
+    if embeddings and len({len(e) for e, _ in embeddings}) == 1:
+        mean = np.average([e for e, _ in embeddings], axis=0, weights=[c for _, c in embeddings])
+        target.embedding = _unit(mean).astype(np.float16).tobytes()
+
+    votes = Counter()
+    for p in points:
+        votes[(p.label, p.status)] += p.count
+    target.label, target.status = votes.most_common(1)[0][0]
+    target.count = int(counts.sum())
+    return target
+
+
+def compact(raw_days=None, retention_days=None):
+    """
+    Average raw points older than `raw_days` into weekly points and drop
+    points and idle plots older than `retention_days`. Returns (points
+    merged, weekly points written, points deleted, plots deleted).
+    """
+    now = timezone.now()
+    raw_cutoff = now - timedelta(days=raw_days if raw_days is not None else settings.PLOT_RAW_DAYS)
+    keep_cutoff = now - timedelta(
+        days=retention_days if retention_days is not None else settings.PLOT_RETENTION_DAYS
+    )
+
+    merged = written = 0
+    state_ids = (
+        PlotPoint.objects.filter(resolution="raw", at__lt=raw_cutoff)
+        .values_list("state_id", flat=True).distinct()
+    )
+    for state_id in list(state_ids):
+        # One plot per transaction: the recorder is never locked out for long
+        with transaction.atomic():
+            weeks = defaultdict(list)
+            raw = PlotPoint.objects.filter(state_id=state_id, resolution="raw", at__lt=raw_cutoff)
+            for point in raw:
+                week = period_start("week", point.at)
+                weeks[datetime.combine(week, dt_time.min, tzinfo=dt_timezone.utc)].append(point)
+
+            existing = {
+                p.at: p for p in PlotPoint.objects.filter(state_id=state_id, resolution="week", at__in=list(weeks))
+            }
+            for week_at, points in weeks.items():
+                merged += len(points)
+                if week_at in existing:
+                    points.insert(0, existing[week_at])
+                else:
+                    points[0].resolution = "week"
+                    points[0].at = week_at
+                _merge(points).save()
+                PlotPoint.objects.filter(pk__in=[p.pk for p in points[1:]]).delete()
+                written += 1
+
+    deleted_points, _ = PlotPoint.objects.filter(at__lt=keep_cutoff).delete()
+    # Their points are already gone (older still than last_at)
+    deleted_plots, _ = PlotState.objects.filter(last_at__lt=keep_cutoff).delete()
+    return merged, written, deleted_points, deleted_plots
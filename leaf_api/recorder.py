@@ -0,0 +1,187 @@
+# recorder.py
+#
+# Write-behind persistence of prediction records. Views enqueue unsaved
+# model instances; one background thread per worker drains the queue and
+# writes them with bulk inserts, so the request never touches SQLite.
+
+import atexit
+import logging
+import queue
+import threading
+import time
+
+from django.conf import settings
+from django.db import DatabaseError, OperationalError, close_old_connections, transaction
+
+from . import metrics
+from .models import ImageResult, Submission
+from .rollups import apply_rollups
+
+logger = logging.getLogger(__name__)
+
+# ======================================================
+# CONFIG
+# ======================================================
+WRITE_RETRIES = 5
+RETRY_BACKOFF_S = 0.05
+
+
+class WriteBehindRecorder:
+    def __init__(self, batch_size=200, flush_interval=1.0, max_queue=10000):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._stopping = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="recorder", daemon=True)
+        self._thread.start()
+
+        metrics.describe("leaf_api_records_written", "Prediction records persisted")
+        metrics.describe("leaf_api_records_dropped", "Prediction records dropped (queue full or write failure)")
+
+    def record(self, submission, images):
+        """Never blocks: a full queue drops the record rather than the request"""
+        try:
+            self._queue.put_nowait((submission, images))
+        except queue.Full:
+            metrics.inc("leaf_api_records_dropped", labels={"reason": "queue_full"})
+
+    def pending(self):
+        return self._queue.qsize()
+
+    def _drain(self):
+        """Block for the first record, then gather until the batch or the interval is full"""
+        try:
+            items = [self._queue.get(timeout=self.flush_interval)]
+        except queue.Empty:
+            return []
+
+        deadline = time.monotonic() + self.flush_interval
+        while len(items) < self.batch_size:
+            timeout = deadline - time.monotonic()
+            if timeout <= 0:
+                break
+            try:
+                items.append(self._queue.get(timeout=timeout))
+            except queue.Empty:
+                break
+        return items
+
+    def _run(self):
+        while not self._stopping.is_set() or not self._queue.empty():
+            items = self._drain()
+            if not items:
+                continue
+            try:
+                self.flush(items)
+            except Exception:
+                # Never let one batch kill the thread: every later record would be lost
+                logger.exception("Dropping %s prediction records after an unexpected error", len(items))
+                metrics.inc("leaf_api_records_dropped", len(items), {"reason": "error"})
+
+    def flush(self, items):
+        """Write `items` in one transaction; returns False when they were dropped"""
+        submissions = [submission for submission, _ in items]
+        images = [image for _, batch in items for image in batch]
+
+        for attempt in range(WRITE_RETRIES):
+            try:
+                close_old_connections()
+                with transaction.atomic():
+                    self.write(submissions, images)
+                metrics.inc("leaf_api_records_written", len(submissions))
+                return True
+            except OperationalError:
+                # "database is locked" from another worker's writer; back off and retry
+                time.sleep(RETRY_BACKOFF_S * (2 ** attempt))
+            except DatabaseError:
+                # Bad data (e.g. a constraint): retrying the batch cannot help
+                if len(items) > 1:
+                    # Write the records one by one so only the bad ones are dropped
+                    return all([self.flush([item]) for item in items])
+                logger.exception("Dropping a prediction record the database rejected")
+                metrics.inc("leaf_api_records_dropped", labels={"reason": "rejected"})
+                return False
+
+        logger.error("Dropping %s prediction records after %s attempts", len(submissions), WRITE_RETRIES)
+        metrics.inc("leaf_api_records_dropped", len(submissions), {"reason": "write_failed"})
+        return False
+
+    def write(self, submissions, images):
+        """Runs inside the flush transaction"""
+        Submission.objects.bulk_create(submissions, batch_size=self.batch_size)
+        ImageResult.objects.bulk_create(images, batch_size=self.batch_size * 10)
+        apply_rollups(submissions)
+
+    def stop(self, timeout=5.0):
+        self._stopping.set()
+        self._thread.join(timeout)
+
+
+# ======================================================
+# SHARED RECORDER (one per worker process)
+# ======================================================
+_recorder = None
+_recorder_lock = threading.Lock()
+
+
+def get_recorder():
+    global _recorder
+    if _recorder is None:
+        with _recorder_lock:
+            if _recorder is None:
+                _recorder = WriteBehindRecorder(
+                    batch_size=settings.RECORDER_BATCH_SIZE,
+                    flush_interval=settings.RECORDER_FLUSH_INTERVAL_S,
+                    max_queue=settings.RECORDER_MAX_QUEUE
+                )
+                atexit.register(_recorder.stop)
+    return _recorder
+
+
+def record_prediction(endpoint, crop, result, details, image_hashes, latency_ms, plot=""):
+    """
+    Build the Submission / ImageResult rows for one prediction and hand
+    them to the recorder.
+    Returns the submission id.
+    """
+    submission = Submission(
+        endpoint=endpoint,
+        crop=result.get("crop", crop or ""),
+        label=details.get("label", ""),
+        status=result.get("status", ""),
+        confidence=result.get("confidence"),
+        agreement=result.get("agreement"),
+        image_count=len(image_hashes),
+        latency_ms=latency_ms,
+        model_version=details.get("model_version", ""),
+        plot=plot
+    )
+
+    images = [
+        ImageResult(
+            submission=submission,
+            position=position,
+            created_at=submission.created_at,
+            crop=submission.crop,
+            image_hash=image_hash,
+            model_version=submission.model_version,
+            **image
+        )
+        for position, (image_hash, image) in enumerate(zip(image_hashes, details.get("images", [])))
+    ]
+
+    if settings.PREDICTION_RECORDING:
+        get_recorder().record(submission, images)
+    return submission.id
+
+
+def enable_sqlite_wal(sender, connection, **kwargs):
+    """
+    connection_created receiver: WAL lets request threads read while the
+    recorder writes, and NORMAL sync is safe under WAL.
+    """
+    if connection.vendor == "sqlite":
+        with connection.cursor() as cursor:
+            cursor.execute("PRAGMA journal_mode=WAL")
+            cursor.execute("PRAGMA synchronous=NORMAL")
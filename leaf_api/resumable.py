@@ -0,0 +1,274 @@
+# resumable.py
+#
+# Resumable chunked uploads for poor networks.
+#
+#   POST /api/uploads/                          {"endpoint", "crop", "sizes": [bytes per image]}
+#   PUT  /api/uploads/<id>/images/<i>/?offset=N  raw chunk bytes
+#   GET  /api/uploads/<id>/                     bytes received per image (resume point)
+#   POST /api/uploads/<id>/finalize/            run the prediction, same response as the endpoint
+#
+# Chunk bytes live in a content-addressed store (UPLOAD_CHUNK_DIR/ab/<sha256>),
+# written once however many times or sessions they arrive in; UploadChunk
+# rows map (session, image, offset) to a hash. A retried chunk may carry
+# X-Chunk-SHA256 with an empty body: if the server already holds those
+# bytes nothing is re-sent. Every worker that serves uploads expires idle
+# sessions and removes chunk files no session references every
+# UPLOAD_CLEANUP_INTERVAL_S; `manage.py cleanup_uploads` does the same on
+# demand.
+
+import hashlib
+import logging
+import os
+import re
+import threading
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+
+from .models import UploadChunk, UploadSession
+
+logger = logging.getLogger(__name__)
+
+
+class UploadError(ValueError):
+    pass
+
+
+SHA256_RE = re.compile(r"^[0-9a-f]{64}$")
+
+
+# ======================================================
+# CHUNK STORE
+# ======================================================
+def chunk_path(sha256):
+    # Hashes come from clients: never let one name anything outside the store
+    if not isinstance(sha256, str) or not SHA256_RE.match(sha256):
+        raise ValueError(f"Not a lowercase hex sha256: {sha256!r}")
+    return os.path.join(settings.UPLOAD_CHUNK_DIR, sha256[:2], sha256)
+
+
+def store_chunk(data, sha256=None):
+    """Write `data` unless an identical chunk is already stored; returns its sha256"""
+    sha256 = sha256 or hashlib.sha256(data).hexdigest()
+    path = chunk_path(sha256)
+
+    if os.path.exists(path):
+        os.utime(path)  # fresh mtime keeps it out of the next garbage collection
+        return sha256
+
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "wb") as f:
+        f.write(data)
+    os.replace(tmp, path)
+    return sha256
+
+
+def chunk_size(sha256):
+    """Size of a stored chunk, or None when it is not stored"""
+    try:
+        return os.path.getsize(chunk_path(sha256))
+    except OSError:
+        return None
+
+
+# ======================================================
+# SESSIONS
+# ======================================================
+def create_session(endpoint, crop, sizes):
+    if endpoint not in dict(UploadSession._meta.get_field("endpoint").choices):
+        raise UploadError("endpoint must be leaf or areca_coconut")
+    if endpoint == "leaf" and not crop:
+        raise UploadError("crop is required for leaf uploads")
+    if not isinstance(sizes, list) or not 3 <= len(sizes) <= settings.UPLOAD_MAX_IMAGES:
+        raise UploadError(f"sizes must list 3 to {settings.UPLOAD_MAX_IMAGES} image sizes")
+    if not all(isinstance(s, int) and 0 < s <= settings.UPLOAD_MAX_IMAGE_BYTES for s in sizes):
+        raise UploadError(f"every image size must be 1 to {settings.UPLOAD_MAX_IMAGE_BYTES} bytes")
+
+    return UploadSession.objects.create(endpoint=endpoint, crop=crop or "", sizes=sizes)
+
+
+def add_chunk(session, image, offset, data, claimed_sha256=None):
+    """
+    Record bytes [offset, offset + len) of image `image`. With an empty
+    `data` and `claimed_sha256` of a chunk already stored, that chunk is
+    reused. Re-sending an offset replaces it. Returns received(session).
+    """
+    if session.finalized_at is not None:
+        raise UploadError("session already finalized")
+    if not 0 <= image < len(session.sizes):
+        raise UploadError(f"image must be 0 to {len(session.sizes) - 1}")
+    if claimed_sha256 and not SHA256_RE.match(claimed_sha256):
+        raise UploadError("X-Chunk-SHA256 must be 64 lowercase hex digits")
+
+    if data:
+        if len(data) > settings.UPLOAD_MAX_CHUNK_BYTES:
+            raise UploadError(f"chunks are limited to {settings.UPLOAD_MAX_CHUNK_BYTES} bytes")
+        length = len(data)
+    else:
+        length = chunk_size(claimed_sha256) if claimed_sha256 else None
+        if not length:
+            raise UploadError("empty chunk and no stored chunk with that X-Chunk-SHA256")
+
+    if offset < 0 or offset + length > session.sizes[image]:
+        raise UploadError(f"chunk outside image {image} (size {session.sizes[image]})")
+
+    if data:
+        # Check before storing: a mismatched chunk must not land on disk
+        sha256 = hashlib.sha256(data).hexdigest()
+        if claimed_sha256 and claimed_sha256 != sha256:
+            raise UploadError("chunk does not match X-Chunk-SHA256")
+        store_chunk(data, sha256)
+    else:
+        sha256 = claimed_sha256
+        os.utime(chunk_path(sha256))
+
+    try:
+        with transaction.atomic():
+            UploadChunk.objects.update_or_create(
+                session=session, image=image, offset=offset,
+                defaults={"length": length, "sha256": sha256},
+            )
+    except IntegrityError:
+        pass  # a concurrent retry of the same chunk won
+    UploadSession.objects.filter(pk=session.pk).update(updated_at=timezone.now())
+
+    return received(session)
+
+
+def received(session):
+    """Contiguous bytes received from the start of every image"""
+    pos = [0] * len(session.sizes)
+    for image, offset, length in (
+        session.chunks.order_by("image", "offset").values_list("image", "offset", "length")
+    ):
+        if offset <= pos[image]:
+            pos[image] = max(pos[image], offset + length)
+    return pos
+
+
+def assemble(session, dest_dir, paths):
+    """
+    Write every image to dest_dir, appending each path to `paths` as soon
+    as it exists; returns the sha256 of every image. Raises UploadError
+    while any image is incomplete.
+    """
+    missing = [
+        i for i, (got, size) in enumerate(zip(received(session), session.sizes))
+        if got < size
+    ]
+    if missing:
+        raise UploadError(f"images not complete yet: {missing}")
+
+    chunks = {}
+    for chunk in session.chunks.order_by("image", "offset"):
+        chunks.setdefault(chunk.image, []).append(chunk)
+
+    hashes = []
+    for image, size in enumerate(session.sizes):
+        path = os.path.join(dest_dir, f"{session.id}_{image}.jpg")
+        paths.append(path)
+        digest = hashlib.sha256()
+        pos = 0
+
+        with open(path, "wb") as out:
+            for chunk in chunks[image]:
+                if chunk.offset + chunk.length <= pos or chunk.offset > pos:
+                    continue  # fully overlapped by earlier chunks
+                with open(chunk_path(chunk.sha256), "rb") as f:
+                    f.seek(pos - chunk.offset)
+                    data = f.read(min(size, chunk.offset + chunk.length) - pos)
+                out.write(data)
+                digest.update(data)
+                pos += len(data)
+
+        hashes.append(digest.hexdigest())
+
+    return hashes
+
+
+def claim_for_finalize(session):
+    """True for exactly one caller; the others see the session already claimed"""
+    return bool(
+        UploadSession.objects
+        .filter(pk=session.pk, finalized_at__isnull=True)
+        .update(finalized_at=timezone.now())
+    )
+
+
+def release_claim(session):
+    """Prediction failed: allow finalize to be retried"""
+    UploadSession.objects.filter(pk=session.pk, result__isnull=True).update(finalized_at=None)
+
+
+# ======================================================
+# CLEANUP
+# ======================================================
+def expire_sessions(max_age_h=None):
+    """Delete sessions idle for longer than max_age_h; returns how many"""
+    max_age_h = max_age_h if max_age_h is not None else settings.UPLOAD_SESSION_TTL_H
+    cutoff = timezone.now() - timedelta(hours=max_age_h)
+    _, deleted = UploadSession.objects.filter(updated_at__lt=cutoff).delete()
+    return deleted.get(UploadSession._meta.label, 0)
+
+
+def collect_chunks(grace_s=3600):
+    """
+    Remove stored chunks no session references. Files newer than grace_s
+    are kept: their UploadChunk row may still be on its way.
+    Returns (files removed, bytes freed).
+    """
+    root = settings.UPLOAD_CHUNK_DIR
+    if not os.path.isdir(root):
+        return 0, 0
+
+    referenced = set(UploadChunk.objects.values_list("sha256", flat=True).distinct())
+    cutoff = time.time() - grace_s
+    removed = freed = 0
+
+    for prefix in os.scandir(root):
+        if not prefix.is_dir():
+            continue
+        for entry in os.scandir(prefix.path):
+            name = entry.name.split(".", 1)[0]
+            stat = entry.stat()
+            if name in referenced or stat.st_mtime > cutoff:
+                continue
+            try:
+                os.remove(entry.path)
+            except FileNotFoundError:
+                continue  # another worker's cleanup got there first
+            removed += 1
+            freed += stat.st_size
+
+    return removed, freed
+
+
+_cleaner = None
+_cleaner_lock = threading.Lock()
+
+
+def _clean_periodically():
+    while True:
+        time.sleep(settings.UPLOAD_CLEANUP_INTERVAL_S)
+        try:
+            sessions = expire_sessions()
+            removed, freed = collect_chunks()
+            if sessions or removed:
+                logger.info("Upload cleanup: %d sessions expired, %d chunks (%d bytes) removed",
+                            sessions, removed, freed)
+        except Exception:
+            logger.exception("Upload cleanup failed")
+
+
+def start_cleaner():
+    """Run the cleanup every UPLOAD_CLEANUP_INTERVAL_S in this worker (idempotent)"""
+    global _cleaner
+    if _cleaner is None and settings.UPLOAD_CLEANUP_INTERVAL_S > 0:
+        with _cleaner_lock:
+            if _cleaner is None:
+                _cleaner = threading.Thread(target=_clean_periodically, name="upload-cleanup", daemon=True)
+                _cleaner.start()
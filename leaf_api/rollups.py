@@ -0,0 +1,114 @@
+# rollups.py
+#
+# Incrementally maintained disease-prevalence counts. The recorder calls
+# apply_rollups() inside the same transaction that inserts the
+# submissions, so the rollups never drift from the raw records.
+
+from collections import Counter
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.db import connection, transaction
+from django.db.models import Sum
+
+from .models import PrevalenceRollup, Submission
+
+PERIODS = ("day", "week")
+GROUP_FIELDS = ("crop", "label", "status")
+
+
+def period_start(period, moment):
+    """First day (UTC) of the day / ISO week containing `moment`"""
+    day = moment.astimezone(dt_timezone.utc).date()
+    if period == "week":
+        return day - timedelta(days=day.weekday())
+    return day
+
+
+def rollup_counts(rows):
+    """rows: iterable of (created_at, crop, label, status)"""
+    counts = Counter()
+    for created_at, crop, label, status in rows:
+        for period in PERIODS:
+            counts[(period, period_start(period, created_at), crop, label, status)] += 1
+    return counts
+
+
+def _upsert_sql():
+    table = connection.ops.quote_name(PrevalenceRollup._meta.db_table)
+    key = "period, period_start, crop, label, status"
+    return (
+        f"INSERT INTO {table} ({key}, count) VALUES (%s, %s, %s, %s, %s, %s) "
+        f"ON CONFLICT ({key}) DO UPDATE SET count = {table}.count + excluded.count"
+    )
+
+
+def apply_rollups(submissions):
+    """Add a batch of freshly recorded submissions to the rollups (one statement)"""
+    counts = rollup_counts(
+        (s.created_at, s.crop, s.label, s.status) for s in submissions
+    )
+    if not counts:
+        return
+
+    with connection.cursor() as cursor:
+        cursor.executemany(
+            _upsert_sql(),
+            [
+                (period, connection.ops.adapt_datefield_value(start), crop, label, status, count)
+                for (period, start, crop, label, status), count in counts.items()
+            ]
+        )
+
+
+def rebuild_rollups(chunk_size=5000):
+    """Recompute every rollup from the raw submissions; returns the submission count"""
+    rows = Submission.objects.values_list("created_at", "crop", "label", "status")
+
+    with transaction.atomic():
+        counts = rollup_counts(rows.iterator(chunk_size=chunk_size))
+        total = sum(count for key, count in counts.items() if key[0] == "day")
+
+        PrevalenceRollup.objects.all().delete()
+        PrevalenceRollup.objects.bulk_create(
+            [
+                PrevalenceRollup(
+                    period=period, period_start=start, crop=crop,
+                    label=label, status=status, count=count
+                )
+                for (period, start, crop, label, status), count in counts.items()
+            ],
+            batch_size=1000
+        )
+
+    return total
+
+
+def query_prevalence(period="week", start=None, end=None, crop=None, label=None,
+                     status=None, group_by=GROUP_FIELDS):
+    """
+    Aggregate counts per period bucket. `start` / `end` are dates and are
+    widened to whole buckets; filters are exact matches.
+    """
+    qs = PrevalenceRollup.objects.filter(period=period)
+
+    if start is not None:
+        qs = qs.filter(period_start__gte=period_start(period, _as_datetime(start)))
+    if end is not None:
+        qs = qs.filter(period_start__lte=end)
+    if crop:
+        qs = qs.filter(crop=crop)
+    if label:
+        qs = qs.filter(label=label)
+    if status:
+        qs = qs.filter(status=status)
+
+    fields = ["period_start"] + [f for f in GROUP_FIELDS if f in group_by]
+    return list(
+        qs.values(*fields)
+        .annotate(count=Sum("count"))
+        .order_by(*fields)
+    )
+
+
+def _as_datetime(day):
+    return datetime(day.year, day.month, day.day, tzinfo=dt_timezone.utc)
@@ -0,0 +1,143 @@
+# shadow.py
+#
+# Shadow traffic for a candidate backend. SHADOW_SAMPLE_RATE of the live
+# predictions of every endpoint listed in SHADOW_BACKENDS
+# ("leaf=tflite:/models/leaf_int8.tflite,areca_coconut=version:v5", specs
+# as in ml/compare.py) are re-scored by that backend on one background
+# thread per worker, after the response is built. The request only pays
+# for a queue put; a full queue drops the sample. The shadow backend is
+# loaded by that thread on its first sample, not at boot.
+#
+# Each comparison runs the engine's own verdict rules on the shadow
+# predictions (CropEngine.evaluate), counts per-image label and final
+# status matches as metrics and appends one line to SHADOW_LOG_FILE.
+
+import json
+import logging
+import queue
+import random
+import threading
+import time
+
+import numpy as np
+from django.conf import settings
+
+from . import metrics
+from .ml.calibration import get_calibration
+from .ml.compare import load_backend, parse_backends
+from .ml.engine import get_engine
+
+logger = logging.getLogger(__name__)
+
+
+class ShadowRunner:
+    def __init__(self, specs, max_queue=100):
+        self.specs = specs
+        self._backends = {}
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._thread = threading.Thread(target=self._run, name="shadow", daemon=True)
+        self._thread.start()
+
+        metrics.describe("leaf_api_shadow_images", "Live images re-scored by the shadow backend, by label match")
+        metrics.describe("leaf_api_shadow_submissions", "Live submissions re-scored by the shadow backend, by status match")
+        metrics.describe("leaf_api_shadow_dropped", "Shadow samples dropped (queue full)")
+
+    def submit(self, endpoint, crop, details, result):
+        """Never blocks; `details` / `result` are only read"""
+        try:
+            self._queue.put_nowait((endpoint, crop, details, result.get("status")))
+        except queue.Full:
+            metrics.inc("leaf_api_shadow_dropped", labels={"model": endpoint})
+
+    def _run(self):
+        while True:
+            job = self._queue.get()
+            try:
+                self.compare(*job)
+            except Exception:
+                logger.exception("Shadow comparison failed")
+
+    def _backend(self, endpoint, engine):
+        if endpoint not in self._backends:
+            self._backends[endpoint] = load_backend(self.specs[endpoint], engine.engine.registry)
+            logger.info("Shadow backend for %s: %s", endpoint, self.specs[endpoint])
+        return self._backends[endpoint]
+
+    def compare(self, endpoint, crop, details, live_status):
+        engine = get_engine(endpoint)
+        backend = self._backend(endpoint, engine)
+        rows = details["tensor_rows"]
+        live_images = details["images"]
+
+        started = time.perf_counter()
+        preds = np.asarray(backend.predict(details["tensors"].astype(np.float32) / 255.0), dtype=np.float32)
+        shadow_ms = (time.perf_counter() - started) * 1000
+
+        calibration = get_calibration(engine.MODEL_NAME, details["model_version"], engine.DEFAULT_CALIBRATION)
+        decoded = set(rows)
+        reports = [
+            (i in decoded, image["quality_ok"], image["quality_message"])
+            for i, image in enumerate(live_images)
+        ]
+        shadow = {}
+        result = engine.engine.evaluate(
+            reports, rows, preds, calibration,
+            crop=crop if engine.engine.model.requires_crop else None, details=shadow
+        )
+
+        matched = sum(shadow["images"][row]["label"] == live_images[row]["label"] for row in rows)
+        status_match = result.get("status") == live_status
+
+        metrics.inc("leaf_api_shadow_images", matched, {"model": endpoint, "match": "yes"})
+        metrics.inc("leaf_api_shadow_images", len(rows) - matched, {"model": endpoint, "match": "no"})
+        metrics.inc("leaf_api_shadow_submissions", labels={
+            "model": endpoint, "match": "yes" if status_match else "no"
+        })
+
+        event = {
+            "ts": time.time(),
+            "model": endpoint,
+            "live_version": details["model_version"],
+            "shadow": backend.spec,
+            "images": len(rows),
+            "labels_matched": matched,
+            "live_status": live_status,
+            "shadow_status": result.get("status"),
+            "live_label": details.get("label"),
+            "shadow_label": shadow.get("label"),
+            "shadow_ms": round(shadow_ms, 1),
+        }
+        try:
+            with open(settings.SHADOW_LOG_FILE, "a") as f:
+                f.write(json.dumps(event) + "\n")
+        except OSError:
+            logger.exception("Could not record shadow comparison")
+        return event
+
+
+# ======================================================
+# SHARED RUNNER (one per worker process)
+# ======================================================
+_runner = None
+_runner_lock = threading.Lock()
+
+
+def get_runner():
+    global _runner
+    if _runner is None:
+        with _runner_lock:
+            if _runner is None:
+                _runner = ShadowRunner(parse_backends(settings.SHADOW_BACKENDS), settings.SHADOW_MAX_QUEUE)
+    return _runner
+
+
+def maybe_shadow(endpoint, crop, details, result):
+    """Queue a sampled live prediction for the shadow backend of its endpoint, if any"""
+    if not settings.SHADOW_BACKENDS or "tensors" not in details:
+        return
+    if random.random() >= settings.SHADOW_SAMPLE_RATE:
+        return
+
+    runner = get_runner()
+    if endpoint in runner.specs:
+        runner.submit(endpoint, crop, details, result)
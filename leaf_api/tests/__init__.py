@@ -0,0 +1 @@
+from . import fakes  # noqa: F401  (before anything imports an engine)
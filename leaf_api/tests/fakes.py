@@ -0,0 +1,51 @@
+# Fakes shared by the test modules. The engines build their model registry
+# on first use; tests/__init__.py imports this module first, so they get
+# fake registries and no test ever loads a real model.
+
+import os
+from types import SimpleNamespace
+import cv2
+import numpy as np
+
+from ..ml import engine as engine_module
+
+
+def fake_registry(predict=None, version="test-1"):
+    batcher = SimpleNamespace(predict=predict)
+    return SimpleNamespace(name="test", active=SimpleNamespace(version=version, classes=None, batcher=batcher))
+
+
+from ..ml import areca_coconut_engine, leaf_engine  # noqa: E402
+
+leaf_engine.engine.registry = fake_registry()
+areca_coconut_engine.engine.registry = fake_registry()
+
+
+def make_engine(model, rows):
+    """A CropEngine whose model answers every image with the probability rows in `rows`"""
+    rows = np.asarray(rows, dtype=np.float32)
+    engine = engine_module.CropEngine(model)
+    engine.registry = fake_registry(lambda x: rows[:len(x)])
+    return engine
+
+
+def one_hot(classes, name, confidence):
+    """Probability row with `confidence` on `name` and the rest spread evenly"""
+    row = np.full(len(classes), (1.0 - confidence) / (len(classes) - 1), dtype=np.float32)
+    row[classes.index(name)] = confidence
+    return row
+
+
+OK = (True, True, "OK")
+BATCH = np.zeros((3, 128, 128, 3), dtype=np.uint8)
+
+
+def write_image(directory, name, color, size=(300, 300)):
+    """Lossless image of one BGR color, with a green top half for any but dark colors"""
+    path = os.path.join(directory, name)
+    img = np.zeros(size + (3,), dtype=np.uint8)
+    img[:] = color
+    if max(color) > 50:
+        img[: size[0] // 2] = (0, 200, 0)
+    cv2.imwrite(path, img)
+    return path
@@ -0,0 +1,110 @@
+import json
+import os
+import shutil
+import sys
+import tempfile
+from types import SimpleNamespace
+from unittest import mock
+
+import numpy as np
+from django.test import SimpleTestCase, override_settings
+
+from ..ml import artifacts
+from ..ml.artifacts import artifact_dir, convert, is_current, load_fast, load_model
+
+WEIGHTS = [
+    np.arange(6, dtype=np.float32).reshape(2, 3),
+    np.array([1, -2, 3], dtype=np.int8),  # odd size: the next weight is padded
+    np.linspace(0, 1, 7, dtype=np.float64),
+    np.zeros((0,), dtype=np.float32),
+]
+
+
+class FakeModel:
+    def __init__(self, config="{}", weights=None):
+        self.config = config
+        self.weights = weights
+
+    def to_json(self):
+        return self.config
+
+    def get_weights(self):
+        return self.weights
+
+    def set_weights(self, arrays):
+        self.weights = [np.array(a) for a in arrays]
+
+
+def fake_tensorflow():
+    """Just the Keras calls artifacts.py makes"""
+    models = SimpleNamespace(
+        load_model=mock.Mock(side_effect=lambda path: FakeModel('{"layers": 3}', WEIGHTS)),
+        model_from_json=lambda config: FakeModel(config),
+    )
+    return SimpleNamespace(__version__="2.99", keras=SimpleNamespace(models=models))
+
+
+class ArtifactTests(SimpleTestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.dir, ignore_errors=True)
+        self.model_path = os.path.join(self.dir, "model.h5")
+        with open(self.model_path, "wb") as f:
+            f.write(b"h5 model bytes")
+
+        self.tf = fake_tensorflow()
+        patcher = mock.patch.dict(sys.modules, {"tensorflow": self.tf})
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_round_trip(self):
+        self.assertFalse(is_current(self.model_path))
+        out = convert(self.model_path)
+        self.assertEqual(out, os.path.join(self.dir, "model.fast"))
+        self.assertTrue(is_current(self.model_path))
+
+        with open(os.path.join(out, "index.json")) as f:
+            self.assertTrue(all(w["offset"] % artifacts.ALIGN == 0 for w in json.load(f)["weights"]))
+
+        model = load_fast(out)
+        self.assertEqual(model.config, '{"layers": 3}')
+        for loaded, original in zip(model.weights, WEIGHTS):
+            self.assertEqual(loaded.dtype, original.dtype)
+            np.testing.assert_array_equal(loaded, original)
+
+    def test_staleness(self):
+        convert(self.model_path)
+
+        os.utime(self.model_path, ns=(0, 0))  # same bytes, new mtime (fresh checkout)
+        self.assertTrue(is_current(self.model_path))
+
+        with open(self.model_path, "wb") as f:
+            f.write(b"H5 MODEL BYTES")  # same size, new contents
+        self.assertFalse(is_current(self.model_path))
+
+        with open(self.model_path, "wb") as f:
+            f.write(b"longer model bytes")
+        self.assertFalse(is_current(self.model_path))
+
+    def test_load_model(self):
+        with override_settings(MODEL_FAST_LOAD=True):
+            self.assertEqual(load_model(self.model_path)[1], "h5")  # no artifact yet
+
+            convert(self.model_path)
+            model, source = load_model(self.model_path)
+            self.assertEqual(source, "fast")
+            np.testing.assert_array_equal(model.weights[0], WEIGHTS[0])
+
+            self.assertEqual(load_model(self.model_path, fast=False)[1], "h5")
+
+            os.remove(os.path.join(artifact_dir(self.model_path), "weights.bin"))
+            with self.assertLogs("leaf_api.ml.artifacts", "ERROR"):
+                self.assertEqual(load_model(self.model_path)[1], "h5")
+
+    def test_reconvert_replaces_the_artifact(self):
+        out = convert(self.model_path)
+        with open(os.path.join(out, "stale"), "w"):
+            pass
+        self.assertEqual(convert(self.model_path), out)
+        self.assertFalse(os.path.exists(os.path.join(out, "stale")))
+        self.assertEqual(sorted(os.listdir(self.dir)), ["model.fast", "model.h5"])
@@ -0,0 +1,75 @@
+import io
+import json
+import os
+import shutil
+import tempfile
+import zipfile
+from unittest import mock
+
+from django.core.management import CommandError, call_command
+from django.test import SimpleTestCase
+
+from ..ml import leaf_engine
+from .fakes import fake_registry, one_hot, write_image
+
+HEALTHY = one_hot(leaf_engine.CLASS_NAMES, "Tomato__healthy", 0.9)
+
+
+class BatchPredictTests(SimpleTestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.dir, ignore_errors=True)
+        self.source = os.path.join(self.dir, "field")
+        for folder, count in (("plot-a", 3), ("plot-b", 3), ("plot-c", 2)):
+            os.makedirs(os.path.join(self.source, folder))
+            for i in range(count):
+                write_image(os.path.join(self.source, folder), f"{i}.png", (40, 120, 200))
+
+        for patcher in (
+            mock.patch.dict(os.environ),  # the worker initializer sets the thread split
+            mock.patch.object(leaf_engine.engine, "registry", fake_registry(lambda x: [HEALTHY] * len(x))),
+        ):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def run_command(self, *args, **options):
+        out = io.StringIO()
+        call_command("batch_predict", *args, processes=1, stdout=out, **options)
+        return out.getvalue()
+
+    def rows(self, path):
+        with open(path) as f:
+            return {row["submission"]: row for row in map(json.loads, f)}
+
+    def test_directory_and_resume(self):
+        output = os.path.join(self.dir, "results.jsonl")
+        self.assertIn("2 to score", self.run_command(self.source, output, crop="tomato"))
+
+        rows = self.rows(output)
+        self.assertEqual(rows["plot-c"]["status"], "skipped")
+        for key in ("plot-a", "plot-b"):
+            self.assertEqual((rows[key]["status"], rows[key]["label"]), ("healthy", "Tomato__healthy"))
+            self.assertEqual(rows[key]["model_version"], "test-1")
+
+        self.assertIn("0 to score", self.run_command(self.source, output, crop="tomato"))
+
+    def test_zip_with_manifest(self):
+        archive = os.path.join(self.dir, "field.zip")
+        manifest = os.path.join(self.dir, "manifest.csv")
+        with zipfile.ZipFile(archive, "w") as zf, open(manifest, "w") as mf:
+            mf.write("submission,path,crop\n")
+            for i in range(3):
+                name = f"plot-a/{i}.png"
+                zf.write(os.path.join(self.source, name), name)
+                mf.write(f"s1,{name},Tomato\n")
+
+        output = os.path.join(self.dir, "results.csv")
+        self.run_command(archive, output, manifest=manifest)
+        with open(output) as f:
+            lines = f.read().splitlines()
+        self.assertEqual(lines[0].split(",")[:3], ["submission", "image_count", "status"])
+        self.assertTrue(lines[1].startswith("s1,3,healthy,Tomato,Tomato__healthy"))
+
+    def test_leaf_needs_a_crop(self):
+        with self.assertRaises(CommandError):
+            self.run_command(self.source, os.path.join(self.dir, "results.jsonl"))
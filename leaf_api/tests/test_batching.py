@@ -0,0 +1,90 @@
+import threading
+import time
+
+import numpy as np
+from django.test import TestCase
+
+from ..ml.batching import MicroBatcher
+
+BATCH_1 = np.zeros((1, 128, 128, 3), dtype=np.uint8)
+
+class MicroBatcherTests(TestCase):
+    def slow_forward(self, x):
+        time.sleep(0.005)
+        return np.ones((len(x), 3), dtype=np.float32)
+
+    def test_close_while_predicting_never_strands_a_caller(self):
+        batcher = MicroBatcher(self.slow_forward, max_batch=4, timeout_s=5)
+        results = []
+
+        def call():
+            try:
+                results.append(batcher.predict(np.zeros((2, 128, 128, 3), dtype=np.uint8)).shape)
+            except Exception as e:
+                results.append(e)
+
+        threads = [threading.Thread(target=call) for _ in range(20)]
+        for thread in threads[:10]:
+            thread.start()
+        batcher.close()
+        for thread in threads[10:]:
+            thread.start()
+        for thread in threads:
+            thread.join(5)
+
+        self.assertEqual(results, [(2, 3)] * 20)
+        batcher._thread.join(1)
+        self.assertFalse(batcher._thread.is_alive())
+
+    def test_wait_times_out(self):
+        batcher = MicroBatcher(lambda x: time.sleep(0.5) or np.ones((len(x), 3)), timeout_s=0.05)
+        self.addCleanup(batcher.close)
+        with self.assertRaises(TimeoutError):
+            batcher.predict(np.zeros((1, 128, 128, 3), dtype=np.uint8))
+
+    def test_each_caller_gets_its_own_rows(self):
+        batcher = MicroBatcher(lambda x: x.reshape(len(x), -1)[:, :1], max_batch=8, max_wait_ms=20)
+        self.addCleanup(batcher.close)
+        results = {}
+
+        def call(value):
+            rows = np.full((value, 128, 128, 3), value, dtype=np.uint8)
+            results[value] = batcher.predict(rows)
+
+        threads = [threading.Thread(target=call, args=(value,)) for value in (1, 2, 3)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join(5)
+
+        for value in (1, 2, 3):
+            np.testing.assert_allclose(results[value], np.full((value, 1), value / 255.0), rtol=1e-6)
+
+    def test_timed_out_job_is_not_scored(self):
+        release = threading.Event()
+        scored = []
+
+        def forward(x):
+            scored.append(len(x))
+            release.wait(5)
+            return np.ones((len(x), 3), dtype=np.float32)
+
+        def first_caller():
+            try:
+                batcher.predict(BATCH_1)
+            except TimeoutError:
+                pass
+
+        batcher = MicroBatcher(forward, max_batch=1, timeout_s=0.05)
+        self.addCleanup(batcher.close)
+        running = threading.Thread(target=first_caller)
+        running.start()
+        time.sleep(0.01)
+        with self.assertRaises(TimeoutError):
+            batcher.predict(BATCH_1)  # queued behind the blocked batch
+        release.set()
+        running.join(5)
+
+        batcher.close()
+        batcher._thread.join(5)
+        self.assertEqual(scored, [1])
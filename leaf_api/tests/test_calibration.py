@@ -0,0 +1,93 @@
+import json
+import os
+import shutil
+import tempfile
+from unittest import mock
+
+import numpy as np
+from django.test import SimpleTestCase, override_settings
+
+from ..ml import calibration as calibration_module
+from ..ml.calibration import Calibration, get_calibration
+from ..ml.leaf_engine import CLASS_NAMES, LeafModel
+from .fakes import OK, make_engine, one_hot
+
+
+class CalibrationTests(SimpleTestCase):
+    def test_identity(self):
+        identity = Calibration("none")
+        preds = np.array([[0.7, 0.2, 0.1]], dtype=np.float32)
+        np.testing.assert_array_equal(identity.probabilities(preds), preds)
+        self.assertEqual(identity.confidence(87.5), 87.5)
+
+    def test_temperature_keeps_the_argmax_and_softens(self):
+        preds = np.array([[0.8, 0.15, 0.05], [0.1, 0.3, 0.6]], dtype=np.float32)
+        scaled = Calibration("t2", temperature=2.0).probabilities(preds)
+
+        np.testing.assert_allclose(scaled.sum(axis=1), 1.0, rtol=1e-6)
+        self.assertEqual(scaled.argmax(axis=1).tolist(), [0, 2])
+        self.assertTrue(np.all(scaled.max(axis=1) < preds.max(axis=1)))
+        # p ** (1 / T), renormalized
+        expected = np.sqrt(preds[0]) / np.sqrt(preds[0]).sum()
+        np.testing.assert_allclose(scaled[0], expected, rtol=1e-5)
+
+    def test_confidence_map(self):
+        calibration = Calibration("v", confidence_points=[[0, 0], [90, 90], [100, 95]])
+        self.assertEqual(calibration.confidence(50), 50)
+        self.assertEqual(calibration.confidence(95), 92.5)
+        np.testing.assert_allclose(calibration.confidence(np.array([90, 100])), [90, 95])
+
+    def test_invalid(self):
+        for kwargs in (
+            {"temperature": 0},
+            {"confidence_points": [[0, 0]]},
+            {"confidence_points": [[0, 0], [50, 60], [40, 70]]},
+            {"confidence_points": [[0, 50], [100, 40]]},
+        ):
+            with self.subTest(kwargs), self.assertRaises(ValueError):
+                Calibration("bad", **kwargs)
+
+    def test_engine_reports_calibrated_confidence(self):
+        rows = [one_hot(CLASS_NAMES, "Tomato__Early_blight", 0.96)] * 3
+        engine = make_engine(LeafModel(), rows)
+        calibration = Calibration("v2", confidence_points=[[0, 0], [90, 90], [100, 95]])
+        details = {}
+        result = engine.evaluate(
+            [OK] * 3, [0, 1, 2], np.asarray(rows), calibration, crop="Tomato", details=details
+        )
+
+        self.assertEqual(result["confidence"], 93.0)
+        self.assertEqual(details["calibration_version"], "v2")
+
+
+class CalibrationLookupTests(SimpleTestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.dir, ignore_errors=True)
+        model_dir = override_settings(MODEL_DIR=self.dir)
+        model_dir.enable()
+        self.addCleanup(model_dir.disable)
+        patcher = mock.patch.dict(calibration_module._cache, clear=True)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.default = Calibration("builtin")
+
+    def write(self, spec, *parts):
+        directory = os.path.join(self.dir, "leaf", *parts)
+        os.makedirs(directory, exist_ok=True)
+        with open(os.path.join(directory, "calibration.json"), "w") as f:
+            f.write(spec if isinstance(spec, str) else json.dumps(spec))
+
+    def test_version_file_then_model_file_then_default(self):
+        self.assertIs(get_calibration("leaf", "v1", self.default), self.default)
+
+        self.write({"version": "shared", "temperature": 1.5})
+        self.write({"version": "for-v3"}, "v3")
+        self.assertEqual(get_calibration("leaf", "v2", self.default).version, "shared")
+        self.assertEqual(get_calibration("leaf", "v3", self.default).version, "for-v3")
+        self.assertIs(get_calibration("leaf", "v1", self.default), self.default)  # cached per version
+
+    def test_bad_file_falls_back(self):
+        self.write("{not json", "v1")
+        with self.assertLogs("leaf_api.ml.calibration", "ERROR"):
+            self.assertIs(get_calibration("leaf", "v1", self.default), self.default)
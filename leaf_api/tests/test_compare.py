@@ -0,0 +1,137 @@
+import json
+import shutil
+import tempfile
+import threading
+import time
+from types import SimpleNamespace
+from unittest import mock
+
+import numpy as np
+from django.test import SimpleTestCase, TestCase, override_settings
+
+from ..ml import leaf_engine
+from ..ml.compare import Backend, load_backend, parse_backends, replay
+from ..ml.tensor_store import TensorStoreWriter
+from ..models import ImageResult, Submission
+from ..shadow import ShadowRunner
+from .fakes import OK, fake_registry
+from .test_tensor_store import FakeModel, tensor
+
+
+def backend(spec, model):
+    return Backend(spec, lambda x: model.predict_on_batch(x), 0.0, 0)
+
+
+class BackendTests(SimpleTestCase):
+    def test_parse(self):
+        self.assertEqual(
+            parse_backends(" leaf=tflite:/m/leaf.tflite, areca_coconut=version:v5,"),
+            {"leaf": "tflite:/m/leaf.tflite", "areca_coconut": "version:v5"},
+        )
+
+    def test_load(self):
+        model = mock.Mock()
+        registry = SimpleNamespace(
+            active=SimpleNamespace(model=model), model_path=lambda version: f"/models/leaf/{version}/model.h5"
+        )
+        with mock.patch("leaf_api.ml.compare.load_model", return_value=(model, "fast")) as load, \
+                mock.patch("leaf_api.ml.compare.current_rss", side_effect=[100, 150]):
+            b = load_backend("version:v5", registry)
+        load.assert_called_once_with("/models/leaf/v5/model.h5")
+        self.assertEqual((b.spec, b.load_rss), ("version:v5", 50))
+        model.predict_on_batch.assert_called_once()  # warmed up
+
+        self.assertIs(load_backend("active", registry).predict, model.predict_on_batch)
+        with self.assertRaises(ValueError):
+            load_backend("onnx:/m.onnx", registry)
+
+
+@override_settings(MODEL_DIR="/nonexistent")
+class ReplayTests(TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.dir, ignore_errors=True)
+        store = override_settings(TENSOR_STORE_DIR=self.dir)
+        store.enable()
+        self.addCleanup(store.disable)
+
+        writer = TensorStoreWriter(self.dir)
+        writer.append("leaf", ["h1", "h2", "h3", "b1"], [tensor(1)] * 3 + [tensor(2)])
+        writer.close()
+
+        submission = Submission.objects.create(
+            endpoint="leaf", crop="Tomato", status="healthy", latency_ms=1.0, model_version="test-1"
+        )
+        for position, image_hash in enumerate(["h1", "h2", "h3"]):
+            ImageResult.objects.create(submission=submission, position=position, image_hash=image_hash,
+                                       model_version="test-1")
+        # Not every image stored: left out of the per-submission comparison
+        partial = Submission.objects.create(
+            endpoint="leaf", crop="Tomato", status="healthy", latency_ms=1.0, model_version="test-1"
+        )
+        for position, image_hash in enumerate(["b1", "missing"]):
+            ImageResult.objects.create(submission=partial, position=position, image_hash=image_hash,
+                                       model_version="test-1")
+
+    def test_same_model(self):
+        report = replay(leaf_engine, backend("a", FakeModel()), backend("b", FakeModel()))
+        self.assertEqual((report["images"], report["label_agreement"], report["submissions"]), (4, 1.0, 1))
+        self.assertEqual((report["status_changed"], report["final_label_changed"]), (0, 0))
+        self.assertEqual(report["backends"]["a"]["batches"], 1)
+
+    def test_changed_model(self):
+        report = replay(leaf_engine, backend("a", FakeModel()), backend("b", FakeModel(flip=True)))
+        self.assertEqual(report["label_agreement"], 0.25)
+        self.assertEqual(report["label_transitions"], [["Tomato__healthy", "Tomato__Early_blight", 3]])
+        self.assertEqual(report["status_transitions"], [["healthy", "disease_confirmed", 1]])
+
+
+class ShadowTests(SimpleTestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.dir, ignore_errors=True)
+        self.log = f"{self.dir}/shadow.jsonl"
+
+    def live(self):
+        """details / result of a served healthy tomato submission"""
+        batch = np.stack([tensor(1)] * 3)
+        model = FakeModel()
+        registry = fake_registry(lambda x: model.predict_on_batch(np.asarray(x) / 255.0))
+        with mock.patch.object(leaf_engine.engine, "registry", registry):
+            details = {}
+            result = leaf_engine.predict_batch(batch, [OK] * 3, None, "Tomato", details)
+        return details, result
+
+    def compare(self, model):
+        runner = ShadowRunner({"leaf": "keras:/candidate.h5"})
+        runner._backends["leaf"] = backend("keras:/candidate.h5", model)
+        details, result = self.live()
+        with self.settings(SHADOW_LOG_FILE=self.log):
+            return runner.compare("leaf", "Tomato", details, result["status"])
+
+    def test_agreeing_candidate(self):
+        event = self.compare(FakeModel())
+        self.assertEqual((event["images"], event["labels_matched"]), (3, 3))
+        self.assertEqual((event["live_status"], event["shadow_status"]), ("healthy", "healthy"))
+        with open(self.log) as f:
+            self.assertEqual(json.loads(f.read())["shadow"], "keras:/candidate.h5")
+
+    def test_disagreeing_candidate(self):
+        event = self.compare(FakeModel(flip=True))
+        self.assertEqual(event["labels_matched"], 0)
+        self.assertEqual((event["shadow_status"], event["shadow_label"]), ("disease_confirmed", "Tomato__Early_blight"))
+
+    def test_full_queue_drops_samples(self):
+        busy = threading.Event()
+        done = []
+        runner = ShadowRunner({"leaf": "active"}, max_queue=1)
+        with mock.patch.object(runner, "compare", side_effect=lambda *job: done.append(busy.wait(5))), \
+                mock.patch("leaf_api.shadow.metrics.inc") as inc:
+            for _ in range(4):
+                runner.submit("leaf", "Tomato", {}, {"status": "healthy"})
+            busy.set()
+            while runner._queue.unfinished_tasks > len(done):
+                time.sleep(0.01)
+        dropped = [c for c in inc.call_args_list if c.args[0] == "leaf_api_shadow_dropped"]
+        # At most one sample running and one queued
+        self.assertEqual(len(dropped), 4 - runner._queue.unfinished_tasks)
@@ -0,0 +1,159 @@
+import os
+import shutil
+import tempfile
+import uuid
+from unittest import mock
+
+import numpy as np
+from django.test import SimpleTestCase, override_settings
+
+from ..ml import embeddings
+from ..ml.chunk_writer import ChunkedWriter
+from ..ml.embeddings import (
+    EmbeddingIndex, EmbeddingWriter, attach_similar_cases, build_index, get_index, normalize, read_raw,
+    split_outputs,
+)
+
+
+def unit(*values):
+    return normalize(np.array(values, dtype=np.float32))
+
+
+class TempDirTestCase(SimpleTestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.dir, ignore_errors=True)
+
+
+class ChunkedWriterTests(TempDirTestCase):
+    def test_rows_chunks_and_index(self):
+        writer = ChunkedWriter(self.dir, "rows", np.int16, chunk_rows=2)
+        writer.write_rows([("a", 1), ("b", 2), ("c", 3)], [[1, 2], [3, 4], [5, 6]])
+        writer.write_rows([("d", 4)], [[7, 8, 9]])  # another shape: new chunk
+        writer.write_rows([], [])
+        writer.close()
+
+        with open(os.path.join(self.dir, f"index-{writer.writer_id}.tsv")) as f:
+            lines = [line.rstrip("\n").split("\t") for line in f]
+        chunks = [f"rows-{writer.writer_id}-{n}.npy" for n in range(3)]
+        self.assertEqual(lines, [
+            ["a", "1", chunks[0], "0"], ["b", "2", chunks[0], "1"],
+            ["c", "3", chunks[1], "0"], ["d", "4", chunks[2], "0"],
+        ])
+
+        first = np.load(os.path.join(self.dir, chunks[0]))
+        self.assertEqual((first.dtype, first.shape), (np.int16, (2, 2)))
+        self.assertEqual(first.tolist(), [[1, 2], [3, 4]])
+        self.assertEqual(np.load(os.path.join(self.dir, chunks[2])).shape, (2, 3))
+
+
+class HelperTests(SimpleTestCase):
+    def test_normalize(self):
+        np.testing.assert_allclose(normalize([[3, 4], [0, 0]]), [[0.6, 0.8], [0, 0]])
+
+    def test_split_outputs(self):
+        preds = np.arange(10, dtype=np.float32).reshape(2, 5)
+        probs, features = split_outputs(preds, 3)
+        self.assertEqual((probs.shape, features.shape), ((2, 3), (2, 2)))
+        self.assertIsNone(split_outputs(preds, 5)[1])
+        self.assertIsNone(split_outputs(preds, None)[1])
+
+
+class IndexTests(TempDirTestCase):
+    def setUp(self):
+        super().setUp()
+        self.raw = os.path.join(self.dir, "raw")
+        self.ids = [str(uuid.UUID(int=i + 1)) for i in range(4)]
+
+        writer = EmbeddingWriter(self.raw, chunk_rows=3)
+        writer.append(self.ids[0], "Tomato__healthy", "healthy", [unit(1, 0, 0), unit(1, 0.1, 0)])
+        writer.append(self.ids[1], "Tomato__healthy", "healthy", [unit(0.9, 0.2, 0)])
+        writer.append(self.ids[2], "Tomato__Early_blight", "disease_confirmed", [unit(0, 1, 0)])
+        writer.append(self.ids[3], "Tomato__Late_blight", "disease_confirmed", [unit(0, 0, 1)])
+        writer.close()
+
+    def test_read_raw(self):
+        with open(os.path.join(self.raw, "index-torn.tsv"), "w") as f:
+            f.write("half\ta line")
+        entries = read_raw(self.raw)
+        self.assertEqual(len(entries), 5)
+        self.assertEqual(entries[0][:3], (self.ids[0], "Tomato__healthy", "healthy"))
+        self.assertEqual([e[5] for e in entries], [0, 1, 2, 0, 1])
+
+    def test_exact_search(self):
+        directory, rows, lists = build_index(self.dir)
+        self.assertEqual((rows, lists), (5, 1))
+        with open(os.path.join(self.dir, "CURRENT")) as f:
+            self.assertEqual(f.read().strip(), os.path.basename(directory))
+
+        index = EmbeddingIndex(directory)
+        cases = index.similar_cases(unit(1, 0, 0), k=2)
+        # Two rows of the first submission: listed once
+        self.assertEqual([c["submission_id"] for c in cases], self.ids[:2])
+        self.assertEqual(cases[0]["label"], "Tomato__healthy")
+        self.assertAlmostEqual(cases[0]["similarity"], 1.0, places=2)
+
+        cases = index.similar_cases(unit(1, 0, 0), k=2, exclude=self.ids[0])
+        self.assertEqual([c["submission_id"] for c in cases], [self.ids[1], self.ids[2]])
+
+    def test_inverted_lists(self):
+        directory, _, lists = build_index(self.dir, lists=3)
+        index = EmbeddingIndex(directory)
+        self.assertEqual(lists, 3)
+        self.assertEqual(int(index.offsets[-1]), 5)
+
+        # One probe: only the list of the query's cluster is scored
+        rows, scores = index.search_rows(unit(0, 0, 1), k=5, nprobe=1)
+        self.assertEqual(index.statuses[int(index.meta[rows[0]]["status"])], "disease_confirmed")
+        self.assertEqual(len(rows), 1)
+        self.assertEqual(len(index.search_rows(unit(0, 0, 1), k=5, nprobe=3)[0]), 5)
+
+    def test_nothing_stored(self):
+        self.assertIsNone(build_index(os.path.join(self.dir, "empty")))
+
+
+@override_settings(EMBEDDINGS_ENABLED=True, SIMILAR_CASES_K=3, EMBEDDING_RELOAD_S=0)
+class AttachSimilarCasesTests(TempDirTestCase):
+    def setUp(self):
+        super().setUp()
+        store = override_settings(EMBEDDING_DIR=self.dir)
+        store.enable()
+        self.addCleanup(store.disable)
+        for patcher in (mock.patch.dict(embeddings._writers, clear=True),
+                        mock.patch.dict(embeddings._indexes, clear=True)):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def submit(self, status, label="Tomato__healthy"):
+        details = {
+            "label": label,
+            "model_version": "v1",
+            "images": [{"label": "Tomato__healthy"}, {"label": "Tomato__Early_blight"}],
+            "tensor_rows": [0, 1],
+            "embeddings": np.array([[2, 0, 0], [0, 3, 0]], dtype=np.float32),
+        }
+        result = {"status": status, "submission_id": str(uuid.uuid4())}
+        attach_similar_cases("leaf", details, result)
+        return result
+
+    def test_confirmed_voters_are_indexed_then_found(self):
+        first = self.submit("healthy")
+        self.submit("early_risk")  # not confirmed: searched, never stored
+        self.assertNotIn("similar_cases", first)
+        self.assertIsNone(get_index("leaf", "v1"))
+
+        for writer in embeddings._writers.values():
+            writer.close()
+        entries = read_raw(os.path.join(self.dir, "leaf", "v1", "raw"))
+        self.assertEqual([(e[0], e[2]) for e in entries], [(first["submission_id"], "healthy")])
+
+        build_index(os.path.join(self.dir, "leaf", "v1"))
+        cases = self.submit("early_risk")["similar_cases"]
+        self.assertEqual([c["submission_id"] for c in cases], [first["submission_id"]])
+        self.assertAlmostEqual(cases[0]["similarity"], 1.0, places=2)
+
+    def test_disabled_or_no_voters(self):
+        with self.settings(EMBEDDINGS_ENABLED=False):
+            self.assertNotIn("similar_cases", self.submit("healthy"))
+        self.submit("healthy", label="Tomato__Late_blight")
+        self.assertEqual(embeddings._writers, {})
@@ -0,0 +1,103 @@
+from django.test import TestCase
+
+from ..ml.areca_coconut_engine import ArecaCoconutModel
+from ..ml.engine import CropModel
+from ..ml.leaf_engine import CLASS_NAMES as LEAF_CLASSES, LeafModel
+from .fakes import BATCH, OK, make_engine, one_hot
+
+
+class LeafVerdictTests(TestCase):
+    def predict(self, rows, reports=(OK, OK, OK), crop="Tomato"):
+        details = {}
+        result = make_engine(LeafModel(), rows).predict_batch(BATCH, list(reports), details, crop=crop)
+        return result, details
+
+    def test_poor_quality(self):
+        bad = (True, False, "Image too dark")
+        result, details = self.predict([], reports=(bad, bad, OK))
+        self.assertEqual(result["status"], "error")
+        self.assertEqual(len(result["quality_issues"]), 2)
+        self.assertNotIn("label", details)
+
+    def test_wrong_crop(self):
+        row = one_hot(LEAF_CLASSES, "Tomato__Early_blight", 0.85)
+        result, details = self.predict([row] * 3, crop="Grape")
+        self.assertEqual(result["status"], "early_risk")
+        self.assertEqual(result["message"], "Images don't appear to be Grape leaves")
+        self.assertNotIn("label", details)
+
+    def test_disease_confirmed(self):
+        row = one_hot(LEAF_CLASSES, "Tomato__Early_blight", 0.85)
+        result, details = self.predict([row] * 3)
+        self.assertEqual(result["status"], "disease_confirmed")
+        self.assertEqual(result["disease"], "Early blight")
+        self.assertEqual(details["label"], "Tomato__Early_blight")
+        self.assertEqual(details["model_version"], "test-1")
+
+    def test_early_risk(self):
+        row = one_hot(LEAF_CLASSES, "Tomato__Early_blight", 0.6)
+        result, details = self.predict([row] * 3)
+        self.assertEqual(result["status"], "early_risk")
+        self.assertEqual(result["possible_disease"], "Early blight")
+
+    def test_healthy(self):
+        row = one_hot(LEAF_CLASSES, "Tomato__healthy", 0.9)
+        result, details = self.predict([row] * 3)
+        self.assertEqual(result["status"], "healthy")
+        self.assertEqual(result["crop"], "Tomato")
+
+    def test_votes_only_for_the_requested_crop(self):
+        tomato = one_hot(LEAF_CLASSES, "Tomato__Early_blight", 0.85)
+        potato = one_hot(LEAF_CLASSES, "Potato__Late_blight", 0.85)
+        result, details = self.predict([tomato, tomato, potato])
+        self.assertEqual(details["label"], "Tomato__Early_blight")
+
+
+class ArecaVerdictTests(TestCase):
+    def predict(self, rows, reports=(OK, OK, OK)):
+        details = {}
+        result = make_engine(ArecaCoconutModel(), rows).predict_batch(BATCH, list(reports), details)
+        return result, details
+
+    def test_unclear(self):
+        unreadable = (False, False, "Unreadable image")
+        result, details = self.predict([], reports=(unreadable,) * 3)
+        self.assertEqual(result["status"], "early_risk")
+        self.assertEqual(result["message"], "Images are unclear or not leaf-related")
+
+    def test_healthy(self):
+        row = one_hot(ArecaCoconutModel.class_names, "Coconut_Healthy", 0.9)
+        result, details = self.predict([row] * 3)
+        self.assertEqual(result["status"], "healthy")
+        self.assertEqual(result["crop"], "Coconut")
+
+    def test_disease_confirmed(self):
+        row = one_hot(ArecaCoconutModel.class_names, "Arecanut_Disease", 0.85)
+        result, details = self.predict([row] * 3)
+        self.assertEqual(result["status"], "disease_confirmed")
+        self.assertEqual(result["crop"], "Arecanut")
+
+
+class CropModelDeclarationTests(TestCase):
+    def test_missing_hook_fails_at_instantiation(self):
+        class NoAdvice(CropModel):
+            def unclear_response(self):
+                return {}
+
+        with self.assertRaises(TypeError):
+            NoAdvice()
+
+    def test_flagged_hook_is_required(self):
+        class NamesCrop(CropModel):
+            requires_crop = True
+
+            def unclear_response(self):
+                return {}
+
+            def advise(self, vote):
+                return {}
+
+        with self.assertRaises(TypeError):
+            NamesCrop()
+        NamesCrop.requires_crop = False
+        self.assertIsInstance(NamesCrop(), CropModel)
@@ -0,0 +1,112 @@
+import os
+import shutil
+import socket
+import stat
+import tempfile
+import threading
+from types import SimpleNamespace
+from unittest import mock
+
+import numpy as np
+from django.test import SimpleTestCase
+
+from ..ml import inference_server
+from ..ml.inference_server import InferenceServer, RemoteRegistry, bind, recv_msg, send_msg, served_models
+
+
+class FakeRegistry:
+    """Scores each image as its mean pixel value, in two columns"""
+
+    def __init__(self, version):
+        self.active = SimpleNamespace(version=version, classes=2, batcher=self)
+
+    def predict(self, batch):
+        means = batch.reshape(len(batch), -1).mean(axis=1)
+        return np.stack([means, -means], axis=1)
+
+    def describe(self):
+        return {"active": self.active.version}
+
+
+class FramingTests(SimpleTestCase):
+    def test_round_trip(self):
+        a, b = socket.socketpair()
+        self.addCleanup(a.close)
+        self.addCleanup(b.close)
+
+        send_msg(a, {"op": "predict", "n": 2}, b"\x00" * 70000)
+        header, payload = recv_msg(b)
+        self.assertEqual((header["op"], header["n"], header["payload"]), ("predict", 2, 70000))
+        self.assertEqual(len(payload), 70000)
+
+    def test_closed_socket(self):
+        a, b = socket.socketpair()
+        self.addCleanup(b.close)
+        a.close()
+        with self.assertRaises(ConnectionError):
+            recv_msg(b)
+
+
+class InferenceServerTests(SimpleTestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.dir, ignore_errors=True)
+        self.path = os.path.join(self.dir, "inference.sock")
+
+    def serve(self):
+        # Server and client share this process, and with it one resource
+        # tracker entry per segment: leave it to the client's unlink
+        patcher = mock.patch.object(inference_server, "resource_tracker")
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        listener = bind(self.path)
+        self.addCleanup(listener.close)
+        server = InferenceServer({"leaf": FakeRegistry("v7")})
+        threading.Thread(target=server.serve_forever, args=(listener,), daemon=True).start()
+
+        client = RemoteRegistry("leaf", self.path)
+        self.addCleanup(client._release_segments)
+        self.addCleanup(client._drop_connection)
+        return client
+
+    def test_served_models_follow_the_engines(self):
+        self.assertEqual(served_models(), {
+            "leaf": "leaf_model.h5",
+            "areca_coconut": "arecanut_coconut_leaf_model.h5",
+        })
+
+    def test_socket_is_private(self):
+        bind(self.path).close()
+        self.assertEqual(stat.S_IMODE(os.stat(self.path).st_mode), 0o600)
+
+    def test_predict_through_shared_memory(self):
+        client = self.serve()
+        self.assertEqual(client.describe()["active"], "v7")
+
+        batch = np.stack([np.full((128, 128, 3), v, dtype=np.uint8) for v in (1, 2, 3)])
+        preds = client.predict(batch)
+        np.testing.assert_allclose(preds, [[1, -1], [2, -2], [3, -3]])
+        self.assertEqual((client.active.version, client.active.classes), ("v7", 2))
+
+        # A bigger batch grows this thread's segment
+        preds = client.predict(np.ones((20, 128, 128, 3), dtype=np.uint8))
+        self.assertEqual(preds.shape, (20, 2))
+        self.assertEqual(len(client._segments), 1)
+
+    def test_server_errors_are_raised(self):
+        client = self.serve()
+        client.name = "missing"
+        with self.assertLogs(inference_server.logger, "ERROR"), self.assertRaises(RuntimeError):
+            client.describe()
+
+    def test_failed_connection_is_closed_before_retrying(self):
+        client = RemoteRegistry("leaf", self.path)
+        broken = mock.Mock()
+        broken.sendall.side_effect = socket.timeout()
+        client._local.conn = broken
+
+        with self.assertRaises(OSError):
+            client.describe()  # no server: the reconnect fails too
+        broken.close.assert_called_once_with()
+        self.assertIsNone(client._local.conn)
@@ -0,0 +1,126 @@
+import json
+import shutil
+import tempfile
+import uuid
+from unittest import mock
+
+from django.test import SimpleTestCase, override_settings
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+
+from ..localization import AdvisoryJSONRenderer, negotiate_locale, served_locales
+from ..ml import advisory, leaf_engine
+from ..ml.advisory import Catalog, compile_model, install_catalog, localize
+from ..ml.engine import Vote
+from ..views import LeafHealthAPIView
+from .fakes import fake_registry, one_hot
+from .test_tensor_upload import STATS, part
+
+KANNADA = {
+    "Tomato leaves appear healthy": "ಟೊಮೆಟೊ ಎಲೆಗಳು ಆರೋಗ್ಯಕರವಾಗಿವೆ",
+    "Continue regular irrigation": "ನಿಯಮಿತ ನೀರಾವರಿ ಮುಂದುವರಿಸಿ",
+    "Prediction agreement: {}%": "ಮುನ್ಸೂಚನೆ ಒಪ್ಪಿಗೆ: {}%",
+}
+
+
+def request(path="/", **headers):
+    return Request(APIRequestFactory().get(path, **headers))
+
+
+class LocalizationTestCase(SimpleTestCase):
+    """Empty LOCALE_DIR; catalogs and fragments put back after each test"""
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.dir, ignore_errors=True)
+        locales = override_settings(LOCALE_DIR=self.dir, ADVISORY_LOCALES="en,kn,hi")
+        locales.enable()
+        self.addCleanup(locales.disable)
+        for patcher in (mock.patch.dict(advisory._catalogs, clear=True), mock.patch.dict(advisory._fragments)):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def install_kannada(self):
+        install_catalog("kn", KANNADA)
+        compile_model(leaf_engine.engine.model)
+
+
+class NegotiateLocaleTests(LocalizationTestCase):
+    def test_without_catalogs_everything_is_english(self):
+        with self.assertLogs("leaf_api.ml.advisory", "WARNING"):
+            self.assertEqual(served_locales(), ["en"])
+            self.assertEqual(negotiate_locale(request("/?lang=kn")), "en")
+            self.assertEqual(negotiate_locale(request(HTTP_ACCEPT_LANGUAGE="kn,hi;q=0.8")), "en")
+
+    def test_served_locales(self):
+        self.install_kannada()
+        install_catalog("hi", {})
+        self.assertEqual(served_locales(), ["en", "kn"])
+
+        self.assertEqual(negotiate_locale(request("/?lang=kn-IN")), "kn")
+        self.assertEqual(negotiate_locale(request("/?lang=hi", HTTP_ACCEPT_LANGUAGE="kn")), "en")
+        self.assertEqual(negotiate_locale(request(HTTP_ACCEPT_LANGUAGE="hi, kn-IN;q=0.8, en;q=0.5")), "kn")
+        self.assertEqual(negotiate_locale(request(HTTP_ACCEPT_LANGUAGE="kn;q=0, en;q=0.1")), "en")
+        self.assertEqual(negotiate_locale(request(HTTP_ACCEPT_LANGUAGE="kn;q=bad")), "en")
+
+
+class CatalogTests(SimpleTestCase):
+    def test_strings_and_templates(self):
+        catalog = Catalog("kn", dict(KANNADA, **{"Untranslated": ""}))
+        self.assertEqual(catalog.translate(["Continue regular irrigation", "Other"]),
+                         ["ನಿಯಮಿತ ನೀರಾವರಿ ಮುಂದುವರಿಸಿ", "Other"])
+        self.assertEqual(catalog.translate_text("Prediction agreement: 67%"), "ಮುನ್ಸೂಚನೆ ಒಪ್ಪಿಗೆ: 67%")
+        # Templates are only for per-request text
+        self.assertEqual(catalog.translate("Prediction agreement: 67%"), "Prediction agreement: 67%")
+        self.assertEqual(catalog.translate_text("Untranslated"), "Untranslated")
+
+
+class LocalizeTests(LocalizationTestCase):
+    def english(self):
+        vote = Vote("Tomato__healthy", 90.0, 1.0, "Tomato")
+        return leaf_engine.engine.model.advise(vote)
+
+    def test_fragment_renders_like_a_plain_dict(self):
+        self.install_kannada()
+        english = self.english()
+        localized = localize(leaf_engine.MODEL_NAME, english, "Tomato__healthy", "kn")
+
+        self.assertEqual(localized["message"], KANNADA["Tomato leaves appear healthy"])
+        self.assertEqual(localized["status"], "healthy")
+        self.assertTrue(localized.static)
+        localized["submission_id"] = "abc"
+        rendered = AdvisoryJSONRenderer().render(localized)
+        self.assertEqual(json.loads(rendered), dict(localized))
+
+    def test_uncompiled_advisories_are_translated_per_response(self):
+        self.install_kannada()
+        result = {"status": "early_risk", "message": "Tomato leaves appear healthy"}
+        localized = localize(leaf_engine.MODEL_NAME, result, None, "kn")
+        self.assertEqual(localized.static, set())
+        self.assertEqual(localized["message"], KANNADA["Tomato leaves appear healthy"])
+
+
+@override_settings(STREAMING_UPLOAD_DECODE=False)
+class LocalizedResponseTests(LocalizationTestCase):
+    def post(self, path):
+        data = {"crop": "tomato", "tensors": [part() for _ in range(3)], "stats": json.dumps([STATS] * 3)}
+        healthy = one_hot(leaf_engine.CLASS_NAMES, "Tomato__healthy", 0.9)
+        with mock.patch.object(leaf_engine.engine, "registry", fake_registry(lambda x: [healthy] * len(x))), \
+                mock.patch("leaf_api.views.record_prediction", return_value=uuid.uuid4()):
+            response = LeafHealthAPIView.as_view()(APIRequestFactory().post(path, data, format="multipart"))
+        response.render()
+        return response
+
+    def test_falls_back_to_english(self):
+        with self.assertLogs("leaf_api.ml.advisory", "WARNING"):
+            response = self.post("/?lang=kn")
+        self.assertEqual(response["Content-Language"], "en")
+        self.assertEqual(json.loads(response.content)["message"], "Tomato leaves appear healthy")
+
+    def test_kannada(self):
+        self.install_kannada()
+        response = self.post("/?lang=kn")
+        self.assertEqual(response["Content-Language"], "kn")
+        body = json.loads(response.content)
+        self.assertEqual(body["message"], KANNADA["Tomato leaves appear healthy"])
+        self.assertEqual(body["status"], "healthy")
@@ -0,0 +1,77 @@
+import os
+import shutil
+import tempfile
+from unittest import mock
+
+from django.test import SimpleTestCase
+
+from ..ml import planner
+
+
+class CgroupTests(SimpleTestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.dir, ignore_errors=True)
+
+    def cpu_max(self, content):
+        path = os.path.join(self.dir, "cpu.max")
+        with open(path, "w") as f:
+            f.write(content)
+        return mock.patch.object(planner, "CGROUP_V2_CPU_MAX", path)
+
+    def test_quota(self):
+        with self.cpu_max("250000 100000\n"):
+            self.assertEqual(planner.cgroup_cpu_limit(), 2.5)
+
+    def test_unlimited(self):
+        with self.cpu_max("max 100000\n"):
+            self.assertIsNone(planner.cgroup_cpu_limit())
+
+    def test_quota_caps_affinity(self):
+        with mock.patch.object(planner, "cgroup_cpu_limit", return_value=2.5), \
+                mock.patch("os.sched_getaffinity", return_value=set(range(16))):
+            self.assertEqual(planner.available_cores(), (3, 16, 2.5))
+
+
+@mock.patch.dict(os.environ, {}, clear=True)
+class PlanTests(SimpleTestCase):
+    def test_small_machine_has_one_worker(self):
+        plan = planner.plan_runtime(cores=2)
+        self.assertEqual((plan["workers"], plan["intra_op_threads"], plan["decode_pool_workers"]), (1, 2, 2))
+
+    def test_threads_never_oversubscribe(self):
+        for cores in (4, 6, 8, 16):
+            plan = planner.plan_runtime(cores=cores)
+            self.assertLessEqual(plan["workers"] * plan["intra_op_threads"], cores)
+            self.assertGreaterEqual(plan["intra_op_threads"], 2)
+            self.assertEqual(plan["inter_op_threads"], 1)
+
+    def test_environment_overrides(self):
+        with mock.patch.dict(os.environ, {"WEB_CONCURRENCY": "3", "TF_INTRA_OP_THREADS": "5"}):
+            plan = planner.plan_runtime(cores=8)
+        self.assertEqual((plan["workers"], plan["intra_op_threads"]), (3, 5))
+
+
+class AutotuneTests(SimpleTestCase):
+    def test_largest_batch_within_the_latency_target(self):
+        clock = [0.0]
+
+        def predict(x):
+            clock[0] += 0.004 + 0.001 * len(x)  # 4 ms overhead + 1 ms per image
+
+        with mock.patch.object(planner.time, "perf_counter", lambda: clock[0]):
+            size, trials = planner.autotune_batch_size(predict, latency_target_ms=15, rounds=2)
+
+        self.assertEqual(size, 8)
+        # 16 images took 20 ms: nothing larger was tried
+        self.assertEqual([t["batch_size"] for t in trials], [1, 2, 4, 8, 16])
+
+    def test_falls_back_to_the_smallest_batch(self):
+        clock = [0.0]
+
+        def predict(x):
+            clock[0] += 1.0
+
+        with mock.patch.object(planner.time, "perf_counter", lambda: clock[0]):
+            size, trials = planner.autotune_batch_size(predict, latency_target_ms=15, rounds=1)
+        self.assertEqual((size, len(trials)), (1, 1))
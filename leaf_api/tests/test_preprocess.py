@@ -0,0 +1,87 @@
+import os
+import shutil
+import tempfile
+from unittest import mock
+
+import numpy as np
+from django.test import SimpleTestCase, override_settings
+
+from ..ml import preprocess
+from ..ml.preprocess import DecodePool, check_image_stats
+from .fakes import write_image
+
+
+class ImageQualityTests(SimpleTestCase):
+    def test_gate(self):
+        self.assertEqual(check_image_stats(300, 300, 120), (True, "OK"))
+        self.assertEqual(check_image_stats(199, 300, 120), (False, "Low resolution image"))
+        self.assertFalse(check_image_stats(300, 300, 20)[0])
+        self.assertFalse(check_image_stats(300, 300, 250)[0])
+
+
+class DecodePoolTests(SimpleTestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.dir, ignore_errors=True)
+        unreadable = os.path.join(self.dir, "broken.jpg")
+        with open(unreadable, "wb") as f:
+            f.write(b"not a jpeg")
+        self.paths = [
+            write_image(self.dir, "ok.png", (40, 120, 200)),
+            write_image(self.dir, "dark.png", (5, 5, 5)),
+            write_image(self.dir, "small.png", (40, 120, 200), size=(100, 100)),
+            unreadable,
+        ]
+
+    def pool(self, kind):
+        pool = DecodePool(kind, workers=2)
+        self.addCleanup(pool.shutdown)
+        return pool
+
+    def test_inline_decode(self):
+        batch, reports = self.pool("none").preprocess(self.paths)
+        self.assertEqual(batch.shape, (4, 128, 128, 3))
+        self.assertEqual(reports, [
+            (True, True, "OK"),
+            (True, False, "Image too dark - take in daylight"),
+            (True, False, "Low resolution image"),
+            (False, False, "Unreadable image"),
+        ])
+        # RGB, bottom half of the first image was BGR (40, 120, 200)
+        self.assertEqual(batch[0, -1, -1].tolist(), [200, 120, 40])
+        self.assertFalse(batch[3].any())
+
+    def test_pools_agree(self):
+        expected, expected_reports = self.pool("none").preprocess(self.paths)
+        for kind in ("thread", "process"):
+            pool = self.pool(kind)
+            batch, reports = pool.preprocess(self.paths)
+            np.testing.assert_array_equal(batch, expected)
+            self.assertEqual(reports, expected_reports)
+
+            batch, reports = pool.gather([pool.submit(path) for path in self.paths])
+            np.testing.assert_array_equal(batch, expected)
+            self.assertEqual(reports, expected_reports)
+
+    def test_unknown_kind(self):
+        with self.assertRaises(ValueError):
+            DecodePool("gpu")
+
+
+@override_settings(DECODE_POOL_KIND="none")
+class SharedPoolTests(SimpleTestCase):
+    def setUp(self):
+        patcher = mock.patch.multiple(preprocess, _pool=None, _pool_served=False)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_configure_replaces_an_unserved_pool(self):
+        first = preprocess.configure_pool(workers=1)
+        second = preprocess.configure_pool(workers=3)
+        self.assertIsNot(first, second)
+        self.assertIs(preprocess.get_pool(), second)
+
+    def test_pool_in_use_is_kept(self):
+        served = preprocess.get_pool()
+        self.assertIs(preprocess.configure_pool(workers=3), served)
+        self.assertIs(preprocess.get_pool(), served)
@@ -0,0 +1,76 @@
+import io
+import os
+import shutil
+import tempfile
+import time
+
+from django.core.management import call_command
+from django.test import RequestFactory, SimpleTestCase, override_settings
+from rest_framework.response import Response
+
+from ..profiling import list_captures, profiled, sign, trigger
+
+SECRET = "s3cret"
+
+
+class View:
+    @profiled("leaf")
+    def post(self, request):
+        return Response({"sum": sum(range(1000))})
+
+
+@override_settings(PROFILING_SECRET=SECRET, PROFILING_TOKEN_TTL_S=300, PROFILING_SAMPLE_RATE=0,
+                   PROFILING_MAX_CAPTURES=2, PROFILING_TOP_ALLOCATIONS=5)
+class ProfilingTests(SimpleTestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.dir, ignore_errors=True)
+        patcher = override_settings(PROFILING_DIR=self.dir)
+        patcher.enable()
+        self.addCleanup(patcher.disable)
+
+    def request(self, token=None):
+        headers = {"HTTP_X_PROFILE": token} if token else {}
+        return RequestFactory().post("/", **headers)
+
+    def token(self, age=0):
+        ts = int(time.time()) - age
+        return f"{ts}:{sign(ts)}"
+
+    def test_trigger(self):
+        self.assertEqual(trigger(self.request(self.token())), "header")
+        self.assertIsNone(trigger(self.request()))
+        self.assertIsNone(trigger(self.request(self.token(age=600))))  # expired
+        self.assertIsNone(trigger(self.request(f"{int(time.time())}:{sign(1, 'other')}")))
+        self.assertIsNone(trigger(self.request("garbage")))
+        with self.settings(PROFILING_SECRET=""):
+            self.assertIsNone(trigger(self.request(self.token())))
+        with self.settings(PROFILING_SAMPLE_RATE=1.0):
+            self.assertEqual(trigger(self.request()), "sample")
+
+    def test_capture(self):
+        response = View().post(self.request(self.token()))
+
+        capture_id = response["X-Profile-Id"]
+        self.assertTrue(os.path.exists(os.path.join(self.dir, f"{capture_id}.prof")))
+        [meta] = list_captures(self.dir)
+        self.assertEqual((meta["id"], meta["endpoint"], meta["trigger"], meta["status"]),
+                         (capture_id, "leaf", "header", 200))
+        self.assertLessEqual(len(meta["top_allocations"]), 5)
+
+    def test_unprofiled(self):
+        response = View().post(self.request())
+        self.assertNotIn("X-Profile-Id", response)
+        self.assertEqual(list_captures(self.dir), [])
+
+    def test_rotation_and_summary(self):
+        for _ in range(3):
+            View().post(self.request(self.token()))
+            time.sleep(0.01)  # distinct mtimes
+        self.assertEqual(len(list_captures(self.dir)), 2)
+        self.assertEqual(len([n for n in os.listdir(self.dir) if n.endswith(".prof")]), 2)
+
+        out = io.StringIO()
+        call_command("summarize_profiles", stdout=out)
+        self.assertIn("2 captures", out.getvalue())
+        self.assertIn("Top allocation sites", out.getvalue())
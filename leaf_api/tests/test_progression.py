@@ -0,0 +1,127 @@
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+import numpy as np
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.utils import timezone
+
+from ..ml import leaf_engine
+from ..models import PlotPoint, PlotState
+from ..progression import Observation, advance, compact, compare, observe, record_observation, valid_plot
+
+START = datetime(2026, 3, 2, 8, tzinfo=dt_timezone.utc)  # a Monday
+
+
+def probabilities(healthy, other=None):
+    """Tomato row with `healthy` on Tomato__healthy, the rest on early blight (and `other` on a potato class)"""
+    row = np.zeros(len(leaf_engine.CLASS_NAMES), dtype=np.float32)
+    row[leaf_engine.CLASS_NAMES.index("Tomato__healthy")] = healthy
+    row[leaf_engine.CLASS_NAMES.index("Tomato__Early_blight")] = 1 - healthy
+    if other:
+        row *= 1 - other
+        row[leaf_engine.CLASS_NAMES.index("Potato__Late_blight")] = other
+    return row.tolist()
+
+
+def observation(score, days=0.0, plot="north", embedding=None):
+    return Observation(
+        "leaf", plot, START + timedelta(days=days), "Tomato__Early_blight", "disease_confirmed",
+        score, [], embedding
+    )
+
+
+class ObserveTests(SimpleTestCase):
+    def details(self, label="Tomato__Early_blight", rows=((0.2, None), (0.4, 0.5))):
+        return {
+            "label": label,
+            "images": [{"label": "Tomato__Early_blight", "probabilities": probabilities(*row)} for row in rows]
+            + [{"label": None, "probabilities": probabilities(1.0)}],
+            "tensor_rows": [0, 1, 2],
+        }
+
+    def test_score_of_the_voted_crop(self):
+        obs = observe("leaf", "north", {"status": "disease_confirmed"}, self.details(), crop="Tomato", at=START)
+        # Mean tomato probabilities: 0.2 healthy of 0.75; potato and unlabelled images never count
+        self.assertAlmostEqual(obs.score, 1 - 0.2 / 0.75, places=5)
+        self.assertEqual((obs.plot, obs.at, obs.status), ("north", START, "disease_confirmed"))
+        self.assertIsNone(obs.embedding)
+
+    def test_embedding_of_the_labelled_images(self):
+        details = self.details()
+        details["embeddings"] = np.array([[3, 0], [0, 3], [5, 5]], dtype=np.float32)
+        obs = observe("leaf", "north", {}, details, crop="Tomato")
+        np.testing.assert_allclose(obs.embedding, [2 ** -0.5, 2 ** -0.5], rtol=1e-6)
+
+    def test_no_verdict_no_observation(self):
+        self.assertIsNone(observe("leaf", "north", {}, self.details(label=None), crop="Tomato"))
+        self.assertIsNone(observe("leaf", "north", {}, self.details(rows=()), crop="Tomato"))
+
+    def test_valid_plot(self):
+        self.assertTrue(valid_plot("field-7.north_A"))
+        self.assertFalse(valid_plot("../etc"))
+        self.assertFalse(valid_plot("x" * 65))
+
+
+@override_settings(PLOT_HALF_LIFE_DAYS=4, PLOT_TREND_DELTA=0.1)
+class StateTests(SimpleTestCase):
+    def test_first_observation(self):
+        self.assertEqual(compare(None, observation(0.3)), {
+            "plot": "north", "disease_score": 0.3, "observations": 1, "trend": "first",
+        })
+        state = advance(None, observation(0.3))
+        self.assertEqual((state.observations, state.baseline_score, state.last_at), (1, 0.3, START))
+
+    def test_trend_against_the_decayed_baseline(self):
+        state = advance(None, observation(0.2))
+        progression = compare(state, observation(0.5, days=4))
+        self.assertEqual(
+            (progression["trend"], progression["previous_score"], progression["days_since_last"]),
+            ("worsening", 0.2, 4.0)
+        )
+
+        # One half-life later the old score keeps half its weight
+        state = advance(state, observation(0.5, days=4))
+        self.assertAlmostEqual(state.baseline_score, 0.35)
+        self.assertEqual(compare(state, observation(0.3, days=5))["trend"], "stable")
+        self.assertEqual(compare(state, observation(0.1, days=5))["trend"], "improving")
+
+    def test_same_day_repeats_are_a_running_mean(self):
+        state = advance(None, observation(0.0))
+        for score in (0.3, 0.6):
+            state = advance(state, observation(score))
+        self.assertAlmostEqual(state.baseline_score, 0.3)
+        self.assertEqual(state.observations, 3)
+
+    def test_similarity_to_last(self):
+        state = advance(None, observation(0.2, embedding=np.array([1, 0], dtype=np.float32)))
+        progression = compare(state, observation(0.2, 1, embedding=np.array([0.6, 0.8], dtype=np.float32)))
+        self.assertEqual(progression["similarity_to_last"], 0.6)
+        self.assertNotIn("similarity_to_last", compare(state, observation(0.2, 1)))
+
+
+@override_settings(PLOT_HALF_LIFE_DAYS=4, PLOT_TREND_DELTA=0.1)
+class RecordTests(TestCase):
+    def test_record_and_compact(self):
+        now = timezone.now()
+        week = now - timedelta(days=60)
+        week = week.replace(hour=8, minute=0, second=0, microsecond=0) - timedelta(days=week.weekday())
+        for days, score in ((0, 0.2), (0.5, 0.4), (1, 0.6)):
+            obs = observation(score)
+            obs.at = week + timedelta(days=days)
+            record_observation(obs)
+        recent = observation(0.8)
+        recent.at = now
+        self.assertEqual(record_observation(recent)["observations"], 4)
+
+        state = PlotState.objects.get(endpoint="leaf", plot="north")
+        self.assertEqual((state.observations, state.last_score), (4, 0.8))
+        self.assertEqual(state.points.count(), 4)
+
+        self.assertEqual(compact(raw_days=30, retention_days=365), (3, 1, 0, 0))
+        weekly = PlotPoint.objects.get(state=state, resolution="week")
+        self.assertEqual((weekly.count, weekly.label), (3, "Tomato__Early_blight"))
+        self.assertAlmostEqual(weekly.score, 0.4, places=5)
+        self.assertEqual(PlotPoint.objects.filter(state=state, resolution="raw").count(), 1)
+
+        # Everything older than the retention window goes, idle plots with it
+        compact(raw_days=30, retention_days=0)
+        self.assertFalse(PlotState.objects.exists())
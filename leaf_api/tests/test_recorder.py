@@ -0,0 +1,90 @@
+import queue
+import threading
+import time
+from unittest import mock
+
+from django.test import TransactionTestCase, override_settings
+
+from .. import metrics
+from ..models import ImageResult, PrevalenceRollup, Submission
+from ..recorder import WriteBehindRecorder, record_prediction
+
+
+def submission(model_version="test-1"):
+    return Submission(endpoint="leaf", crop="Tomato", label="Tomato__healthy", status="healthy",
+                      image_count=0, latency_ms=1.0, model_version=model_version)
+
+
+class RecorderTests(TransactionTestCase):
+    def setUp(self):
+        self.recorder = WriteBehindRecorder(flush_interval=0.01)
+        self.addCleanup(self.recorder.stop)
+
+    def test_rejected_record_does_not_drop_its_batch(self):
+        good, bad = submission(), submission(model_version=None)
+        with self.assertLogs("leaf_api.recorder", "ERROR"):
+            self.assertFalse(self.recorder.flush([(good, []), (bad, [])]))
+        self.assertEqual(list(Submission.objects.values_list("id", flat=True)), [good.id])
+
+    def test_thread_survives_an_unexpected_error(self):
+        flushed = threading.Event()
+        calls = []
+
+        def flush(items):
+            calls.append(items)
+            if len(calls) == 1:
+                raise RuntimeError("boom")
+            flushed.set()
+            return True
+
+        with mock.patch.object(self.recorder, "flush", side_effect=flush), \
+                self.assertLogs("leaf_api.recorder", "ERROR"):
+            self.recorder.record(submission(), [])
+            time.sleep(0.1)
+            self.recorder.record(submission(), [])
+            self.assertTrue(flushed.wait(2))
+        self.assertTrue(self.recorder._thread.is_alive())
+
+    def test_prediction_is_written_with_its_images_and_rollups(self):
+        result = {"status": "disease_confirmed", "crop": "Tomato", "confidence": 91.0, "agreement": 100.0}
+        details = {
+            "label": "Tomato__Early_blight", "model_version": "test-1",
+            "images": [
+                {"quality_ok": True, "quality_message": "OK", "label": "Tomato__Early_blight",
+                 "confidence": 91.0, "probabilities": [0.9, 0.1]},
+                {"quality_ok": False, "quality_message": "Image too dark", "label": "",
+                 "confidence": None, "probabilities": []},
+            ],
+        }
+        recorded = []
+        with override_settings(PREDICTION_RECORDING=True), \
+                mock.patch("leaf_api.recorder.get_recorder", return_value=mock.Mock(record=lambda *item: recorded.append(item))):
+            submission_id = record_prediction("leaf", "Tomato", result, details, ["a" * 64, "b" * 64], 12.5)
+
+        self.assertTrue(self.recorder.flush(recorded))
+        stored = Submission.objects.get()
+        self.assertEqual(stored.id, submission_id)
+        self.assertEqual((stored.label, stored.status, stored.image_count), ("Tomato__Early_blight", "disease_confirmed", 2))
+        self.assertEqual(
+            list(ImageResult.objects.order_by("position").values_list("image_hash", "quality_ok")),
+            [("a" * 64, True), ("b" * 64, False)],
+        )
+        self.assertEqual(PrevalenceRollup.objects.filter(period="day").get().count, 1)
+
+    @override_settings(PREDICTION_RECORDING=False)
+    def test_recording_off(self):
+        with mock.patch("leaf_api.recorder.get_recorder") as get_recorder:
+            record_prediction("leaf", "Tomato", {"status": "healthy"}, {"model_version": "test-1"}, [], 1.0)
+        get_recorder.assert_not_called()
+
+    def test_full_queue_drops_instead_of_blocking(self):
+        self.recorder.stop()
+        self.recorder._queue = queue.Queue(maxsize=1)
+        self.recorder.record(submission(), [])
+
+        def dropped():
+            return metrics.snapshot()[1].get(("leaf_api_records_dropped", (("reason", "queue_full"),)), 0)
+
+        before = dropped()
+        self.recorder.record(submission(), [])
+        self.assertEqual(dropped(), before + 1)
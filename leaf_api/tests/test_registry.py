@@ -0,0 +1,88 @@
+import os
+import shutil
+import tempfile
+from types import SimpleNamespace
+from unittest import mock
+
+from django.test import SimpleTestCase, override_settings
+
+from ..ml import registry
+from ..ml.registry import LoadedModel, ModelRegistry, ModelVersions, version_key, write_active
+
+
+class RegistryTestCase(SimpleTestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.dir, ignore_errors=True)
+        model_dir = override_settings(MODEL_DIR=self.dir, MODEL_WATCH_INTERVAL_S=3600)
+        model_dir.enable()
+        self.addCleanup(model_dir.disable)
+
+    def add_versions(self, *versions):
+        for version in versions:
+            os.makedirs(os.path.join(self.dir, "leaf", version))
+
+
+class ModelVersionsTests(RegistryTestCase):
+    def test_natural_order(self):
+        self.assertEqual(sorted(["v10", "v9", "v1"], key=version_key), ["v1", "v9", "v10"])
+        self.add_versions("v9", "v10", "v2")
+        versions = ModelVersions("leaf", "leaf_model.h5")
+        self.assertEqual(versions.versions(), ["v2", "v9", "v10"])
+        self.assertEqual(versions.wanted_version(), "v10")
+
+    def test_active_file_wins(self):
+        self.add_versions("v1", "v2")
+        write_active("leaf", "v1")
+        self.assertEqual(ModelVersions("leaf", "leaf_model.h5").wanted_version(), "v1")
+
+    def test_legacy_file_without_versions(self):
+        versions = ModelVersions("leaf", "leaf_model.h5")
+        self.assertEqual(versions.wanted_version(), "leaf_model")
+        self.assertEqual(versions.model_path("leaf_model"), os.path.join(self.dir, "leaf_model.h5"))
+
+
+def fake_load(self, version):
+    if version == "broken":
+        raise OSError("truncated model file")
+    batcher = SimpleNamespace(close=mock.Mock())
+    return LoadedModel(self.name, version, None, batcher, 1.0)
+
+
+@mock.patch.object(registry, "apply_plan", lambda: None)
+@mock.patch.object(ModelRegistry, "load", autospec=True, side_effect=fake_load)
+class ModelRegistryTests(RegistryTestCase):
+    def test_hot_swap_and_rollback(self, load):
+        self.add_versions("v1", "v2")
+        write_active("leaf", "v1")
+        models = ModelRegistry("leaf", "leaf_model.h5")
+        self.assertEqual(models.active.version, "v1")
+
+        write_active("leaf", "v2")
+        models.poll()
+        self.assertEqual((models.active.version, models.previous.version), ("v2", "v1"))
+
+        models.rollback()
+        self.assertEqual(models.active.version, "v1")
+        # ACTIVE follows the rollback, so the next poll keeps it
+        models.poll()
+        self.assertEqual(models.active.version, "v1")
+        self.assertEqual(load.call_count, 2)  # v1 was still loaded
+
+    def test_failed_version_is_not_retried_until_active_changes(self, load):
+        self.add_versions("v1", "broken")
+        write_active("leaf", "v1")
+        models = ModelRegistry("leaf", "leaf_model.h5")
+
+        write_active("leaf", "broken")
+        with self.assertLogs("leaf_api.ml.registry", "ERROR"):
+            models.poll()
+        models.poll()
+        models.poll()
+        self.assertEqual(load.call_count, 2)
+        self.assertEqual(models.active.version, "v1")
+
+        os.utime(os.path.join(self.dir, "leaf", "ACTIVE"), ns=(0, 0))  # rewritten
+        with self.assertLogs("leaf_api.ml.registry", "ERROR"):
+            models.poll()
+        self.assertEqual(load.call_count, 3)
@@ -0,0 +1,124 @@
+import hashlib
+import os
+import shutil
+import tempfile
+from datetime import timedelta
+
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from .. import resumable
+from ..models import UploadChunk, UploadSession
+
+
+class ResumableHashTests(TestCase):
+    def setUp(self):
+        self.chunk_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.chunk_dir, ignore_errors=True)
+        chunk_settings = override_settings(UPLOAD_CHUNK_DIR=self.chunk_dir)
+        chunk_settings.enable()
+        self.addCleanup(chunk_settings.disable)
+        self.session = resumable.create_session("leaf", "Tomato", [10, 10, 10])
+
+    def test_chunk_path_rejects_anything_but_a_sha256(self):
+        for value in ("../../etc/passwd", "A" * 64, "0" * 63, None):
+            with self.assertRaises(ValueError):
+                resumable.chunk_path(value)
+
+    def test_malformed_header_is_rejected(self):
+        with self.assertRaises(resumable.UploadError):
+            resumable.add_chunk(self.session, 0, 0, b"", claimed_sha256="../" + "0" * 61)
+
+    def test_mismatched_chunk_is_not_stored(self):
+        data = b"0123456789"
+        wrong = hashlib.sha256(b"something else").hexdigest()
+        with self.assertRaises(resumable.UploadError):
+            resumable.add_chunk(self.session, 0, 0, data, claimed_sha256=wrong)
+
+        self.assertIsNone(resumable.chunk_size(hashlib.sha256(data).hexdigest()))
+        self.assertFalse(UploadChunk.objects.exists())
+
+    def test_stored_chunk_is_reused_by_hash(self):
+        data = b"0123456789"
+        sha256 = hashlib.sha256(data).hexdigest()
+        self.assertEqual(resumable.add_chunk(self.session, 0, 0, data, claimed_sha256=sha256), [10, 0, 0])
+        self.assertEqual(resumable.add_chunk(self.session, 1, 0, b"", claimed_sha256=sha256), [10, 10, 0])
+
+
+@override_settings(UPLOAD_MAX_IMAGES=4, UPLOAD_MAX_IMAGE_BYTES=100, UPLOAD_MAX_CHUNK_BYTES=8)
+class ResumableSessionTests(TestCase):
+    def setUp(self):
+        self.chunk_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.chunk_dir, ignore_errors=True)
+        chunk_settings = override_settings(UPLOAD_CHUNK_DIR=self.chunk_dir)
+        chunk_settings.enable()
+        self.addCleanup(chunk_settings.disable)
+        self.images = [b"first image", b"second", b"3rd"]
+        self.session = resumable.create_session("leaf", "Tomato", [len(data) for data in self.images])
+
+    def upload(self, image, offset, length):
+        return resumable.add_chunk(self.session, image, offset, self.images[image][offset:offset + length])
+
+    def test_create_session_validation(self):
+        cases = [
+            (("rice", "", [1, 1, 1]), "endpoint"),
+            (("leaf", "", [1, 1, 1]), "crop is required"),
+            (("areca_coconut", "", [1, 1]), "sizes must list 3 to 4"),
+            (("areca_coconut", "", [1, 1, 101]), "every image size must be 1 to 100"),
+        ]
+        for args, message in cases:
+            with self.subTest(message), self.assertRaisesMessage(resumable.UploadError, message):
+                resumable.create_session(*args)
+
+    def test_resume_point_is_the_contiguous_prefix(self):
+        self.assertEqual(self.upload(0, 8, 3), [0, 0, 0])  # gap before it
+        self.assertEqual(self.upload(0, 0, 5), [5, 0, 0])
+        self.assertEqual(self.upload(0, 3, 8), [11, 0, 0])  # overlaps both
+        self.assertEqual(self.upload(2, 0, 3), [11, 0, 3])
+
+        for image, offset, data, message in (
+            (3, 0, b"x", "image must be 0 to 2"),
+            (1, 4, b"xyz", "chunk outside image 1"),
+            (1, 0, b"x" * 9, "limited to 8 bytes"),
+        ):
+            with self.subTest(message), self.assertRaisesMessage(resumable.UploadError, message):
+                resumable.add_chunk(self.session, image, offset, data)
+
+    def test_assemble_overlapping_chunks(self):
+        self.upload(0, 0, 6)
+        self.upload(0, 4, 7)
+        self.upload(1, 0, 6)
+        with self.assertRaisesMessage(resumable.UploadError, "images not complete yet: [2]"):
+            resumable.assemble(self.session, self.chunk_dir, [])
+        self.upload(2, 0, 3)
+
+        paths = []
+        hashes = resumable.assemble(self.session, self.chunk_dir, paths)
+        for path, data, digest in zip(paths, self.images, hashes):
+            with open(path, "rb") as f:
+                self.assertEqual(f.read(), data)
+            self.assertEqual(digest, hashlib.sha256(data).hexdigest())
+
+    def test_finalize_claim(self):
+        self.assertTrue(resumable.claim_for_finalize(self.session))
+        self.assertFalse(resumable.claim_for_finalize(self.session))
+        self.session.refresh_from_db()
+        with self.assertRaisesMessage(resumable.UploadError, "already finalized"):
+            self.upload(0, 0, 5)
+
+        resumable.release_claim(self.session)
+        self.assertTrue(resumable.claim_for_finalize(self.session))
+
+    def test_cleanup(self):
+        self.upload(0, 0, 5)
+        stale = resumable.store_chunk(b"no session refers to me")
+        os.utime(resumable.chunk_path(stale), (0, 0))
+
+        self.assertEqual(resumable.collect_chunks(), (1, len(b"no session refers to me")))
+        self.assertIsNone(resumable.chunk_size(stale))
+
+        UploadSession.objects.filter(pk=self.session.pk).update(updated_at=timezone.now() - timedelta(hours=2))
+        self.assertEqual(resumable.expire_sessions(max_age_h=1), 1)
+        # Its chunk is unreferenced now, but too recent to go
+        self.assertEqual(resumable.collect_chunks(), (0, 0))
+        self.assertEqual(resumable.collect_chunks(grace_s=-60), (1, 5))
@@ -0,0 +1,74 @@
+from datetime import date, datetime, timezone
+
+from django.test import TestCase
+from rest_framework.test import APIRequestFactory
+
+from ..models import PrevalenceRollup, Submission
+from ..rollups import apply_rollups, period_start, query_prevalence, rebuild_rollups
+from ..views import PrevalenceAPIView
+
+MONDAY = datetime(2026, 6, 1, 9, tzinfo=timezone.utc)
+THURSDAY = datetime(2026, 6, 4, 9, tzinfo=timezone.utc)
+NEXT_MONDAY = datetime(2026, 6, 8, 9, tzinfo=timezone.utc)
+
+
+def submission(at, crop="Tomato", label="Tomato__Early_blight", status="disease_confirmed"):
+    return Submission(created_at=at, endpoint="leaf", crop=crop, label=label, status=status,
+                      latency_ms=1.0, model_version="test-1")
+
+
+class RollupTests(TestCase):
+    def record(self, *submissions):
+        Submission.objects.bulk_create(submissions)
+        apply_rollups(submissions)
+
+    def test_period_start(self):
+        self.assertEqual(period_start("day", THURSDAY), date(2026, 6, 4))
+        self.assertEqual(period_start("week", THURSDAY), date(2026, 6, 1))
+
+    def test_batches_add_up(self):
+        self.record(submission(MONDAY), submission(THURSDAY))
+        self.record(submission(THURSDAY), submission(NEXT_MONDAY, label="Tomato__healthy", status="healthy"))
+
+        weeks = query_prevalence("week", group_by=("label",))
+        self.assertEqual(weeks, [
+            {"period_start": date(2026, 6, 1), "label": "Tomato__Early_blight", "count": 3},
+            {"period_start": date(2026, 6, 8), "label": "Tomato__healthy", "count": 1},
+        ])
+        self.assertEqual(query_prevalence("day", start=date(2026, 6, 4), end=date(2026, 6, 4))[0]["count"], 2)
+
+    def test_rebuild_matches_incremental(self):
+        self.record(submission(MONDAY), submission(THURSDAY, crop="Potato", label="Potato__healthy", status="healthy"))
+        incremental = sorted(PrevalenceRollup.objects.values_list("period", "period_start", "crop", "label", "count"))
+
+        self.assertEqual(rebuild_rollups(), 2)
+        rebuilt = sorted(PrevalenceRollup.objects.values_list("period", "period_start", "crop", "label", "count"))
+        self.assertEqual(rebuilt, incremental)
+
+    def test_filters(self):
+        self.record(submission(MONDAY), submission(MONDAY, crop="Potato", label="Potato__healthy", status="healthy"))
+        self.assertEqual(query_prevalence("day", crop="Potato", group_by=()), [
+            {"period_start": date(2026, 6, 1), "count": 1},
+        ])
+
+
+class PrevalenceAPITests(TestCase):
+    def get(self, **params):
+        request = APIRequestFactory().get("/api/analytics/prevalence/", params)
+        return PrevalenceAPIView.as_view()(request)
+
+    def test_buckets(self):
+        submissions = [submission(MONDAY), submission(THURSDAY)]
+        Submission.objects.bulk_create(submissions)
+        apply_rollups(submissions)
+
+        response = self.get(period="week", group_by="crop")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data["total"], 2)
+        self.assertEqual(response.data["buckets"], [{"period_start": date(2026, 6, 1), "crop": "Tomato", "count": 2}])
+
+    def test_bad_parameters(self):
+        for params in ({"period": "month"}, {"from": "June"}, {"group_by": "crop,plot"}):
+            response = self.get(**params)
+            self.assertEqual(response.status_code, 400)
+            self.assertIn("error", response.data)
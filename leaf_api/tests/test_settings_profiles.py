@@ -0,0 +1,30 @@
+import importlib
+import io
+
+from django.core.management import call_command
+from django.test import SimpleTestCase, override_settings
+from django.urls import Resolver404, resolve
+
+api = importlib.import_module("agrihat_backend.settings_api")
+
+
+class ApiProfileTests(SimpleTestCase):
+    def test_only_what_the_api_needs(self):
+        self.assertEqual(api.INSTALLED_APPS, ["rest_framework", "leaf_api"])
+        self.assertFalse(any("csrf" in m or "session" in m or "auth" in m for m in api.MIDDLEWARE))
+        self.assertEqual(api.MIDDLEWARE[0], "leaf_api.timing.ServerTimingMiddleware")
+        self.assertEqual(api.REST_FRAMEWORK["DEFAULT_AUTHENTICATION_CLASSES"], [])
+
+    @override_settings(ROOT_URLCONF=api.ROOT_URLCONF)
+    def test_api_routes_without_admin(self):
+        resolve("/api/runtime-plan/")
+        with self.assertRaises(Resolver404):
+            resolve("/admin/")
+
+    def test_both_profiles_serve(self):
+        # Each profile runs in its own interpreter, as DRF binds its settings at import
+        out = io.StringIO()
+        call_command("bench_settings_profiles", requests=5, stdout=out)
+        rows = out.getvalue().splitlines()[2:]
+        self.assertEqual([row.split()[0] for row in rows], ["agrihat_backend.settings", "agrihat_backend.settings_api"])
+        self.assertTrue(all(row.split()[1] == "200" for row in rows), out.getvalue())
@@ -0,0 +1,130 @@
+import io
+import os
+import shutil
+import tempfile
+from unittest import mock
+
+import numpy as np
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+
+from ..ml import leaf_engine
+from ..ml.preprocess import TENSOR_SHAPE
+from ..ml.tensor_store import TensorStoreWriter, iter_batches, load_index
+from ..models import ImageResult, Submission
+from .fakes import one_hot
+
+CLASSES = leaf_engine.CLASS_NAMES
+HEALTHY = CLASSES.index("Tomato__healthy")
+BLIGHT = CLASSES.index("Tomato__Early_blight")
+
+
+def tensor(value):
+    return np.full(TENSOR_SHAPE, value, dtype=np.uint8)
+
+
+class FakeModel:
+    """Labels each image by its (constant) pixel value: 1 -> healthy, 2 -> blight, blight for both with `flip`"""
+
+    def __init__(self, flip=False):
+        self.flip = flip
+
+    def predict_on_batch(self, x):
+        rows = []
+        for value in np.rint(x[:, 0, 0, 0] * 255).astype(int):
+            name = CLASSES[HEALTHY if value == 1 and not self.flip else BLIGHT]
+            rows.append(one_hot(CLASSES, name, 0.9))
+        return np.stack(rows)
+
+
+class TensorStoreTests(TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.dir, ignore_errors=True)
+
+    def test_round_trip_across_chunks(self):
+        writer = TensorStoreWriter(self.dir, chunk_rows=2)
+        writer.append("leaf", ["a", "b", "c"], [tensor(1), tensor(2), tensor(3)])
+        writer.append("leaf", ["a", "d"], [tensor(9), tensor(4)])  # "a" again is not stored twice
+        writer.append("areca_coconut", ["e"], [tensor(5)])
+        writer.close()
+
+        index = load_index(self.dir, "leaf")
+        self.assertEqual(list(index), ["a", "b", "c", "d"])
+        self.assertEqual(len(load_index(self.dir)), 5)
+
+        stored = {}
+        for hashes, batch in iter_batches(self.dir, index, batch_size=3):
+            for image_hash, t in zip(hashes, batch):
+                stored[image_hash] = int(t[0, 0, 0])
+        self.assertEqual(stored, {"a": 1, "b": 2, "c": 3, "d": 4})
+
+    def test_gather_of_scattered_rows(self):
+        writer = TensorStoreWriter(self.dir, chunk_rows=4)
+        writer.append("leaf", ["a", "b", "c"], [tensor(1), tensor(2), tensor(3)])
+        writer.close()
+
+        index = load_index(self.dir)
+        del index["b"]
+        [(hashes, batch)] = list(iter_batches(self.dir, index))
+        self.assertEqual(hashes, ["a", "c"])
+        self.assertEqual(batch[:, 0, 0, 0].tolist(), [1, 3])
+
+
+@override_settings(MODEL_FAST_LOAD=False)
+class RescoreTests(TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.dir, ignore_errors=True)
+        patcher = override_settings(TENSOR_STORE_DIR=self.dir, MODEL_DIR=self.dir)
+        patcher.enable()
+        self.addCleanup(patcher.disable)
+
+        writer = TensorStoreWriter(self.dir)
+        writer.append("leaf", ["h1", "h2", "h3", "b1", "b2", "b3"], [tensor(1)] * 3 + [tensor(2)] * 3)
+        writer.close()
+
+        # Recorded the way the recorder stores a served verdict
+        self.record(["h1", "h2", "h3"], [True] * 3)
+        self.record(["b1", "b2", "b3"], [False, False, True])  # poor quality: no image has a label
+
+    def record(self, hashes, quality):
+        preds = FakeModel().predict_on_batch(np.stack([tensor(1 if h[0] == "h" else 2) for h in hashes]) / 255.0)
+        reports = [(True, ok, "OK" if ok else "too dark") for ok in quality]
+        details = {}
+        calibration = leaf_engine.DEFAULT_CALIBRATION
+        result = leaf_engine.engine.evaluate(
+            reports, list(range(len(hashes))), preds, calibration, crop="Tomato", details=details
+        )
+        submission = Submission.objects.create(
+            endpoint="leaf", crop="Tomato", label=details.get("label", ""), status=result["status"],
+            latency_ms=1.0, model_version="test-1"
+        )
+        for position, (image_hash, image) in enumerate(zip(hashes, details["images"])):
+            ImageResult.objects.create(
+                submission=submission, position=position, image_hash=image_hash, crop="Tomato",
+                label=image["label"], confidence=image["confidence"], quality_ok=image["quality_ok"],
+                quality_message=image["quality_message"], model_version="test-1"
+            )
+
+    def rescore(self, model):
+        out = io.StringIO()
+        with mock.patch(
+            "leaf_api.management.commands.rescore.load_model", return_value=(model, "h5")
+        ) as load:
+            call_command("rescore", stdout=out)
+        return out.getvalue(), load
+
+    def test_same_model_changes_nothing(self):
+        out, load = self.rescore(FakeModel())
+
+        load.assert_called_once_with(os.path.join(self.dir, "leaf_model.h5"))  # no versions: the legacy file
+        self.assertIn("Per-image label changes: 0", out)
+        self.assertIn("Submissions compared: 2, status changed: 0, final label changed: 0", out)
+
+    def test_changed_model(self):
+        out, _ = self.rescore(FakeModel(flip=True))
+
+        self.assertIn("Per-image label changes: 3", out)
+        self.assertIn("Submissions compared: 2, status changed: 1, final label changed: 1", out)
+        self.assertIn("Tomato__healthy -> Tomato__Early_blight: 1", out)
@@ -0,0 +1,87 @@
+import json
+import uuid
+import zlib
+from unittest import mock
+
+import numpy as np
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import SimpleTestCase, override_settings
+from rest_framework.test import APIRequestFactory
+
+from ..ml import leaf_engine
+from ..ml.preprocess import TENSOR_BYTES, TENSOR_SHAPE
+from ..ml.tensor_upload import TensorUploadError, read_tensor_uploads
+from ..views import BOTH_INPUTS_ERROR, ArecaCoconutAPIView, LeafHealthAPIView
+from .fakes import fake_registry, one_hot
+
+STATS = {"width": 3000, "height": 4000, "brightness": 120}
+
+
+def part(value=7, name="t.bin", data=None):
+    if data is None:
+        data = np.full(TENSOR_BYTES, value, dtype=np.uint8).tobytes()
+    return SimpleUploadedFile(name, data, content_type="application/octet-stream")
+
+
+class ReadTensorUploadsTests(SimpleTestCase):
+    def test_raw_and_zlib(self):
+        raw = np.arange(TENSOR_BYTES, dtype=np.uint32).astype(np.uint8).tobytes()
+        for encoding, data in (("raw", raw), ("zlib", zlib.compress(raw))):
+            batch, reports, hashes = read_tensor_uploads(
+                [part(data=data), part(data=data)], json.dumps([STATS, dict(STATS, brightness=10)]), encoding
+            )
+            self.assertEqual(batch.shape, (2,) + TENSOR_SHAPE)
+            self.assertEqual(batch[0].tobytes(), raw)
+            self.assertEqual(reports[0], (True, True, "OK"))
+            self.assertFalse(reports[1][1])  # too dark
+            self.assertEqual(hashes[0], hashes[1])
+
+    def test_stats_optional_without_quality_gate(self):
+        _, reports, _ = read_tensor_uploads([part()], None, check_quality=False)
+        self.assertEqual(reports, [(True, True, "OK")])
+
+    def test_errors(self):
+        stats = json.dumps([STATS])
+        cases = [
+            (([part()], stats, "gzip"), "tensor_encoding"),
+            (([part(data=b"\0" * 100)], stats), "expected 49152 bytes, got 100"),
+            (([part(data=b"not zlib")], stats, "zlib"), "not valid zlib data"),
+            (([part(data=zlib.compress(b"\0" * (TENSOR_BYTES + 1)))], stats, "zlib"), "inflates past"),
+            (([part(data=zlib.compress(b"\0" * 100))], stats, "zlib"), "got 100"),
+            (([part(data=zlib.compress(b"\0" * TENSOR_BYTES)[:-4])], stats, "zlib"), "truncated zlib data"),
+            (([part()], None), "stats are required"),
+            (([part()], "{"), "must be a JSON list"),
+            (([part(), part()], stats), "one entry per tensor (2)"),
+            (([part()], json.dumps([{"width": 1}])), "needs numeric width"),
+            (([part()], json.dumps([dict(STATS, brightness=300)])), "out of range"),
+        ]
+        for args, message in cases:
+            with self.subTest(message), self.assertRaisesMessage(TensorUploadError, message):
+                read_tensor_uploads(*args)
+
+
+@override_settings(STREAMING_UPLOAD_DECODE=False)
+class TensorUploadViewTests(SimpleTestCase):
+    def post(self, view, data):
+        request = APIRequestFactory().post("/", data, format="multipart")
+        return view.as_view()(request)
+
+    def test_images_and_tensors_together(self):
+        data = {"crop": "tomato", "tensors": [part()] * 3, "images": [part(name="a.jpg")] * 3}
+        for view in (LeafHealthAPIView, ArecaCoconutAPIView):
+            response = self.post(view, data)
+            self.assertEqual((response.status_code, response.data), (400, {"error": BOTH_INPUTS_ERROR}))
+
+    def test_minimum_counts_the_scored_tensors(self):
+        response = self.post(LeafHealthAPIView, {"crop": "tomato", "tensors": [part()] * 2})
+        self.assertEqual(response.status_code, 400)
+
+    def test_tensor_request(self):
+        healthy = one_hot(leaf_engine.CLASS_NAMES, "Tomato__healthy", 0.9)
+        with mock.patch.object(leaf_engine.engine, "registry", fake_registry(lambda x: [healthy] * len(x))), \
+                mock.patch("leaf_api.views.record_prediction", return_value=uuid.uuid4()):
+            response = self.post(LeafHealthAPIView, {
+                "crop": "tomato", "tensors": [part(), part(), part()], "stats": json.dumps([STATS] * 3),
+            })
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data["status"], "healthy")
@@ -0,0 +1,132 @@
+import os
+import shutil
+import tempfile
+import uuid
+from unittest import mock
+
+import cv2
+import numpy as np
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import SimpleTestCase, override_settings
+from rest_framework.test import APIRequestFactory
+
+from ..ml import leaf_engine
+from ..ml.tiling import TilingError, _windows, select_tiles, tile_image, vegetation_mask
+from ..views import PlantPhotoAPIView
+from .fakes import fake_registry, one_hot
+
+SOIL = (40, 70, 110)    # BGR brown
+LEAF = (40, 160, 60)    # BGR green
+
+
+def field_photo(width=800, height=600):
+    """Soil with a plant in the top-left 400 x 300 px"""
+    img = np.zeros((height, width, 3), dtype=np.uint8)
+    img[:] = SOIL
+    img[:300, :400] = LEAF
+    return img
+
+
+class WindowTests(SimpleTestCase):
+    def test_last_window_is_flush_with_the_edge(self):
+        self.assertEqual(_windows(300, 100, 100, 100), [(0, 0), (100, 0), (200, 0)])
+        self.assertEqual(_windows(250, 100, 100, 100), [(0, 0), (100, 0), (150, 0)])
+        self.assertEqual(_windows(100, 100, 100, 50), [(0, 0)])
+        self.assertEqual(len(_windows(1024, 768, 256, 128)), 7 * 5)
+
+    def test_vegetation_mask(self):
+        mask = vegetation_mask(field_photo())
+        self.assertEqual(mask[:300, :400].min(), 1)
+        self.assertEqual(mask[300:].max(), 0)
+
+
+@override_settings(TILE_SIZE=200, TILE_STRIDE=100, TILE_MIN_VEGETATION=0.25, TILE_MAX_PATCHES=48)
+class SelectTilesTests(SimpleTestCase):
+    def test_plant_windows_most_plant_first(self):
+        tiles = select_tiles(field_photo())
+
+        for x, y, size, share, brightness in tiles:
+            self.assertEqual(size, 200)
+            self.assertGreaterEqual(share, 0.25)
+        self.assertTrue(all(x < 400 and y < 300 for x, y, *_ in tiles))
+        shares = [t[3] for t in tiles]
+        self.assertEqual(shares, sorted(shares, reverse=True))
+        self.assertEqual(tiles[0][3], 1.0)
+
+    def test_cap_and_small_images(self):
+        with self.settings(TILE_MAX_PATCHES=2):
+            self.assertEqual(len(select_tiles(field_photo())), 2)
+
+        # Window shrinks to the short side of a small photo
+        tiles = select_tiles(np.full((120, 150, 3), LEAF, dtype=np.uint8))
+        self.assertEqual({t[2] for t in tiles}, {120})
+
+    def test_bare_soil(self):
+        self.assertEqual(select_tiles(np.full((400, 400, 3), SOIL, dtype=np.uint8)), [])
+
+
+@override_settings(TILE_MAX_SIDE=400, TILE_SIZE=100, TILE_STRIDE=100, TILE_MIN_VEGETATION=0.25,
+                   TILE_MAX_PATCHES=48)
+class TileImageTests(SimpleTestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.dir, ignore_errors=True)
+        self.path = os.path.join(self.dir, "plant.png")
+        cv2.imwrite(self.path, field_photo())
+
+    def test_tiles_in_full_resolution_pixels(self):
+        batch, reports, info = tile_image(self.path, check_quality=False)
+
+        self.assertEqual((info["width"], info["height"]), (800, 600))
+        self.assertEqual(len(batch), len(info["tiles"]))
+        # 400 x 300 at half scale: 2 x 1.5 -> 2 x 2 windows of 100 px
+        self.assertEqual(sorted((t["x"], t["y"]) for t in info["tiles"]), [(0, 0), (0, 200), (200, 0), (200, 200)])
+        self.assertTrue(all(t["size"] == 200 for t in info["tiles"]))
+        self.assertEqual(reports, [(True, True, "OK")] * len(batch))
+        # RGB green
+        self.assertEqual(batch[0, 0, 0].tolist(), [60, 160, 40])
+
+    def test_errors(self):
+        cv2.imwrite(self.path, np.full((400, 400, 3), SOIL, dtype=np.uint8))
+        with self.assertRaisesMessage(TilingError, "No plant found"):
+            tile_image(self.path)
+
+        with open(self.path, "wb") as f:
+            f.write(b"junk")
+        with self.assertRaisesMessage(TilingError, "Unreadable image"):
+            tile_image(self.path)
+
+
+@override_settings(TILE_MAX_SIDE=400, TILE_SIZE=100, TILE_STRIDE=100)
+class PlantPhotoViewTests(SimpleTestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.dir, ignore_errors=True)
+        media = override_settings(MEDIA_ROOT=self.dir)
+        media.enable()
+        self.addCleanup(media.disable)
+        self.photo = cv2.imencode(".png", field_photo(2000, 1500))[1].tobytes()
+
+    def post(self, **data):
+        data.setdefault("image", SimpleUploadedFile("plant.png", self.photo))
+        request = APIRequestFactory().post("/", data, format="multipart")
+        return PlantPhotoAPIView.as_view()(request)
+
+    def test_leaf(self):
+        healthy = one_hot(leaf_engine.CLASS_NAMES, "Tomato__healthy", 0.9)
+        with mock.patch.object(leaf_engine.engine, "registry", fake_registry(lambda x: [healthy] * len(x))), \
+                mock.patch("leaf_api.views.record_prediction", return_value=uuid.uuid4()) as record:
+            response = self.post(endpoint="leaf", crop="tomato")
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data["status"], "healthy")
+        self.assertEqual(len(response.data["tiles"]["tiles"]), len(record.call_args.args[4]))
+        self.assertEqual(record.call_args.args[:2], ("leaf", "Tomato"))
+        self.assertEqual(os.listdir(self.dir), [])
+
+    def test_validation(self):
+        self.assertEqual(self.post(endpoint="leaf").data, {"error": "Image required (and crop for leaf)"})
+        self.assertEqual(
+            self.post(endpoint="areca_coconut", image=SimpleUploadedFile("p.png", b"junk")).data,
+            {"error": "Unreadable image"}
+        )
@@ -0,0 +1,97 @@
+import shutil
+import tempfile
+import threading
+import time
+from unittest import mock
+
+from django.http import HttpResponse
+from django.test import RequestFactory, SimpleTestCase
+
+from .. import timing
+from ..ml.preprocess import DecodePool
+from ..timing import ServerTimingMiddleware
+from .fakes import write_image
+
+
+def spin(seconds):
+    end = time.thread_time() + seconds
+    while time.thread_time() < end:
+        pass
+
+
+def run(view):
+    """The parsed Server-Timing entries of one request through the middleware"""
+    response = ServerTimingMiddleware(view)(RequestFactory().get("/"))
+    entries = {}
+    for part in response["Server-Timing"].split(", "):
+        name, _, value = part.partition(";")
+        entries[name] = value
+    return entries
+
+
+def ms(value):
+    return float(value.split("=")[1])
+
+
+class ServerTimingTests(SimpleTestCase):
+    def test_stages_in_report_order(self):
+        def view(request):
+            timing.add("inference", 5)
+            timing.add("custom", 1)
+            with timing.stage("upload"):
+                pass
+            timing.add("inference", 2.5)
+            started = time.perf_counter()
+            timing.add("decode", 0)
+            timing.since("aggregation", started, exclude=("decode",))
+            timing.note("source", "batch")
+            return HttpResponse()
+
+        entries = run(view)
+        self.assertEqual(
+            list(entries),
+            ["upload", "decode", "inference", "aggregation", "custom", "total", "cpu", "process_mem", "source"]
+        )
+        self.assertEqual(entries["inference"], "dur=7.5")
+        self.assertEqual(entries["source"], 'desc="source=batch"')
+        self.assertTrue(entries["process_mem"].startswith('desc="peak_rss_delta_kb='))
+
+    def test_cpu_is_this_requests_only(self):
+        busy = threading.Thread(target=spin, args=(0.3,))
+
+        def view(request):
+            busy.start()
+            busy.join()  # another request's work, in the same process
+            spin(0.05)
+            return HttpResponse()
+
+        cpu = ms(run(view)["cpu"])
+        self.assertGreaterEqual(cpu, 50)
+        self.assertLess(cpu, 250)
+
+    def test_decode_pool_cpu_is_added(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory, ignore_errors=True)
+        paths = [write_image(directory, f"{i}.png", (40, 120, 200), size=(1500, 1500)) for i in range(4)]
+
+        pool = DecodePool("thread", workers=2)
+        self.addCleanup(pool.shutdown)
+
+        added = []
+        with mock.patch.object(timing, "add_cpu", side_effect=added.append):
+            pool.preprocess(paths)
+            DecodePool("none").preprocess(paths)  # decoded in this thread: counted already
+        self.assertEqual(len(added), 1)
+        self.assertGreater(added[0], 0)
+
+    def test_no_op_outside_a_request(self):
+        self.assertIsNone(timing.current())
+        with timing.stage("decode"):
+            timing.add("inference", 1)
+            timing.add_cpu(1)
+            timing.note("source", "batch")
+
+    def test_disabled(self):
+        with self.settings(SERVER_TIMING_ENABLED=False):
+            response = ServerTimingMiddleware(lambda request: HttpResponse())(RequestFactory().get("/"))
+        self.assertNotIn("Server-Timing", response)
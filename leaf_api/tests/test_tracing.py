@@ -0,0 +1,111 @@
+import json
+import os
+import shutil
+import tempfile
+import threading
+from unittest import mock
+
+from django.http import HttpResponse
+from django.test import RequestFactory, SimpleTestCase, override_settings
+
+from .. import tracing
+from ..tracing import FileExporter, Span, TracingMiddleware
+
+
+@override_settings(TRACING_ENABLED=True, TRACING_SAMPLE_RATE=1.0)
+class TracingTests(SimpleTestCase):
+    def setUp(self):
+        self.spans = []
+        patcher = mock.patch.object(tracing, "_export", self.spans.append)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def run_request(self, view):
+        return TracingMiddleware(view)(RequestFactory().post("/api/predict/"))
+
+    def by_name(self):
+        return {span.name: span for span in self.spans}
+
+    def test_request_tree(self):
+        def view(request):
+            with tracing.span("preprocess", images=3) as parent:
+                worker = threading.Thread(target=in_pool, args=(parent,))
+                worker.start()
+                worker.join()
+            tracing.set_attribute("crop", "Tomato")
+            return HttpResponse(status=201)
+
+        def in_pool(parent):
+            with tracing.attach(parent), tracing.span("decode", file="a.jpg"):
+                pass
+
+        self.run_request(view)
+        spans = self.by_name()
+        root, preprocess, decode = spans["POST /api/predict/"], spans["preprocess"], spans["decode"]
+
+        self.assertEqual(root.kind, tracing.KIND_SERVER)
+        self.assertEqual(root.attributes["http.status_code"], 201)
+        self.assertEqual(root.attributes["crop"], "Tomato")
+        self.assertEqual({s.trace_id for s in self.spans}, {root.trace_id})
+        self.assertEqual((preprocess.parent_id, decode.parent_id), (root.span_id, preprocess.span_id))
+        self.assertTrue(all(s.end_ns >= s.start_ns for s in self.spans))
+        self.assertIsNone(tracing.current())
+
+    def test_errors_are_marked(self):
+        def view(request):
+            with tracing.span("inference"):
+                raise ValueError("boom")
+
+        with self.assertRaises(ValueError):
+            self.run_request(view)
+        spans = self.by_name()
+        self.assertEqual(spans["inference"].attributes["error"], "ValueError")
+        self.assertEqual(spans["POST /api/predict/"].to_otlp()["status"], {"code": 2})
+
+    def test_not_sampled(self):
+        def view(request):
+            with tracing.span("preprocess") as span:
+                self.assertIsNone(span)
+            return HttpResponse()
+
+        with self.settings(TRACING_SAMPLE_RATE=0.0):
+            self.run_request(view)
+        self.assertEqual(self.spans, [])
+
+    def test_otlp_shape(self):
+        parent = Span("batch")
+        child = Span("inference", parent, attributes={"rows": 3, "ok": True, "ms": 1.5, "crop": "Tomato"})
+        child.links.append(parent)
+        child.end_ns = child.start_ns + 10
+
+        otlp = child.to_otlp()
+        self.assertEqual(otlp["parentSpanId"], parent.span_id)
+        self.assertEqual(otlp["attributes"], [
+            {"key": "rows", "value": {"intValue": "3"}},
+            {"key": "ok", "value": {"boolValue": True}},
+            {"key": "ms", "value": {"doubleValue": 1.5}},
+            {"key": "crop", "value": {"stringValue": "Tomato"}},
+        ])
+        self.assertEqual(otlp["links"], [{"traceId": parent.trace_id, "spanId": parent.span_id}])
+        self.assertEqual((len(child.trace_id), len(child.span_id)), (32, 16))
+
+
+class FileExporterTests(SimpleTestCase):
+    def test_write_and_rotate(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory, ignore_errors=True)
+        exporter = FileExporter(directory, max_bytes=100)
+        span = Span("request")
+        span.end_ns = span.start_ns + 1
+
+        exporter._write([span])
+        path = exporter._path()
+        with open(path) as f:
+            [line] = f.readlines()
+        [resource] = json.loads(line)["resourceSpans"]
+        self.assertEqual(resource["scopeSpans"][0]["spans"][0]["spanId"], span.span_id)
+
+        exporter._write([span])  # past max_bytes: the old file moves aside
+        self.assertTrue(os.path.exists(path + ".1"))
+        with open(path) as f:
+            self.assertEqual(len(f.readlines()), 1)
@@ -0,0 +1,83 @@
+import hashlib
+import os
+import shutil
+import tempfile
+import uuid
+from unittest import mock
+
+import numpy as np
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import RequestFactory, SimpleTestCase, override_settings
+from rest_framework.test import APIRequestFactory
+
+from ..ml import leaf_engine, preprocess
+from ..ml.preprocess import DecodePool
+from ..uploads import StreamedUpload, stream_decode
+from ..views import LeafHealthAPIView
+from .fakes import fake_registry, one_hot, write_image
+
+
+@override_settings(STREAMING_UPLOAD_DECODE=True, DECODE_POOL_KIND="thread", DECODE_POOL_WORKERS=2)
+class StreamingDecodeTests(SimpleTestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.dir, ignore_errors=True)
+        self.media = os.path.join(self.dir, "media")
+        os.makedirs(self.media)
+        media = override_settings(MEDIA_ROOT=self.media)
+        media.enable()
+        self.addCleanup(media.disable)
+
+        # A shared pool of its own, shut down afterwards
+        patcher = mock.patch.multiple(preprocess, _pool=None, _pool_served=False)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.addCleanup(lambda: preprocess._pool and preprocess._pool.shutdown())
+
+        self.paths = [
+            write_image(self.dir, "a.png", (40, 120, 200)),
+            write_image(self.dir, "b.png", (5, 5, 5)),
+            write_image(self.dir, "c.png", (40, 120, 200), size=(100, 100)),
+        ]
+
+    def uploads(self):
+        files = []
+        for path in self.paths:
+            with open(path, "rb") as f:
+                files.append(SimpleUploadedFile(os.path.basename(path), f.read(), content_type="image/png"))
+        return files
+
+    def test_parts_are_decoded_as_they_arrive(self):
+        request = RequestFactory().post("/", {"crop": "tomato", "images": self.uploads(), "other": self.uploads()[0]})
+        handler = stream_decode(request)
+
+        images = request.FILES.getlist("images")
+        self.assertTrue(all(isinstance(upload, StreamedUpload) for upload in images))
+        self.assertNotIsInstance(request.FILES["other"], StreamedUpload)  # left to Django's handlers
+        self.assertEqual(request.POST["crop"], "tomato")
+
+        for upload, path in zip(images, self.paths):
+            with open(path, "rb") as f:
+                self.assertEqual(upload.sha256, hashlib.sha256(f.read()).hexdigest())
+            self.assertTrue(upload.path.startswith(self.media))
+        self.assertEqual(handler.temp_paths, [upload.path for upload in images])
+
+        batch, reports = handler.gather()
+        expected, expected_reports = DecodePool("none").preprocess(self.paths)
+        np.testing.assert_array_equal(batch, expected)
+        self.assertEqual(reports, expected_reports)
+
+    def test_disabled(self):
+        with self.settings(STREAMING_UPLOAD_DECODE=False):
+            self.assertIsNone(stream_decode(RequestFactory().post("/")))
+
+    def test_view_removes_streamed_files(self):
+        healthy = one_hot(leaf_engine.CLASS_NAMES, "Tomato__healthy", 0.9)
+        request = APIRequestFactory().post("/", {"crop": "tomato", "images": self.uploads()}, format="multipart")
+        with mock.patch.object(leaf_engine.engine, "registry", fake_registry(lambda x: [healthy] * len(x))), \
+                mock.patch("leaf_api.views.record_prediction", return_value=uuid.uuid4()):
+            response = LeafHealthAPIView.as_view()(request)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data["status"], "error")  # two of the three fail the quality gate
+        self.assertEqual(os.listdir(self.media), [])
@@ -0,0 +1,138 @@
+import os
+import shutil
+import tempfile
+import uuid
+from unittest import mock
+
+import cv2
+import numpy as np
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import SimpleTestCase, override_settings
+from rest_framework.test import APIRequestFactory
+
+from ..ml import areca_coconut_engine
+from ..ml.video import VideoError, sample_video, select_keyframes
+from ..views import VideoAPIView
+from .fakes import fake_registry, one_hot
+
+
+class Candidate:
+    def __init__(self, index, sharpness, scene):
+        self.index = index
+        self.sharpness = sharpness
+        self.thumb = np.full((32, 32), scene * 40, dtype=np.int16)
+
+    def difference(self, other):
+        return float(np.abs(self.thumb - other.thumb).mean())
+
+
+def write_video(path, scenes, frames_per_scene=10, fps=10, size=(320, 240)):
+    """MJPG clip of `scenes` sharp random textures, each a different brightness"""
+    writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*"MJPG"), fps, size)
+    for scene in range(scenes):
+        low = 40 + scene * 40
+        frame = np.random.RandomState(scene).randint(low, low + 60, (size[1], size[0], 3), dtype=np.uint8)
+        for _ in range(frames_per_scene):
+            writer.write(frame)
+    writer.release()
+    return path
+
+
+@override_settings(VIDEO_BLUR_RATIO=0.4, VIDEO_MIN_DIFFERENCE=12, VIDEO_MAX_FRAMES=6)
+class SelectKeyframesTests(SimpleTestCase):
+    def test_sharp_distinct_in_time_order(self):
+        found = [
+            Candidate(0, 100, scene=0),
+            Candidate(5, 90, scene=0),    # same scene as frame 0
+            Candidate(10, 20, scene=1),   # below 0.4 x the sharpest
+            Candidate(15, 80, scene=2),
+            Candidate(20, 95, scene=3),
+        ]
+        self.assertEqual([c.index for c in select_keyframes(found)], [0, 15, 20])
+
+    def test_cap(self):
+        found = [Candidate(i, 100 - i, scene=i) for i in range(5)]
+        self.assertEqual([c.index for c in select_keyframes(found, max_frames=2)], [0, 1])
+
+    def test_fills_up_to_the_minimum(self):
+        found = [Candidate(0, 100, scene=0), Candidate(1, 99, scene=0), Candidate(2, 10, scene=0)]
+        self.assertEqual([c.index for c in select_keyframes(found)], [0, 1, 2])
+        self.assertEqual(select_keyframes([]), [])
+
+
+@override_settings(VIDEO_CANDIDATES=12, VIDEO_MAX_SECONDS=15)
+class SampleVideoTests(SimpleTestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.dir, ignore_errors=True)
+
+    def test_sample(self):
+        path = write_video(os.path.join(self.dir, "sweep.avi"), scenes=4)
+        batch, reports, info = sample_video(path)
+
+        self.assertEqual(batch.shape[1:], (128, 128, 3))
+        self.assertEqual(len(batch), len(reports))
+        self.assertEqual(len(info["frames"]), len(batch))
+        # Three candidates per scene, one kept
+        self.assertEqual([f["frame"] // 10 for f in info["frames"]], [0, 1, 2, 3])
+        self.assertEqual(info["duration_s"], 4.0)
+        self.assertEqual(info["candidates"], 12)
+        times = [f["time_s"] for f in info["frames"]]
+        self.assertEqual(times, sorted(times))
+
+    def test_errors(self):
+        broken = os.path.join(self.dir, "broken.avi")
+        with open(broken, "wb") as f:
+            f.write(b"not a video")
+        with self.assertRaisesMessage(VideoError, "Unreadable video"):
+            sample_video(broken)
+
+        long_clip = write_video(os.path.join(self.dir, "long.avi"), scenes=2, frames_per_scene=100)
+        with self.assertRaisesMessage(VideoError, "at most 15 seconds"):
+            sample_video(long_clip)
+
+
+@override_settings(VIDEO_CANDIDATES=12)
+class VideoViewTests(SimpleTestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.dir, ignore_errors=True)
+        media = override_settings(MEDIA_ROOT=self.dir)
+        media.enable()
+        self.addCleanup(media.disable)
+
+        with open(write_video(os.path.join(self.dir, "clip.avi"), scenes=3), "rb") as f:
+            self.clip = f.read()
+        os.remove(os.path.join(self.dir, "clip.avi"))
+
+    def post(self, **data):
+        data.setdefault("video", SimpleUploadedFile("clip.avi", self.clip))
+        request = APIRequestFactory().post("/", data, format="multipart")
+        return VideoAPIView.as_view()(request)
+
+    def test_dispatches_to_the_named_engine(self):
+        healthy = one_hot(areca_coconut_engine.CLASS_NAMES, areca_coconut_engine.CLASS_NAMES[0], 0.9)
+        registry = fake_registry(lambda x: [healthy] * len(x))
+        with mock.patch.object(areca_coconut_engine.engine, "registry", registry), \
+                mock.patch("leaf_api.views.record_prediction", return_value=uuid.uuid4()) as record:
+            response = self.post(endpoint="areca_coconut")
+
+        self.assertEqual(response.status_code, 200)
+        hashes = record.call_args.args[4]
+        self.assertEqual(len(hashes), len(response.data["video"]["frames"]))
+        self.assertEqual(record.call_args.args[:2], ("areca_coconut", ""))
+        self.assertEqual(os.listdir(self.dir), [])
+
+    def test_validation(self):
+        response = self.post(endpoint="rice")
+        self.assertEqual(response.data, {"error": "endpoint must be one of areca_coconut, leaf"})
+
+        response = self.post(endpoint="leaf")
+        self.assertEqual(response.data, {"error": "Video required (and crop for leaf)"})
+
+        with self.settings(VIDEO_MAX_BYTES=10):
+            response = self.post(endpoint="areca_coconut")
+        self.assertEqual(response.data, {"error": "Video must be at most 10 bytes"})
+
+        response = self.post(endpoint="areca_coconut", video=SimpleUploadedFile("clip.avi", b"junk"))
+        self.assertEqual(response.data, {"error": "Unreadable video"})
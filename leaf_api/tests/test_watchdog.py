@@ -0,0 +1,102 @@
+import json
+import os
+import shutil
+import tempfile
+from unittest import mock
+
+from django.test import SimpleTestCase, override_settings
+
+from ..watchdog import MB, MemoryWatchdog, current_rss, default_limit, recycle_history
+
+
+class Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class MemoryWatchdogTests(SimpleTestCase):
+    def watchdog(self, rss, limit_mb=None, growth_mb_per_h=None):
+        self.clock = Clock()
+        self.rss = rss
+        self.recycled = []
+        return MemoryWatchdog(
+            limit_bytes=limit_mb and limit_mb * MB,
+            growth_limit_bytes_per_h=growth_mb_per_h and growth_mb_per_h * MB,
+            interval_s=60, window_s=3600, warmup_s=600,
+            on_recycle=lambda: self.recycled.append(True),
+            rss_fn=lambda: self.rss[0], clock=self.clock,
+        )
+
+    def advance(self, watchdog, seconds, rss_mb):
+        self.clock.now += seconds
+        self.rss[0] = rss_mb * MB
+        return watchdog.check()
+
+    def test_ceiling(self):
+        watchdog = self.watchdog([100 * MB], limit_mb=500)
+        self.assertIsNone(watchdog.check())
+        self.assertIsNone(self.advance(watchdog, 60, 500))
+        self.assertEqual(self.advance(watchdog, 60, 501), "rss_limit")
+        self.assertEqual(watchdog.peak, 501 * MB)
+
+    def test_growth_needs_warmup_and_a_full_window(self):
+        watchdog = self.watchdog([100 * MB], growth_mb_per_h=50)
+
+        # Model loading during warm-up never counts as growth
+        self.assertIsNone(self.advance(watchdog, 300, 900))
+        self.assertIsNone(watchdog.growth_per_h())
+
+        # 100 MB/h, but only half a window sampled yet
+        self.advance(watchdog, 300, 1000)
+        for _ in range(30):
+            self.assertIsNone(self.advance(watchdog, 60, self.rss[0] / MB + 100 / 60))
+        self.assertIsNone(watchdog.growth_per_h())
+
+        reason = None
+        while reason is None and self.clock.now < 600 + 3600:
+            reason = self.advance(watchdog, 60, self.rss[0] / MB + 100 / 60)
+        self.assertEqual(reason, "rss_growth")
+        self.assertAlmostEqual(watchdog.growth_per_h() / MB, 100, places=3)
+
+    def test_steady_worker_is_kept(self):
+        watchdog = self.watchdog([800 * MB], limit_mb=1000, growth_mb_per_h=50)
+        for i in range(200):
+            self.assertIsNone(self.advance(watchdog, 60, 800 + (i % 2) * 5))
+
+    def test_recycle_records_the_event(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory, ignore_errors=True)
+        events = os.path.join(directory, "events.jsonl")
+
+        watchdog = self.watchdog([600 * MB], limit_mb=500)
+        with override_settings(MEMORY_EVENTS_FILE=events), self.assertLogs("leaf_api.watchdog", "WARNING"):
+            watchdog._recycle("rss_limit")
+            watchdog._recycle("rss_limit")
+
+        self.assertEqual(self.recycled, [True, True])
+        with open(events) as f:
+            event = json.loads(f.readline())
+        self.assertEqual((event["reason"], event["rss_mb"], event["limit_mb"]), ("rss_limit", 600, 500))
+
+        with open(events, "a") as f:
+            f.write("torn line\n")
+        self.assertEqual(recycle_history(events), {"rss_limit": 2})
+        self.assertEqual(recycle_history(os.path.join(directory, "missing")), {})
+
+
+class LimitTests(SimpleTestCase):
+    def test_current_rss(self):
+        self.assertGreater(current_rss(), 10 * MB)
+
+    @override_settings(MEMORY_LIMIT_MB=0)
+    def test_share_of_the_cgroup_limit(self):
+        with mock.patch("leaf_api.watchdog.cgroup_memory_limit", return_value=4000 * MB), \
+                mock.patch("leaf_api.watchdog.get_plan", return_value={"workers": 4}):
+            self.assertEqual(default_limit(), int(4000 * MB * 0.9 / 4))
+        with mock.patch("leaf_api.watchdog.cgroup_memory_limit", return_value=None):
+            self.assertIsNone(default_limit())
+        with self.settings(MEMORY_LIMIT_MB=700):
+            self.assertEqual(default_limit(), 700 * MB)
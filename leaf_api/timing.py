@@ -0,0 +1,149 @@
+# timing.py
+#
+# Per-request stage timing reported in the Server-Timing header. The
+# middleware opens a RequestTiming in a context variable; views and
+# engines record into it with stage() / add() / note(). Outside a timed
+# request (timing disabled, management commands) every call is a no-op.
+#
+# "cpu" is the CPU time of the request's own thread plus that of the
+# decode-pool tasks it waited for (add_cpu); model inference runs on
+# threads shared by all requests and is not included. "process_mem" is
+# how much the peak RSS of the whole worker process grew meanwhile, so
+# concurrent requests show up in each other's figure.
+
+import contextvars
+import resource
+import time
+from contextlib import contextmanager
+
+from django.conf import settings
+
+_current = contextvars.ContextVar("request_timing", default=None)
+
+# Report order; anything else is appended after these
+STAGE_ORDER = ("upload", "decode", "quality", "inference", "aggregation", "render")
+
+
+class RequestTiming:
+    __slots__ = ("started", "cpu_started", "pool_cpu_ms", "rss_started", "stages", "notes", "render_started")
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.cpu_started = time.thread_time()
+        self.pool_cpu_ms = 0.0
+        self.rss_started = _peak_rss_kb()
+        self.stages = {}
+        self.notes = {}
+        self.render_started = None
+
+    def add(self, name, ms):
+        self.stages[name] = self.stages.get(name, 0.0) + ms
+
+    def header(self):
+        total_ms = (time.perf_counter() - self.started) * 1000
+        cpu_ms = (time.thread_time() - self.cpu_started) * 1000 + self.pool_cpu_ms
+        rss_delta = _peak_rss_kb() - self.rss_started
+
+        names = [n for n in STAGE_ORDER if n in self.stages]
+        names += [n for n in self.stages if n not in STAGE_ORDER]
+
+        parts = [f"{name};dur={self.stages[name]:.1f}" for name in names]
+        parts.append(f"total;dur={total_ms:.1f}")
+        parts.append(f"cpu;dur={cpu_ms:.1f}")
+        parts.append(f'process_mem;desc="peak_rss_delta_kb={rss_delta}"')
+
+        if self.notes:
+            desc = " ".join(f"{k}={v}" for k, v in self.notes.items())
+            parts.append(f'source;desc="{desc}"')
+
+        return ", ".join(parts)
+
+
+def _peak_rss_kb():
+    # ru_maxrss is KiB on Linux (bytes on macOS; close enough for a delta)
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+# ======================================================
+# RECORDING API
+# ======================================================
+def current():
+    return _current.get()
+
+
+@contextmanager
+def stage(name):
+    timing = _current.get()
+    if timing is None:
+        yield
+        return
+
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        timing.add(name, (time.perf_counter() - started) * 1000)
+
+
+def add(name, ms):
+    timing = _current.get()
+    if timing is not None:
+        timing.add(name, ms)
+
+
+def since(name, started, exclude=()):
+    """Record the time since `started` (perf_counter) minus stages recorded inside it"""
+    timing = _current.get()
+    if timing is not None:
+        elapsed = (time.perf_counter() - started) * 1000
+        inner = sum(timing.stages.get(n, 0.0) for n in exclude)
+        timing.add(name, max(0.0, elapsed - inner))
+
+
+def add_cpu(seconds):
+    """CPU time the request used on other threads or processes (decode pool tasks)"""
+    timing = _current.get()
+    if timing is not None:
+        timing.pool_cpu_ms += seconds * 1000
+
+
+def note(key, value):
+    """Result provenance, e.g. note("source", "batch") / note("source", "early_exit")"""
+    timing = _current.get()
+    if timing is not None:
+        timing.notes[key] = value
+
+
+# ======================================================
+# MIDDLEWARE
+# ======================================================
+class ServerTimingMiddleware:
+    """Adds Server-Timing to every response when SERVER_TIMING_ENABLED"""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.enabled = getattr(settings, "SERVER_TIMING_ENABLED", True)
+
+    def __call__(self, request):
+        if not self.enabled:
+            return self.get_response(request)
+
+        timing = RequestTiming()
+        token = _current.set(timing)
+        try:
+            response = self.get_response(request)
+        finally:
+            _current.reset(token)
+
+        if timing.render_started is not None:
+            timing.add("render", (time.perf_counter() - timing.render_started) * 1000)
+
+        response["Server-Timing"] = timing.header()
+        return response
+
+    def process_template_response(self, request, response):
+        # DRF responses are rendered right after this hook returns
+        timing = _current.get()
+        if timing is not None:
+            timing.render_started = time.perf_counter()
+        return response
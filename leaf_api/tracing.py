@@ -0,0 +1,284 @@
+# tracing.py
+#
+# Lightweight span tracing written as OTLP/JSON lines to local files, one
+# file per worker process (TRACING_DIR/spans-<pid>.jsonl). Every line is
+# an ExportTraceServiceRequest, the same shape the OpenTelemetry
+# collector's file exporter writes, so the files load into any OTLP tool.
+#
+# TracingMiddleware opens a SERVER span per sampled request; code below it
+# opens children with span(). Work handed to other threads passes the
+# parent explicitly (attach()). A micro-batch is its own trace whose span
+# links to the inference span of every request it served; each of those
+# request spans carries the batch's ids as attributes.
+#
+# With tracing off or the request not sampled, current() is None and every
+# call here is a no-op.
+
+import json
+import logging
+import os
+import queue
+import random
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+
+from . import metrics
+
+logger = logging.getLogger(__name__)
+
+KIND_INTERNAL = 1
+KIND_SERVER = 2
+
+EXPORT_BATCH = 512
+EXPORT_INTERVAL_S = 1.0
+MAX_QUEUE = 20000
+
+_current = ContextVar("trace_span", default=None)
+
+
+# ======================================================
+# SPANS
+# ======================================================
+def _new_id(nbytes):
+    return os.urandom(nbytes).hex()
+
+
+class Span:
+    __slots__ = (
+        "trace_id", "span_id", "parent_id", "name", "kind",
+        "start_ns", "end_ns", "attributes", "links",
+    )
+
+    def __init__(self, name, parent=None, kind=KIND_INTERNAL, start_ns=None, links=(), attributes=None):
+        self.trace_id = parent.trace_id if parent is not None else _new_id(16)
+        self.span_id = _new_id(8)
+        self.parent_id = parent.span_id if parent is not None else ""
+        self.name = name
+        self.kind = kind
+        self.start_ns = start_ns or time.time_ns()
+        self.end_ns = None
+        self.attributes = dict(attributes or {})
+        self.links = list(links)
+
+    def set(self, key, value):
+        self.attributes[key] = value
+
+    def end(self, end_ns=None):
+        self.end_ns = end_ns or time.time_ns()
+        _export(self)
+
+    def to_otlp(self):
+        span = {
+            "traceId": self.trace_id,
+            "spanId": self.span_id,
+            "name": self.name,
+            "kind": self.kind,
+            "startTimeUnixNano": str(self.start_ns),
+            "endTimeUnixNano": str(self.end_ns),
+            "attributes": _attributes(self.attributes),
+            "status": {"code": 2 if self.attributes.get("error") else 0},
+        }
+        if self.parent_id:
+            span["parentSpanId"] = self.parent_id
+        if self.links:
+            span["links"] = [
+                {"traceId": link.trace_id, "spanId": link.span_id}
+                for link in self.links
+            ]
+        return span
+
+
+def _attributes(attrs):
+    out = []
+    for key, value in attrs.items():
+        if isinstance(value, bool):
+            typed = {"boolValue": value}
+        elif isinstance(value, int):
+            typed = {"intValue": str(value)}
+        elif isinstance(value, float):
+            typed = {"doubleValue": value}
+        else:
+            typed = {"stringValue": str(value)}
+        out.append({"key": key, "value": typed})
+    return out
+
+
+# ======================================================
+# RECORDING API
+# ======================================================
+def current():
+    return _current.get()
+
+
+@contextmanager
+def span(name, **attributes):
+    """Child of the current span; no-op when the request is not traced"""
+    parent = _current.get()
+    if parent is None:
+        yield None
+        return
+
+    child = Span(name, parent, attributes=attributes)
+    token = _current.set(child)
+    try:
+        yield child
+    except Exception as e:
+        child.set("error", type(e).__name__)
+        raise
+    finally:
+        _current.reset(token)
+        child.end()
+
+
+@contextmanager
+def attach(parent):
+    """Make `parent` current in this thread, e.g. inside a pool worker"""
+    token = _current.set(parent)
+    try:
+        yield
+    finally:
+        _current.reset(token)
+
+
+def record(name, parent, start_ns, end_ns, **attributes):
+    """A finished child span with explicit timestamps"""
+    if parent is not None:
+        Span(name, parent, start_ns=start_ns, attributes=attributes).end(end_ns)
+
+
+def set_attribute(key, value):
+    active = _current.get()
+    if active is not None:
+        active.set(key, value)
+
+
+# ======================================================
+# EXPORT
+# ======================================================
+class FileExporter:
+    """Background writer: spans are queued and appended in batches"""
+
+    def __init__(self, directory, max_bytes):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self._queue = queue.Queue(maxsize=MAX_QUEUE)
+        self._pid = None
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def submit(self, finished):
+        self._ensure_thread()
+        try:
+            self._queue.put_nowait(finished)
+        except queue.Full:
+            metrics.inc("leaf_api_trace_spans_dropped")
+
+    def _ensure_thread(self):
+        # One writer per process; a forked worker starts its own
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid != os.getpid():
+                self._pid = os.getpid()
+                self._thread = threading.Thread(target=self._run, name="trace-export", daemon=True)
+                self._thread.start()
+
+    def _path(self):
+        return os.path.join(self.directory, f"spans-{os.getpid()}.jsonl")
+
+    def _run(self):
+        while True:
+            spans = [self._queue.get()]
+            deadline = time.monotonic() + EXPORT_INTERVAL_S
+            while len(spans) < EXPORT_BATCH:
+                try:
+                    spans.append(self._queue.get(timeout=max(0.0, deadline - time.monotonic())))
+                except queue.Empty:
+                    break
+            try:
+                self._write(spans)
+            except Exception:
+                logger.exception("Could not export %d spans", len(spans))
+
+    def _write(self, spans):
+        os.makedirs(self.directory, exist_ok=True)
+        path = self._path()
+        if os.path.exists(path) and os.path.getsize(path) > self.max_bytes:
+            os.replace(path, path + ".1")
+
+        line = json.dumps({
+            "resourceSpans": [{
+                "resource": {"attributes": _attributes({
+                    "service.name": "agrihat-backend",
+                    "process.pid": os.getpid(),
+                })},
+                "scopeSpans": [{
+                    "scope": {"name": "leaf_api"},
+                    "spans": [s.to_otlp() for s in spans],
+                }],
+            }]
+        }, separators=(",", ":"))
+
+        with open(path, "a") as f:
+            f.write(line + "\n")
+
+
+_exporter = None
+_exporter_lock = threading.Lock()
+
+
+def _export(finished):
+    global _exporter
+    if _exporter is None:
+        with _exporter_lock:
+            if _exporter is None:
+                _exporter = FileExporter(settings.TRACING_DIR, settings.TRACING_MAX_BYTES)
+    _exporter.submit(finished)
+
+
+# ======================================================
+# MIDDLEWARE
+# ======================================================
+class TracingMiddleware:
+    """Root SERVER span per sampled request, plus its serialization span"""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.enabled = getattr(settings, "TRACING_ENABLED", False)
+        self.sample_rate = getattr(settings, "TRACING_SAMPLE_RATE", 1.0)
+
+    def __call__(self, request):
+        if not self.enabled or random.random() >= self.sample_rate:
+            return self.get_response(request)
+
+        root = Span(f"{request.method} {request.path}", kind=KIND_SERVER, attributes={
+            "http.method": request.method,
+            "http.target": request.path,
+        })
+        request._trace_render_ns = None
+        token = _current.set(root)
+        try:
+            response = self.get_response(request)
+        except Exception as e:
+            root.set("error", type(e).__name__)
+            root.end()
+            raise
+        finally:
+            _current.reset(token)
+
+        if request._trace_render_ns is not None:
+            record("serialize", root, request._trace_render_ns, time.time_ns())
+
+        root.set("http.status_code", response.status_code)
+        root.end()
+        return response
+
+    def process_template_response(self, request, response):
+        # DRF responses are rendered right after this hook returns
+        if _current.get() is not None:
+            request._trace_render_ns = time.time_ns()
+        return response
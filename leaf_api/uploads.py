@@ -0,0 +1,101 @@
+# uploads.py
+#
+# Streaming ingestion of images[] parts. Django parses the multipart body
+# while the view reads request.FILES; with StreamingDecodeHandler
+# installed each image part is written straight to MEDIA_ROOT (hashed on
+# the way) and handed to the decode pool the moment it has fully arrived,
+# so decoding the first images overlaps with receiving the rest. The view
+# then only waits for whatever is still in flight (gather()).
+
+import hashlib
+import os
+import uuid
+
+from django.conf import settings
+from django.core.files.uploadedfile import UploadedFile
+from django.core.files.uploadhandler import FileUploadHandler, StopFutureHandlers
+
+from .ml.preprocess import get_pool
+
+FIELD = "images"
+
+
+class StreamedUpload(UploadedFile):
+    """An images[] part already on disk and already being decoded"""
+
+    def __init__(self, file, name, content_type, size, charset, path, sha256, future):
+        super().__init__(file, name, content_type, size, charset)
+        self.path = path
+        self.sha256 = sha256
+        self.future = future
+
+    def temporary_file_path(self):
+        return self.path
+
+
+class StreamingDecodeHandler(FileUploadHandler):
+    def __init__(self, request=None, check_quality=True):
+        super().__init__(request)
+        self.check_quality = check_quality
+        self.pool = get_pool()
+        self.temp_paths = []
+        self.uploads = []
+        self._file = None
+
+    def new_file(self, field_name, file_name, *args, **kwargs):
+        super().new_file(field_name, file_name, *args, **kwargs)
+        if field_name != FIELD:
+            self._file = None
+            return  # other parts go to the default handlers
+
+        path = os.path.join(settings.MEDIA_ROOT, f"{uuid.uuid4()}_{self.file_name}")
+        # Registered before the first byte so the view's cleanup sees partial writes
+        self.temp_paths.append(path)
+        self._file = open(path, "wb+")
+        self._digest = hashlib.sha256()
+        raise StopFutureHandlers()
+
+    def receive_data_chunk(self, raw_data, start):
+        if self._file is None:
+            return raw_data
+        self._file.write(raw_data)
+        self._digest.update(raw_data)
+        return None
+
+    def file_complete(self, file_size):
+        if self._file is None:
+            return None
+
+        f, self._file = self._file, None
+        f.flush()
+        f.seek(0)
+        path = self.temp_paths[-1]
+        upload = StreamedUpload(
+            f, self.file_name, self.content_type, file_size, self.charset,
+            path, self._digest.hexdigest(), self.pool.submit(path, self.check_quality)
+        )
+        self.uploads.append(upload)
+        return upload
+
+    def upload_interrupted(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def gather(self):
+        """(batch, reports) for the images[] parts, in upload order"""
+        return self.pool.gather([upload.future for upload in self.uploads])
+
+
+def stream_decode(request, check_quality=True):
+    """
+    Install the handler for this request (before anything reads
+    request.data / request.FILES). Returns it, or None when disabled.
+    """
+    if not settings.STREAMING_UPLOAD_DECODE:
+        return None
+
+    handler = StreamingDecodeHandler(request, check_quality)
+    django_request = getattr(request, "_request", request)
+    django_request.upload_handlers = [handler] + list(django_request.upload_handlers)
+    return handler
@@ -1,7 +1,21 @@
 from django.urls import path
-from .views import LeafHealthAPIView, ArecaCoconutAPIView
+from .views import (
+    LeafHealthAPIView, ArecaCoconutAPIView, VideoAPIView, PlantPhotoAPIView, RuntimePlanAPIView, MetricsAPIView, ModelsAPIView,
+    PrevalenceAPIView,
+    UploadSessionCreateAPIView, UploadSessionAPIView, UploadChunkAPIView, UploadFinalizeAPIView,
+)
 
 urlpatterns = [
     path("leaf-health/", LeafHealthAPIView.as_view()),
     path("areca-coconut/", ArecaCoconutAPIView.as_view()),
+    path("video/", VideoAPIView.as_view()),
+    path("plant-photo/", PlantPhotoAPIView.as_view()),
+    path("runtime-plan/", RuntimePlanAPIView.as_view()),
+    path("metrics/", MetricsAPIView.as_view()),
+    path("models/", ModelsAPIView.as_view()),
+    path("analytics/prevalence/", PrevalenceAPIView.as_view()),
+    path("uploads/", UploadSessionCreateAPIView.as_view()),
+    path("uploads/<uuid:session_id>/", UploadSessionAPIView.as_view()),
+    path("uploads/<uuid:session_id>/images/<int:image>/", UploadChunkAPIView.as_view()),
+    path("uploads/<uuid:session_id>/finalize/", UploadFinalizeAPIView.as_view()),
 ]
@@ -4,45 +4,234 @@ from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status
 from django.conf import settings
+from django.http import HttpResponse
+from django.utils.dateparse import parse_date
+import hashlib
 import os
+import time
 import uuid
 
+from . import metrics, resumable, timing, tracing
+from .localization import AdvisoryJSONRenderer, negotiate_locale
+from .models import UploadSession
+from .profiling import profiled
+from .progression import observe, record_observation, valid_plot
+from .recorder import record_prediction
+from .shadow import maybe_shadow
+from .rollups import GROUP_FIELDS, PERIODS, query_prevalence
+from .uploads import stream_decode
+from .ml import leaf_engine, areca_coconut_engine
 from .ml.leaf_engine import predict_images as leaf_predict
 from .ml.areca_coconut_engine import predict_images as areca_predict
+from .ml.advisory import localize, translate_result
+from .ml.engine import ENGINES, get_engine
+from .ml.embeddings import attach_similar_cases
+from .ml.planner import get_plan
+from .ml.tensor_store import store_submission
+from .ml.tensor_upload import TensorUploadError, read_tensor_uploads
+from .ml.tiling import TilingError, tile_image
+from .ml.video import VideoError, sample_video
 
 
-class LeafHealthAPIView(APIView):
+def save_uploads(images, temp_paths):
     """
-    POST:
-    - crop
-    - images[]
+    Write uploads to MEDIA_ROOT, appending each path to `temp_paths` as
+    soon as it exists so the caller's cleanup sees partial writes.
+    Returns the sha256 hex digest of every image.
     """
+    hashes = []
 
-    def post(self, request):
+    for img in images:
+        filename = f"{uuid.uuid4()}_{img.name}"
+        path = os.path.join(settings.MEDIA_ROOT, filename)
+        temp_paths.append(path)
+        digest = hashlib.sha256()
+
+        with tracing.span("upload.write", bytes=img.size), open(path, "wb+") as f:
+            for chunk in img.chunks():
+                f.write(chunk)
+                digest.update(chunk)
+
+        hashes.append(digest.hexdigest())
+
+    return hashes
+
+
+PLOT_ERROR = "plot must be 1-64 letters, digits, '.', '_' or '-'"
+BOTH_INPUTS_ERROR = "Send either images[] or tensors[], not both"
+
+
+def finish_prediction(endpoint, crop, result, details, hashes, started, plot=""):
+    """
+    Store tensors, count, record the submission and maybe shadow it;
+    adds model_version / submission_id (and similar_cases, progression)
+    to `result`
+    """
+    store_submission(endpoint, hashes, details)
+    result["model_version"] = details["model_version"]
+    if "calibration_version" in details:
+        result["calibration_version"] = details["calibration_version"]
+    metrics.inc("leaf_api_predictions", labels={"model": endpoint, "version": details["model_version"]})
+
+    observation = observe(endpoint, plot, result, details, crop) if plot else None
+    if observation is not None:
+        # One indexed row, however long the plot's history (progression.py)
+        progression = record_observation(observation)
+        if progression is not None:
+            result["progression"] = progression
+
+    result["submission_id"] = str(record_prediction(
+        endpoint, crop, result, details, hashes,
+        (time.perf_counter() - started) * 1000, plot
+    ))
+    attach_similar_cases(endpoint, details, result)
+    maybe_shadow(endpoint, crop, details, result)
+    return result
+
+
+def localized_response(request, endpoint, result, label):
+    """`result` in the request's locale, from the pre-rendered advisories (ml/advisory.py)"""
+    locale = negotiate_locale(request)
+    response = Response(localize(endpoint, result, label, locale), status=status.HTTP_200_OK)
+    response["Content-Language"] = locale
+    return response
+
+
+def predict_sampled_upload(request, field, max_bytes, input_kind, sample, sample_error, row_names, info_key):
+    """
+    POST flow of the one-upload endpoints (video, plant photo): validate,
+    save the `field` upload, turn it into a batch with
+    sample(path, check_quality) -> (batch, reports, info), score it with
+    the engine named by `endpoint` and return `info` under `info_key`.
+    row_names(info) names the batch rows in quality messages.
+    """
+    upload_started = time.perf_counter()
+    temp_paths = []
+
+    try:
+        endpoint = request.data.get("endpoint")
         crop = request.data.get("crop")
-        images = request.FILES.getlist("images")
+        plot = request.data.get("plot", "")
+        upload = request.FILES.get(field)
 
-        if not crop or len(images) < 3:
+        if endpoint not in ENGINES:
             return Response(
-                {"error": "Crop and minimum 3 images required"},
+                {"error": f"endpoint must be one of {', '.join(sorted(ENGINES))}"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        model = get_engine(endpoint).engine.model
+        if not upload or (model.requires_crop and not crop):
+            needs = f" (and crop for {endpoint})" if model.requires_crop else ""
+            return Response(
+                {"error": f"{field.capitalize()} required{needs}"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        if plot and not valid_plot(plot):
+            return Response({"error": PLOT_ERROR}, status=status.HTTP_400_BAD_REQUEST)
+        if upload.size > max_bytes:
+            return Response(
+                {"error": f"{field.capitalize()} must be at most {max_bytes} bytes"},
                 status=status.HTTP_400_BAD_REQUEST
             )
 
-        temp_paths = []
+        save_uploads([upload], temp_paths)
+        timing.since("upload", upload_started)
+        timing.note("input", input_kind)
+
+        started = time.perf_counter()
+        details = {}
+
+        try:
+            batch, reports, info = sample(temp_paths[0], check_quality=model.check_quality)
+        except sample_error as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        # Rows are tensors from here on: hash them like tensor uploads
+        hashes = [hashlib.sha256(row.tobytes()).hexdigest() for row in batch]
+
+        crop = crop.capitalize() if model.requires_crop else ""
+        result = get_engine(endpoint).engine.predict_batch(
+            batch, reports, details, names=row_names(info), crop=crop or None
+        )
+        timing.since("aggregation", started, exclude=("decode", "inference"))
+
+        finish_prediction(endpoint, crop, result, details, hashes, started, plot)
+        result[info_key] = info
+        return localized_response(request, endpoint, result, details.get("label"))
+
+    finally:
+        for path in temp_paths:
+            if os.path.exists(path):
+                os.remove(path)
+
+
+class LeafHealthAPIView(APIView):
+    """
+    POST:
+    - crop
+    - images[]  or  tensors[] + stats (+ tensor_encoding), see ml/tensor_upload.py
+    - plot      (optional) plot / field id for progression tracking
+    - ?lang= or Accept-Language picks the advisory language (ADVISORY_LOCALES)
+    """
+    renderer_classes = [AdvisoryJSONRenderer]
+
+    @profiled("leaf")
+    def post(self, request):
+        upload_started = time.perf_counter()
+        streamed = stream_decode(request, check_quality=True)
+        temp_paths = streamed.temp_paths if streamed else []
 
         try:
-            for img in images:
-                filename = f"{uuid.uuid4()}_{img.name}"
-                path = os.path.join(settings.MEDIA_ROOT, filename)
+            # Parsing the body writes images[] to disk and starts decoding them
+            crop = request.data.get("crop")
+            plot = request.data.get("plot", "")
+            images = request.FILES.getlist("images")
+            tensors = request.FILES.getlist("tensors")
+
+            if images and tensors:
+                return Response({"error": BOTH_INPUTS_ERROR}, status=status.HTTP_400_BAD_REQUEST)
+            if not crop or len(tensors or images) < 3:
+                return Response(
+                    {"error": "Crop and minimum 3 images required"},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+            if plot and not valid_plot(plot):
+                return Response({"error": PLOT_ERROR}, status=status.HTTP_400_BAD_REQUEST)
+
+            started = time.perf_counter()
+            details = {}
+
+            if tensors:
+                try:
+                    batch, reports, hashes = read_tensor_uploads(
+                        tensors, request.data.get("stats"), request.data.get("tensor_encoding")
+                    )
+                except TensorUploadError as e:
+                    return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+                timing.since("upload", upload_started)
+                timing.note("input", "tensor")
 
-                with open(path, "wb+") as f:
-                    for chunk in img.chunks():
-                        f.write(chunk)
+                engine_started = time.perf_counter()
+                result = leaf_engine.predict_batch(
+                    batch, reports, [t.name for t in tensors], crop.capitalize(), details
+                )
+            elif streamed:
+                hashes = [img.sha256 for img in images]
+                timing.since("upload", upload_started)
 
-                temp_paths.append(path)
+                engine_started = time.perf_counter()
+                batch, reports = streamed.gather()
+                result = leaf_engine.predict_batch(
+                    batch, reports, [os.path.basename(img.path) for img in images], crop.capitalize(), details
+                )
+            else:
+                hashes = save_uploads(images, temp_paths)
+                timing.since("upload", upload_started)
 
-            result = leaf_predict(temp_paths, crop.capitalize())
-            return Response(result, status=status.HTTP_200_OK)
+                engine_started = time.perf_counter()
+                result = leaf_predict(temp_paths, crop.capitalize(), details)
+            timing.since("aggregation", engine_started, exclude=("decode", "inference"))
+            finish_prediction("leaf", crop.capitalize(), result, details, hashes, started, plot)
+            return localized_response(request, "leaf", result, details.get("label"))
 
         finally:
             for path in temp_paths:
@@ -53,33 +242,314 @@ class LeafHealthAPIView(APIView):
 class ArecaCoconutAPIView(APIView):
     """
     POST:
-    - images[]
+    - images[]  or  tensors[] (+ tensor_encoding), see ml/tensor_upload.py
+    - plot      (optional) plot / field id for progression tracking
+    - ?lang= or Accept-Language picks the advisory language (ADVISORY_LOCALES)
+    """
+    renderer_classes = [AdvisoryJSONRenderer]
+
+    @profiled("areca_coconut")
+    def post(self, request):
+        upload_started = time.perf_counter()
+        streamed = stream_decode(request, check_quality=False)
+        temp_paths = streamed.temp_paths if streamed else []
+
+        try:
+            # Parsing the body writes images[] to disk and starts decoding them
+            plot = request.data.get("plot", "")
+            images = request.FILES.getlist("images")
+            tensors = request.FILES.getlist("tensors")
+
+            if images and tensors:
+                return Response({"error": BOTH_INPUTS_ERROR}, status=status.HTTP_400_BAD_REQUEST)
+            if len(tensors or images) < 3:
+                return Response(
+                    {"error": "Minimum 3 images required"},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+            if plot and not valid_plot(plot):
+                return Response({"error": PLOT_ERROR}, status=status.HTTP_400_BAD_REQUEST)
+
+            started = time.perf_counter()
+            details = {}
+
+            if tensors:
+                try:
+                    # No quality gate on this endpoint, so stats are optional
+                    batch, reports, hashes = read_tensor_uploads(
+                        tensors, None, request.data.get("tensor_encoding"), check_quality=False
+                    )
+                except TensorUploadError as e:
+                    return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+                timing.since("upload", upload_started)
+                timing.note("input", "tensor")
+
+                engine_started = time.perf_counter()
+                result = areca_coconut_engine.predict_batch(batch, reports, details)
+            elif streamed:
+                hashes = [img.sha256 for img in images]
+                timing.since("upload", upload_started)
+
+                engine_started = time.perf_counter()
+                batch, reports = streamed.gather()
+                result = areca_coconut_engine.predict_batch(batch, reports, details)
+            else:
+                hashes = save_uploads(images, temp_paths)
+                timing.since("upload", upload_started)
+
+                engine_started = time.perf_counter()
+                result = areca_predict(temp_paths, details)
+            timing.since("aggregation", engine_started, exclude=("decode", "inference"))
+            finish_prediction("areca_coconut", "", result, details, hashes, started, plot)
+            return localized_response(request, "areca_coconut", result, details.get("label"))
+
+        finally:
+            for path in temp_paths:
+                if os.path.exists(path):
+                    os.remove(path)
+
+
+class VideoAPIView(APIView):
+    """
+    POST:
+    - endpoint  leaf | areca_coconut
+    - crop      (leaf only)
+    - video     short sweep over the plant, see ml/video.py
+    - plot      (optional) plot / field id for progression tracking
+    - ?lang= or Accept-Language picks the advisory language (ADVISORY_LOCALES)
     """
+    renderer_classes = [AdvisoryJSONRenderer]
 
+    @profiled("video")
     def post(self, request):
-        images = request.FILES.getlist("images")
+        return predict_sampled_upload(
+            request, "video", settings.VIDEO_MAX_BYTES, "video", sample_video, VideoError,
+            lambda info: [f"frame at {f['time_s']}s" for f in info["frames"]], "video"
+        )
+
 
-        if len(images) < 3:
+class PlantPhotoAPIView(APIView):
+    """
+    POST:
+    - endpoint  leaf | areca_coconut
+    - crop      (leaf only)
+    - image     one photo of a whole plant or canopy, see ml/tiling.py
+    - plot      (optional) plot / field id for progression tracking
+    - ?lang= or Accept-Language picks the advisory language (ADVISORY_LOCALES)
+    """
+    renderer_classes = [AdvisoryJSONRenderer]
+
+    @profiled("plant_photo")
+    def post(self, request):
+        return predict_sampled_upload(
+            request, "image", settings.TILE_MAX_BYTES, "tiles", tile_image, TilingError,
+            lambda info: [f"region at {t['x']},{t['y']}" for t in info["tiles"]], "tiles"
+        )
+
+
+class RuntimePlanAPIView(APIView):
+    """
+    GET:
+    - worker / thread / decode-pool split and micro-batch sizes of this worker
+    """
+
+    def get(self, request):
+        return Response(get_plan(), status=status.HTTP_200_OK)
+
+
+class MetricsAPIView(APIView):
+    """
+    GET:
+    - Prometheus text exposition of this worker's metrics
+    """
+
+    def get(self, request):
+        return HttpResponse(metrics.render(), content_type="text/plain; version=0.0.4")
+
+
+class ModelsAPIView(APIView):
+    """
+    GET:
+    - active / previous / available versions of every model serving this worker
+    """
+
+    def get(self, request):
+        models = {name: get_engine(name).engine.registry.describe() for name in ENGINES}
+        return Response(models, status=status.HTTP_200_OK)
+
+
+class PrevalenceAPIView(APIView):
+    """
+    GET:
+    - period    day | week (default week)
+    - from, to  YYYY-MM-DD (optional)
+    - crop, label, status (optional filters)
+    - group_by  comma separated subset of crop,label,status (default all)
+    """
+
+    def get(self, request):
+        params = request.query_params
+        period = params.get("period", "week")
+
+        if period not in PERIODS:
             return Response(
-                {"error": "Minimum 3 images required"},
+                {"error": f"period must be one of {', '.join(PERIODS)}"},
                 status=status.HTTP_400_BAD_REQUEST
             )
 
+        dates = {}
+        for key in ("from", "to"):
+            value = params.get(key)
+            dates[key] = parse_date(value) if value else None
+            if value and dates[key] is None:
+                return Response(
+                    {"error": f"{key} must be a date (YYYY-MM-DD)"},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+
+        group_by = [f for f in params.get("group_by", ",".join(GROUP_FIELDS)).split(",") if f]
+        if any(f not in GROUP_FIELDS for f in group_by):
+            return Response(
+                {"error": f"group_by must be a subset of {','.join(GROUP_FIELDS)}"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        buckets = query_prevalence(
+            period=period,
+            start=dates["from"],
+            end=dates["to"],
+            crop=params.get("crop"),
+            label=params.get("label"),
+            status=params.get("status"),
+            group_by=group_by
+        )
+
+        return Response({
+            "period": period,
+            "buckets": buckets,
+            "total": sum(b["count"] for b in buckets),
+        }, status=status.HTTP_200_OK)
+
+
+class UploadSessionCreateAPIView(APIView):
+    """
+    POST (JSON):
+    - endpoint  leaf | areca_coconut
+    - crop      (leaf only)
+    - sizes     byte size of every image, 3 to UPLOAD_MAX_IMAGES entries
+    """
+
+    def post(self, request):
+        try:
+            session = resumable.create_session(
+                request.data.get("endpoint"), request.data.get("crop"), request.data.get("sizes")
+            )
+        except resumable.UploadError as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        resumable.start_cleaner()
+        return Response({
+            "session_id": str(session.id),
+            "chunk_size": settings.UPLOAD_CHUNK_SIZE,
+            "expires_after_idle_h": settings.UPLOAD_SESSION_TTL_H,
+        }, status=status.HTTP_201_CREATED)
+
+
+class UploadSessionAPIView(APIView):
+    """
+    GET:
+    - bytes received per image (resume from there), and the result once finalized
+    """
+
+    def get(self, request, session_id):
+        session = UploadSession.objects.filter(pk=session_id).first()
+        if session is None:
+            return Response({"error": "Unknown upload session"}, status=status.HTTP_404_NOT_FOUND)
+
+        return Response({
+            "session_id": str(session.id),
+            "sizes": session.sizes,
+            "received": resumable.received(session),
+            "finalized": session.finalized_at is not None,
+            "result": session.result,
+        }, status=status.HTTP_200_OK)
+
+
+class UploadChunkAPIView(APIView):
+    """
+    PUT (raw body):
+    - offset          query parameter, byte offset of the chunk in the image
+    - X-Chunk-SHA256  optional; with an empty body reuses a chunk the server already has
+    """
+
+    def put(self, request, session_id, image):
+        session = UploadSession.objects.filter(pk=session_id).first()
+        if session is None:
+            return Response({"error": "Unknown upload session"}, status=status.HTTP_404_NOT_FOUND)
+
+        try:
+            offset = int(request.query_params.get("offset", ""))
+        except ValueError:
+            return Response({"error": "offset is required"}, status=status.HTTP_400_BAD_REQUEST)
+
+        try:
+            received = resumable.add_chunk(
+                session, image, offset, request.body, request.headers.get("X-Chunk-SHA256")
+            )
+        except resumable.UploadError as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        return Response({"image": image, "received": received[image]}, status=status.HTTP_200_OK)
+
+
+class UploadFinalizeAPIView(APIView):
+    """
+    POST:
+    - runs the session's prediction endpoint on the assembled images;
+      repeating it returns the same result
+    - ?lang= or Accept-Language picks the advisory language (ADVISORY_LOCALES)
+    """
+    renderer_classes = [AdvisoryJSONRenderer]
+
+    def post(self, request, session_id):
+        session = UploadSession.objects.filter(pk=session_id).first()
+        if session is None:
+            return Response({"error": "Unknown upload session"}, status=status.HTTP_404_NOT_FOUND)
+        if session.result is not None:
+            # Stored in English; its label is not kept, so no pre-rendered fragment
+            locale = negotiate_locale(request)
+            response = Response(translate_result(session.result, locale), status=status.HTTP_200_OK)
+            response["Content-Language"] = locale
+            return response
+
+        if not resumable.claim_for_finalize(session):
+            return Response({"error": "Upload is already being finalized"}, status=status.HTTP_409_CONFLICT)
+
+        started = time.perf_counter()
         temp_paths = []
 
         try:
-            for img in images:
-                filename = f"{uuid.uuid4()}_{img.name}"
-                path = os.path.join(settings.MEDIA_ROOT, filename)
+            hashes = resumable.assemble(session, settings.MEDIA_ROOT, temp_paths)
+
+            details = {}
+            if session.endpoint == "leaf":
+                crop = session.crop.capitalize()
+                result = leaf_predict(temp_paths, crop, details)
+            else:
+                crop = ""
+                result = areca_predict(temp_paths, details)
+            finish_prediction(session.endpoint, crop, result, details, hashes, started)
 
-                with open(path, "wb+") as f:
-                    for chunk in img.chunks():
-                        f.write(chunk)
+            UploadSession.objects.filter(pk=session.pk).update(result=result)
+            return localized_response(request, session.endpoint, result, details.get("label"))
 
-                temp_paths.append(path)
+        except resumable.UploadError as e:
+            resumable.release_claim(session)
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
 
-            result = areca_predict(temp_paths)
-            return Response(result, status=status.HTTP_200_OK)
+        except Exception:
+            resumable.release_claim(session)
+            raise
 
         finally:
             for path in temp_paths:
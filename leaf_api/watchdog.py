@@ -0,0 +1,180 @@
+# watchdog.py
+#
+# Per-worker memory watchdog. A thread samples the worker's RSS every
+# MEMORY_SAMPLE_INTERVAL_S and publishes it as metrics. When RSS crosses
+# the ceiling, or grows faster than MEMORY_GROWTH_LIMIT_MB_PER_H over
+# MEMORY_GROWTH_WINDOW_S (after MEMORY_WARMUP_S of model loading), the
+# worker recycles itself gracefully: gunicorn finishes the requests in
+# flight, the worker exits and the arbiter forks a replacement, which
+# loads and warms its models before it accepts traffic (gunicorn.conf.py).
+#
+# Every recycle is appended to MEMORY_EVENTS_FILE, so the history
+# survives the worker that wrote it; new workers publish the totals.
+
+import json
+import logging
+import os
+import signal
+import threading
+import time
+from collections import Counter, deque
+
+from django.conf import settings
+
+from . import metrics
+from .ml.planner import cgroup_memory_limit, get_plan
+
+logger = logging.getLogger(__name__)
+
+MB = 1024 * 1024
+# Share of the container's memory the workers may use together before recycling
+AUTO_LIMIT_SHARE = 0.9
+
+
+def current_rss():
+    with open("/proc/self/statm") as f:
+        return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+
+
+def default_limit():
+    """MEMORY_LIMIT_MB, or an equal share of the cgroup limit per worker"""
+    if settings.MEMORY_LIMIT_MB:
+        return settings.MEMORY_LIMIT_MB * MB
+    limit = cgroup_memory_limit()
+    if limit is None:
+        return None
+    return int(limit * AUTO_LIMIT_SHARE / get_plan()["workers"])
+
+
+class MemoryWatchdog:
+    def __init__(self, limit_bytes, growth_limit_bytes_per_h, interval_s, window_s, warmup_s,
+                 on_recycle, rss_fn=current_rss, clock=time.monotonic):
+        self.limit = limit_bytes
+        self.growth_limit = growth_limit_bytes_per_h
+        self.interval = interval_s
+        self.window = window_s
+        self.warmup = warmup_s
+        self.on_recycle = on_recycle
+        self.rss_fn = rss_fn
+        self.clock = clock
+
+        self.started = clock()
+        self.peak = 0
+        self._samples = deque()
+        self._thread = None
+
+    def growth_per_h(self):
+        """RSS slope (bytes/hour) across the window, None until the window is covered"""
+        if len(self._samples) < 2:
+            return None
+        (t0, rss0), (t1, rss1) = self._samples[0], self._samples[-1]
+        if t1 - t0 < self.window * 0.8:
+            return None
+        return (rss1 - rss0) / (t1 - t0) * 3600
+
+    def check(self):
+        """Take one sample; returns the recycle reason or None"""
+        now, rss = self.clock(), self.rss_fn()
+        self.peak = max(self.peak, rss)
+
+        if now - self.started >= self.warmup:
+            self._samples.append((now, rss))
+            while self._samples and now - self._samples[0][0] > self.window:
+                self._samples.popleft()
+
+        growth = self.growth_per_h()
+        metrics.set_gauge("leaf_api_worker_rss_bytes", rss)
+        metrics.set_gauge("leaf_api_worker_rss_peak_bytes", self.peak)
+        if growth is not None:
+            metrics.set_gauge("leaf_api_worker_rss_growth_bytes_per_hour", growth)
+
+        if self.limit and rss > self.limit:
+            return "rss_limit"
+        if self.growth_limit and growth is not None and growth > self.growth_limit:
+            return "rss_growth"
+        return None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="memory-watchdog", daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        while True:
+            time.sleep(self.interval)
+            try:
+                reason = self.check()
+            except Exception:
+                logger.exception("Memory watchdog sample failed")
+                continue
+            if reason:
+                self._recycle(reason)
+                return
+
+    def _recycle(self, reason):
+        rss, growth = self.rss_fn(), self.growth_per_h()
+        event = {
+            "ts": time.time(),
+            "pid": os.getpid(),
+            "reason": reason,
+            "rss_mb": round(rss / MB, 1),
+            "limit_mb": round(self.limit / MB, 1) if self.limit else None,
+            "growth_mb_per_h": round(growth / MB, 1) if growth is not None else None,
+            "uptime_s": round(self.clock() - self.started),
+        }
+        logger.warning("Recycling worker %s: %s (RSS %.0f MB)", event["pid"], reason, event["rss_mb"])
+        metrics.inc("leaf_api_worker_recycles", labels={"reason": reason})
+
+        try:
+            with open(settings.MEMORY_EVENTS_FILE, "a") as f:
+                f.write(json.dumps(event) + "\n")
+        except OSError:
+            logger.exception("Could not record recycle event")
+
+        self.on_recycle()
+
+
+def recycle_history(path):
+    """Recycle counts per reason from the events file"""
+    counts = Counter()
+    try:
+        with open(path) as f:
+            for line in f:
+                try:
+                    counts[json.loads(line)["reason"]] += 1
+                except (ValueError, KeyError):
+                    continue
+    except OSError:
+        pass
+    return counts
+
+
+def _graceful_exit():
+    # SIGTERM to a gunicorn worker: stop accepting, finish in-flight requests, exit
+    os.kill(os.getpid(), signal.SIGTERM)
+
+
+def start_watchdog(on_recycle=_graceful_exit):
+    """Start the watchdog in this worker; returns it, or None when disabled"""
+    if not settings.MEMORY_WATCHDOG_ENABLED:
+        return None
+
+    metrics.describe("leaf_api_worker_rss_bytes", "Resident memory of this worker")
+    metrics.describe("leaf_api_worker_recycles_recorded", "Memory recycles recorded by all workers so far")
+    for reason, count in recycle_history(settings.MEMORY_EVENTS_FILE).items():
+        metrics.set_gauge("leaf_api_worker_recycles_recorded", count, {"reason": reason})
+
+    watchdog = MemoryWatchdog(
+        limit_bytes=default_limit(),
+        growth_limit_bytes_per_h=settings.MEMORY_GROWTH_LIMIT_MB_PER_H * MB,
+        interval_s=settings.MEMORY_SAMPLE_INTERVAL_S,
+        window_s=settings.MEMORY_GROWTH_WINDOW_S,
+        warmup_s=settings.MEMORY_WARMUP_S,
+        on_recycle=on_recycle,
+    )
+    watchdog.start()
+    logger.info(
+        "Memory watchdog: limit %s MB, growth limit %s MB/h",
+        round(watchdog.limit / MB) if watchdog.limit else "none",
+        settings.MEMORY_GROWTH_LIMIT_MB_PER_H or "none"
+    )
+    return watchdog